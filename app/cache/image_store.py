@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def image_key(model: str, prompt: str, **params: Any) -> str:
+    """Content address of an image request: sha256 over model, prompt and params."""
+    blob = json.dumps(
+        {"model": model, "prompt": prompt, "params": params},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _ext_for(data: bytes) -> str:
+    if data.startswith(b"\xff\xd8"):
+        return ".jpg"
+    return ".png"
+
+
+class ImageStore:
+    """Content-addressed image files in ``root`` with a SQLite index.
+
+    A request key (see :func:`image_key`) maps to the sha256 of the image
+    bytes, and each distinct image is stored once as ``<sha256>.<ext>``, so two
+    requests producing the same picture share a file.  Lookups only read the
+    index.  With ``quota_bytes`` the least recently used images are deleted
+    once the total size exceeds the quota.  The index file
+    (``.image_index.sqlite`` in ``root``) is created on the first :meth:`put`.
+    """
+
+    INDEX_NAME = ".image_index.sqlite"
+
+    def __init__(self, root: str | Path = "media", *, quota_bytes: int = 0) -> None:
+        self.root = Path(root)
+        self.quota_bytes = quota_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stats = {"hits": 0, "misses": 0, "dedup": 0, "evictions": 0}
+
+    def _db(self, create: bool) -> Optional[sqlite3.Connection]:
+        if self._conn is None:
+            path = self.root / self.INDEX_NAME
+            if not create and not path.exists():
+                return None
+            self.root.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS keys (k TEXT PRIMARY KEY, digest TEXT)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs "
+                "(digest TEXT PRIMARY KEY, filename TEXT, size INT, accessed_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS blobs_accessed ON blobs (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Filename (relative to ``root``) stored for ``key`` or ``None``."""
+        with self._lock:
+            conn = self._db(create=False)
+            row = None
+            if conn is not None:
+                row = conn.execute(
+                    "SELECT b.digest, b.filename FROM keys k JOIN blobs b ON b.digest = k.digest "
+                    "WHERE k.k = ?",
+                    (key,),
+                ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            digest, filename = row
+            if not (self.root / filename).exists():
+                # файл удалили вручную — забываем запись
+                self._drop_locked(conn, digest)
+                conn.commit()
+                self._stats["misses"] += 1
+                return None
+            conn.execute("UPDATE blobs SET accessed_at = ? WHERE digest = ?", (time.time(), digest))
+            conn.commit()
+            self._stats["hits"] += 1
+            return filename
+
+    def put(self, key: str, data: bytes) -> str:
+        """Store ``data`` for ``key`` and return its filename relative to ``root``."""
+        digest = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self._lock:
+            conn = self._db(create=True)
+            assert conn is not None
+            row = conn.execute("SELECT filename FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row is not None and (self.root / row[0]).exists():
+                filename = row[0]
+                self._stats["dedup"] += 1
+                conn.execute("UPDATE blobs SET accessed_at = ? WHERE digest = ?", (now, digest))
+            else:
+                filename = digest + _ext_for(data)
+                tmp = self.root / f".{filename}.tmp"
+                tmp.write_bytes(data)
+                os.replace(tmp, self.root / filename)
+                conn.execute(
+                    "INSERT OR REPLACE INTO blobs (digest, filename, size, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (digest, filename, len(data), now),
+                )
+            conn.execute("INSERT OR REPLACE INTO keys (k, digest) VALUES (?, ?)", (key, digest))
+            if self.quota_bytes:
+                self._evict_locked(conn, keep=digest)
+            conn.commit()
+            return filename
+
+    def _drop_locked(self, conn: sqlite3.Connection, digest: str) -> None:
+        conn.execute("DELETE FROM keys WHERE digest = ?", (digest,))
+        conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+
+    def _evict_locked(self, conn: sqlite3.Connection, keep: str) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.quota_bytes:
+            return
+        rows = conn.execute(
+            "SELECT digest, filename, size FROM blobs WHERE digest != ? ORDER BY accessed_at",
+            (keep,),
+        ).fetchall()
+        for digest, filename, size in rows:
+            if total <= self.quota_bytes:
+                break
+            try:
+                (self.root / filename).unlink()
+            except FileNotFoundError:
+                pass
+            self._drop_locked(conn, digest)
+            total -= size
+            self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._db(create=False)
+            entries, size = (0, 0)
+            if conn is not None:
+                entries, size = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+                ).fetchone()
+            return {**self._stats, "entries": entries, "bytes": size}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_stores: Dict[Path, ImageStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_image_store(root: str | Path, *, quota_bytes: int = 0) -> ImageStore:
+    """Shared :class:`ImageStore` for ``root`` (one per directory per process)."""
+    key = Path(root).resolve()
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ImageStore(root, quota_bytes=quota_bytes)
+        store.quota_bytes = quota_bytes
+        return store
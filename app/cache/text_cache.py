@@ -1,31 +1,157 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import sqlite3
+import threading
 import time
+from collections import OrderedDict
 from pathlib import Path
+from typing import Any, Dict, Iterable
+
+
+def make_key(model: str, system: str, messages: Any, params: Dict[str, Any] | None = None) -> str:
+    """Content address of an LLM request: sha256 over its canonical JSON form."""
+    blob = json.dumps(
+        {"model": model, "system": system, "messages": messages, "params": params or {}},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
 
 
 class TextCache:
-    """Simple key-value cache backed by SQLite."""
+    """Key-value cache backed by SQLite with an in-memory LRU in front.
+
+    ``ttl`` (seconds, ``0`` — forever) expires old entries, ``max_entries``
+    bounds the SQLite table (least recently used rows are evicted) and
+    ``l1_size`` bounds the in-process dict.  Counters are available via
+    :meth:`stats`.
 
-    def __init__(self, path: str | Path = "var/text_cache.sqlite") -> None:
+    Hits served from the dict do not touch SQLite; their access times are
+    collected and written before the next eviction, so hot keys stay the
+    most recently used rows.
+    """
+
+    def __init__(
+        self,
+        path: str | Path = "var/text_cache.sqlite",
+        *,
+        ttl: int = 0,
+        max_entries: int = 0,
+        l1_size: int = 1024,
+    ) -> None:
         self.path = Path(path)
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(self.path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.l1_size = l1_size
+        self._l1: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._touched: Dict[str, int] = {}  # L1-хиты, ещё не записанные в accessed_at
+        self._lock = threading.Lock()
+        self._stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "bytes_saved": 0, "evictions": 0}
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        # a cache does not need fsync per write
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
         self.conn.execute(
             "CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, v TEXT, created_at INT)"
         )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(kv)")}
+        if "accessed_at" not in columns:
+            self.conn.execute("ALTER TABLE kv ADD COLUMN accessed_at INT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS kv_accessed ON kv (accessed_at)")
         self.conn.commit()
 
+    def _expired(self, created_at: int, now: float) -> bool:
+        return bool(self.ttl) and now - created_at > self.ttl
+
+    def _remember(self, key: str, value: str, created_at: int) -> None:
+        self._l1[key] = (value, created_at)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_size:
+            self._l1.popitem(last=False)
+
+    def _hit(self, kind: str, value: str) -> str:
+        self._stats[kind] += 1
+        self._stats["bytes_saved"] += len(value.encode("utf-8"))
+        return value
+
+    def _lookup(self, key: str, now: float) -> str | None:
+        cached = self._l1.get(key)
+        if cached is not None:
+            value, created_at = cached
+            if not self._expired(created_at, now):
+                self._l1.move_to_end(key)
+                self._touched[key] = int(now)
+                return self._hit("l1_hits", value)
+            del self._l1[key]
+
+        row = self.conn.execute("SELECT v, created_at FROM kv WHERE k = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if self._expired(created_at or 0, now):
+            self.conn.execute("DELETE FROM kv WHERE k = ?", (key,))
+            self.conn.commit()
+            return None
+        self.conn.execute("UPDATE kv SET accessed_at = ? WHERE k = ?", (int(now), key))
+        self.conn.commit()
+        self._remember(key, value, created_at or 0)
+        return self._hit("l2_hits", value)
+
     def get(self, key: str) -> str | None:
-        cur = self.conn.execute("SELECT v FROM kv WHERE k = ?", (key,))
-        row = cur.fetchone()
-        return row[0] if row else None
+        return self.get_first([key])
+
+    def get_first(self, keys: Iterable[str]) -> str | None:
+        """Value of the first cached key; a miss of all of them counts as one."""
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                value = self._lookup(key, now)
+                if value is not None:
+                    return value
+            self._stats["misses"] += 1
+            return None
+
+    def _flush_touched(self) -> None:
+        if self._touched:
+            self.conn.executemany(
+                "UPDATE kv SET accessed_at = MAX(COALESCE(accessed_at, 0), ?) WHERE k = ?",
+                [(ts, key) for key, ts in self._touched.items()],
+            )
+            self._touched.clear()
 
     def set(self, key: str, value: str) -> None:
-        self.conn.execute(
-            "INSERT INTO kv (k, v, created_at) VALUES (?, ?, ?) "
-            "ON CONFLICT(k) DO UPDATE SET v=excluded.v, created_at=excluded.created_at",
-            (key, value, int(time.time())),
-        )
-        self.conn.commit()
+        now = int(time.time())
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO kv (k, v, created_at, accessed_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(k) DO UPDATE SET v=excluded.v, created_at=excluded.created_at, "
+                "accessed_at=excluded.accessed_at",
+                (key, value, now, now),
+            )
+            self._touched.pop(key, None)
+            if self.max_entries:
+                self._flush_touched()
+                cur = self.conn.execute(
+                    "DELETE FROM kv WHERE k IN (SELECT k FROM kv "
+                    "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+                self._stats["evictions"] += max(cur.rowcount, 0)
+            self.conn.commit()
+            self._remember(key, value, now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._l1.pop(key, None)
+            self._touched.pop(key, None)
+            self.conn.execute("DELETE FROM kv WHERE k = ?", (key,))
+            self.conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+            return {**self._stats, "entries": entries, "l1_entries": len(self._l1)}
@@ -1,10 +1,19 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
 import typer
-from typing import Optional
+from typing import List, Optional
 
 from .orchestration.pipeline import LessonConfig, build_lesson
 from .settings import settings  # noqa: F401  - trigger config loading
+from .telemetry.jsonl import EVENTS_PATH
+from .telemetry.query import DAILY_DIR
 
 app = typer.Typer(help="MCP Language Assistant CLI")
+events_app = typer.Typer(help="Query telemetry events (var/telemetry/events.jsonl)")
+app.add_typer(events_app, name="events")
 
 
 @app.command("build-lesson")
@@ -46,5 +55,151 @@ def youtube_to_anki(
     typer.echo({k: (len(v) if isinstance(v, list) else v) for k, v in result.items()})
 
 
+@app.command("bench")
+def bench_cmd(
+    cards: int = typer.Option(20, "--cards", "-n", help="How many cards to build"),
+    concurrency: int = typer.Option(4, "--concurrency", "-c", help="Cards in parallel"),
+    words: str = typer.Option("Hund,Haus,Baum", help="Comma-separated words, cycled"),
+    deck: str = typer.Option("Bench", help="Anki deck name"),
+    tag: str = typer.Option("bench", help="Tag for notes"),
+    replay: Optional[Path] = typer.Option(None, help="Serve providers from this cassette"),
+    record: Optional[Path] = typer.Option(None, help="Call providers and record to this file"),
+    speed: float = typer.Option(1.0, help="Replayed latency multiplier"),
+    error_rate: float = typer.Option(0.0, help="Share of replayed requests that fail"),
+    error_status: Optional[int] = typer.Option(None, help="Fail with this HTTP status"),
+    seed: Optional[int] = typer.Option(None, help="Seed for injected failures"),
+    fresh: bool = typer.Option(True, help="Run in a temp dir: cold text and image caches"),
+    log: bool = typer.Option(False, "--log", help="Log as the server does, report cost per card"),
+):
+    """Measure card throughput (cards/s, per-stage p50/p95/p99, peak RSS)."""
+    from contextlib import nullcontext
+
+    from . import setup_logging
+    from .mcp_tools.lesson import make_card
+    from .net import replay as replay_mod
+    from .net.limits import configure_providers
+    from .orchestration.bench import count_log_records, log_overhead_report, run_bench
+
+    if replay and record:
+        raise typer.BadParameter("Use either --replay or --record")
+    configure_providers()  # как в сервере: лимиты провайдеров на весь процесс
+    if replay:
+        ctx = replay_mod.replaying(
+            replay.resolve(),
+            speed=speed,
+            error_rate=error_rate,
+            error_status=error_status,
+            seed=seed,
+        )
+    elif record:
+        ctx = replay_mod.recording(record.resolve())
+    else:
+        typer.echo("warning: no --replay, calling real providers", err=True)
+        ctx = nullcontext()
+    if fresh:
+        # кэши (var/, media/) лежат относительно текущего каталога
+        os.chdir(tempfile.mkdtemp(prefix="bench-"))
+
+    def card(word: str) -> dict:
+        return make_card(word, "de", deck, tag, defer_image=False)
+
+    if log:
+        # logs/ — в текущем (временном при --fresh) каталоге
+        setup_logging()
+    with ctx as transport, count_log_records() as logged:
+        report = run_bench(
+            card,
+            [w.strip() for w in words.split(",") if w.strip()],
+            cards=cards,
+            concurrency=concurrency,
+        )
+        if replay:
+            report["replay"] = {
+                "served": transport.served,
+                "injected": transport.injected,
+                "missing": transport.missing,
+            }
+    if log:
+        report["logging"] = {
+            "queued": os.getenv("LOG_QUEUE", "true").lower() in {"1", "true", "yes"},
+            **log_overhead_report(logged.count, report["ok"] + sum(report["errors"].values())),
+        }
+    typer.echo(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+
+@events_app.command("tail")
+def events_tail(
+    n: int = typer.Option(10, "-n", help="How many last events"),
+    name: Optional[List[str]] = typer.Option(None, help="Only events with this name"),
+    follow: bool = typer.Option(False, "--follow", "-f", help="Wait for new events"),
+    path: Path = typer.Option(EVENTS_PATH, help="Event file"),
+):
+    """Print the last events, one JSON line each."""
+    from .telemetry.query import follow as follow_events, tail
+
+    for event in tail(path, n, names=name or None):
+        typer.echo(json.dumps(event, ensure_ascii=False))
+    if follow:
+        try:
+            for event in follow_events(path, names=name or None):
+                typer.echo(json.dumps(event, ensure_ascii=False))
+        except KeyboardInterrupt:
+            pass
+
+
+@events_app.command("rollup")
+def events_rollup(
+    since: Optional[str] = typer.Option(None, help="15m, 2h, 7d or an ISO date (UTC)"),
+    until: Optional[str] = typer.Option(None, help="Same formats as --since"),
+    name: Optional[List[str]] = typer.Option(None, help="Only events with this name"),
+    price: Optional[List[str]] = typer.Option(
+        None, help="provider=price per request (default TELEMETRY_PRICES)"
+    ),
+    daily: bool = typer.Option(
+        False, help="Merge daily rollup files instead of raw events (no --name)"
+    ),
+    path: Path = typer.Option(EVENTS_PATH, help="Event file"),
+    out: Path = typer.Option(DAILY_DIR, help="Directory of daily rollup files"),
+):
+    """Per-step p50/p95/p99 and error rates, requests and cost per card."""
+    from .telemetry.query import (
+        Rollup,
+        iter_events,
+        load_rollups,
+        parse_prices,
+        parse_time,
+        prices_from_env,
+    )
+
+    if daily and name:
+        # дневные сводки строятся по всем событиям — отфильтровать их по имени нельзя
+        raise typer.BadParameter("--name cannot be combined with --daily")
+    try:
+        start = parse_time(since) if since else None
+        end = parse_time(until) if until else None
+        prices = parse_prices(price) if price else prices_from_env()
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc))
+    if daily:
+        rollup = load_rollups(out, since=start, until=end)
+    else:
+        rollup = Rollup.of(iter_events(path, names=name or None, since=start, until=end))
+    report = rollup.summary(prices or None)
+    typer.echo(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+@events_app.command("daily")
+def events_daily(
+    path: Path = typer.Option(EVENTS_PATH, help="Event file"),
+    out: Path = typer.Option(DAILY_DIR, help="Directory of daily rollup files"),
+):
+    """Write one rollup file per UTC day (run it from cron)."""
+    from .telemetry.query import write_daily_rollups
+
+    for day in write_daily_rollups(path, out):
+        typer.echo(str(out / f"{day}.json"))
+
+
 if __name__ == "__main__":
     app()
@@ -1,23 +1,31 @@
 from __future__ import annotations
 
+import atexit
 import logging
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
 import os
 from pathlib import Path
+import queue
 import re
-from typing import Iterable
+from typing import Iterable, List, Optional
 
 from dotenv import load_dotenv
 
+from app.telemetry.tracing import current_ids
+
 
 class ContextFilter(logging.Filter):
-    """Добавляет недостающие поля trace/run/step."""
+    """Добавляет недостающие поля trace/span/run/step (из текущего спана)."""
 
-    def filter(self, record: logging.LogRecord) -> bool:  # pragma: no cover - trivial
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace_id, span_id, run_id = current_ids()
         if not hasattr(record, "trace_id"):
-            record.trace_id = "-"
+            record.trace_id = trace_id
+        if not hasattr(record, "span_id"):
+            record.span_id = span_id
         if not hasattr(record, "run_id"):
-            record.run_id = "-"
+            record.run_id = run_id
         if not hasattr(record, "step"):
             record.step = "-"
         return True
@@ -45,13 +53,53 @@ class SecretsFilter(logging.Filter):
         return True
 
 
+LOG_FORMAT = (
+    "%(asctime)s %(levelname)s trace=%(trace_id)s span=%(span_id)s run=%(run_id)s "
+    "step=%(step)s %(message)s"
+)
+
+
+def log_secrets() -> List[str]:
+    """Значения переменных окружения, которые нельзя выводить в лог."""
+    return [
+        v
+        for k, v in os.environ.items()
+        if any(key in k for key in ("KEY", "TOKEN", "SECRET", "PASSWORD"))
+    ]
+
+
+def queue_handlers(logger: logging.Logger) -> QueueListener:
+    """Move the handlers of ``logger`` behind a queue and start their listener.
+
+    The calling thread only fills trace ids (:class:`ContextFilter` needs the
+    caller's context), renders the message and enqueues the record; masking
+    secrets, formatting and file/console I/O happen in the listener thread.
+    """
+    handlers = list(logger.handlers)
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    producer = QueueHandler(records)
+    producer.addFilter(ContextFilter())
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(producer)
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
 _configured = False
+_listener: Optional[QueueListener] = None
 
 
 def setup_logging(level: str | None = None) -> logging.Logger:
-    """Configure root logger with console and rotating file handlers."""
+    """Configure root logger with console and rotating file handlers.
 
-    global _configured
+    With ``LOG_QUEUE=true`` (the default) the handlers run in a background
+    thread behind a :class:`~logging.handlers.QueueHandler`, so request
+    threads never wait for disk or terminal I/O.
+    """
+
+    global _configured, _listener
     if _configured:
         return logging.getLogger()
 
@@ -60,20 +108,14 @@ def setup_logging(level: str | None = None) -> logging.Logger:
     log_file = os.getenv("LOG_FILE", "logs/app.log")
     Path(os.path.dirname(log_file)).mkdir(parents=True, exist_ok=True)
 
-    secrets = [
-        v
-        for k, v in os.environ.items()
-        if any(key in k for key in ("KEY", "TOKEN", "SECRET", "PASSWORD"))
-    ]
+    secrets = log_secrets()
 
     dictConfig(
         {
             "version": 1,
             "disable_existing_loggers": False,
             "formatters": {
-                "standard": {
-                    "format": "%(asctime)s %(levelname)s trace=%(trace_id)s run=%(run_id)s step=%(step)s %(message)s"
-                }
+                "standard": {"format": LOG_FORMAT}
             },
             "filters": {
                 "context": {"()": ContextFilter},
@@ -103,5 +145,12 @@ def setup_logging(level: str | None = None) -> logging.Logger:
     _configured = True
     root = logging.getLogger()
     handlers = ",".join(h.__class__.__name__ for h in root.handlers)
-    root.info("logging initialized level=%s handlers=%s", level_name, handlers)
+    queued = os.getenv("LOG_QUEUE", "true").lower() in {"1", "true", "yes"}
+    if queued:
+        _listener = queue_handlers(root)
+        # остановка listener'а дописывает очередь до конца
+        atexit.register(_listener.stop)
+    root.info(
+        "logging initialized level=%s handlers=%s queued=%s", level_name, handlers, queued
+    )
     return root
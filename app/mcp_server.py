@@ -25,8 +25,15 @@ from .tools.tts import speak_to_file
 from .tools.anki_tool import add_basic_note
 from .tools.health import check_health
 from .orchestration.pipeline import LessonConfig, build_lesson
-from .mcp_tools.lesson import make_card as make_lesson_card
+from .mcp_tools.lesson import make_card as make_lesson_card, make_card_async
 from .mcp_tools.health_genapi import genapi_check
+from .mcp_tools.text import cache_stats as text_cache_stats, hedge_stats, router_stats
+from .net.breaker import breaker_states
+from .net.limits import configure_providers
+from .net.pool import aclose_pool, pool_stats
+from .orchestration.image_jobs import get_image_jobs, image_jobs_stats
+from .orchestration.jobs import get_job_queue
+from .telemetry.metrics import metrics_snapshot, start_metrics_server
 
 from .settings import settings  # noqa: F401  - trigger config loading
 
@@ -52,9 +59,11 @@ def create_server() -> "mcp.server.FastMCP":  # type: ignore[return-type]
 
     server = mcp.server.FastMCP("language-assistant")
 
+    # Tools with native asyncio variants await them directly; the remaining
+    # blocking helpers run in worker threads so the event loop stays free.
     @log_tool(server, "transcript.get")
     async def transcript_get(url: str) -> str:
-        return fetch_transcript(url)
+        return await asyncio.to_thread(fetch_transcript, url)
 
     @log_tool(server, "vocab.extract")
     async def vocab_extract(text: str, limit: int = 20):
@@ -62,32 +71,65 @@ def create_server() -> "mcp.server.FastMCP":  # type: ignore[return-type]
 
     @log_tool(server, "grammar.check")
     async def grammar_check(text: str, language: str = "de"):
-        return check_text(text, language=language)
+        return await asyncio.to_thread(check_text, text, language=language)
 
     @log_tool(server, "tts.speak")
     async def tts_speak(text: str, voice: str = "de-DE") -> str:
-        return speak_to_file(text, f"tts_{abs(hash(text))}.mp3", voice=voice)
+        return await asyncio.to_thread(
+            speak_to_file, text, f"tts_{abs(hash(text))}.mp3", voice=voice
+        )
 
     @log_tool(server, "anki.add_note")
     async def anki_add_note(front: str, back: str, deck: str, tags: list[str] | None = None):
-        return add_basic_note(front, back, deck, tags=tags)
+        return await asyncio.to_thread(add_basic_note, front, back, deck, tags=tags)
 
     @log_tool(server, "lesson.build")
     async def lesson_build(url: str, deck: str, tag: str = "auto", limit: int = 15):
         cfg = LessonConfig(url=url, deck=deck, tag=tag, limit=limit)
-        return build_lesson(cfg)
+        return await asyncio.to_thread(build_lesson, cfg)
 
     @log_tool(server, "lesson.make_card")
     async def lesson_make_card_tool(word: str, lang: str, deck: str, tag: str) -> dict:
-        return make_lesson_card(word, lang, deck, tag)
+        return await make_card_async(word, lang, deck, tag)
+
+    @log_tool(server, "jobs.enqueue_card")
+    async def jobs_enqueue_card(
+        word: str, lang: str, deck: str, tag: str, callback_url: str | None = None
+    ) -> dict:
+        payload = {"word": word, "lang": lang, "deck": deck, "tag": tag}
+        if callback_url:
+            payload["callback_url"] = callback_url
+        job_id = await asyncio.to_thread(get_job_queue().enqueue, "make_card", payload)
+        return {"job_id": job_id, "status": "queued"}
+
+    @log_tool(server, "jobs.status")
+    async def jobs_status(job_id: int) -> dict:
+        job = await asyncio.to_thread(get_job_queue().get, job_id)
+        return job.as_dict() if job is not None else {"job_id": job_id, "status": "unknown"}
+
+    @server.tool("jobs.stats")
+    async def jobs_stats() -> dict:
+        return await asyncio.to_thread(get_job_queue().stats)
 
     @server.tool("server.health")
     async def server_health() -> dict:
-        return check_health()
+        return {
+            **await asyncio.to_thread(check_health),
+            "http_pool": pool_stats(),
+            "text_cache": text_cache_stats(),
+            "text_hedge": hedge_stats(),
+            "text_router": router_stats(),
+            "image_jobs": image_jobs_stats(),
+            "breakers": breaker_states(),
+        }
+
+    @server.tool("server.metrics")
+    async def server_metrics() -> dict:
+        return metrics_snapshot()
 
     @log_tool(server, "health.genapi_check")
     async def health_genapi_check_tool() -> dict:
-        return genapi_check()
+        return await asyncio.to_thread(genapi_check)
 
     return server
 
@@ -111,7 +153,14 @@ def list_tools() -> Dict[str, dict]:
             "args": ["word: str", "lang: str", "deck: str", "tag: str"],
             "returns": "dict",
         },
+        "jobs.enqueue_card": {
+            "args": ["word: str", "lang: str", "deck: str", "tag: str", "callback_url: str=None"],
+            "returns": "dict",
+        },
+        "jobs.status": {"args": ["job_id: int"], "returns": "dict"},
+        "jobs.stats": {"args": [], "returns": "dict"},
         "server.health": {"args": [], "returns": "dict"},
+        "server.metrics": {"args": [], "returns": "dict"},
         "health.genapi_check": {"args": [], "returns": "dict"},
     }
 
@@ -122,9 +171,16 @@ async def run() -> None:
     logger = logging.getLogger(__name__)
     log_effective_settings(logger)
     logger.info("Application starting...")
+    configure_providers()
+    start_metrics_server()
     server = create_server()
+    if settings.CARD_IMAGE_DEFERRED:
+        get_image_jobs()  # дозапустить картинки, прерванные прошлым остановом
     logger.info("MCP server listening on stdio.")
-    await server.run_stdio_async()
+    try:
+        await server.run_stdio_async()
+    finally:
+        await aclose_pool()
 
 
 if __name__ == "__main__":  # pragma: no cover - manual execution only
@@ -1,34 +1,122 @@
 from __future__ import annotations
 
-import base64
+import asyncio
 import logging
 import os
+import threading
 import time
-from typing import Any, List, Optional
+from concurrent.futures import Future
+from typing import Any, List, Optional, Tuple
+from urllib.parse import urlparse
 
-from app.net.http import NetworkError, request_json
+from app.net.body import Base64JsonBody
+from app.net.http import NetworkError, request_json, request_json_async
 from app.settings import settings
+from app.telemetry.metrics import observe_step
 
 
 logger = logging.getLogger(__name__)
 
 
-def _invoke(action: str, **params) -> Any:
-    """Вызов метода AnkiConnect через общий HTTP-слой."""
-    payload = {"action": action, "version": 6, "params": params}
-    out = request_json("POST", settings.ANKI_CONNECT_URL, json=payload, timeout=30)
+def _payload(action: str, params: dict) -> dict:
+    return {"action": action, "version": 6, "params": params}
+
+
+def _result(action: str, out: dict) -> Any:
     if out.get("error"):
         # единый формат сетевых ошибок
         raise NetworkError("anki-error", out["error"], {"action": action})
     return out.get("result")
 
 
+def _invoke(action: str, **params) -> Any:
+    """Вызов метода AnkiConnect через общий HTTP-слой."""
+    out = request_json("POST", settings.ANKI_CONNECT_URL, json=_payload(action, params), timeout=30)
+    return _result(action, out)
+
+
+async def _invoke_async(action: str, **params) -> Any:
+    """Асинхронный вызов метода AnkiConnect."""
+    out = await request_json_async(
+        "POST", settings.ANKI_CONNECT_URL, json=_payload(action, params), timeout=30
+    )
+    return _result(action, out)
+
+
+_LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+
+def _anki_is_local() -> bool:
+    """AnkiConnect на этой же машине может прочитать файл сам по пути."""
+    return (urlparse(settings.ANKI_CONNECT_URL).hostname or "") in _LOCAL_HOSTS
+
+
+def _media_params(path: str) -> dict:
+    # вариант storeMediaFile с ``path``: файл читает сам Anki
+    return {"filename": os.path.basename(path), "path": os.path.abspath(path)}
+
+
+def _store_media_stream(path: str) -> str:
+    """Загрузка на удалённый Anki: base64 кодируется потоком, по частям."""
+    body = Base64JsonBody(
+        _payload("storeMediaFile", {"filename": os.path.basename(path), "data": "@file"}),
+        path,
+    )
+    out = request_json(
+        "POST",
+        settings.ANKI_CONNECT_URL,
+        data=body,
+        headers={"Content-Type": "application/json"},
+        timeout=30,
+    )
+    return _result("storeMediaFile", out)
+
+
 def store_media_file(path: str) -> str:
-    """Загрузить файл в медиа Anki и вернуть итоговое имя файла."""
-    filename = os.path.basename(path)
-    with open(path, "rb") as f:
-        encoded = base64.b64encode(f.read()).decode("ascii")
-    return _invoke("storeMediaFile", filename=filename, data=encoded)
+    """Загрузить файл в медиа Anki и вернуть итоговое имя файла.
+
+    Локальному Anki передаётся только путь к файлу, удалённому — тело
+    запроса, которое кодируется в base64 по частям при отправке, без копии
+    всего файла в памяти.
+    """
+    if _anki_is_local():
+        return _invoke("storeMediaFile", **_media_params(path))
+    return _store_media_stream(path)
+
+
+async def store_media_file_async(path: str) -> str:
+    """Асинхронная версия :func:`store_media_file`."""
+    if _anki_is_local():
+        return await _invoke_async("storeMediaFile", **_media_params(path))
+    # потоковое тело отправляется синхронной сессией в отдельном потоке
+    return await asyncio.to_thread(_store_media_stream, path)
+
+
+def _build_note(
+    front: str,
+    back_html: str,
+    deck: str,
+    tags: List[str],
+    media_filename: Optional[str],
+) -> dict:
+    if media_filename:
+        # Добавляем картинку, если пользователь ещё не вставил <img> вручную
+        if "<img" not in back_html:
+            back_html += f'<br><img src="{media_filename}">'
+    return {
+        "deckName": deck,
+        "modelName": "Basic",
+        "fields": {"Front": front, "Back": back_html},
+        "tags": tags,
+    }
+
+
+def _log_ok(start: float, note_id: Any) -> None:
+    lat_ms = (time.perf_counter() - start) * 1000
+    observe_step("anki.add_note", lat_ms)
+    logger.info(
+        "ok", extra={"step": "anki.add_note", "lat_ms": int(lat_ms), "outlen": note_id}
+    )
 
 
 def add_anki_note(
@@ -41,27 +129,231 @@ def add_anki_note(
     """Создать базовую карточку Anki с опциональным изображением на обороте."""
     logger.info("start", extra={"step": "anki.add_note"})
     start = time.perf_counter()
-    tags = tags or []
 
-    if media_path:
-        media_filename = store_media_file(media_path)
-        # Добавляем картинку, если пользователь ещё не вставил <img> вручную
-        if "<img" not in back_html:
-            back_html += f'<br><img src="{media_filename}">' 
-
-    note = {
-        "deckName": deck,
-        "modelName": "Basic",
-        "fields": {"Front": front, "Back": back_html},
-        "tags": tags,
-    }
+    media_filename = store_media_file(media_path) if media_path else None
+    note = _build_note(front, back_html, deck, tags or [], media_filename)
     try:
         note_id = _invoke("addNote", note=note)
-        lat_ms = int((time.perf_counter() - start) * 1000)
-        logger.info(
-            "ok", extra={"step": "anki.add_note", "lat_ms": lat_ms, "outlen": note_id}
-        )
+        _log_ok(start, note_id)
         return note_id
     except Exception:
         logger.error("error", exc_info=True, extra={"step": "anki.add_note"})
         raise
+
+
+async def add_anki_note_async(
+    front: str,
+    back_html: str,
+    deck: str,
+    tags: Optional[List[str]] = None,
+    media_path: Optional[str] = None,
+) -> int:
+    """Асинхронная версия :func:`add_anki_note`."""
+    logger.info("start", extra={"step": "anki.add_note"})
+    start = time.perf_counter()
+
+    media_filename = await store_media_file_async(media_path) if media_path else None
+    note = _build_note(front, back_html, deck, tags or [], media_filename)
+    try:
+        note_id = await _invoke_async("addNote", note=note)
+        _log_ok(start, note_id)
+        return note_id
+    except Exception:
+        logger.error("error", exc_info=True, extra={"step": "anki.add_note"})
+        raise
+
+
+def attach_image(note_id: int, path: str, field: str = "Back") -> str:
+    """Догрузить картинку в уже созданную заметку (когда она готова позже).
+
+    Загружает файл в медиа Anki и дописывает ``<img>`` в поле ``field``, если
+    картинки там ещё нет. Возвращает имя файла в медиа Anki.
+    """
+    logger.info("start", extra={"step": "anki.attach_image"})
+    start = time.perf_counter()
+    try:
+        filename = store_media_file(path)
+        info = _invoke("notesInfo", notes=[note_id]) or [{}]
+        current = info[0].get("fields", {}).get(field, {}).get("value", "")
+        if "<img" not in current:
+            _invoke(
+                "updateNoteFields",
+                note={"id": note_id, "fields": {field: current + f'<br><img src="{filename}">'}},
+            )
+    except Exception:
+        logger.error("error", exc_info=True, extra={"step": "anki.attach_image"})
+        raise
+    lat_ms = (time.perf_counter() - start) * 1000
+    observe_step("anki.attach_image", lat_ms)
+    logger.info(
+        "ok", extra={"step": "anki.attach_image", "lat_ms": int(lat_ms), "outlen": note_id}
+    )
+    return filename
+
+
+def _multi_result(action: str, out: Any) -> Any:
+    # в multi с version=6 каждый ответ — {"result", "error"}
+    if isinstance(out, dict) and "result" in out and "error" in out:
+        return _result(action, out)
+    return out
+
+
+def _settle(fut: Future, action: str, out: Any) -> None:
+    try:
+        fut.set_result(_multi_result(action, out))
+    except NetworkError as exc:
+        fut.set_exception(exc)
+
+
+class AnkiWriter:
+    """Буферизованная запись заметок и медиа в AnkiConnect.
+
+    :meth:`add_note`, :meth:`submit` и :meth:`store_media` ставят операцию в
+    буфер и сразу возвращают :class:`~concurrent.futures.Future`. Буфер
+    отправляется одним запросом ``multi`` (все ``storeMediaFile`` и один
+    ``addNotes``), как только в нём ``max_batch`` заметок или через
+    ``flush_interval`` секунд после первой операции. Если ``addNotes``
+    отклонён целиком, заметки повторяются по одной внутри ещё одного
+    ``multi``, чтобы каждая получила свою ошибку.
+    """
+
+    def __init__(
+        self, *, max_batch: Optional[int] = None, flush_interval: Optional[float] = None
+    ) -> None:
+        self.max_batch = max(1, max_batch or getattr(settings, "ANKI_BATCH_SIZE", 50))
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else getattr(settings, "ANKI_FLUSH_INTERVAL_S", 0.5)
+        )
+        self._media: List[Tuple[str, Future]] = []
+        self._notes: List[Tuple[dict, Future]] = []
+        self._lock = threading.Lock()
+        # запросы отправляются по одному, чтобы медиа не обгоняло заметки
+        self._send_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def _enqueue(self, queue: List[Tuple[Any, Future]], item: Any) -> Future:
+        fut: Future = Future()
+        with self._lock:
+            queue.append((item, fut))
+            full = len(self._notes) >= self.max_batch
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+        return fut
+
+    def store_media(self, path: str) -> Future:
+        """Поставить загрузку файла в буфер; результат — имя файла в Anki."""
+        return self._enqueue(self._media, path)
+
+    def submit(self, note: dict) -> Future:
+        """Поставить готовый словарь заметки AnkiConnect в буфер; результат — id."""
+        return self._enqueue(self._notes, note)
+
+    def add_note(
+        self,
+        front: str,
+        back_html: str,
+        deck: str,
+        tags: Optional[List[str]] = None,
+        media_path: Optional[str] = None,
+    ) -> Future:
+        """Буферизованная версия :func:`add_anki_note`."""
+        media_filename = None
+        if media_path:
+            self.store_media(media_path)
+            media_filename = os.path.basename(media_path)
+        return self.submit(_build_note(front, back_html, deck, tags or [], media_filename))
+
+    def flush(self) -> None:
+        """Отправить всё накопленное одним запросом и разрешить futures."""
+        with self._send_lock:
+            with self._lock:
+                media, self._media = self._media, []
+                notes, self._notes = self._notes, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if media or notes:
+                self._send(media, notes)
+
+    def _send(self, media: List[Tuple[str, Future]], notes: List[Tuple[dict, Future]]) -> None:
+        start = time.perf_counter()
+        uploaded = len(media)
+        if not _anki_is_local():
+            # удалённому Anki файлы уходят потоковыми запросами, не внутри multi
+            for path, fut in media:
+                try:
+                    fut.set_result(_store_media_stream(path))
+                except Exception as exc:
+                    fut.set_exception(exc)
+            media = []
+        actions = [_payload("storeMediaFile", _media_params(path)) for path, _ in media]
+        if notes:
+            actions.append(_payload("addNotes", {"notes": [note for note, _ in notes]}))
+        if not actions:
+            return
+        try:
+            out = _invoke("multi", actions=actions)
+            if not isinstance(out, list) or len(out) != len(actions):
+                raise NetworkError("anki-error", "unexpected multi result", {"action": "multi"})
+        except Exception as exc:
+            logger.error("error", exc_info=True, extra={"step": "anki.flush"})
+            for _, fut in media + notes:
+                fut.set_exception(exc)
+            return
+
+        for (_, fut), item in zip(media, out):
+            _settle(fut, "storeMediaFile", item)
+        if notes:
+            try:
+                ids = _multi_result("addNotes", out[len(media)])
+            except NetworkError:
+                ids = None
+            if isinstance(ids, list) and len(ids) == len(notes):
+                for (_, fut), note_id in zip(notes, ids):
+                    if note_id is None:
+                        fut.set_exception(
+                            NetworkError("anki-error", "note was not added", {"action": "addNotes"})
+                        )
+                    else:
+                        fut.set_result(note_id)
+            else:
+                self._send_one_by_one(notes)
+        lat_ms = (time.perf_counter() - start) * 1000
+        observe_step("anki.flush", lat_ms)
+        logger.info(
+            "ok",
+            extra={
+                "step": "anki.flush",
+                "lat_ms": int(lat_ms),
+                "outlen": len(notes),
+                "media": uploaded,
+            },
+        )
+
+    def _send_one_by_one(self, notes: List[Tuple[dict, Future]]) -> None:
+        actions = [_payload("addNote", {"note": note}) for note, _ in notes]
+        try:
+            out = _invoke("multi", actions=actions)
+            if not isinstance(out, list) or len(out) != len(actions):
+                raise NetworkError("anki-error", "unexpected multi result", {"action": "multi"})
+        except Exception as exc:
+            for _, fut in notes:
+                fut.set_exception(exc)
+            return
+        for (_, fut), item in zip(notes, out):
+            _settle(fut, "addNote", item)
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "AnkiWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -1,21 +1,166 @@
 from __future__ import annotations
 
-from typing import List, Dict
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
-from .lesson import make_card
+from app.settings import settings
 
+from .anki import AnkiWriter
+from .lesson import _detect_lang, make_card
+from .text import generate_sentences, translate_many
 
-def make_cards_from_list(words: List[str], lang: str, deck: str, tag: str) -> List[Dict]:
-    """Создать несколько карточек из списка слов.
+logger = logging.getLogger(__name__)
+
+
+def _prefetch_text(words: Sequence[str], lang: Optional[str]) -> List[Dict[str, str]]:
+    """Пакетно получить текстовые поля карточек для :func:`make_card`.
 
-    Для каждого слова вызывает :func:`make_card`. Если при обработке слова
-    происходит исключение, оно не прерывает цикл, а добавляется в результат в
-    виде словаря ``{"word": word, "error": str(exc)}``.
+    Переводы RU→DE, примеры (:func:`generate_sentences`) и их переводы идут
+    одним запросом на всю порцию слов. Что не удалось получить пакетно,
+    карточка досчитает сама.
     """
-    results: List[Dict] = []
-    for word in words:
+    prefilled: List[Dict[str, str]] = [{} for _ in words]
+    langs = [(lang or "").strip().lower() or _detect_lang(w) for w in words]
+    ru = [i for i, code in enumerate(langs) if code != "de"]
+    for i, code in enumerate(langs):
+        if code == "de":
+            prefilled[i]["word_de"] = words[i]
+    if ru:
+        try:
+            for i, word_de in zip(ru, translate_many([words[i] for i in ru], "ru", "de")):
+                prefilled[i]["word_de"] = word_de
+        except Exception as exc:
+            logger.warning("translate_many failed: %s", exc, extra={"step": "batch.prefetch"})
+
+    ready = [i for i in range(len(words)) if prefilled[i].get("word_de")]
+    if ready:
+        try:
+            sentences = generate_sentences([prefilled[i]["word_de"] for i in ready])
+            for i, sentence in zip(ready, sentences):
+                if sentence:
+                    prefilled[i]["sentence_de"] = sentence
+        except Exception as exc:
+            logger.warning("generate_sentences failed: %s", exc, extra={"step": "batch.prefetch"})
+    ready = [i for i in ready if prefilled[i].get("sentence_de")]
+
+    if ready:
         try:
-            results.append(make_card(word, lang, deck, tag))
-        except Exception as exc:  # pragma: no cover - защитный catch
-            results.append({"word": word, "error": str(exc)})
+            sentences_de = [prefilled[i]["sentence_de"] for i in ready]
+            for i, translation in zip(ready, translate_many(sentences_de, "de", "ru")):
+                prefilled[i]["translation_ru"] = translation
+        except Exception as exc:
+            logger.warning("translate_many failed: %s", exc, extra={"step": "batch.prefetch"})
+    return prefilled
+
+
+def _make_one(
+    word: str,
+    lang: Optional[str],
+    deck: str,
+    tag: str,
+    prefilled: Dict[str, str],
+    writer: AnkiWriter,
+) -> Dict:
+    try:
+        return make_card(word, lang, deck, tag, prefilled=prefilled, anki=writer)
+    except Exception as exc:  # pragma: no cover - защитный catch
+        logger.warning("card failed: %s", exc, extra={"step": "batch.card"})
+        return {"word": word, "error": str(exc)}
+
+
+def _note_done(result: Dict) -> bool:
+    note = result.get("note_id")
+    return not isinstance(note, Future) or note.done()
+
+
+def _resolve_note(word: str, result: Dict) -> Dict:
+    note = result.get("note_id")
+    if not isinstance(note, Future):
+        return result
+    try:
+        return {**result, "note_id": note.result()}
+    except Exception as exc:
+        return {"word": word, "error": str(exc)}
+
+
+def iter_cards(
+    words: Sequence[str],
+    lang: Optional[str],
+    deck: str,
+    tag: str,
+    *,
+    workers: Optional[int] = None,
+) -> Iterator[Tuple[int, Dict]]:
+    """Создавать карточки параллельно и отдавать ``(index, result)`` по готовности.
+
+    Число одновременных карточек задаёт ``workers`` (по умолчанию
+    ``settings.BATCH_WORKERS``); число одновременных запросов к OpenRouter,
+    GenAPI и AnkiConnect ограничивают лимиты процесса
+    (:func:`app.net.limits.configure_providers`). Слова обрабатываются
+    порциями по большему из ``TRANSLATE_BATCH_SIZE`` и ``SENTENCE_BATCH_SIZE``:
+    переводы и примеры порции получаются пакетно, каждый своими запросами
+    нужного размера (см. :func:`_prefetch_text`), а заметки и медиа уходят в
+    Anki общими запросами через :class:`AnkiWriter`.
+    """
+    workers = max(1, workers or getattr(settings, "BATCH_WORKERS", 4))
+    chunk_size = max(
+        1,
+        getattr(settings, "TRANSLATE_BATCH_SIZE", 20),
+        getattr(settings, "SENTENCE_BATCH_SIZE", 10),
+    )
+    writer = AnkiWriter()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+    # карточки, у которых заметка ещё ждёт отправки в буфере AnkiWriter
+    waiting: List[Tuple[int, Dict]] = []
+
+    def _ready() -> Iterator[Tuple[int, Dict]]:
+        for item in [w for w in waiting if _note_done(w[1])]:
+            waiting.remove(item)
+            yield item[0], _resolve_note(words[item[0]], item[1])
+
+    try:
+        futures: Dict[Future, int] = {}
+        for offset in range(0, len(words), chunk_size):
+            chunk = list(words[offset : offset + chunk_size])
+            # текст следующей порции готовится, пока идут картинки и Anki
+            prefilled = _prefetch_text(chunk, lang)
+            for j, word in enumerate(chunk):
+                fut = pool.submit(_make_one, word, lang, deck, tag, prefilled[j], writer)
+                futures[fut] = offset + j
+            for fut in [f for f in futures if f.done()]:
+                waiting.append((futures.pop(fut), fut.result()))
+            yield from _ready()
+        for fut in as_completed(futures):
+            waiting.append((futures[fut], fut.result()))
+            yield from _ready()
+        writer.flush()
+        yield from _ready()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+
+
+def make_cards_from_list(
+    words: List[str],
+    lang: Optional[str],
+    deck: str,
+    tag: str,
+    *,
+    workers: Optional[int] = None,
+    on_result: Optional[Callable[[int, Dict], None]] = None,
+) -> List[Dict]:
+    """Создать несколько карточек из списка слов.
+
+    Для каждого слова вызывает :func:`make_card`, до ``workers`` слов
+    одновременно. Если при обработке слова происходит исключение, оно не
+    прерывает обработку, а добавляется в результат в виде словаря
+    ``{"word": word, "error": str(exc)}``. ``on_result`` вызывается для каждого
+    слова сразу по готовности; итоговый список сохраняет порядок ``words``.
+    """
+    results: List[Dict] = [{} for _ in words]
+    for index, result in iter_cards(words, lang, deck, tag, workers=workers):
+        results[index] = result
+        if on_result is not None:
+            on_result(index, result)
     return results
@@ -5,8 +5,7 @@ from __future__ import annotations
 import logging
 from typing import Any, Dict
 
-import requests
-
+from app.net.pool import get_session
 from app.settings import settings
 
 IMAGES_URL = "https://api.gen-api.ru/v1/images/generate"
@@ -32,7 +31,7 @@ def genapi_check() -> Dict[str, Any]:
     }
 
     try:
-        resp = requests.post(IMAGES_URL, headers=headers, json=payload, timeout=10)
+        resp = get_session(IMAGES_URL).post(IMAGES_URL, headers=headers, json=payload, timeout=10)
     except Exception as exc:
         logger.error("genapi.check error: %s", exc)
         return {"ok": False, "error": str(exc)}
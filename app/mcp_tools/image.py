@@ -2,14 +2,20 @@
 
 from __future__ import annotations
 
+import asyncio
 import base64
+import importlib
 import logging
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from pathlib import Path
 from typing import Any
-from uuid import uuid4
-
-import requests
 
+from app.cache.image_store import ImageStore, get_image_store, image_key
+from app.mcp_tools.image_genapi import _get_request_id
+from app.net import breaker
+from app.net.genapi_client import send_guarded, send_guarded_async
+from app.net.limits import provider_for
+from app.net.pool import get_async_client, get_session
 from app.settings import settings
 
 # endpoint согласно документации GPT Images API
@@ -25,21 +31,55 @@ def _build_prompt(sentence_de: str) -> str:
     return f"Illustrate the meaning of this German sentence without text: {sentence_de}"
 
 
-def generate_image_file(sentence_de: str) -> str:
-    """Generate image illustrating ``sentence_de`` via GenAPI.
+def image_store() -> ImageStore:
+    """Общее хранилище картинок в ``MEDIA_DIR`` (см. :mod:`app.cache.image_store`)."""
+    quota_mb = getattr(settings, "IMAGE_STORE_MAX_MB", 0)
+    return get_image_store(MEDIA_DIR, quota_bytes=quota_mb * 1024 * 1024)
 
-    Returns a relative path like ``media/uuid.png`` or an empty string on any
-    error. All errors are logged but never raised.
-    """
 
-    logger.info("start", extra={"step": "image.generate"})
-    api_key = settings.GENAPI_API_KEY
-    if not api_key:
-        logger.warning("GENAPI_API_KEY is empty", extra={"step": "image.generate"})
+def breaker_open() -> bool:
+    """GenAPI недоступен: circuit breaker открыт, запрос сразу завершится ошибкой."""
+    return breaker.is_open(provider_for(IMAGES_URL))
+
+
+def _post_images(headers: dict[str, str], payload: dict[str, Any]) -> Any:
+    return send_guarded(
+        IMAGES_URL,
+        lambda: get_session(IMAGES_URL).post(
+            IMAGES_URL, headers=headers, json=payload, timeout=60
+        ),
+    )
+
+
+async def _post_images_async(headers: dict[str, str], payload: dict[str, Any]) -> Any:
+    async def send() -> Any:
+        client = await get_async_client(IMAGES_URL)
+        return await client.post(IMAGES_URL, headers=headers, json=payload, timeout=60)
+
+    return await send_guarded_async(IMAGES_URL, send)
+
+
+def _request_key(payload: dict[str, Any]) -> str:
+    return image_key(
+        payload["model"],
+        payload["prompt"],
+        size=payload["size"],
+        quality=payload["quality"],
+        background=payload["background"],
+    )
+
+
+def _cached(payload: dict[str, Any]) -> str:
+    filename = image_store().get(_request_key(payload))
+    if not filename:
         return ""
+    logger.info("cache hit", extra={"step": "image.generate"})
+    return str(Path("media") / filename)
+
 
+def _build_request(sentence_de: str) -> tuple[dict[str, str], dict[str, Any]]:
     headers = {
-        "Authorization": f"Bearer {api_key}",
+        "Authorization": f"Bearer {settings.GENAPI_API_KEY}",
         "Content-Type": "application/json",
     }
     payload: dict[str, Any] = {
@@ -51,13 +91,20 @@ def generate_image_file(sentence_de: str) -> str:
         "response_format": "b64_json",
         "n": 1,
     }
+    if callback_mode():
+        callbacks = importlib.import_module("app.mcp_tools.image_callbacks")
+        payload["is_sync"] = False
+        payload["callback_url"] = callbacks.callback_url()
+    return headers, payload
 
-    try:
-        resp = requests.post(IMAGES_URL, headers=headers, json=payload, timeout=60)
-    except Exception as exc:
-        logger.error("image.generate error: %s", exc)
-        return ""
 
+def callback_mode() -> bool:
+    """Результат придёт на ``GENAPI_CALLBACK_URL``, а не в ответе на запрос."""
+    return not settings.GENAPI_IS_SYNC and bool(getattr(settings, "GENAPI_CALLBACK_URL", None))
+
+
+def _handle_response(resp: Any, key: str) -> str:
+    """Save the image from a GenAPI response; works for requests and httpx."""
     if not settings.GENAPI_IS_SYNC:
         if resp.status_code == 200:
             logger.info(
@@ -90,12 +137,161 @@ def generate_image_file(sentence_de: str) -> str:
 
     try:
         img_bytes = base64.b64decode(b64)
-        filename = f"{uuid4()}.png"
-        out_path = MEDIA_DIR / filename
-        out_path.write_bytes(img_bytes)
+        filename = image_store().put(key, img_bytes)
         logger.info("ok", extra={"step": "image.generate", "outlen": len(img_bytes)})
         return str(Path("media") / filename)
     except Exception as exc:
         logger.error("image.generate error: %s", exc)
         return ""
 
+
+def generate_image_file(sentence_de: str) -> str:
+    """Generate image illustrating ``sentence_de`` via GenAPI.
+
+    Returns a relative path like ``media/<sha256>.png`` or an empty string on
+    any error. All errors are logged but never raised. An image already
+    generated for the same model/prompt/size/quality is reused without
+    calling GenAPI.  In callback mode the call waits (up to
+    ``GENAPI_CALLBACK_TIMEOUT_S``) for the result to arrive at the receiver,
+    see :func:`start_image_file`.
+    """
+    if callback_mode():
+        return _wait_callback(start_image_file(sentence_de))
+
+    logger.info("start", extra={"step": "image.generate"})
+    if not settings.GENAPI_API_KEY:
+        logger.warning("GENAPI_API_KEY is empty", extra={"step": "image.generate"})
+        return ""
+
+    headers, payload = _build_request(sentence_de)
+    cached = _cached(payload)
+    if cached:
+        return cached
+    try:
+        resp = _post_images(headers, payload)
+    except Exception as exc:
+        logger.error("image.generate error: %s", exc)
+        return ""
+    return _handle_response(resp, _request_key(payload))
+
+
+async def generate_image_file_async(sentence_de: str) -> str:
+    """Async twin of :func:`generate_image_file` on the shared httpx client."""
+    if callback_mode():
+        fut = await start_image_file_async(sentence_de)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), _callback_timeout_s())
+        except asyncio.TimeoutError:
+            logger.error("image.generate error: no callback in time")
+            return ""
+
+    logger.info("start", extra={"step": "image.generate"})
+    if not settings.GENAPI_API_KEY:
+        logger.warning("GENAPI_API_KEY is empty", extra={"step": "image.generate"})
+        return ""
+
+    headers, payload = _build_request(sentence_de)
+    cached = _cached(payload)
+    if cached:
+        return cached
+    try:
+        resp = await _post_images_async(headers, payload)
+    except Exception as exc:
+        logger.error("image.generate error: %s", exc)
+        return ""
+    return _handle_response(resp, _request_key(payload))
+
+
+def _callback_timeout_s() -> float:
+    return float(getattr(settings, "GENAPI_CALLBACK_TIMEOUT_S", 600))
+
+
+def _wait_callback(fut: "Future[str]") -> str:
+    try:
+        return fut.result(timeout=_callback_timeout_s())
+    except FutureTimeout:
+        logger.error("image.generate error: no callback in time")
+        return ""
+
+
+def _resolved(value: str) -> "Future[str]":
+    fut: Future = Future()
+    fut.set_result(value)
+    return fut
+
+
+def start_image_file(sentence_de: str) -> "Future[str]":
+    """Like :func:`generate_image_file`, but returns a future of the path.
+
+    In callback mode (``GENAPI_IS_SYNC=false`` with ``GENAPI_CALLBACK_URL``)
+    the request is only submitted; the future completes when GenAPI posts the
+    result to the embedded receiver (see :mod:`app.mcp_tools.image_callbacks`)
+    or with ``""`` on error/timeout.  Otherwise the future is already done.
+    """
+    if not callback_mode():
+        return _resolved(generate_image_file(sentence_de))
+
+    logger.info("start", extra={"step": "image.generate"})
+    if not settings.GENAPI_API_KEY:
+        logger.warning("GENAPI_API_KEY is empty", extra={"step": "image.generate"})
+        return _resolved("")
+
+    headers, payload = _build_request(sentence_de)
+    cached = _cached(payload)
+    if cached:
+        return _resolved(cached)
+    importlib.import_module("app.mcp_tools.image_callbacks").ensure_receiver()
+    try:
+        resp = _post_images(headers, payload)
+    except Exception as exc:
+        logger.error("image.generate error: %s", exc)
+        return _resolved("")
+    return _expect_callback(resp, payload)
+
+
+async def start_image_file_async(sentence_de: str) -> "Future[str]":
+    """Async twin of :func:`start_image_file`: only the request is awaited."""
+    if not callback_mode():
+        return _resolved(await generate_image_file_async(sentence_de))
+
+    logger.info("start", extra={"step": "image.generate"})
+    if not settings.GENAPI_API_KEY:
+        logger.warning("GENAPI_API_KEY is empty", extra={"step": "image.generate"})
+        return _resolved("")
+
+    headers, payload = _build_request(sentence_de)
+    cached = _cached(payload)
+    if cached:
+        return _resolved(cached)
+    importlib.import_module("app.mcp_tools.image_callbacks").ensure_receiver()
+    try:
+        resp = await _post_images_async(headers, payload)
+    except Exception as exc:
+        logger.error("image.generate error: %s", exc)
+        return _resolved("")
+    return _expect_callback(resp, payload)
+
+
+def _expect_callback(resp: Any, payload: dict[str, Any]) -> "Future[str]":
+    """Register the ``request_id`` of an accepted request with the callback registry."""
+    callbacks = importlib.import_module("app.mcp_tools.image_callbacks")
+    try:
+        resp.raise_for_status()
+        request_id = _get_request_id(resp.json())
+    except Exception as exc:
+        logger.error("image.generate error: %s", exc)
+        return _resolved("")
+    if not request_id:
+        logger.error("image.generate error: no request_id in response")
+        return _resolved("")
+
+    key = _request_key(payload)
+
+    def _save(img_bytes: bytes) -> str:
+        return str(Path("media") / image_store().put(key, img_bytes))
+
+    logger.info(
+        "request sent, result will arrive via callback",
+        extra={"step": "image.generate", "request_id": request_id},
+    )
+    return callbacks.registry.expect(request_id, _save)
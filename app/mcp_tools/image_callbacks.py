@@ -0,0 +1,250 @@
+"""Приём результатов GenAPI через callback (``GENAPI_IS_SYNC=false``).
+
+При асинхронной генерации GenAPI сразу отвечает ``request_id``, а картинку
+присылает POST-запросом на ``GENAPI_CALLBACK_URL``. :class:`CallbackRegistry`
+сопоставляет такие запросы с ожидающими генерациями: сохраняет картинку в
+общее хранилище ``media/`` и завершает future, который вернул
+:func:`app.mcp_tools.image.start_image_file`. Встроенный HTTP-приёмник
+(:func:`ensure_receiver`) слушает ``GENAPI_CALLBACK_HOST:GENAPI_CALLBACK_PORT``;
+``GENAPI_CALLBACK_URL`` должен вести на него (напрямую или через прокси).
+
+Приёмник принимает только запросы с токеном процесса (:func:`callback_url`
+добавляет его к ``GENAPI_CALLBACK_URL``), скачивает картинки только с хостов
+``GENAPI_CALLBACK_IMAGE_HOSTS``, а ранние callback'и хранит в пределах
+``MAX_EARLY`` штук и ``MAX_EARLY_BYTES``.
+"""
+from __future__ import annotations
+
+import logging
+import secrets
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from app.net.webhook import WebhookServer
+from app.settings import settings
+
+from .image_genapi import _extract_image, _get_request_id, _image_bytes
+
+logger = logging.getLogger(__name__)
+
+# callback'и, пришедшие раньше регистрации: сколько и сколько байт держать
+MAX_EARLY = 64
+MAX_EARLY_BYTES = 128 * 1024 * 1024
+
+_token: Optional[str] = None
+
+
+def callback_token() -> str:
+    """``GENAPI_CALLBACK_SECRET`` или случайный токен, один на процесс."""
+    global _token
+    if _token is None:
+        _token = getattr(settings, "GENAPI_CALLBACK_SECRET", None) or secrets.token_urlsafe(24)
+    return _token
+
+
+def callback_url() -> str:
+    """``GENAPI_CALLBACK_URL`` с токеном в параметре ``token``."""
+    parts = urlsplit(settings.GENAPI_CALLBACK_URL)
+    query = parse_qsl(parts.query) + [("token", callback_token())]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _trusted_url(url: str) -> bool:
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    allowed = getattr(settings, "GENAPI_CALLBACK_IMAGE_HOSTS", "gen-api.ru")
+    hosts = [h.strip().lower() for h in allowed.split(",") if h.strip()]
+    return parts.scheme == "https" and any(host == h or host.endswith("." + h) for h in hosts)
+
+
+@dataclass
+class _Pending:
+    future: Future
+    save: Callable[[bytes], str]
+    deadline: float
+
+
+@dataclass
+class _Early:
+    image: Optional[Tuple[str, str]]  # что нашёл _extract_image
+    size: int
+    deadline: float
+
+
+class CallbackRegistry:
+    """Ожидающие генерации по ``request_id``.
+
+    ``save(bytes) -> path`` сохраняет картинку и возвращает путь, которым
+    завершится future. Callback, пришедший раньше :meth:`expect` (GenAPI
+    бывает быстрее, чем мы успеваем зарегистрироваться), придерживается до
+    ``timeout`` секунд. Непришедшие вовремя генерации завершаются ``""``
+    фоновым потоком, даже если других callback'ов больше не будет.
+    """
+
+    def __init__(self, timeout: float = 600.0) -> None:
+        self.timeout = timeout
+        self._pending: Dict[str, _Pending] = {}
+        self._early: Dict[str, _Early] = {}
+        self._early_bytes = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+
+    def expect(self, request_id: str, save: Callable[[bytes], str]) -> Future:
+        fut: Future = Future()
+        now = time.monotonic()
+        with self._lock:
+            expired = self._expire_locked(now)
+            early = self._pop_early_locked(request_id)
+            if early is None:
+                self._pending[request_id] = _Pending(fut, save, now + self.timeout)
+                self._start_sweeper_locked()
+        self._time_out(expired)
+        if early is not None:
+            self._complete(_Pending(fut, save, now + self.timeout), early.image)
+        return fut
+
+    def deliver(self, payload: Any) -> bool:
+        """Обработать тело callback'а; ``False`` — это не ответ GenAPI."""
+        if not isinstance(payload, dict):
+            return False
+        request_id = _get_request_id(payload)
+        if request_id is None and isinstance(payload.get("result"), dict):
+            request_id = _get_request_id(payload["result"])
+        if request_id is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            expired = self._expire_locked(now)
+            pending = self._pending.pop(request_id, None)
+            kept = pending is None and self._keep_early_locked(request_id, payload, now)
+            if kept:
+                self._start_sweeper_locked()
+        self._time_out(expired)
+        if pending is None:
+            if not kept:
+                logger.warning(
+                    "early callback too large",
+                    extra={"step": "image.callback", "request_id": request_id},
+                )
+                return False
+            logger.info(
+                "callback before registration",
+                extra={"step": "image.callback", "request_id": request_id},
+            )
+            return True
+        self._complete(pending, _extract_image(payload))
+        return True
+
+    def _pop_early_locked(self, request_id: str) -> Optional[_Early]:
+        early = self._early.pop(request_id, None)
+        if early is not None:
+            self._early_bytes -= early.size
+        return early
+
+    def _keep_early_locked(self, request_id: str, payload: Any, now: float) -> bool:
+        image = _extract_image(payload)
+        size = len(image[1]) if image else 0
+        if size > MAX_EARLY_BYTES:
+            return False
+        self._pop_early_locked(request_id)
+        # место освобождаем за счёт самых старых
+        while self._early and (
+            len(self._early) >= MAX_EARLY or self._early_bytes + size > MAX_EARLY_BYTES
+        ):
+            dropped = next(iter(self._early))
+            self._pop_early_locked(dropped)
+            logger.warning(
+                "early callback dropped", extra={"step": "image.callback", "request_id": dropped}
+            )
+        self._early[request_id] = _Early(image, size, now + self.timeout)
+        self._early_bytes += size
+        return True
+
+    def _complete(self, pending: _Pending, image: Optional[Tuple[str, str]]) -> None:
+        if image is None:
+            logger.error("callback without image", extra={"step": "image.callback"})
+            pending.future.set_result("")
+            return
+        if image[0] == "url" and not _trusted_url(image[1]):
+            logger.error("callback image from untrusted host", extra={"step": "image.callback"})
+            pending.future.set_result("")
+            return
+        try:
+            path = pending.save(_image_bytes(*image))
+        except Exception:
+            logger.exception("failed to save callback image", extra={"step": "image.callback"})
+            path = ""
+        logger.info("ok", extra={"step": "image.callback", "outlen": len(path)})
+        pending.future.set_result(path)
+
+    def _expire_locked(self, now: float) -> List[tuple[str, Future]]:
+        expired = []
+        for request_id, pending in list(self._pending.items()):
+            if pending.deadline <= now:
+                del self._pending[request_id]
+                expired.append((request_id, pending.future))
+        for request_id, early in list(self._early.items()):
+            if early.deadline <= now:
+                self._pop_early_locked(request_id)
+        return expired
+
+    @staticmethod
+    def _time_out(expired: List[tuple[str, Future]]) -> None:
+        # future завершаем вне блокировки: его callback'и ходят в Anki
+        for request_id, fut in expired:
+            logger.warning(
+                "callback timed out", extra={"step": "image.callback", "request_id": request_id}
+            )
+            fut.set_result("")
+
+    def _start_sweeper_locked(self) -> None:
+        if self._sweeper is None or not self._sweeper.is_alive():
+            self._sweeper = threading.Thread(
+                target=self._sweep, name="genapi-callback-sweeper", daemon=True
+            )
+            self._sweeper.start()
+        self._wake.set()
+
+    def _sweep(self) -> None:
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                expired = self._expire_locked(now)
+                deadlines = [p.deadline for p in self._pending.values()]
+                deadlines += [early.deadline for early in self._early.values()]
+                if not deadlines and not expired:
+                    self._sweeper = None  # следующий expect/deliver запустит заново
+                    return
+                self._wake.clear()
+            self._time_out(expired)
+            if deadlines:
+                self._wake.wait(max(min(deadlines) - now, 0.0) + 0.01)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+
+registry = CallbackRegistry(getattr(settings, "GENAPI_CALLBACK_TIMEOUT_S", 600))
+
+_server: Optional[WebhookServer] = None
+_server_lock = threading.Lock()
+
+
+def ensure_receiver() -> WebhookServer:
+    """Запустить встроенный приёмник callback'ов (один на процесс)."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = WebhookServer(
+                getattr(settings, "GENAPI_CALLBACK_HOST", "127.0.0.1"),
+                getattr(settings, "GENAPI_CALLBACK_PORT", 8766),
+                registry.deliver,
+                token=callback_token(),
+            ).start()
+        return _server
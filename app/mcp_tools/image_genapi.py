@@ -2,13 +2,17 @@ from __future__ import annotations
 
 import base64
 import hashlib
+import json
 import logging
 import os
-import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Callable, Dict, Tuple
 
-import requests
+from app.cache.image_store import ImageStore, get_image_store, image_key
+from app.net.genapi_poller import TaskPoller
+from app.net.pool import get_session
 from app.settings import settings
 
 # external client functions; they will be patched in tests
@@ -77,28 +81,112 @@ def _get_request_id(resp: Dict[str, Any]) -> str | None:
     return None
 
 
-def _save_image(kind: str, data: str, out_path: Path) -> str:
+def _image_store() -> ImageStore:
+    # то же хранилище, что и у app.mcp_tools.image
+    quota_mb = getattr(settings, "IMAGE_STORE_MAX_MB", 0)
+    return get_image_store(MEDIA_DIR, quota_bytes=quota_mb * 1024 * 1024)
+
+
+def _image_bytes(kind: str, data: str) -> bytes:
+    """Bytes of an image found by :func:`_extract_image` (downloads URLs)."""
+    if kind == "url":
+        resp = get_session(data).get(data, timeout=60)
+        resp.raise_for_status()
+        return resp.content
+    return base64.b64decode(data)
+
+
+def _save_image(kind: str, data: str, key: str) -> str:
     try:
-        if kind == "url":
-            resp = requests.get(data, timeout=60)
-            resp.raise_for_status()
-            img_bytes = resp.content
-        else:
-            img_bytes = base64.b64decode(data)
-        out_path.write_bytes(img_bytes)
-        return str(out_path)
+        return str(MEDIA_DIR / _image_store().put(key, _image_bytes(kind, data)))
     except Exception:
         logger.exception("Failed to save image")
         return ""
 
 
-def generate_image_file_genapi(
+def _resolved(value: str) -> "Future[str]":
+    fut: Future = Future()
+    fut.set_result(value)
+    return fut
+
+
+_saver: ThreadPoolExecutor | None = None
+_saver_lock = threading.Lock()
+
+
+def _save_executor() -> ThreadPoolExecutor:
+    """Потоки для сохранения картинок: скачивание не держит потоки опроса."""
+    global _saver
+    with _saver_lock:
+        if _saver is None:
+            _saver = ThreadPoolExecutor(max_workers=4, thread_name_prefix="genapi-save")
+        return _saver
+
+
+def _then(fut: Future, fn: Callable[[Any], str]) -> "Future[str]":
+    """Future of ``fn(result)`` run on the save pool; any failure becomes ``""``."""
+    out: Future = Future()
+
+    def _apply(src: Future) -> None:
+        try:
+            out.set_result(fn(src.result()))
+        except TimeoutError:
+            logger.error("Image generation timed out")
+            out.set_result("")
+        except Exception:
+            logger.exception("Image generation failed")
+            out.set_result("")
+
+    def _done(src: Future) -> None:
+        # колбэк вызывается в потоке опроса — сама работа уходит в отдельный пул
+        try:
+            _save_executor().submit(_apply, src)
+        except RuntimeError:  # пул закрыт при выходе
+            _apply(src)
+
+    fut.add_done_callback(_done)
+    return out
+
+
+def _save_status(status: Any, key: str) -> str:
+    image = _extract_image(status)
+    if not image:
+        logger.error("No image in finished task")
+        return ""
+    kind, data = image
+    return _save_image(kind, data, key)
+
+
+_poller: TaskPoller | None = None
+_poller_lock = threading.Lock()
+
+
+def _task_poller() -> TaskPoller:
+    """Общий фоновый опрос задач GenAPI для всех генераций процесса."""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = TaskPoller(
+                # имя ищется при вызове: библиотека опциональна и подменяется в тестах
+                lambda request_id: get_task_status(request_id),  # type: ignore[misc]
+                done=lambda data: _extract_image(data) is not None,
+                first_interval=_env_int("GENAPI_POLL_INTERVAL_MS", 1000) / 1000,
+                max_interval=_env_int("GENAPI_POLL_MAX_INTERVAL_MS", 8000) / 1000,
+            )
+        return _poller
+
+
+def start_image_genapi(
     sentence_de: str,
     ref_image: str | bytes | None = None,
     ref_kind: str | None = None,
-) -> str:
+) -> "Future[str]":
     """
-    Generate an image via GenAPI. Return local file path or empty string.
+    Start image generation via GenAPI without blocking on the task.
+
+    Returns a future with the local file path or an empty string. Tasks that
+    are not ready immediately are tracked by the shared background poller, so
+    many generations can be in flight without a waiting thread each.
 
     Parameters
     ----------
@@ -111,18 +199,12 @@ def generate_image_file_genapi(
 
     model_id = os.environ.get("GENAPI_MODEL_ID")
     if not model_id or create_generation_task is None or get_task_status is None:
-        return ""
+        return _resolved("")
 
     is_sync = os.environ.get("GENAPI_IS_SYNC", "false").lower() == "true"
     callback_url = os.environ.get("GENAPI_CALLBACK_URL")
-    poll_interval_ms = _env_int("GENAPI_POLL_INTERVAL_MS", 1000)
     poll_timeout_ms = _env_int("GENAPI_POLL_TIMEOUT_MS", 10000)
 
-    hash_hex = hashlib.sha1(f"{sentence_de}{model_id}".encode("utf-8")).hexdigest()
-    out_path = MEDIA_DIR / f"img_{hash_hex}.png"
-    if out_path.exists():
-        return str(out_path)
-
     prompt = f"Иллюстрируй смысл простого немецкого предложения без текста: {sentence_de}"
 
     quality = settings.GENAPI_QUALITY
@@ -162,7 +244,7 @@ def generate_image_file_genapi(
                 size = os.path.getsize(ref_image)
                 if max_bytes and size > max_bytes:
                     logger.warning("Reference image too large: %s", size)
-                    return ""
+                    return _resolved("")
                 mime = _EXT_TO_MIME.get(Path(ref_image).suffix.lower())
                 if allowed_types and mime not in allowed_types:
                     # try signature for better guess
@@ -173,52 +255,60 @@ def generate_image_file_genapi(
                         mime = None
                 if allowed_types and mime not in allowed_types:
                     logger.warning("Unsupported reference image type: %s", mime)
-                    return ""
+                    return _resolved("")
                 ref_payload["image_path"] = ref_image
         elif kind == "b64":
             data = ref_image if isinstance(ref_image, bytes) else base64.b64decode(ref_image)
             size = len(data)
             if max_bytes and size > max_bytes:
                 logger.warning("Reference image too large: %s", size)
-                return ""
+                return _resolved("")
             mime = _guess_mime_from_bytes(data)
             if allowed_types and mime not in allowed_types:
                 logger.warning("Unsupported reference image type: %s", mime)
-                return ""
+                return _resolved("")
             ref_payload["image_b64"] = base64.b64encode(data).decode()
         else:
             logger.warning("Unsupported reference image input")
 
     kwargs.update(ref_payload)
 
+    ref_hash = None
+    if ref_payload:
+        ref_blob = json.dumps(ref_payload, sort_keys=True).encode("utf-8")
+        ref_hash = hashlib.sha256(ref_blob).hexdigest()
+    key = image_key(model_id, prompt, quality=quality, ref=ref_hash)
+    cached = _image_store().get(key)
+    if cached:
+        return _resolved(str(MEDIA_DIR / cached))
+
     try:
         resp = create_generation_task(**kwargs)  # type: ignore[misc]
     except Exception:
         logger.exception("create_generation_task failed")
-        return ""
+        return _resolved("")
 
     image = _extract_image(resp)
     if image:
         kind, data = image
-        return _save_image(kind, data, out_path)
+        return _resolved(_save_image(kind, data, key))
 
     request_id = _get_request_id(resp)
     if not request_id:
         logger.error("No request_id for polling")
-        return ""
+        return _resolved("")
 
-    deadline = time.time() + poll_timeout_ms / 1000
-    while time.time() < deadline:
-        try:
-            status = get_task_status(request_id)  # type: ignore[misc]
-        except Exception:
-            logger.exception("get_task_status failed")
-            return ""
-        image = _extract_image(status)
-        if image:
-            kind, data = image
-            return _save_image(kind, data, out_path)
-        time.sleep(poll_interval_ms / 1000)
-
-    logger.error("Image generation timed out")
-    return ""
+    fut = _task_poller().submit(request_id, timeout=poll_timeout_ms / 1000)
+    return _then(fut, lambda status: _save_status(status, key))
+
+
+def generate_image_file_genapi(
+    sentence_de: str,
+    ref_image: str | bytes | None = None,
+    ref_kind: str | None = None,
+) -> str:
+    """Generate an image via GenAPI. Return local file path or empty string.
+
+    Blocking wrapper around :func:`start_image_genapi`.
+    """
+    return start_image_genapi(sentence_de, ref_image, ref_kind).result()
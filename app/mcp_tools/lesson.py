@@ -1,11 +1,24 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import inspect
 import logging
 import re
 import time
-from typing import Dict, Optional
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
 import importlib
 
+from app.orchestration.dag import Stage, Timings, run_graph, run_graph_async
+from app.telemetry.jsonl import events_enabled, log_event
+from app.telemetry.metrics import observe_step, usage_scope
+from app.telemetry.tracing import current_ids, traced
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .anki import AnkiWriter
+
 # Для грубого детекта кириллицы
 _CYRILLIC_RE = re.compile(r"[\u0400-\u04FF]")
 
@@ -37,98 +50,422 @@ def generate_image_file(sentence: str) -> str:
     return gen(sentence)
 
 
+def start_image_file(sentence: str) -> "Future[str]":
+    image_mod = importlib.import_module("app.mcp_tools.image")
+    return getattr(image_mod, "start_image_file")(sentence)
+
+
+def image_callback_mode() -> bool:
+    image_mod = importlib.import_module("app.mcp_tools.image")
+    callback_mode = getattr(image_mod, "callback_mode", None)
+    return bool(callback_mode and callback_mode())
+
+
+def image_breaker_open() -> bool:
+    image_mod = importlib.import_module("app.mcp_tools.image")
+    breaker_open = getattr(image_mod, "breaker_open", None)
+    return bool(breaker_open and breaker_open())
+
+
+def attach_image(note_id: int, path: str) -> str:
+    anki_mod = importlib.import_module("app.mcp_tools.anki")
+    return getattr(anki_mod, "attach_image")(note_id, path)
+
+
+def image_deferred() -> bool:
+    settings_mod = importlib.import_module("app.settings")
+    return bool(getattr(settings_mod.settings, "CARD_IMAGE_DEFERRED", False))
+
+
+def enqueue_image(note_id: int, sentence: str) -> "Future[str]":
+    jobs_mod = importlib.import_module("app.orchestration.image_jobs")
+    return getattr(jobs_mod, "get_image_jobs")().enqueue(note_id, sentence)
+
+
 def add_anki_note(**kwargs) -> int:
     anki_mod = importlib.import_module("app.mcp_tools.anki")
     add_note = getattr(anki_mod, "add_anki_note")
     return add_note(**kwargs)
 
 
+def store_media_file(path: str) -> str:
+    anki_mod = importlib.import_module("app.mcp_tools.anki")
+    return getattr(anki_mod, "store_media_file")(path)
+
+
+async def generate_sentence_async(word: str) -> str:
+    text_mod = importlib.import_module("app.mcp_tools.text")
+    return await getattr(text_mod, "generate_sentence_async")(word)
+
+
+async def translate_text_async(text: str, src: str, tgt: str) -> str:
+    text_mod = importlib.import_module("app.mcp_tools.text")
+    return await getattr(text_mod, "translate_text_async")(text, src, tgt)
+
+
+async def generate_image_file_async(sentence: str) -> str:
+    image_mod = importlib.import_module("app.mcp_tools.image")
+    return await getattr(image_mod, "generate_image_file_async")(sentence)
+
+
+async def start_image_file_async(sentence: str) -> "Future[str]":
+    image_mod = importlib.import_module("app.mcp_tools.image")
+    return await getattr(image_mod, "start_image_file_async")(sentence)
+
+
+async def add_anki_note_async(**kwargs) -> int:
+    anki_mod = importlib.import_module("app.mcp_tools.anki")
+    return await getattr(anki_mod, "add_anki_note_async")(**kwargs)
+
+
+async def store_media_file_async(path: str) -> str:
+    anki_mod = importlib.import_module("app.mcp_tools.anki")
+    return await getattr(anki_mod, "store_media_file_async")(path)
+
+
+def _require(value: str, what: str) -> str:
+    if not value.strip():
+        logger.error("empty fields", extra={"step": "lesson.make_card"})
+        raise EmptyFieldsError(f"{what} is empty")
+    return value
+
+
+def _compose_back(translation_ru: str, sentence_de: str, img_path: str) -> str:
+    back_html = (
+        f"<div>Перевод: {translation_ru}</div>"
+        f"<div>Satz: {sentence_de}</div>"
+    )
+    if img_path:
+        back_html += f'<img src="{img_path}">'  # already includes media/
+    return _require(back_html, "back")
+
+
+def _card_stages(
+    word: str,
+    lang: Optional[str],
+    deck: str,
+    tag: str,
+    ops: Any,
+    prefilled: Optional[Dict[str, str]] = None,
+    deferred: Optional[Dict[str, Any]] = None,
+) -> List[Stage]:
+    """Граф шагов карточки; ``ops`` — синхронные или асинхронные реализации.
+
+    Обратный перевод и картинка зависят только от ``sentence_de`` и идут
+    параллельно; загрузка медиа в Anki стартует сразу после картинки.
+    Значения из ``prefilled`` (например, посчитанные пакетно) заменяют
+    соответствующие шаги и проходят ту же проверку. Если картинка пришла
+    как ещё не готовый future, карточка собирается без неё, а future
+    кладётся в ``deferred["image"]``.
+    """
+    in_lang = (lang or "").strip().lower() or _detect_lang(word)
+
+    def _word_de(r: Dict[str, Any]) -> Any:
+        return word if in_lang == "de" else ops.translate(word, "ru", "de")
+
+    def _image_now(value: Any) -> str:
+        if isinstance(value, Future):
+            if value.done():
+                return value.result() or ""
+            if deferred is not None:
+                deferred["image"] = value
+            return ""
+        return value or ""
+
+    def _media(r: Dict[str, Any]) -> Any:
+        # имя файла в медиа Anki; без картинки загружать нечего
+        return ops.store_media(r["image"]) if r["image"] else ""
+
+    def _back(r: Dict[str, Any]) -> str:
+        return _compose_back(r["translation_ru"], r["sentence_de"], _card_image(r))
+
+    def _note(r: Dict[str, Any]) -> Any:
+        return ops.add_note(
+            front=r["word_de"],
+            back_html=r["back"],
+            deck=deck,
+            tags=[tag] if tag else [],
+            media_path=None,  # медиа уже загружено шагом media
+        )
+
+    stages = [
+        Stage("word_de", _word_de, check=lambda v: _require(v, "front")),
+        Stage(
+            "sentence_de",
+            lambda r: ops.generate_sentence(r["word_de"]),
+            ("word_de",),
+            check=lambda v: _require(v, "sentence"),
+        ),
+        Stage(
+            "translation_ru",
+            lambda r: ops.translate(r["sentence_de"], "de", "ru"),
+            ("sentence_de",),
+            check=lambda v: _require(v, "translation"),
+        ),
+        # картинка опциональна: generate_image_file возвращает "" при ошибке
+        Stage("image", lambda r: ops.generate_image(r["sentence_de"]), ("sentence_de",),
+              check=_image_now),
+        Stage("media", _media, ("image",), optional=True),
+        Stage("back", _back, ("translation_ru", "sentence_de", "image", "media")),
+        Stage("note", _note, ("word_de", "back")),
+    ]
+    for stage in stages:
+        if prefilled and prefilled.get(stage.name):
+            stage.fn = lambda r, value=prefilled[stage.name]: value
+    return stages
+
+
+def _card_image(results: Dict[str, Any]) -> str:
+    # если загрузка в Anki не удалась, карточка создаётся без картинки
+    return results["image"] if results.get("media") else ""
+
+
+def _card_result(
+    start: float, results: Dict[str, Any], timings: Timings
+) -> Dict[str, Any]:
+    img_path = _card_image(results)
+    back_html = results["back"]
+    lat_ms = (time.perf_counter() - start) * 1000
+    observe_step("lesson.make_card", lat_ms)
+    logger.info(
+        "ok",
+        extra={"step": "lesson.make_card", "lat_ms": int(lat_ms), "outlen": len(back_html)},
+    )
+    message = (
+        "Карточка создана с изображением" if img_path else "Карточка создана без изображения"
+    )
+    return {
+        "note_id": results["note"],
+        "front": results["word_de"],
+        "back": back_html,
+        "image": img_path,
+        "message": message,
+        "timings": timings,
+    }
+
+
+def _emit_card(
+    word: str, lang: Optional[str], start: float, usage: Dict[str, float],
+    result: Optional[Dict[str, Any]], error: Optional[BaseException],
+) -> None:
+    payload: Dict[str, Any] = {
+        "word": word,
+        "lang": lang,
+        "ok": error is None,
+        "lat_ms": int((time.perf_counter() - start) * 1000),
+        "stages": {k: v["lat_ms"] for k, v in ((result or {}).get("timings") or {}).items()},
+        "requests": usage,
+        "trace_id": current_ids()[0],
+    }
+    if error is not None:
+        payload["error"] = type(error).__name__
+    log_event("card", payload)
+
+
+def _card_event(func: Callable) -> Callable:
+    """Записать событие ``card`` в телеметрию: время, шаги, запросы к провайдерам."""
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(word: str, lang: Optional[str], *args: Any, **kwargs: Any) -> Any:
+            if not events_enabled():
+                return await func(word, lang, *args, **kwargs)
+            start = time.perf_counter()
+            with usage_scope() as usage:
+                try:
+                    result = await func(word, lang, *args, **kwargs)
+                except Exception as exc:
+                    _emit_card(word, lang, start, usage.counts(), None, exc)
+                    raise
+            _emit_card(word, lang, start, usage.counts(), result, None)
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(word: str, lang: Optional[str], *args: Any, **kwargs: Any) -> Any:
+        if not events_enabled():
+            return func(word, lang, *args, **kwargs)
+        start = time.perf_counter()
+        with usage_scope() as usage:
+            try:
+                result = func(word, lang, *args, **kwargs)
+            except Exception as exc:
+                _emit_card(word, lang, start, usage.counts(), None, exc)
+                raise
+        _emit_card(word, lang, start, usage.counts(), result, None)
+        return result
+
+    return wrapper
+
+
+def _attach_when_ready(image: Future, note: Any) -> None:
+    """Дописать картинку в заметку, когда придёт callback GenAPI."""
+
+    def _done(fut: Future) -> None:
+        path = fut.result()
+        if not path:
+            return
+        try:
+            note_id = note.result() if isinstance(note, Future) else note
+            attach_image(note_id, path)
+        except Exception:
+            logger.warning(
+                "deferred image was not attached", exc_info=True, extra={"step": "lesson.make_card"}
+            )
+
+    image.add_done_callback(_done)
+
+
+def _no_image(sentence: str) -> str:
+    return ""
+
+
+def _enqueue_when_created(note: Any, sentence: str) -> None:
+    """Поставить картинку в очередь, как только известен id заметки."""
+
+    def _enqueue(note_id: Any) -> None:
+        try:
+            enqueue_image(note_id, sentence)
+        except Exception:
+            logger.warning(
+                "image job was not queued", exc_info=True, extra={"step": "lesson.make_card"}
+            )
+
+    def _created(fut: Future) -> None:
+        # заметка не создалась — прикреплять некуда, ошибку вернёт сам результат
+        if fut.exception() is None:
+            _enqueue(fut.result())
+
+    if isinstance(note, Future):
+        note.add_done_callback(_created)
+    else:
+        _enqueue(note)
+
+
+@traced("lesson.make_card")
+@_card_event
 def make_card(
     word: str,
     lang: Optional[str],
     deck: str,
     tag: str = "tg-auto",
     # TODO: ref_image: str | bytes | None = None
-) -> Dict[str, str | int]:
+    *,
+    prefilled: Optional[Dict[str, str]] = None,
+    anki: Optional[AnkiWriter] = None,
+    defer_image: Optional[bool] = None,
+) -> Dict[str, Any]:
     """Полный цикл создания карточки Anki из одного слова.
 
     Front = слово на DE
     Back  = Перевод (RU) + Satz (DE) + (опционально) <img>
 
-    Если картинка не сгенерировалась — карточка всё равно создаётся.
+    Если картинка не сгенерировалась — карточка всё равно создаётся; если
+    circuit breaker GenAPI открыт, картинка даже не запрашивается.
+    Независимые шаги выполняются параллельно (см. :func:`_card_stages`),
+    в ``timings`` возвращается время каждого шага. ``prefilled`` позволяет
+    передать уже готовые ``word_de``/``sentence_de``/``translation_ru``.
+    С ``anki`` медиа и заметка ставятся в буфер :class:`AnkiWriter`, а
+    ``note_id`` в результате — :class:`~concurrent.futures.Future`.
+
+    В режиме callback'ов GenAPI (``GENAPI_IS_SYNC=false``) карточка
+    создаётся, не дожидаясь картинки; картинка дописывается в заметку, когда
+    придёт callback.
+
+    С ``defer_image`` (по умолчанию ``CARD_IMAGE_DEFERRED``) картинка вообще
+    не ждётся: заметка создаётся с текстом, а генерация и прикрепление
+    картинки уходят в постоянную очередь :mod:`app.orchestration.image_jobs`.
     """
     logger.info("start", extra={"step": "lesson.make_card"})
     start = time.perf_counter()
-    gen_sentence = generate_sentence
-    translate = translate_text
-    add_note = add_anki_note
+    deferred: Dict[str, Any] = {}
+    if defer_image is None:
+        defer_image = image_deferred()
+    if defer_image:
+        generate_image: Any = _no_image
+    elif image_breaker_open():
+        logger.warning("image provider is down, skipping image", extra={"step": "lesson.make_card"})
+        generate_image = _no_image
+    elif image_callback_mode():
+        generate_image = start_image_file
+    else:
+        generate_image = generate_image_file
+    ops = SimpleNamespace(
+        translate=translate_text,
+        generate_sentence=generate_sentence,
+        generate_image=generate_image,
+        store_media=anki.store_media if anki else store_media_file,
+        add_note=anki.add_note if anki else add_anki_note,
+    )
 
     try:
-        # 1) Определяем язык входа
-        in_lang = (lang or "").strip().lower() or _detect_lang(word)
-
-        # 2) Получаем целевое слово на немецком
-        if in_lang == "de":
-            word_de = word
-        else:
-            # слово было RU → переводим в DE
-            word_de = translate(word, "ru", "de")
-
-        if not word_de.strip():
-            logger.error("empty fields", extra={"step": "lesson.make_card"})
-            raise EmptyFieldsError("front is empty")
-
-        # 3) Генерируем B1-предложение с этим словом
-        sentence_de = gen_sentence(word_de)
-        if not sentence_de.strip():
-            logger.error("empty fields", extra={"step": "lesson.make_card"})
-            raise EmptyFieldsError("sentence is empty")
-
-        # 4) Переводим предложение на RU (для Back)
-        translation_ru = translate(sentence_de, "de", "ru")
-        if not translation_ru.strip():
-            logger.error("empty fields", extra={"step": "lesson.make_card"})
-            raise EmptyFieldsError("translation is empty")
-
-        # 5) Пытаемся сгенерировать картинку (может вернуть пустую строку)
-        img_path = generate_image_file(sentence_de) or ""
-
-        # 6) Формируем Back
-        back_html = (
-            f"<div>Перевод: {translation_ru}</div>"
-            f"<div>Satz: {sentence_de}</div>"
+        results, timings = run_graph(
+            _card_stages(word, lang, deck, tag, ops, prefilled, deferred)
         )
-        if img_path:
-            back_html += f'<img src="{img_path}">'  # already includes media/
+        result = _card_result(start, results, timings)
+        if defer_image:
+            _enqueue_when_created(results["note"], results["sentence_de"])
+        elif "image" in deferred:
+            _attach_when_ready(deferred["image"], results["note"])
+        if defer_image or "image" in deferred:
+            result["message"] = "Карточка создана, изображение будет добавлено позже"
+        return result
+    except EmptyFieldsError:
+        raise
+    except Exception:
+        logger.error("error", exc_info=True, extra={"step": "lesson.make_card"})
+        raise
 
-        if not back_html.strip():
-            logger.error("empty fields", extra={"step": "lesson.make_card"})
-            raise EmptyFieldsError("back is empty")
 
-        # 7) Добавляем карточку в Anki
-        note_id = add_note(
-            front=word_de,
-            back_html=back_html,
-            deck=deck,
-            tags=[tag] if tag else [],
-            media_path=img_path or None,  # картинка опциональна
-        )
+@traced("lesson.make_card")
+@_card_event
+async def make_card_async(
+    word: str,
+    lang: Optional[str],
+    deck: str,
+    tag: str = "tg-auto",
+) -> Dict[str, Any]:
+    """Асинхронная версия :func:`make_card` без блокировки event loop."""
+    logger.info("start", extra={"step": "lesson.make_card"})
+    start = time.perf_counter()
+    defer_image = image_deferred()
+    skip_image = defer_image or image_breaker_open()
 
-        # 8) Возвращаем краткий результат
-        lat_ms = int((time.perf_counter() - start) * 1000)
-        logger.info(
-            "ok", extra={"step": "lesson.make_card", "lat_ms": lat_ms, "outlen": len(back_html)}
-        )
-        message = (
-            "Карточка создана с изображением" if img_path else "Карточка создана без изображения"
+    deferred: Dict[str, Any] = {}
+
+    async def _no_image_async(sentence: str) -> str:
+        return ""
+
+    if skip_image:
+        generate_image: Any = _no_image_async
+    elif image_callback_mode():
+        generate_image = start_image_file_async
+    else:
+        generate_image = generate_image_file_async
+    ops = SimpleNamespace(
+        translate=translate_text_async,
+        generate_sentence=generate_sentence_async,
+        generate_image=generate_image,
+        store_media=store_media_file_async,
+        add_note=add_anki_note_async,
+    )
+
+    try:
+        results, timings = await run_graph_async(
+            _card_stages(word, lang, deck, tag, ops, deferred=deferred)
         )
-        return {
-            "note_id": note_id,
-            "front": word_de,
-            "back": back_html,
-            "image": img_path,
-            "message": message,
-        }
+        result = _card_result(start, results, timings)
+        if defer_image:
+            # постановка в очередь — запись в SQLite, не держим ею event loop
+            await asyncio.to_thread(
+                _enqueue_when_created, results["note"], results["sentence_de"]
+            )
+        elif "image" in deferred:
+            _attach_when_ready(deferred["image"], results["note"])
+        if defer_image or "image" in deferred:
+            result["message"] = "Карточка создана, изображение будет добавлено позже"
+        return result
     except EmptyFieldsError:
         raise
     except Exception:
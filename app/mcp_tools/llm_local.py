@@ -0,0 +1,152 @@
+"""Local OpenAI-compatible LLM server as the text backend.
+
+llama.cpp ``server``, ollama (``/v1``), vLLM and LM Studio all speak the
+OpenAI chat completions API.  With ``TEXT_BACKEND=local``
+:mod:`app.mcp_tools.llm_text` sends every text request to
+``TEXT_LOCAL_BASE_URL`` instead of OpenRouter: no per-token cost, no quota.
+
+A backend is anything with the functions of :mod:`app.mcp_tools.llm_text`:
+``chat(messages, model=None, max_tokens=200) -> str`` and, optionally,
+``chat_async``, ``chat_stream`` and ``chat_stream_async`` (the latter two
+yield text deltas).  :class:`LocalBackend` implements all four.
+
+Local servers batch concurrent requests themselves (llama.cpp ``--parallel``
+slots, ``OLLAMA_NUM_PARALLEL``, vLLM continuous batching), so the client
+side of batching is keeping those slots busy: ``translate_many`` and
+``generate_sentences`` send up to ``TEXT_BATCH_PARALLEL`` structured requests
+at once, and requests are capped at ``TEXT_LOCAL_PARALLEL`` in flight (the
+rest wait in :func:`app.net.limits.concurrency_slot` instead of queueing on
+the server).
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from app.net.http import NetworkError, request_json, request_json_async
+from app.net.limits import configure_concurrency, provider_for
+from app.net.sse import chat_delta, stream_sse, stream_sse_async
+from app.settings import settings
+
+__all__ = ["LocalBackend", "get_backend"]
+
+
+class LocalBackend:
+    """Chat completions against ``base_url`` (e.g. ``http://127.0.0.1:8080/v1``)."""
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        model: str = "",
+        api_key: str = "",
+        timeout: int = 120,
+        parallel: int = 4,
+    ) -> None:
+        if not base_url:
+            raise NetworkError("config", "TEXT_LOCAL_BASE_URL is not set")
+        self.base_url = base_url.rstrip("/")
+        self.url = f"{self.base_url}/chat/completions"
+        # ollama требует имя модели, llama.cpp принимает любое
+        self.model = model or "local"
+        self.api_key = api_key
+        self.timeout = timeout
+        self.parallel = max(1, parallel)
+        self.provider = provider_for(self.url)
+        configure_concurrency({self.provider: self.parallel})
+
+    def _request(
+        self, messages: List[Dict], model: Optional[str], max_tokens: int, stream: bool = False
+    ) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        payload: Dict[str, Any] = {
+            "model": model or self.model,
+            "max_tokens": max_tokens,
+            "messages": messages,
+        }
+        if stream:
+            payload["stream"] = True
+        return headers, payload
+
+    def chat(
+        self, messages: List[Dict], model: Optional[str] = None, max_tokens: int = 200
+    ) -> str:
+        headers, payload = self._request(messages, model, max_tokens)
+        data = request_json(
+            "POST",
+            self.url,
+            json=payload,
+            headers=headers,
+            timeout=self.timeout,
+            provider=self.provider,
+        )
+        return data["choices"][0]["message"]["content"]
+
+    async def chat_async(
+        self, messages: List[Dict], model: Optional[str] = None, max_tokens: int = 200
+    ) -> str:
+        headers, payload = self._request(messages, model, max_tokens)
+        data = await request_json_async(
+            "POST",
+            self.url,
+            json=payload,
+            headers=headers,
+            timeout=self.timeout,
+            provider=self.provider,
+        )
+        return data["choices"][0]["message"]["content"]
+
+    def chat_stream(
+        self, messages: List[Dict], model: Optional[str] = None, max_tokens: int = 200
+    ) -> Iterator[str]:
+        headers, payload = self._request(messages, model, max_tokens, stream=True)
+        events = stream_sse(
+            "POST",
+            self.url,
+            json=payload,
+            headers=headers,
+            timeout=self.timeout,
+            provider=self.provider,
+        )
+        try:
+            for event in events:
+                yield chat_delta(event)
+        finally:
+            events.close()
+
+    async def chat_stream_async(
+        self, messages: List[Dict], model: Optional[str] = None, max_tokens: int = 200
+    ) -> AsyncIterator[str]:
+        headers, payload = self._request(messages, model, max_tokens, stream=True)
+        events = stream_sse_async(
+            "POST",
+            self.url,
+            json=payload,
+            headers=headers,
+            timeout=self.timeout,
+            provider=self.provider,
+        )
+        try:
+            async for event in events:
+                yield chat_delta(event)
+        finally:
+            await events.aclose()
+
+
+_backend: Optional[LocalBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> LocalBackend:
+    """Shared :class:`LocalBackend` configured from ``TEXT_LOCAL_*`` settings."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = LocalBackend(
+                getattr(settings, "TEXT_LOCAL_BASE_URL", ""),
+                model=getattr(settings, "TEXT_LOCAL_MODEL", ""),
+                api_key=getattr(settings, "TEXT_LOCAL_API_KEY", ""),
+                timeout=getattr(settings, "TEXT_LOCAL_TIMEOUT_S", 120),
+                parallel=getattr(settings, "TEXT_LOCAL_PARALLEL", 4),
+            )
+        return _backend
@@ -1,14 +1,46 @@
-"""Simple wrapper around OpenRouter chat completions."""
+"""Text backend used by :mod:`app.mcp_tools.text`: OpenRouter or a local server.
+
+``TEXT_BACKEND=openrouter`` (default) calls OpenRouter chat completions;
+``TEXT_BACKEND=local`` hands every call to
+:class:`app.mcp_tools.llm_local.LocalBackend`.  Both provide ``chat``,
+``chat_async`` and the streaming ``chat_stream`` / ``chat_stream_async``.
+"""
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
-from app.net.http import NetworkError, request_json
+from app.net.http import NetworkError, request_json, request_json_async
+from app.net.sse import chat_delta, stream_sse, stream_sse_async
 from app.settings import settings
 
 API_URL = "https://openrouter.ai/api/v1/chat/completions"
 
 
+def _local() -> Any:
+    """The local backend when ``TEXT_BACKEND=local``, else ``None``."""
+    if getattr(settings, "TEXT_BACKEND", "openrouter") != "local":
+        return None
+    from .llm_local import get_backend
+
+    return get_backend()
+
+
+def _build_request(
+    messages: List[Dict], model: Optional[str], max_tokens: int
+) -> Tuple[Dict[str, str], Dict]:
+    api_key = settings.OPENROUTER_API_KEY
+    mdl = model or settings.OPENROUTER_TEXT_MODEL
+
+    if not api_key:
+        raise NetworkError("config", "OPENROUTER_API_KEY is not set")
+    if not mdl:
+        raise NetworkError("config", "OPENROUTER_TEXT_MODEL is not set")
+
+    headers = {"Authorization": f"Bearer {api_key}"}
+    payload = {"model": mdl, "max_tokens": max_tokens, "messages": messages}
+    return headers, payload
+
+
 def chat(
     messages: List[Dict],
     model: Optional[str] = None,
@@ -27,16 +59,72 @@ def chat(
     Raises:
         NetworkError: If configuration is missing or the request fails.
     """
-    api_key = settings.OPENROUTER_API_KEY
-    mdl = model or settings.OPENROUTER_TEXT_MODEL
-
-    if not api_key:
-        raise NetworkError("config", "OPENROUTER_API_KEY is not set")
-    if not mdl:
-        raise NetworkError("config", "OPENROUTER_TEXT_MODEL is not set")
+    local = _local()
+    if local is not None:
+        return local.chat(messages, model, max_tokens)
+    headers, payload = _build_request(messages, model, max_tokens)
+    data = request_json("POST", API_URL, json=payload, headers=headers, timeout=20)
+    return data["choices"][0]["message"]["content"]
 
-    headers = {"Authorization": f"Bearer {api_key}"}
-    payload = {"model": mdl, "max_tokens": max_tokens, "messages": messages}
 
-    data = request_json("POST", API_URL, json=payload, headers=headers, timeout=20)
+async def chat_async(
+    messages: List[Dict],
+    model: Optional[str] = None,
+    max_tokens: int = 200,
+) -> str:
+    """Async variant of :func:`chat` on the shared asyncio HTTP client."""
+    local = _local()
+    if local is not None:
+        return await local.chat_async(messages, model, max_tokens)
+    headers, payload = _build_request(messages, model, max_tokens)
+    data = await request_json_async(
+        "POST", API_URL, json=payload, headers=headers, timeout=20
+    )
     return data["choices"][0]["message"]["content"]
+
+
+def chat_stream(
+    messages: List[Dict],
+    model: Optional[str] = None,
+    max_tokens: int = 200,
+) -> Iterator[str]:
+    """Stream the completion as text deltas; close the iterator to stop early."""
+    local = _local()
+    if local is not None:
+        yield from local.chat_stream(messages, model, max_tokens)
+        return
+    headers, payload = _build_request(messages, model, max_tokens)
+    events = stream_sse(
+        "POST", API_URL, json={**payload, "stream": True}, headers=headers, timeout=20
+    )
+    try:
+        for event in events:
+            yield chat_delta(event)
+    finally:
+        events.close()
+
+
+async def chat_stream_async(
+    messages: List[Dict],
+    model: Optional[str] = None,
+    max_tokens: int = 200,
+) -> AsyncIterator[str]:
+    """Async variant of :func:`chat_stream`."""
+    local = _local()
+    if local is not None:
+        events = local.chat_stream_async(messages, model, max_tokens)
+        try:
+            async for delta in events:
+                yield delta
+        finally:
+            await events.aclose()
+        return
+    headers, payload = _build_request(messages, model, max_tokens)
+    stream = stream_sse_async(
+        "POST", API_URL, json={**payload, "stream": True}, headers=headers, timeout=20
+    )
+    try:
+        async for event in stream:
+            yield chat_delta(event)
+    finally:
+        await stream.aclose()
@@ -0,0 +1,157 @@
+"""Choosing an LLM per text task from several candidate models.
+
+Candidates are configured per task (``TEXT_MODELS_GENERATE``,
+``TEXT_MODELS_TRANSLATE``) as ``model[:cost]`` lists, where ``cost`` is the
+price per million tokens.  For every (task, model) :class:`ModelRouter` keeps
+a rolling window of latencies, request failures and validation results (for
+sentences — whether :func:`app.mcp_tools.text._includes_target` passed) and
+orders the candidates by the expected time to a *valid* answer:
+
+    p95 latency / (success rate × validation pass rate)
+
+Models more expensive than ``TEXT_ROUTER_MAX_COST`` are never chosen.  Models
+without enough samples go first (unless that many requests to them have
+already failed — then last), and every ``explore_every``-th request goes to
+the least recently used model, so the statistics of the others do not go
+stale.  The caller walks the returned order as a fallback chain.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Mapping, Optional, Sequence
+
+__all__ = ["Candidate", "ModelRouter", "parse_candidates"]
+
+# samples needed before a model's latency is trusted
+MIN_SAMPLES = 5
+
+
+@dataclass
+class Candidate:
+    model: str
+    cost: float = 0.0
+
+
+def parse_candidates(spec: Optional[str]) -> List[Candidate]:
+    """``"a/model:0.15, b/model"`` → candidates (cost defaults to ``0``)."""
+    out: List[Candidate] = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        model, sep, cost = item.rpartition(":")
+        try:
+            out.append(Candidate(model.strip(), float(cost)) if sep else Candidate(item))
+        except ValueError:  # двоеточие — часть имени модели
+            out.append(Candidate(item))
+    return out
+
+
+def _rate(flags: Sequence[bool]) -> float:
+    # сглаживание Лапласа: одна ошибка на старте не выключает модель
+    return (sum(flags) + 1) / (len(flags) + 2)
+
+
+def _p95(values: Sequence[float]) -> float:
+    ordered = sorted(values)
+    return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+@dataclass
+class _Stats:
+    window: int
+    latencies: Deque[float] = field(init=False)
+    outcomes: Deque[bool] = field(init=False)
+    validations: Deque[bool] = field(init=False)
+    last_used: float = 0.0
+
+    def __post_init__(self) -> None:
+        self.latencies = deque(maxlen=self.window)
+        self.outcomes = deque(maxlen=self.window)
+        self.validations = deque(maxlen=self.window)
+
+    def score(self) -> float:
+        if len(self.latencies) < MIN_SAMPLES:
+            # попыток хватает, а успехов нет — модель не работает, в конец списка
+            return math.inf if len(self.outcomes) >= MIN_SAMPLES else 0.0
+        return _p95(self.latencies) / (_rate(self.outcomes) * _rate(self.validations))
+
+
+class ModelRouter:
+    """Rank candidate models per task by recent latency, failures and validity."""
+
+    def __init__(
+        self,
+        candidates: Mapping[str, Sequence[Candidate]],
+        *,
+        window: int = 100,
+        max_cost: float = 0.0,
+        explore_every: int = 20,
+    ) -> None:
+        self.candidates = {task: list(items) for task, items in candidates.items()}
+        self.window = window
+        self.max_cost = max_cost
+        self.explore_every = explore_every
+        self._stats: Dict[tuple, _Stats] = {}
+        self._calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, task: str, model: str) -> _Stats:
+        key = (task, model)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _Stats(self.window)
+        return stats
+
+    def _allowed(self, task: str) -> List[Candidate]:
+        items = self.candidates.get(task, [])
+        if not self.max_cost:
+            return items
+        cheap = [c for c in items if c.cost <= self.max_cost]
+        return cheap or sorted(items, key=lambda c: c.cost)[:1]
+
+    def order(self, task: str) -> List[str]:
+        """Models to try for ``task``, best first; ``[]`` if none configured."""
+        items = self._allowed(task)
+        if not items:
+            return []
+        with self._lock:
+            calls = self._calls[task] = self._calls.get(task, 0) + 1
+            ranked = sorted(
+                enumerate(items),
+                key=lambda ic: (self._get(task, ic[1].model).score(), ic[1].cost, ic[0]),
+            )
+            models = [c.model for _, c in ranked]
+            if self.explore_every and len(models) > 1 and calls % self.explore_every == 0:
+                stale = min(models, key=lambda m: self._get(task, m).last_used)
+                models.remove(stale)
+                models.insert(0, stale)
+        return models
+
+    def record(self, task: str, model: str, ok: bool, lat_ms: float) -> None:
+        with self._lock:
+            stats = self._get(task, model)
+            stats.outcomes.append(ok)
+            if ok:
+                stats.latencies.append(lat_ms)
+            stats.last_used = time.monotonic()
+
+    def record_validation(self, task: str, model: str, passed: bool) -> None:
+        with self._lock:
+            self._get(task, model).validations.append(passed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {}
+            for (task, model), s in self._stats.items():
+                out.setdefault(task, {})[model] = {
+                    "p95_ms": round(_p95(s.latencies)) if s.latencies else None,
+                    "success_rate": round(_rate(s.outcomes), 3),
+                    "pass_rate": round(_rate(s.validations), 3),
+                    "samples": len(s.outcomes),
+                }
+            return out
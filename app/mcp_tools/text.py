@@ -1,12 +1,23 @@
 """Text-related MCP tools."""
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import json
 import logging
 import re
+import threading
 import time
-from typing import Any, Dict, List
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
 
-from app.net.http import NetworkError, request_json
+from app.cache.text_cache import TextCache, make_key
+from app.mcp_tools.model_router import ModelRouter, parse_candidates
+from app.net.deadline import deadline_scope, time_left
+from app.net.http import NetworkError, request_json, request_json_async
+from app.net.sse import chat_delta, stream_sse, stream_sse_async
 
 # ── optional local provider (preferred if present) ────────────────────────────
 try:  # pragma: no cover - optional dependency
@@ -16,6 +27,7 @@ except Exception:  # pragma: no cover
 
 # ── env / config for OpenRouter fallback ─────────────────────────────────────
 from app.settings import settings
+from app.telemetry.metrics import observe_step
 
 CHAT_URL = "https://openrouter.ai/api/v1/chat/completions"
 
@@ -24,6 +36,24 @@ SYSTEM_PROMPT = (
     "that MUST include the target word. No quotes."
 )
 
+TRANSLATE_MANY_PROMPT = (
+    "Translate every string of the JSON array from {src} to {tgt}. "
+    "Answer with a JSON array of translations only: same length, same order, "
+    "no comments."
+)
+
+SENTENCES_PROMPT = (
+    "For every German word of the JSON array write one short, natural German "
+    "B1 sentence (6–12 words) that MUST include that word. Answer with a JSON "
+    "array of sentences only: same length, same order, no comments."
+)
+
+# attempts per word before generate_sentences gives up on it
+SENTENCE_ATTEMPTS = 3
+
+# items per structured request when the caller does not pass ``batch_size``
+DEFAULT_BATCH_SIZE = 20
+
 
 # ── helpers ──────────────────────────────────────────────────────────────────
 def _extract_content(resp: Any) -> str:
@@ -68,10 +98,12 @@ def _extract_content(resp: Any) -> str:
     return str(resp)
 
 
-def _chat_openrouter(messages: List[dict]) -> Dict[str, Any]:
-    """Fallback chat via OpenRouter using our generic JSON client."""
+def _openrouter_request(
+    messages: List[dict], model: Optional[str] = None
+) -> tuple[Dict[str, str], Dict[str, Any]]:
+    """Build headers and payload for an OpenRouter chat completion."""
     api_key = settings.OPENROUTER_API_KEY
-    model = settings.OPENROUTER_TEXT_MODEL
+    model = model or settings.OPENROUTER_TEXT_MODEL
     missing = []
     if not api_key:
         missing.append("OPENROUTER_API_KEY")
@@ -82,18 +114,635 @@ def _chat_openrouter(messages: List[dict]) -> Dict[str, Any]:
 
     headers = {"Authorization": f"Bearer {api_key}"}
     payload = {"model": model, "messages": messages}
+    return headers, payload
 
+
+def _chat_openrouter(messages: List[dict], model: Optional[str] = None) -> Dict[str, Any]:
+    """Fallback chat via OpenRouter using our generic JSON client."""
+    headers, payload = _openrouter_request(messages, model)
     # keep the call local and reusable; _chat() will extract text content
     return request_json("POST", CHAT_URL, headers=headers, json=payload, timeout=30)
 
 
-def _chat(messages: List[dict]) -> str:
-    """Unified chat: prefer local llm_text, else OpenRouter fallback."""
+async def _chat_openrouter_async(
+    messages: List[dict], model: Optional[str] = None
+) -> Dict[str, Any]:
+    headers, payload = _openrouter_request(messages, model)
+    return await request_json_async(
+        "POST", CHAT_URL, headers=headers, json=payload, timeout=30
+    )
+
+
+# ── response cache ───────────────────────────────────────────────────────────
+_cache: Optional[TextCache] = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> Optional[TextCache]:
+    """Shared LLM response cache, or ``None`` when disabled in settings."""
+    global _cache
+    if not getattr(settings, "TEXT_CACHE_ENABLED", False):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TextCache(
+                settings.TEXT_CACHE_PATH,
+                ttl=settings.TEXT_CACHE_TTL_S,
+                max_entries=settings.TEXT_CACHE_MAX_ENTRIES,
+            )
+        return _cache
+
+
+def _cache_key(messages: List[dict], model: Optional[str] = None) -> str:
+    """Cache key of ``messages`` answered by ``model`` (``None`` — the backend default)."""
+    system = ""
+    rest = messages
+    if messages and messages[0].get("role") == "system":
+        system, rest = messages[0].get("content", ""), messages[1:]
+    backend = "llm_text" if llm_text is not None else "openrouter"
+    default = getattr(settings, "OPENROUTER_TEXT_MODEL", "")
+    if getattr(settings, "TEXT_BACKEND", "openrouter") == "local":
+        # ответы локальной модели не смешиваются с ответами OpenRouter
+        backend = f"local:{getattr(settings, 'TEXT_LOCAL_BASE_URL', '')}"
+        default = getattr(settings, "TEXT_LOCAL_MODEL", "")
+    return make_key(model or default, system, rest, {"backend": backend})
+
+
+def _cache_models(task: str) -> List[Optional[str]]:
+    """Models that may answer ``task`` (routed candidates and hedges), in router order."""
+    models: List[Optional[str]] = []
+    for model, hedge_model in _fallback_chain(task):
+        for m in (model, hedge_model):
+            if m not in models:
+                models.append(m)
+    return models
+
+
+def _cache_lookup(cache: TextCache, messages: List[dict], task: str) -> Optional[str]:
+    """A cached answer of any model that may answer ``task``, the preferred one first."""
+    return cache.get_first(_cache_key(messages, model) for model in _cache_models(task))
+
+
+def _cache_discard(messages: List[dict]) -> None:
+    """Drop a cached answer that failed validation so the retry hits the LLM."""
+    cache = _get_cache()
+    if cache is not None:
+        for model in _cache_models(_task_for(messages)):
+            cache.delete(_cache_key(messages, model))
+
+
+def cache_stats() -> Dict[str, int]:
+    cache = _get_cache()
+    return cache.stats() if cache is not None else {}
+
+
+# ── deadlines and hedged requests ────────────────────────────────────────────
+# latencies of recent completions; the hedge fires at their p90
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+_hedge_lock = threading.Lock()
+_latencies: Deque[float] = deque(maxlen=HEDGE_WINDOW)
+_hedge_counts = {"calls": 0, "hedged": 0, "primary_wins": 0, "hedge_wins": 0}
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _hedge_enabled() -> bool:
+    return bool(getattr(settings, "TEXT_HEDGE_ENABLED", False))
+
+
+def _hedge_delay_s() -> float:
+    """When to fire the hedge: p90 of recent latencies (a fixed delay until known)."""
+    floor = getattr(settings, "TEXT_HEDGE_MIN_MS", 300) / 1000
+    with _hedge_lock:
+        samples = sorted(_latencies)
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return max(floor, getattr(settings, "TEXT_HEDGE_DELAY_MS", 3000) / 1000)
+    return max(floor, samples[int(0.9 * (len(samples) - 1))])
+
+
+def _count(name: str) -> None:
+    with _hedge_lock:
+        _hedge_counts[name] += 1
+
+
+def hedge_stats() -> Dict[str, Any]:
+    """How often requests were hedged and which request won."""
+    with _hedge_lock:
+        stats: Dict[str, Any] = dict(_hedge_counts)
+    stats["hedge_delay_ms"] = int(_hedge_delay_s() * 1000)
+    return stats
+
+
+def _complete(
+    messages: List[dict], model: Optional[str] = None, task: Optional[str] = None
+) -> Any:
+    """One completion from the configured backend; ``model`` overrides the default.
+
+    Completions of a routed ``model`` also feed the router's statistics.
+    """
+    start = time.perf_counter()
+    try:
+        if llm_text is not None:
+            if model:
+                resp = llm_text.chat(messages, model=model)  # type: ignore[attr-defined]
+            else:
+                resp = llm_text.chat(messages)  # type: ignore[attr-defined]
+        else:
+            resp = _chat_openrouter(messages, model) if model else _chat_openrouter(messages)
+    except Exception:
+        _route_record(task, model, False, start)
+        raise
+    _route_record(task, model, True, start)
+    with _hedge_lock:
+        _latencies.append(time.perf_counter() - start)
+    return resp
+
+
+async def _complete_async(
+    messages: List[dict], model: Optional[str] = None, task: Optional[str] = None
+) -> Any:
+    start = time.perf_counter()
+    kwargs = {"model": model} if model else {}
+    try:
+        if llm_text is not None:
+            chat_async = getattr(llm_text, "chat_async", None)
+            if chat_async is not None:
+                resp = await chat_async(messages, **kwargs)
+            else:
+                resp = await asyncio.to_thread(llm_text.chat, messages, **kwargs)  # type: ignore[attr-defined]
+        else:
+            resp = await _chat_openrouter_async(messages, model)
+    except asyncio.CancelledError:
+        raise  # проигравший хедж — не ошибка модели
+    except Exception:
+        _route_record(task, model, False, start)
+        raise
+    _route_record(task, model, True, start)
+    with _hedge_lock:
+        _latencies.append(time.perf_counter() - start)
+    return resp
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _hedge_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+        return _hedge_pool
+
+
+def _deadline_error() -> NetworkError:
+    return NetworkError("deadline", "deadline exceeded", {"provider": "llm"})
+
+
+def _hedged_complete(
+    messages: List[dict],
+    model: Optional[str] = None,
+    hedge_model: Optional[str] = None,
+    task: Optional[str] = None,
+) -> Tuple[Any, Optional[str]]:
+    """Send a second request if the first is slower than p90; first answer wins.
+
+    Returns the answer and the model that gave it.  The loser cannot be
+    interrupted mid-request in a thread; its answer is simply dropped (it
+    still lands in the latency window).
+    """
+    pool = _get_hedge_pool()
+    _count("calls")
+    # у каждого потока своя копия контекста: в ней дедлайн вызова
+    primary = pool.submit(contextvars.copy_context().run, _complete, messages, model, task)
+    left = time_left()
+    first_wait = _hedge_delay_s() if left is None else min(_hedge_delay_s(), max(0.0, left))
+    if wait([primary], timeout=first_wait).done or (left is not None and left <= first_wait):
+        if not primary.done():
+            primary.cancel()
+            raise _deadline_error()
+        resp = primary.result()  # ошибка первичного запроса — не победа
+        _count("primary_wins")
+        return resp, model
+
+    _count("hedged")
+    hedge_model = hedge_model or getattr(settings, "TEXT_HEDGE_MODEL", None)
+    hedge = pool.submit(contextvars.copy_context().run, _complete, messages, hedge_model, task)
+    logger.info("hedge fired", extra={"step": "text.hedge", "model": hedge_model or "-"})
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    while pending:
+        left = time_left()
+        done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+        if not done:
+            raise _deadline_error()
+        for fut in done:
+            if fut.exception() is None:
+                resp = fut.result()
+                for other in pending:
+                    other.cancel()
+                _count("hedge_wins" if fut is hedge else "primary_wins")
+                return resp, (hedge_model if fut is hedge else model)
+            error = fut.exception()
+    assert error is not None
+    raise error
+
+
+async def _hedged_complete_async(
+    messages: List[dict],
+    model: Optional[str] = None,
+    hedge_model: Optional[str] = None,
+    task: Optional[str] = None,
+) -> Tuple[Any, Optional[str]]:
+    _count("calls")
+    primary = asyncio.ensure_future(_complete_async(messages, model, task))
+    left = time_left()
+    first_wait = _hedge_delay_s() if left is None else min(_hedge_delay_s(), max(0.0, left))
+    done, _ = await asyncio.wait({primary}, timeout=first_wait)
+    if done or (left is not None and left <= first_wait):
+        if not done:
+            primary.cancel()
+            raise _deadline_error()
+        resp = primary.result()  # ошибка первичного запроса — не победа
+        _count("primary_wins")
+        return resp, model
+
+    _count("hedged")
+    hedge_model = hedge_model or getattr(settings, "TEXT_HEDGE_MODEL", None)
+    hedge = asyncio.ensure_future(_complete_async(messages, hedge_model, task))
+    logger.info("hedge fired", extra={"step": "text.hedge", "model": hedge_model or "-"})
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=time_left(), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise _deadline_error()
+            for fut in done:
+                if fut.exception() is None:
+                    resp = fut.result()
+                    _count("hedge_wins" if fut is hedge else "primary_wins")
+                    return resp, (hedge_model if fut is hedge else model)
+                error = fut.exception()
+    finally:
+        for fut in pending:
+            fut.cancel()
+    assert error is not None
+    raise error
+
+
+# ── model routing ────────────────────────────────────────────────────────────
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+# (task, model) of the last answer of _chat in this context, for validation
+_answered_by: ContextVar[Optional[Tuple[str, str]]] = ContextVar("answered_by", default=None)
+
+
+def get_router() -> ModelRouter:
+    """Router over ``TEXT_MODELS_GENERATE`` / ``TEXT_MODELS_TRANSLATE``."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter(
+                {
+                    "generate": parse_candidates(getattr(settings, "TEXT_MODELS_GENERATE", "")),
+                    "translate": parse_candidates(getattr(settings, "TEXT_MODELS_TRANSLATE", "")),
+                },
+                max_cost=getattr(settings, "TEXT_ROUTER_MAX_COST", 0.0),
+            )
+        return _router
+
+
+def router_stats() -> Dict[str, Any]:
+    """Per-task, per-model p95 latency, success and validation rates."""
+    return get_router().stats()
+
+
+def _task_for(messages: List[dict]) -> str:
+    system = messages[0].get("content") if messages else None
+    return "generate" if system in (SYSTEM_PROMPT, SENTENCES_PROMPT) else "translate"
+
+
+def _route_record(task: Optional[str], model: Optional[str], ok: bool, start: float) -> None:
+    if task and model:
+        get_router().record(task, model, ok, (time.perf_counter() - start) * 1000)
+
+
+def _note_validation(passed: bool, answered: Optional[Tuple[str, str]] = None) -> None:
+    """Credit a validation result to the model that gave the (last) answer."""
+    answered = answered or _answered_by.get()
+    if answered is not None:
+        get_router().record_validation(answered[0], answered[1], passed)
+
+
+def _fallback_chain(task: str) -> List[Tuple[Optional[str], Optional[str]]]:
+    """(model, hedge model) pairs to try; ``[(None, None)]`` without routing."""
+    models: List[Optional[str]] = list(get_router().order(task)) or [None]
+    hedge = getattr(settings, "TEXT_HEDGE_MODEL", None)
+    return [
+        (m, hedge or (models[i + 1] if i + 1 < len(models) else None))
+        for i, m in enumerate(models)
+    ]
+
+
+def _routed_complete(messages: List[dict], task: str) -> Tuple[Any, Optional[str]]:
+    error: Optional[Exception] = None
+    for model, hedge_model in _fallback_chain(task):
+        try:
+            if _hedge_enabled():
+                return _hedged_complete(messages, model, hedge_model, task)
+            return _complete(messages, model, task), model
+        except Exception as exc:
+            if model is None or (isinstance(exc, NetworkError) and exc.code == "deadline"):
+                raise
+            logger.warning(
+                "model failed, falling back",
+                extra={"step": "text.route", "model": model, "error": str(exc)},
+            )
+            error = exc
+    assert error is not None
+    raise error
+
+
+async def _routed_complete_async(messages: List[dict], task: str) -> Tuple[Any, Optional[str]]:
+    error: Optional[Exception] = None
+    for model, hedge_model in _fallback_chain(task):
+        try:
+            if _hedge_enabled():
+                return await _hedged_complete_async(messages, model, hedge_model, task)
+            return await _complete_async(messages, model, task), model
+        except Exception as exc:
+            if model is None or (isinstance(exc, NetworkError) and exc.code == "deadline"):
+                raise
+            logger.warning(
+                "model failed, falling back",
+                extra={"step": "text.route", "model": model, "error": str(exc)},
+            )
+            error = exc
+    assert error is not None
+    raise error
+
+
+def _chat(messages: List[dict], *, deadline_s: Optional[float] = None) -> str:
+    """Unified chat: prefer local llm_text, else OpenRouter fallback.
+
+    ``deadline_s`` (by default ``TEXT_DEADLINE_S``) bounds the whole call
+    including retries. With ``TEXT_HEDGE_ENABLED`` a second request (to
+    ``TEXT_HEDGE_MODEL`` if set) is fired once the first one is slower than
+    the recent p90 latency, and whichever answers first is used.  With
+    ``TEXT_MODELS_*`` configured the model is picked by :func:`get_router`
+    and the next candidates serve as fallbacks.
+    """
+    _answered_by.set(None)
+    cache = _get_cache()
+    task = _task_for(messages)
+    if cache is not None:
+        hit = _cache_lookup(cache, messages, task)
+        if hit is not None:
+            return hit
+    with deadline_scope(deadline_s or getattr(settings, "TEXT_DEADLINE_S", 0)):
+        resp, model = _routed_complete(messages, task)
+    if model:
+        _answered_by.set((task, model))
+    out = _extract_content(resp).strip()
+    if cache is not None and out:
+        # ключ — модель, которая на самом деле ответила
+        cache.set(_cache_key(messages, model), out)
+    return out
+
+
+async def _chat_async(messages: List[dict], *, deadline_s: Optional[float] = None) -> str:
+    """Async :func:`_chat`; sync-only providers are run in a worker thread."""
+    _answered_by.set(None)
+    cache = _get_cache()
+    task = _task_for(messages)
+    if cache is not None:
+        hit = _cache_lookup(cache, messages, task)
+        if hit is not None:
+            return hit
+    with deadline_scope(deadline_s or getattr(settings, "TEXT_DEADLINE_S", 0)):
+        resp, model = await _routed_complete_async(messages, task)
+    if model:
+        _answered_by.set((task, model))
+    out = _extract_content(resp).strip()
+    if cache is not None and out:
+        # ключ — модель, которая на самом деле ответила
+        cache.set(_cache_key(messages, model), out)
+    return out
+
+
+# ── batches of structured requests ───────────────────────────────────────────
+def _chat_answered(messages: List[dict]) -> Tuple[str, Optional[Tuple[str, str]]]:
+    out = _chat(messages)
+    return out, _answered_by.get()
+
+
+def _chat_many(batch: List[List[dict]]) -> List[Tuple[str, Optional[Tuple[str, str]]]]:
+    """Answer several requests, up to ``TEXT_BATCH_PARALLEL`` of them at once.
+
+    Returns ``(answer, (task, model))`` pairs in input order; the model is
+    ``None`` unless routing picked it.  A local server batches concurrent
+    requests on its side, so this keeps its slots busy.
+    """
+    parallel = min(int(getattr(settings, "TEXT_BATCH_PARALLEL", 1)), len(batch))
+    if parallel <= 1:
+        return [_chat_answered(messages) for messages in batch]
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="llm-batch") as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _chat_answered, messages)
+            for messages in batch
+        ]
+        return [f.result() for f in futures]
+
+
+# ── streaming ────────────────────────────────────────────────────────────────
+# a sentence ends at punctuation followed by whitespace and a capital letter
+# (or an opening quote), or at a newline; the next character is group 1
+_SENTENCE_END_RE = re.compile(r"[.!?…]+[\"'»“]?(?=\s+(\S))|\n")
+# «Dr. Müller», «ca. 5», «bzw.» — точка после них не конец предложения
+_ABBREVIATIONS = {
+    "bzw", "ca", "dr", "etc", "evtl", "fr", "ggf", "hr", "inkl", "jh", "nr", "prof",
+    "sog", "st", "str", "usw", "vgl",
+}
+
+
+def _is_sentence_end(text: str, match: "re.Match[str]") -> bool:
+    nxt = match.group(1)
+    if not (nxt.isupper() or nxt in "\"„«“‚'"):
+        return False
+    if match.group()[0] != ".":
+        return True  # ! ? … — не сокращение
+    token = (text[: match.start()].split() or [""])[-1].lower()
+    # «Am 3. Mai», «z. B. Hunde», «z.B. Hunde»
+    if token[-1:].isdigit() or len(token) == 1 or "." in token:
+        return False
+    return token not in _ABBREVIATIONS
+
+
+def _stream_enabled() -> bool:
+    return bool(getattr(settings, "TEXT_STREAM_ENABLED", False))
+
+
+def _first_sentence(buffer: str, final: bool = False) -> Optional[str]:
+    """First complete sentence of a partial answer, ``None`` if not there yet."""
+    text = buffer.lstrip()
+    for match in _SENTENCE_END_RE.finditer(text):
+        if match.group() == "\n":
+            return text[: match.start()]
+        if _is_sentence_end(text, match):
+            return text[: match.end()]
+    return text if final and text else None
+
+
+def _stream_deltas(messages: List[dict], model: Optional[str]) -> Optional[Iterator[str]]:
+    """Text deltas of a streamed completion; ``None`` if the backend cannot stream."""
+    kwargs = {"model": model} if model else {}
     if llm_text is not None:
-        resp = llm_text.chat(messages)  # type: ignore[attr-defined]
-    else:
-        resp = _chat_openrouter(messages)
-    return _extract_content(resp).strip()
+        chat_stream = getattr(llm_text, "chat_stream", None)
+        return chat_stream(messages, **kwargs) if chat_stream is not None else None
+    headers, payload = _openrouter_request(messages, model)
+
+    def deltas() -> Iterator[str]:
+        events = stream_sse("POST", CHAT_URL, headers=headers, json={**payload, "stream": True})
+        try:
+            for event in events:
+                yield chat_delta(event)
+        finally:
+            events.close()
+
+    return deltas()
+
+
+def _stream_deltas_async(
+    messages: List[dict], model: Optional[str]
+) -> Optional[AsyncIterator[str]]:
+    kwargs = {"model": model} if model else {}
+    if llm_text is not None:
+        chat_stream = getattr(llm_text, "chat_stream_async", None)
+        return chat_stream(messages, **kwargs) if chat_stream is not None else None
+    headers, payload = _openrouter_request(messages, model)
+
+    async def deltas() -> AsyncIterator[str]:
+        events = stream_sse_async(
+            "POST", CHAT_URL, headers=headers, json={**payload, "stream": True}
+        )
+        try:
+            async for event in events:
+                yield chat_delta(event)
+        finally:
+            await events.aclose()
+
+    return deltas()
+
+
+def _stream_model(task: str) -> Optional[str]:
+    models = get_router().order(task)
+    return models[0] if models else None
+
+
+def _stream_done(task: str, model: Optional[str], start: float, out: str, cut: bool) -> str:
+    _route_record(task, model, True, start)
+    if model:
+        _answered_by.set((task, model))
+    lat_ms = (time.perf_counter() - start) * 1000
+    observe_step("text.stream", lat_ms)
+    logger.info(
+        "stream",
+        extra={
+            "step": "text.stream",
+            "lat_ms": int(lat_ms),
+            "outlen": len(out),
+            "cut": cut,
+        },
+    )
+    return out
+
+
+def _stream_sentence(messages: List[dict]) -> Optional[str]:
+    """Stream a completion and stop reading after its first sentence.
+
+    Chatter after the sentence is never generated to the end: the stream is
+    closed as soon as the sentence is complete, so a wrong answer is retried
+    that much sooner.  Returns ``None`` when streaming is unavailable or the
+    stream fails (the caller then falls back to :func:`_chat`).
+    """
+    _answered_by.set(None)
+    cache = _get_cache()
+    task = _task_for(messages)
+    if cache is not None:
+        hit = _cache_lookup(cache, messages, task)
+        if hit is not None:
+            return hit
+    model = _stream_model(task)
+    start = time.perf_counter()
+    with deadline_scope(getattr(settings, "TEXT_DEADLINE_S", 0)):
+        deltas = _stream_deltas(messages, model)
+        if deltas is None:
+            return None
+        buffer, out, cut = "", None, False
+        try:
+            for delta in deltas:
+                buffer += delta
+                out = _first_sentence(buffer)
+                if out is not None:
+                    cut = True
+                    break
+            else:
+                out = _first_sentence(buffer, final=True)
+        except NetworkError as exc:
+            if exc.code == "deadline":
+                raise
+            _route_record(task, model, False, start)
+            logger.warning("stream failed", extra={"step": "text.stream", "error": str(exc)})
+            return None
+        finally:
+            close = getattr(deltas, "close", None)
+            if close is not None:
+                close()
+    out = _stream_done(task, model, start, (out or "").strip(), cut)
+    if cache is not None and out:
+        cache.set(_cache_key(messages, model), out)
+    return out
+
+
+async def _stream_sentence_async(messages: List[dict]) -> Optional[str]:
+    """Async :func:`_stream_sentence`."""
+    _answered_by.set(None)
+    cache = _get_cache()
+    task = _task_for(messages)
+    if cache is not None:
+        hit = _cache_lookup(cache, messages, task)
+        if hit is not None:
+            return hit
+    model = _stream_model(task)
+    start = time.perf_counter()
+    with deadline_scope(getattr(settings, "TEXT_DEADLINE_S", 0)):
+        deltas = _stream_deltas_async(messages, model)
+        if deltas is None:
+            return None
+        buffer, out, cut = "", None, False
+        try:
+            async for delta in deltas:
+                buffer += delta
+                out = _first_sentence(buffer)
+                if out is not None:
+                    cut = True
+                    break
+            else:
+                out = _first_sentence(buffer, final=True)
+        except NetworkError as exc:
+            if exc.code == "deadline":
+                raise
+            _route_record(task, model, False, start)
+            logger.warning("stream failed", extra={"step": "text.stream", "error": str(exc)})
+            return None
+        finally:
+            aclose = getattr(deltas, "aclose", None)
+            if aclose is not None:
+                await aclose()
+    out = _stream_done(task, model, start, (out or "").strip(), cut)
+    if cache is not None and out:
+        cache.set(_cache_key(messages, model), out)
+    return out
 
 
 def _clean_line(text: str) -> str:
@@ -102,6 +751,23 @@ def _clean_line(text: str) -> str:
     return " ".join(text.split()).strip()
 
 
+def _parse_json_array(text: str) -> Optional[List[Any]]:
+    """Parse a JSON array from an LLM answer (tolerates code fences/chatter)."""
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start : end + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, list) else None
+
+
+def _chunks(items: Sequence[Any], size: int) -> List[List[Any]]:
+    size = max(1, size)
+    return [list(items[i : i + size]) for i in range(0, len(items), size)]
+
+
 def _includes_target(word_de: str, sentence_de: str) -> bool:
     """Return True if `sentence_de` contains `word_de` (normalized)."""
 
@@ -123,30 +789,71 @@ logger = logging.getLogger(__name__)
 
 
 # ── public API ────────────────────────────────────────────────────────────────
+def _sentence_messages(word_de: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": word_de},
+    ]
+
+
+def _translate_messages(text: str, tgt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": f"Translate to {tgt}. Output only the translation."},
+        {"role": "user", "content": text},
+    ]
+
+
+def _log_ok(step: str, start: float, out: str) -> None:
+    lat_ms = (time.perf_counter() - start) * 1000
+    observe_step(step, lat_ms)
+    logger.info("ok", extra={"step": step, "lat_ms": int(lat_ms), "outlen": len(out)})
+
+
 def generate_sentence(word_de: str) -> str:
     """Generate a single B1-level German sentence containing `word_de`."""
     logger.info("start", extra={"step": "text.generate"})
     start = time.perf_counter()
-    messages: List[Dict[str, str]] = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": word_de},
-    ]
+    messages = _sentence_messages(word_de)
+    last: str = ""
+    try:
+        for _ in range(3):
+            out = _stream_sentence(messages) if _stream_enabled() else None
+            if out is None:
+                out = _chat(messages)
+            cleaned = _clean_line(out)
+            passed = _includes_target(word_de, cleaned)
+            _note_validation(passed)
+            if passed:
+                _log_ok("text.generate", start, cleaned)
+                return cleaned
+            _cache_discard(messages)
+            last = cleaned
+    except Exception:
+        logger.error("error", exc_info=True, extra={"step": "text.generate"})
+        raise
+    raise NetworkError(
+        "validation", "target word missing", {"word": word_de, "sentence": last}
+    )
+
+
+async def generate_sentence_async(word_de: str) -> str:
+    """Async twin of :func:`generate_sentence`."""
+    logger.info("start", extra={"step": "text.generate"})
+    start = time.perf_counter()
+    messages = _sentence_messages(word_de)
     last: str = ""
     try:
         for _ in range(3):
-            out = _chat(messages)
+            out = await _stream_sentence_async(messages) if _stream_enabled() else None
+            if out is None:
+                out = await _chat_async(messages)
             cleaned = _clean_line(out)
-            if _includes_target(word_de, cleaned):
-                lat_ms = int((time.perf_counter() - start) * 1000)
-                logger.info(
-                    "ok",
-                    extra={
-                        "step": "text.generate",
-                        "lat_ms": lat_ms,
-                        "outlen": len(cleaned),
-                    },
-                )
+            passed = _includes_target(word_de, cleaned)
+            _note_validation(passed)
+            if passed:
+                _log_ok("text.generate", start, cleaned)
                 return cleaned
+            _cache_discard(messages)
             last = cleaned
     except Exception:
         logger.error("error", exc_info=True, extra={"step": "text.generate"})
@@ -156,23 +863,169 @@ def generate_sentence(word_de: str) -> str:
     )
 
 
+def _sentences_messages(words: List[str]) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SENTENCES_PROMPT},
+        {"role": "user", "content": json.dumps(words, ensure_ascii=False)},
+    ]
+
+
+def generate_sentences(
+    words: Sequence[str], *, batch_size: Optional[int] = None
+) -> List[str]:
+    """Generate B1 sentences for many target words with structured requests.
+
+    Words are asked ``SENTENCE_BATCH_SIZE`` per request (``batch_size``
+    overrides).  Each answer item is validated with :func:`_includes_target`; only the words
+    that failed are asked again, together, in the next round (up to
+    ``SENTENCE_ATTEMPTS`` rounds).  Words that never pass come back as ``""``,
+    so one stubborn word does not fail the whole batch.  Returns sentences in
+    input order.
+    """
+    logger.info("start", extra={"step": "text.generate_many"})
+    start = time.perf_counter()
+    # ответ с предложениями длиннее перевода — своя порция, не TRANSLATE_BATCH_SIZE
+    size = batch_size or getattr(settings, "SENTENCE_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    pending = list(dict.fromkeys(words))
+    done: Dict[str, str] = {}
+    requests_made = 0
+    try:
+        for _ in range(SENTENCE_ATTEMPTS):
+            if not pending:
+                break
+            failed: List[str] = []
+            chunks = _chunks(pending, size)
+            batch = [_sentences_messages(chunk) for chunk in chunks]
+            requests_made += len(batch)
+            for chunk, messages, (answer, answered) in zip(chunks, batch, _chat_many(batch)):
+                parsed = _parse_json_array(answer)
+                if parsed is None or len(parsed) != len(chunk):
+                    parsed = [""] * len(chunk)
+                bad = []
+                for word, out in zip(chunk, parsed):
+                    cleaned = _clean_line(out) if isinstance(out, str) else ""
+                    if _includes_target(word, cleaned):
+                        done[word] = cleaned
+                    else:
+                        bad.append(word)
+                _note_validation(not bad, answered)
+                if bad:
+                    _cache_discard(messages)
+                    failed.extend(bad)
+            pending = failed
+    except Exception:
+        logger.error("error", exc_info=True, extra={"step": "text.generate_many"})
+        raise
+    if pending:
+        logger.warning(
+            "target word missing",
+            extra={"step": "text.generate_many", "outlen": len(pending)},
+        )
+    lat_ms = (time.perf_counter() - start) * 1000
+    observe_step("text.generate_many", lat_ms)
+    logger.info(
+        "ok",
+        extra={
+            "step": "text.generate_many",
+            "lat_ms": int(lat_ms),
+            "outlen": len(words),
+            "requests": requests_made,
+        },
+    )
+    return [done.get(w, "") for w in words]
+
+
 def translate_text(text: str, src: str, tgt: str) -> str:
     """Translate `text` from `src` to `tgt` (e.g., 'de'↔'ru'). Returns translation only."""
     logger.info("start", extra={"step": "text.translate"})
     start = time.perf_counter()
-    messages = [
-        {"role": "system", "content": f"Translate to {tgt}. Output only the translation."},
-        {"role": "user", "content": text},
-    ]
     try:
-        out = _chat(messages)
+        out = _chat(_translate_messages(text, tgt))
         cleaned = _clean_line(out)
-        lat_ms = int((time.perf_counter() - start) * 1000)
-        logger.info(
-            "ok",
-            extra={"step": "text.translate", "lat_ms": lat_ms, "outlen": len(cleaned)},
-        )
+        _log_ok("text.translate", start, cleaned)
         return cleaned
     except Exception:
         logger.error("error", exc_info=True, extra={"step": "text.translate"})
         raise
+
+
+async def translate_text_async(text: str, src: str, tgt: str) -> str:
+    """Async twin of :func:`translate_text`."""
+    logger.info("start", extra={"step": "text.translate"})
+    start = time.perf_counter()
+    try:
+        out = await _chat_async(_translate_messages(text, tgt))
+        cleaned = _clean_line(out)
+        _log_ok("text.translate", start, cleaned)
+        return cleaned
+    except Exception:
+        logger.error("error", exc_info=True, extra={"step": "text.translate"})
+        raise
+
+
+def _translate_many_messages(items: List[str], src: str, tgt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": TRANSLATE_MANY_PROMPT.format(src=src, tgt=tgt)},
+        {"role": "user", "content": json.dumps(items, ensure_ascii=False)},
+    ]
+
+
+def translate_many(
+    texts: Sequence[str], src: str, tgt: str, *, batch_size: Optional[int] = None
+) -> List[str]:
+    """Translate many strings with one structured chat request per batch.
+
+    The model answers with a JSON array; a batch whose answer cannot be parsed
+    or has the wrong number of items is split in half and retried, items that
+    come back empty are retried on their own via :func:`translate_text`.
+    Duplicate inputs are translated once.  Returns translations in input order.
+    """
+    logger.info("start", extra={"step": "text.translate_many"})
+    start = time.perf_counter()
+    unique = list(dict.fromkeys(texts))
+    done: Dict[str, str] = {}
+    queue = _chunks(unique, batch_size or getattr(settings, "TRANSLATE_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    single: List[str] = []
+    requests_made = 0
+    try:
+        while queue:
+            single.extend(chunk[0] for chunk in queue if len(chunk) == 1)
+            wave = [chunk for chunk in queue if len(chunk) > 1]
+            queue = []
+            batch = [_translate_many_messages(chunk, src, tgt) for chunk in wave]
+            requests_made += len(batch)
+            for chunk, messages, (answer, _) in zip(wave, batch, _chat_many(batch)):
+                parsed = _parse_json_array(answer)
+                if parsed is None or len(parsed) != len(chunk):
+                    logger.warning(
+                        "batch answer rejected, splitting",
+                        extra={"step": "text.translate_many", "outlen": len(chunk)},
+                    )
+                    _cache_discard(messages)
+                    half = len(chunk) // 2
+                    queue += [chunk[:half], chunk[half:]]
+                    continue
+                for item, out in zip(chunk, parsed):
+                    cleaned = _clean_line(out) if isinstance(out, str) else ""
+                    if cleaned:
+                        done[item] = cleaned
+                    else:
+                        single.append(item)
+        for item in single:
+            requests_made += 1
+            done[item] = translate_text(item, src, tgt)
+    except Exception:
+        logger.error("error", exc_info=True, extra={"step": "text.translate_many"})
+        raise
+    lat_ms = (time.perf_counter() - start) * 1000
+    observe_step("text.translate_many", lat_ms)
+    logger.info(
+        "ok",
+        extra={
+            "step": "text.translate_many",
+            "lat_ms": int(lat_ms),
+            "outlen": len(texts),
+            "requests": requests_made,
+        },
+    )
+    return [done[t] for t in texts]
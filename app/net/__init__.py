@@ -1,4 +1,5 @@
 from .http import NetworkError, request_json
+from .pool import get_session, pool_stats
 from .genapi_client import (
     GenAPIClient,
     GenAPIError,
@@ -14,6 +15,8 @@ from .genapi_client import (
 __all__ = [
     "NetworkError",
     "request_json",
+    "get_session",
+    "pool_stats",
     "GenAPIClient",
     "GenAPIError",
     "GenAPIBadRequest",
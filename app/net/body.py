@@ -0,0 +1,66 @@
+"""Streaming request bodies.
+
+:class:`Base64JsonBody` produces a JSON document with one field holding a
+file base64-encoded on the fly, so uploading a file never keeps the raw
+bytes, their base64 copy and the serialized JSON in memory at once.  The body
+knows its length in advance (``requests`` sends it with ``Content-Length``
+instead of chunked encoding, which AnkiConnect does not accept) and can be
+iterated more than once, so retries resend it from the start.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import os
+from typing import Any, Dict, Iterator
+
+__all__ = ["Base64JsonBody"]
+
+# multiple of 3, so chunks encode without padding in the middle
+CHUNK_SIZE = 3 * 64 * 1024
+
+_PLACEHOLDER = "\x00base64\x00"
+
+
+class Base64JsonBody:
+    """JSON body ``document`` with the file at ``path`` base64-encoded inline.
+
+    ``document`` must contain the string ``"@file"`` exactly once, at the
+    position where the encoded file goes, e.g.
+    ``{"action": "storeMediaFile", "params": {"filename": "a.png", "data": "@file"}}``.
+    """
+
+    def __init__(self, document: Dict[str, Any], path: str, *, chunk_size: int = CHUNK_SIZE) -> None:
+        if chunk_size % 3:
+            raise ValueError("chunk_size must be a multiple of 3")
+        self.path = path
+        self.chunk_size = chunk_size
+        blob = json.dumps(_replace_marker(document), ensure_ascii=False)
+        head, sep, tail = blob.partition(json.dumps(_PLACEHOLDER))
+        if not sep:
+            raise ValueError('document has no "@file" marker')
+        # кавычки строки остаются вокруг base64
+        self._head = (head + '"').encode("utf-8")
+        self._tail = ('"' + tail).encode("utf-8")
+
+    def __len__(self) -> int:
+        size = os.path.getsize(self.path)
+        return len(self._head) + 4 * ((size + 2) // 3) + len(self._tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._head
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield base64.b64encode(chunk)
+        yield self._tail
+
+
+def _replace_marker(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _replace_marker(v) for k, v in value.items()}
+    if value == "@file":
+        return _PLACEHOLDER
+    return value
@@ -0,0 +1,200 @@
+"""Per-provider circuit breakers for outgoing requests.
+
+A provider that keeps failing (or answering too slowly) is cut off for a
+while instead of making every caller sit through timeouts and retries:
+
+* ``closed`` — requests pass; outcomes of the last ``window`` calls are kept.
+  Once at least ``min_calls`` are recorded and the share of failures (or of
+  calls slower than ``slow_ms``) reaches ``failure_rate``, the breaker opens.
+* ``open`` — requests fail immediately for ``open_s`` seconds.
+* ``half_open`` — after the pause a single probe request is let through; its
+  success closes the breaker, its failure opens it again.
+
+Providers are keyed like the rest of the network layer (URL netloc).  The
+thresholds are read from the environment (``BREAKER_*``), as the HTTP pool
+does; ``BREAKER_ENABLED=false`` turns breakers off.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+__all__ = [
+    "CircuitBreaker",
+    "allow",
+    "breaker_states",
+    "get_breaker",
+    "is_open",
+    "record",
+    "release",
+    "reset_breakers",
+]
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """Closed / open / half-open state machine for one provider."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_ms: int = 0,
+        open_s: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_ms = slow_ms
+        self.open_s = open_s
+        self.state = CLOSED
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window)  # (failed, slow)
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_at = 0.0
+        self._opens = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """May a request go out now?  Moves ``open`` to ``half_open`` when due."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_s:
+                    return False
+                self.state = HALF_OPEN
+                self._probing = False
+            # зависшая проба (ответ так и не записан) не держит breaker вечно
+            if self._probing and time.monotonic() - self._probe_at < self.open_s:
+                return False
+            self._probing = True
+            self._probe_at = time.monotonic()
+            return True
+
+    def release(self) -> None:
+        """Give back the probe slot taken by :meth:`allow` when nothing was sent."""
+        with self._lock:
+            self._probing = False
+
+    def is_open(self) -> bool:
+        """``True`` while requests are being rejected (no probe is due yet)."""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self._opened_at < self.open_s
+
+    def record(self, ok: bool, lat_ms: float = 0.0) -> None:
+        slow = bool(self.slow_ms) and lat_ms >= self.slow_ms
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if ok and not slow:
+                    self.state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open_locked()
+                return
+            if self.state == OPEN:
+                return  # ответ на запрос, ушедший до открытия
+            self._calls.append((not ok, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            failed = sum(1 for f, _ in self._calls if f) / len(self._calls)
+            slowed = sum(1 for _, s in self._calls if s) / len(self._calls)
+            if failed >= self.failure_rate or slowed >= self.failure_rate:
+                self._open_locked()
+
+    def _open_locked(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._opens += 1
+        self._calls.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            failures = sum(1 for f, _ in self._calls if f)
+            info: Dict[str, Any] = {
+                "state": self.state,
+                "calls": len(self._calls),
+                "failures": failures,
+                "opens": self._opens,
+            }
+            if self.state == OPEN:
+                info["retry_in_s"] = round(
+                    max(0.0, self.open_s - (time.monotonic() - self._opened_at)), 1
+                )
+            return info
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    return default if value is None else value.lower() in {"1", "true", "yes"}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+_lock = threading.Lock()
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(provider: str) -> Optional[CircuitBreaker]:
+    """Breaker of ``provider`` (created on first use) or ``None`` if disabled."""
+    if not _env_bool("BREAKER_ENABLED", True):
+        return None
+    with _lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker(
+                provider,
+                window=int(_env_float("BREAKER_WINDOW", 20)),
+                min_calls=int(_env_float("BREAKER_MIN_CALLS", 5)),
+                failure_rate=_env_float("BREAKER_FAILURE_RATE", 0.5),
+                slow_ms=int(_env_float("BREAKER_SLOW_MS", 0)),
+                open_s=_env_float("BREAKER_OPEN_S", 30),
+            )
+        return breaker
+
+
+def allow(provider: str) -> bool:
+    breaker = get_breaker(provider)
+    return breaker is None or breaker.allow()
+
+
+def record(provider: str, ok: bool, lat_ms: float = 0.0) -> None:
+    breaker = get_breaker(provider)
+    if breaker is not None:
+        breaker.record(ok, lat_ms)
+
+
+def release(provider: str) -> None:
+    breaker = get_breaker(provider)
+    if breaker is not None:
+        breaker.release()
+
+
+def is_open(provider: str) -> bool:
+    breaker = get_breaker(provider)
+    return breaker is not None and breaker.is_open()
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """State of every breaker seen so far, for ``server.health``."""
+    with _lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+def reset_breakers() -> None:
+    with _lock:
+        _breakers.clear()
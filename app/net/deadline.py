@@ -0,0 +1,50 @@
+"""Per-call deadlines propagated through the network layer.
+
+:func:`deadline_scope` stores an absolute deadline in a context variable;
+:func:`app.net.http.request_json` (and its async twin) shrink their per-attempt
+timeout to the time left and stop retrying once it runs out.  Context
+variables follow asyncio tasks automatically; code that hands work to other
+threads has to carry the context along (``contextvars.copy_context().run``).
+Nested scopes can only make the deadline earlier.
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+__all__ = ["current_deadline", "deadline_scope", "time_left"]
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[float]:
+    """Absolute deadline (``time.monotonic()`` scale) of the current context."""
+    return _deadline.get()
+
+
+def time_left(deadline: Optional[float] = None) -> Optional[float]:
+    """Seconds until ``deadline`` (or the context deadline); ``None`` if unbounded."""
+    deadline = deadline if deadline is not None else _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """Bound everything inside the block to ``seconds`` from now.
+
+    ``None`` or ``0`` leaves the current deadline as is.
+    """
+    if not seconds:
+        yield _deadline.get()
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
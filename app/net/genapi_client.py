@@ -1,10 +1,25 @@
 import logging
+import threading
 import time
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 import requests
 
+from . import breaker
+from .http import RATE_LIMIT_STATUSES
+from .limits import (
+    acquire_rate,
+    acquire_rate_async,
+    concurrency_slot,
+    concurrency_slot_async,
+    defer_provider,
+    provider_for,
+    retry_after_s,
+)
+from .pool import get_session
+
 __all__ = [
     "GenAPIClient",
     "GenAPIError",
@@ -15,6 +30,8 @@ __all__ = [
     "GenAPISessionExpired",
     "GenAPIServiceUnavailable",
     "GenAPITaskFailed",
+    "send_guarded",
+    "send_guarded_async",
 ]
 
 logger = logging.getLogger(__name__)
@@ -74,6 +91,55 @@ def _extract_details(response: requests.Response) -> Dict[str, Any]:
         return {"text": response.text}
 
 
+def _admit(provider: str) -> None:
+    if not breaker.allow(provider):
+        raise GenAPIServiceUnavailable("Circuit open", details={"provider": provider})
+
+
+def _settle(provider: str, start: float, response: Any) -> Any:
+    breaker.record(provider, response.status_code < 500, (time.perf_counter() - start) * 1000)
+    if response.status_code in RATE_LIMIT_STATUSES:
+        pause = retry_after_s(getattr(response, "headers", None))
+        defer_provider(provider, pause if pause is not None else 1.0)
+    return response
+
+
+def send_guarded(url: str, send: Callable[[], Any]) -> Any:
+    """Run ``send()`` (one HTTP request to ``url``) under the provider's guards.
+
+    The circuit breaker, the token bucket and the concurrency slot of the
+    provider are applied; a 419/429 answer pauses the provider's bucket for
+    ``Retry-After`` (1 s by default), so every GenAPI caller backs off together.
+    The response is returned as is.
+    """
+    provider = provider_for(url)
+    _admit(provider)
+    acquire_rate(provider)
+    start = time.perf_counter()
+    try:
+        with concurrency_slot(provider):
+            response = send()
+    except Exception:
+        breaker.record(provider, False, (time.perf_counter() - start) * 1000)
+        raise
+    return _settle(provider, start, response)
+
+
+async def send_guarded_async(url: str, send: Callable[[], Awaitable[Any]]) -> Any:
+    """Async twin of :func:`send_guarded`; ``send`` returns an awaitable."""
+    provider = provider_for(url)
+    _admit(provider)
+    await acquire_rate_async(provider)
+    start = time.perf_counter()
+    try:
+        async with concurrency_slot_async(provider):
+            response = await send()
+    except Exception:
+        breaker.record(provider, False, (time.perf_counter() - start) * 1000)
+        raise
+    return _settle(provider, start, response)
+
+
 class GenAPIClient:
     """Low-level HTTP client for GenAPI."""
 
@@ -85,11 +151,19 @@ class GenAPIClient:
         self.token = token
         self.timeout = timeout
         self.retries = retries
+        self._poller: Any = None
+        self._poller_lock = threading.Lock()
 
     @property
     def base_headers(self) -> Dict[str, str]:
         return {"Authorization": f"Bearer {self.token}"}
 
+    def _send(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        return send_guarded(
+            url,
+            lambda: get_session(url).request(method, url, timeout=self.timeout, **kwargs),
+        )
+
     def create_generation_task(
         self,
         model_id: str,
@@ -124,24 +198,15 @@ class GenAPIClient:
             data = {k: str(v) for k, v in payload.items()}
             with open(ref_image_path, "rb") as fh:
                 files = {"image": (Path(ref_image_path).name, fh)}
-                response = requests.post(
-                    url,
-                    headers=self.base_headers,
-                    data=data,
-                    files=files,
-                    timeout=self.timeout,
+                response = self._send(
+                    "POST", url, headers=self.base_headers, data=data, files=files
                 )
         else:
             if ref_image_url:
                 payload["image_url"] = ref_image_url
             elif ref_image_b64:
                 payload["image_b64"] = ref_image_b64
-            response = requests.post(
-                url,
-                json=payload,
-                headers=self.base_headers,
-                timeout=self.timeout,
-            )
+            response = self._send("POST", url, json=payload, headers=self.base_headers)
         if response.status_code in _ERROR_MAP:
             raise _ERROR_MAP[response.status_code](
                 "HTTP error",
@@ -155,7 +220,36 @@ class GenAPIClient:
             logger.info("Created generation task", extra={"request_id": request_id})
         return data
 
-    def get_task_status(self, request_id: str) -> Dict[str, Any]:
+    def get_task_status(self, request_id: str, *, wait: bool = True) -> Dict[str, Any]:
+        """Status of a generation task.
+
+        With ``wait=True`` blocks until the task succeeds or fails, checking
+        with growing intervals (or at the ETA reported by GenAPI).  With
+        ``wait=False`` performs a single check and returns the payload as is,
+        even if the task is still processing.
+        """
+        from .genapi_poller import next_interval
+
+        polls = 0
+        while True:
+            data = self._status_once(request_id)
+            status = data.get("status")
+            if status == "processing":
+                if not wait:
+                    return data
+                polls += 1
+                time.sleep(next_interval(polls, data, first=0.5, max_interval=8.0))
+                continue
+            if status == "failed":
+                raise GenAPITaskFailed("Task failed", details=data)
+            if status == "success":
+                logger.info("Task completed", extra={"request_id": request_id})
+                return data
+            if not wait:
+                return data
+            raise GenAPIError(f"Unknown status: {status}", details=data)
+
+    def _status_once(self, request_id: str) -> Dict[str, Any]:
         url = f"{self.BASE_URL}{self.REQUESTS_PATH.format(request_id=request_id)}"
         headers = self.base_headers
         attempt = 0
@@ -163,7 +257,7 @@ class GenAPIClient:
             attempt += 1
             try:
                 logger.debug("Checking task status", extra={"request_id": request_id, "attempt": attempt})
-                response = requests.get(url, headers=headers, timeout=self.timeout)
+                response = self._send("GET", url, headers=headers)
             except (requests.Timeout, requests.RequestException) as exc:
                 if attempt >= self.retries:
                     raise GenAPIError(str(exc)) from exc
@@ -177,14 +271,20 @@ class GenAPIClient:
                     details=_extract_details(response),
                 )
             response.raise_for_status()
-            data = response.json()
-            status = data.get("status")
-            if status == "processing":
-                time.sleep(1)
-                continue
-            if status == "failed":
-                raise GenAPITaskFailed("Task failed", details=data)
-            if status == "success":
-                logger.info("Task completed", extra={"request_id": request_id})
-                return data
-            raise GenAPIError(f"Unknown status: {status}", details=data)
+            return response.json()
+
+    def poll(self, request_id: str, *, timeout: Optional[float] = None) -> Future:
+        """Track the task on the client's background poller; returns a future.
+
+        Unlike ``get_task_status(wait=True)`` this does not hold the calling
+        thread: all tasks of the client share one
+        :class:`~app.net.genapi_poller.TaskPoller`.  ``timeout`` applies to
+        this task only.
+        """
+        with self._poller_lock:
+            if self._poller is None:
+                from .genapi_poller import TaskPoller
+
+                self._poller = TaskPoller(lambda rid: self.get_task_status(rid, wait=False))
+            poller = self._poller
+        return poller.submit(request_id, timeout=timeout)
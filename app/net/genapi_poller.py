@@ -0,0 +1,212 @@
+"""Shared background poller for asynchronous GenAPI tasks.
+
+Instead of every caller sleeping in its own thread until a task finishes, the
+request_id is handed to :class:`TaskPoller`, which keeps all outstanding tasks
+in one schedule and resolves a :class:`~concurrent.futures.Future` per task.
+One scheduler thread decides which tasks are due; each due task gets one
+status request on a small worker pool (GenAPI has no multi-task status call),
+so the number of tasks in flight is not bounded by the number of threads.
+Callbacks of the futures run on that pool too and must not block.
+
+Poll intervals are adaptive: the first checks come quickly, then the interval
+grows exponentially up to ``max_interval``.  If a status response carries an
+ETA, the next check is scheduled for that moment instead.
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from .genapi_client import GenAPIError, GenAPIServiceUnavailable, GenAPITaskFailed
+
+__all__ = ["TaskPoller", "task_state", "next_interval"]
+
+logger = logging.getLogger(__name__)
+
+StatusFn = Callable[[str], Dict[str, Any]]
+
+_ETA_KEYS = ("eta", "eta_s", "estimated_time")
+
+
+def task_state(data: Any) -> str:
+    """``"done"``, ``"failed"`` or ``"pending"`` for a GenAPI status payload."""
+    status = str((data or {}).get("status") or "").lower() if isinstance(data, dict) else ""
+    if status in ("failed", "error"):
+        return "failed"
+    if status == "success":
+        return "done"
+    return "pending"
+
+
+def _eta(data: Any) -> Optional[float]:
+    if not isinstance(data, dict):
+        return None
+    for key in _ETA_KEYS:
+        value = data.get(key)
+        if isinstance(value, (int, float)) and value > 0:
+            return float(value)
+    return None
+
+
+def next_interval(
+    attempt: int, data: Any, *, first: float, max_interval: float, factor: float = 2.0
+) -> float:
+    """Delay before status check number ``attempt + 1``."""
+    eta = _eta(data)
+    if eta is not None:
+        return max(first, eta)
+    return min(max_interval, first * factor ** max(0, attempt - 1))
+
+
+@dataclass(order=True)
+class _Task:
+    due: float
+    request_id: str = field(compare=False)
+    future: Future = field(compare=False)
+    deadline: Optional[float] = field(compare=False, default=None)
+    attempt: int = field(compare=False, default=0)
+    errors: int = field(compare=False, default=0)
+
+
+class TaskPoller:
+    """Poll many GenAPI tasks from one background scheduler.
+
+    ``status_fn(request_id)`` performs a single status request.  A task is
+    finished when :func:`task_state` says so or ``done(data)`` returns true;
+    its future then resolves to the last status payload.  A ``"failed"``
+    status, a non-transient :class:`GenAPIError` or ``max_errors`` consecutive
+    request errors fail the future; so does running past ``timeout``.
+    """
+
+    def __init__(
+        self,
+        status_fn: StatusFn,
+        *,
+        done: Optional[Callable[[Dict[str, Any]], bool]] = None,
+        first_interval: float = 0.5,
+        max_interval: float = 8.0,
+        timeout: Optional[float] = None,
+        max_workers: int = 4,
+        max_errors: int = 3,
+    ) -> None:
+        self.status_fn = status_fn
+        self.done = done
+        self.first_interval = first_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.max_errors = max_errors
+        self._heap: List[_Task] = []
+        self._cond = threading.Condition()
+        self._workers = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="genapi-poll")
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def submit(self, request_id: str, *, timeout: Optional[float] = None) -> Future:
+        """Start tracking ``request_id``; the future resolves to its final status."""
+        fut: Future = Future()
+        now = time.monotonic()
+        timeout = timeout if timeout is not None else self.timeout
+        task = _Task(
+            now + self.first_interval,
+            request_id,
+            fut,
+            deadline=now + timeout if timeout else None,
+        )
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("poller is stopped")
+            heapq.heappush(self._heap, task)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="genapi-poller", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return fut
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped and (
+                    not self._heap or self._heap[0].due > time.monotonic()
+                ):
+                    wait = self._heap[0].due - time.monotonic() if self._heap else None
+                    self._cond.wait(wait)
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0].due <= now:
+                    due.append(heapq.heappop(self._heap))
+            for task in due:
+                self._workers.submit(self._check, task)
+
+    def _reschedule(self, task: _Task, delay: float) -> None:
+        task.due = time.monotonic() + delay
+        if task.deadline is not None and task.due > task.deadline:
+            # последняя проверка ровно к дедлайну
+            task.due = max(time.monotonic(), task.deadline)
+        with self._cond:
+            heapq.heappush(self._heap, task)
+            self._cond.notify()
+
+    def _check(self, task: _Task) -> None:
+        if task.future.cancelled():
+            return
+        task.attempt += 1
+        try:
+            data = self.status_fn(task.request_id)
+        except Exception as exc:
+            transient = not isinstance(exc, GenAPIError) or isinstance(exc, GenAPIServiceUnavailable)
+            task.errors += 1
+            if not transient or task.errors >= self.max_errors or self._expired(task):
+                task.future.set_exception(exc)
+                return
+            logger.warning(
+                "status check failed: %s", exc, extra={"step": "genapi.poll", "request_id": task.request_id}
+            )
+            self._reschedule(task, self.first_interval * 2 ** (task.errors - 1))
+            return
+
+        task.errors = 0
+        state = task_state(data)
+        if state == "pending" and self.done is not None and self.done(data):
+            state = "done"
+        if state == "done":
+            logger.info(
+                "task completed",
+                extra={"step": "genapi.poll", "request_id": task.request_id, "attempt": task.attempt},
+            )
+            task.future.set_result(data)
+        elif state == "failed":
+            task.future.set_exception(GenAPITaskFailed("Task failed", details=data))
+        elif self._expired(task):
+            task.future.set_exception(TimeoutError(f"GenAPI task {task.request_id} timed out"))
+        else:
+            self._reschedule(
+                task,
+                next_interval(
+                    task.attempt, data, first=self.first_interval, max_interval=self.max_interval
+                ),
+            )
+
+    @staticmethod
+    def _expired(task: _Task) -> bool:
+        return task.deadline is not None and time.monotonic() >= task.deadline
+
+    def stop(self) -> None:
+        """Stop polling; outstanding futures are cancelled."""
+        with self._cond:
+            self._stopped = True
+            tasks, self._heap = self._heap, []
+            self._cond.notify()
+        for task in tasks:
+            task.future.cancel()
+        self._workers.shutdown(wait=False, cancel_futures=True)
@@ -1,10 +1,31 @@
+import asyncio
 import time
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 from urllib.parse import urlparse
 
 import requests
 
+from app.telemetry.metrics import HTTP_LATENCY, HTTP_REQUESTS, add_usage
+from app.telemetry.tracing import record_span
+
+from . import breaker
+from .deadline import time_left
+from .limits import (
+    acquire_rate,
+    acquire_rate_async,
+    concurrency_slot,
+    concurrency_slot_async,
+    defer_provider,
+    retry_after_s,
+)
+from .pool import get_async_client, get_session
+
+try:  # pragma: no cover - optional dependency
+    import httpx
+except Exception:  # pragma: no cover
+    httpx = None  # type: ignore
+
 
 class NetworkError(Exception):
     """Standard network error with structured details."""
@@ -19,6 +40,136 @@ class NetworkError(Exception):
         return f"NetworkError(code={self.code!r}, message={self.message!r}, details={self.details!r})"
 
 
+def _finish_reason(data: Any) -> Optional[str]:
+    finish = None
+    if isinstance(data, dict):
+        finish = data.get("finish_reason")
+        if not finish and isinstance(data.get("choices"), list):
+            first = data["choices"][0]
+            if isinstance(first, dict):
+                finish = first.get("finish_reason")
+    return finish
+
+
+def _observe(
+    provider: str, attempt: int, start: float, status: Any, ok: bool
+) -> Tuple[int, str]:
+    lat_ms = (time.perf_counter() - start) * 1000
+    HTTP_LATENCY.observe(lat_ms, provider=provider)
+    HTTP_REQUESTS.inc(provider=provider, status=status)
+    if ok:
+        add_usage(provider)
+    sp = record_span(
+        "net.http",
+        start,
+        error=None if ok else str(status),
+        provider=provider,
+        attempt=attempt,
+        status=str(status),
+    )
+    return int(lat_ms), sp.span_id
+
+
+def _log_ok(provider: str, attempt: int, start: float, status_code: int, data: Any) -> None:
+    lat_ms, span_id = _observe(provider, attempt, start, status_code, True)
+    logging.getLogger(__name__).info(
+        "request",
+        extra={
+            "step": "net.http",
+            "span_id": span_id,
+            "provider": provider,
+            "attempt": attempt,
+            "lat_ms": lat_ms,
+            "status_code": status_code,
+            "finish_reason": _finish_reason(data) or "-",
+        },
+    )
+
+
+def _log_error(
+    provider: str, attempt: int, retries: int, start: float, status_code: Any = None
+) -> None:
+    level = logging.WARNING if attempt < retries else logging.ERROR
+    lat_ms, span_id = _observe(
+        provider, attempt, start, status_code if status_code is not None else "error", False
+    )
+    extra = {
+        "step": "net.http",
+        "span_id": span_id,
+        "provider": provider,
+        "attempt": attempt,
+        "lat_ms": lat_ms,
+    }
+    if status_code is not None:
+        extra["status_code"] = status_code
+    logging.getLogger(__name__).log(
+        level, "request error", extra=extra, exc_info=level == logging.ERROR
+    )
+
+
+# 419 is what GenAPI answers when the request rate is exceeded
+RATE_LIMIT_STATUSES = {419, 429}
+
+
+def _http_error(response: Any) -> NetworkError:
+    details = {
+        "status_code": getattr(response, "status_code", None),
+        "text": getattr(response, "text", ""),
+    }
+    retry_after = retry_after_s(getattr(response, "headers", None))
+    if retry_after is not None:
+        details["retry_after"] = retry_after
+    return NetworkError(details["status_code"], "HTTP error", details)
+
+
+def _provider_failed(error: Optional[NetworkError]) -> bool:
+    """Does ``error`` say the provider is unhealthy (not that the request was bad)?"""
+    if error is None:
+        return False
+    code = error.code
+    return code in ("network", "json") or (isinstance(code, int) and (code >= 500 or code == 408))
+
+
+def _record(provider: str, start: float, error: Optional[NetworkError]) -> None:
+    breaker.record(provider, not _provider_failed(error), (time.perf_counter() - start) * 1000)
+
+
+def _circuit_open(provider: str) -> NetworkError:
+    logging.getLogger(__name__).warning(
+        "circuit open", extra={"step": "net.http", "provider": provider}
+    )
+    return NetworkError("circuit-open", f"circuit open for {provider}", {"provider": provider})
+
+
+def _deadline_exceeded(provider: str, last_error: Optional[NetworkError]) -> NetworkError:
+    details: Dict[str, Any] = {"provider": provider}
+    if last_error is not None:
+        details["last_error"] = last_error.message
+    return NetworkError("deadline", "deadline exceeded", details)
+
+
+def _attempt_timeout(timeout: float, left: Optional[float]) -> float:
+    return timeout if left is None else max(0.001, min(timeout, left))
+
+
+def _retry_delay(
+    provider: str, error: Optional[NetworkError], attempt: int, backoff_base: float
+) -> float:
+    """Pause before the next attempt.
+
+    A rate-limit answer (or any ``Retry-After``) pauses the provider's token
+    bucket so that every caller backs off; the caller itself then waits in
+    :func:`acquire_rate` and needs no extra sleep.
+    """
+    delay = backoff_base * (2 ** (attempt - 1))
+    details = error.details if error is not None else {}
+    retry_after = details.get("retry_after")
+    if retry_after is None and details.get("status_code") not in RATE_LIMIT_STATUSES:
+        return delay
+    pause = retry_after if retry_after is not None else delay
+    return 0.0 if defer_provider(provider, pause) else pause
+
+
 def request_json(
     method: str,
     url: str,
@@ -29,95 +180,142 @@ def request_json(
     retries: int = 3,
     provider: Optional[str] = None,
     backoff_base: float = 1,
+    data: Any = None,
+    deadline: Optional[float] = None,
 ) -> Dict[str, Any]:
-    """Perform an HTTP request expecting JSON with retries and exponential backoff."""
+    """Perform an HTTP request expecting JSON with retries and exponential backoff.
+
+    ``data`` is a raw request body used instead of ``json``; it must be
+    re-iterable (or bytes) so that retries can resend it.
+
+    ``deadline`` (``time.monotonic()`` scale, by default the one set with
+    :func:`app.net.deadline.deadline_scope`) bounds the whole call: every
+    attempt's timeout is cut to the time left, and no retry is started that
+    could not finish in time (``NetworkError("deadline", ...)``).
+    """
     provider = provider or urlparse(url).netloc
-    logger = logging.getLogger(__name__)
+    body = {"data": data} if data is not None else {}
 
     last_error: Optional[NetworkError] = None
     for attempt in range(1, retries + 1):
+        if not breaker.allow(provider):
+            last_error = _circuit_open(provider)
+            break
+        acquire_rate(provider)
+        left = time_left(deadline)
+        if left is not None and left <= 0:
+            # запрос не ушёл: пропуск (в half-open — единственная проба) возвращаем
+            breaker.release(provider)
+            last_error = _deadline_exceeded(provider, last_error)
+            break
         start = time.perf_counter()
         try:
-            resp = requests.request(
-                method, url, json=json, headers=headers, timeout=timeout
-            )
+            with concurrency_slot(provider):
+                resp = get_session(url).request(
+                    method,
+                    url,
+                    json=json,
+                    headers=headers,
+                    timeout=_attempt_timeout(timeout, left),
+                    **body,
+                )
             resp.raise_for_status()
             data = resp.json()
-            lat_ms = int((time.perf_counter() - start) * 1000)
-            finish = None
-            if isinstance(data, dict):
-                finish = data.get("finish_reason")
-                if not finish and isinstance(data.get("choices"), list):
-                    first = data["choices"][0]
-                    if isinstance(first, dict):
-                        finish = first.get("finish_reason")
-            logger.info(
-                "request",
-                extra={
-                    "step": "net.http",
-                    "provider": provider,
-                    "attempt": attempt,
-                    "lat_ms": lat_ms,
-                    "status_code": resp.status_code,
-                    "finish_reason": finish or "-",
-                },
-            )
+            _log_ok(provider, attempt, start, resp.status_code, data)
+            _record(provider, start, None)
             return data
         except requests.HTTPError as exc:  # noqa: PERF203
-            response = exc.response
-            details = {
-                "status_code": getattr(response, "status_code", None),
-                "text": getattr(response, "text", ""),
-            }
-            last_error = NetworkError(details["status_code"], "HTTP error", details)
-            level = logging.WARNING if attempt < retries else logging.ERROR
-            lat_ms = int((time.perf_counter() - start) * 1000)
-            logger.log(
-                level,
-                "request error",
-                extra={
-                    "step": "net.http",
-                    "provider": provider,
-                    "attempt": attempt,
-                    "lat_ms": lat_ms,
-                    "status_code": details["status_code"],
-                },
-                exc_info=level == logging.ERROR,
-            )
+            last_error = _http_error(exc.response)
+            _log_error(provider, attempt, retries, start, last_error.code)
         except requests.RequestException as exc:  # network issue/timeout
             last_error = NetworkError("network", str(exc))
-            level = logging.WARNING if attempt < retries else logging.ERROR
-            lat_ms = int((time.perf_counter() - start) * 1000)
-            logger.log(
-                level,
-                "request error",
-                extra={
-                    "step": "net.http",
-                    "provider": provider,
-                    "attempt": attempt,
-                    "lat_ms": lat_ms,
-                },
-                exc_info=level == logging.ERROR,
-            )
+            _log_error(provider, attempt, retries, start)
+        except ValueError as exc:  # JSON decoding
+            last_error = NetworkError("json", str(exc))
+            _log_error(provider, attempt, retries, start)
+        _record(provider, start, last_error)
+
+        # считается и на последней попытке: пауза провайдера нужна остальным
+        delay = _retry_delay(provider, last_error, attempt, backoff_base)
+        if attempt == retries or breaker.is_open(provider):
+            break
+        left = time_left(deadline)
+        if left is not None and delay >= left:
+            last_error = _deadline_exceeded(provider, last_error)
+            break
+        if delay > 0:
+            time.sleep(delay)
+
+    assert last_error is not None  # for mypy
+    raise last_error
+
+
+async def request_json_async(
+    method: str,
+    url: str,
+    *,
+    json: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: int = 30,
+    retries: int = 3,
+    provider: Optional[str] = None,
+    backoff_base: float = 1,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Asyncio twin of :func:`request_json` with the same retry and error semantics."""
+    if httpx is None:
+        raise NetworkError("config", "httpx is not installed")
+    provider = provider or urlparse(url).netloc
+
+    last_error: Optional[NetworkError] = None
+    for attempt in range(1, retries + 1):
+        if not breaker.allow(provider):
+            last_error = _circuit_open(provider)
+            break
+        await acquire_rate_async(provider)
+        left = time_left(deadline)
+        if left is not None and left <= 0:
+            # запрос не ушёл: пропуск (в half-open — единственная проба) возвращаем
+            breaker.release(provider)
+            last_error = _deadline_exceeded(provider, last_error)
+            break
+        start = time.perf_counter()
+        try:
+            client = await get_async_client(url)
+            async with concurrency_slot_async(provider):
+                resp = await client.request(
+                    method,
+                    url,
+                    json=json,
+                    headers=headers,
+                    timeout=_attempt_timeout(timeout, left),
+                )
+            resp.raise_for_status()
+            data = resp.json()
+            _log_ok(provider, attempt, start, resp.status_code, data)
+            _record(provider, start, None)
+            return data
+        except httpx.HTTPStatusError as exc:  # noqa: PERF203
+            last_error = _http_error(exc.response)
+            _log_error(provider, attempt, retries, start, last_error.code)
+        except httpx.HTTPError as exc:  # network issue/timeout
+            last_error = NetworkError("network", str(exc))
+            _log_error(provider, attempt, retries, start)
         except ValueError as exc:  # JSON decoding
             last_error = NetworkError("json", str(exc))
-            level = logging.WARNING if attempt < retries else logging.ERROR
-            lat_ms = int((time.perf_counter() - start) * 1000)
-            logger.log(
-                level,
-                "request error",
-                extra={
-                    "step": "net.http",
-                    "provider": provider,
-                    "attempt": attempt,
-                    "lat_ms": lat_ms,
-                },
-                exc_info=level == logging.ERROR,
-            )
-
-        if attempt == retries:
+            _log_error(provider, attempt, retries, start)
+        _record(provider, start, last_error)
+
+        # считается и на последней попытке: пауза провайдера нужна остальным
+        delay = _retry_delay(provider, last_error, attempt, backoff_base)
+        if attempt == retries or breaker.is_open(provider):
+            break
+        left = time_left(deadline)
+        if left is not None and delay >= left:
+            last_error = _deadline_exceeded(provider, last_error)
             break
-        time.sleep(backoff_base * (2 ** (attempt - 1)))
+        if delay > 0:
+            await asyncio.sleep(delay)
 
     assert last_error is not None  # for mypy
     raise last_error
@@ -0,0 +1,247 @@
+"""Per-provider concurrency caps and request rates for outgoing requests.
+
+Providers are identified the same way as in :func:`app.net.http.request_json`
+(the ``provider`` argument, i.e. the URL netloc by default).  A provider
+without a configured cap is unlimited.  Caps are plain semaphores, so they are
+shared by worker threads and asyncio tasks alike.
+
+Request rates are token buckets (:class:`TokenBucket`): a provider gets
+``rps`` requests per second with bursts of up to ``burst``.  A ``Retry-After``
+from the provider (see :func:`defer_provider`) pauses the whole bucket, so all
+threads and tasks back off together instead of each retrying on its own.
+
+Processes apply the limits from the settings once at start with
+:func:`configure_providers`; reconfiguring while requests are in flight would
+replace the semaphores and buckets under them.
+"""
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import importlib
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Mapping, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.telemetry.metrics import HTTP_IN_FLIGHT
+
+__all__ = [
+    "TokenBucket",
+    "acquire_rate",
+    "acquire_rate_async",
+    "configure_concurrency",
+    "configure_providers",
+    "configure_rate_limits",
+    "concurrency_slot",
+    "concurrency_slot_async",
+    "defer_provider",
+    "provider_caps",
+    "provider_for",
+    "provider_rates",
+    "retry_after_s",
+]
+
+_lock = threading.Lock()
+_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+# how often an asyncio task re-checks a saturated semaphore
+_ASYNC_POLL_S = 0.01
+
+
+def provider_for(url: str) -> str:
+    """Provider key used by the network layer for ``url``."""
+    return urlparse(url).netloc
+
+
+def configure_concurrency(caps: Mapping[str, int]) -> None:
+    """Set the maximum number of in-flight requests per provider.
+
+    A non-positive value removes the cap.  Reconfiguring a provider replaces its
+    semaphore; requests already holding the old one finish normally.
+    """
+    with _lock:
+        for provider, limit in caps.items():
+            if limit and limit > 0:
+                _semaphores[provider] = threading.BoundedSemaphore(limit)
+            else:
+                _semaphores.pop(provider, None)
+
+
+def _semaphore(provider: str) -> Optional[threading.BoundedSemaphore]:
+    with _lock:
+        return _semaphores.get(provider)
+
+
+@contextmanager
+def concurrency_slot(provider: str) -> Iterator[None]:
+    """Hold one request slot of ``provider`` for the duration of the block."""
+    sem = _semaphore(provider)
+    if sem is not None:
+        sem.acquire()
+    HTTP_IN_FLIGHT.inc(provider=provider)
+    try:
+        yield
+    finally:
+        HTTP_IN_FLIGHT.dec(provider=provider)
+        if sem is not None:
+            sem.release()
+
+
+@asynccontextmanager
+async def concurrency_slot_async(provider: str) -> AsyncIterator[None]:
+    """Async variant of :func:`concurrency_slot` that never blocks the loop."""
+    sem = _semaphore(provider)
+    if sem is not None:
+        while not sem.acquire(blocking=False):
+            await asyncio.sleep(_ASYNC_POLL_S)
+    HTTP_IN_FLIGHT.inc(provider=provider)
+    try:
+        yield
+    finally:
+        HTTP_IN_FLIGHT.dec(provider=provider)
+        if sem is not None:
+            sem.release()
+
+
+class TokenBucket:
+    """Token bucket with reservations (GCRA).
+
+    :meth:`reserve` takes a token right away and returns how long the caller
+    must wait before using it, so waiters are served in arrival order and the
+    sustained rate never exceeds ``rate`` regardless of how many threads
+    compete.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._interval = 1.0 / rate
+        self._tolerance = (self.burst - 1) * self._interval
+        self._tat = 0.0  # theoretical arrival time of the next request
+        self._lock = threading.Lock()
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """Take one token; returns the delay in seconds before it may be used."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            start = max(now, self._tat - self._tolerance)
+            self._tat = max(self._tat, start) + self._interval
+            return start - now
+
+    def pause(self, seconds: float, now: Optional[float] = None) -> None:
+        """No token is handed out for ``seconds``; afterwards no burst either."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._tat = max(self._tat, now + seconds + self._tolerance)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+
+
+def configure_rate_limits(limits: Mapping[str, Tuple[float, int]]) -> None:
+    """Set ``(rps, burst)`` per provider; a non-positive ``rps`` removes the limit."""
+    with _lock:
+        for provider, (rps, burst) in limits.items():
+            if rps and rps > 0:
+                _buckets[provider] = TokenBucket(rps, burst)
+            else:
+                _buckets.pop(provider, None)
+
+
+def _bucket(provider: str) -> Optional[TokenBucket]:
+    with _lock:
+        return _buckets.get(provider)
+
+
+def acquire_rate(provider: str) -> float:
+    """Wait for a request token of ``provider``; returns the time waited."""
+    bucket = _bucket(provider)
+    delay = bucket.reserve() if bucket is not None else 0.0
+    if delay > 0:
+        time.sleep(delay)
+    return delay
+
+
+async def acquire_rate_async(provider: str) -> float:
+    """Async variant of :func:`acquire_rate`."""
+    bucket = _bucket(provider)
+    delay = bucket.reserve() if bucket is not None else 0.0
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return delay
+
+
+def defer_provider(provider: str, seconds: float) -> bool:
+    """Hold back all requests to ``provider`` for ``seconds``.
+
+    Returns ``False`` if the provider has no rate limit, in which case the
+    caller has to wait on its own.
+    """
+    bucket = _bucket(provider)
+    if bucket is None:
+        return False
+    if seconds > 0:
+        bucket.pause(seconds)
+    return True
+
+
+def retry_after_s(headers: Any) -> Optional[float]:
+    """Parse a ``Retry-After`` header (seconds or HTTP date) into seconds."""
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _provider_urls() -> Tuple[str, str, str]:
+    # модули инструментов импортируются лениво: они сами зависят от app.net
+    chat = importlib.import_module("app.mcp_tools.text").CHAT_URL
+    images = importlib.import_module("app.mcp_tools.image").IMAGES_URL
+    tasks = importlib.import_module("app.net.genapi_client").GenAPIClient.BASE_URL
+    return chat, images, tasks
+
+
+def provider_caps() -> Dict[str, int]:
+    """Лимиты одновременных запросов к каждому провайдеру из настроек."""
+    settings = importlib.import_module("app.settings").settings
+    chat, images, tasks = _provider_urls()
+    genapi = getattr(settings, "GENAPI_MAX_CONCURRENCY", 2)
+    return {
+        provider_for(chat): getattr(settings, "OPENROUTER_MAX_CONCURRENCY", 8),
+        provider_for(images): genapi,
+        provider_for(tasks): genapi,
+        provider_for(settings.ANKI_CONNECT_URL): getattr(settings, "ANKI_MAX_CONCURRENCY", 2),
+    }
+
+
+def provider_rates() -> Dict[str, Tuple[float, int]]:
+    """Квоты запросов в секунду ``(rps, burst)`` из настроек; ``0`` — без квоты."""
+    settings = importlib.import_module("app.settings").settings
+    chat, images, tasks = _provider_urls()
+    openrouter = (
+        getattr(settings, "OPENROUTER_RPS", 0.0),
+        getattr(settings, "OPENROUTER_BURST", 1),
+    )
+    genapi = (getattr(settings, "GENAPI_RPS", 0.0), getattr(settings, "GENAPI_BURST", 1))
+    return {
+        provider_for(chat): openrouter,
+        provider_for(images): genapi,
+        provider_for(tasks): genapi,
+    }
+
+
+def configure_providers() -> None:
+    """Apply :func:`provider_caps` and :func:`provider_rates`; call once at process start."""
+    configure_concurrency(provider_caps())
+    configure_rate_limits(provider_rates())
@@ -0,0 +1,278 @@
+"""Per-host pooled HTTP sessions shared by the network layer.
+
+Every outgoing call used to go through the module-level ``requests`` helpers,
+which open a fresh TCP+TLS connection per request.  The registry below keeps
+one :class:`requests.Session` per ``scheme://host`` with a bounded urllib3
+connection pool, so keep-alive connections are reused across OpenRouter,
+GenAPI and AnkiConnect calls.  Sessions that stay unused longer than the idle
+timeout are closed and dropped on the next lookup.
+
+The asyncio path keeps an ``httpx.AsyncClient`` per host in the same registry
+(clients are bound to the event loop that created them, so a client created
+on another loop is replaced rather than reused; the replaced client is closed
+on its own loop, or its sockets are closed directly once that loop is gone).
+Call :func:`aclose_pool` on shutdown to close every client.
+
+:func:`set_transport` mounts a custom ``requests`` adapter on every pooled
+session (see :mod:`app.net.replay`), so recorded responses can stand in for
+the real providers without touching the callers.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+try:  # pragma: no cover - optional dependency
+    import httpx
+except Exception:  # pragma: no cover
+    httpx = None  # type: ignore
+
+__all__ = [
+    "SessionPool",
+    "get_session",
+    "get_async_client",
+    "pool_stats",
+    "close_pool",
+    "aclose_pool",
+    "set_transport",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _host_key(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+@dataclass
+class _Entry:
+    session: requests.Session
+    last_used: float
+
+
+@dataclass
+class _AsyncEntry:
+    client: Any
+    loop: asyncio.AbstractEventLoop
+    last_used: float
+
+
+def _close_sockets(client: Any) -> None:
+    """Close the raw sockets of ``client`` whose event loop is no longer running."""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    for conn in list(getattr(pool, "connections", None) or ()):
+        stream = getattr(getattr(conn, "_connection", None), "_network_stream", None)
+        if stream is None:
+            continue
+        try:
+            sock = stream.get_extra_info("socket")
+            if sock is not None:
+                sock.close()
+        except Exception:  # pragma: no cover - best effort
+            logger.debug("socket close failed", exc_info=True, extra={"step": "net.pool"})
+
+
+def _close_foreign(entry: _AsyncEntry) -> None:
+    """Close a client owned by another event loop without awaiting it."""
+    loop = entry.loop
+    if not loop.is_closed() and loop.is_running():
+        asyncio.run_coroutine_threadsafe(entry.client.aclose(), loop)
+    else:
+        # aclose() на мёртвой петле не запустить — закрываем сокеты напрямую
+        _close_sockets(entry.client)
+
+
+class SessionPool:
+    """Thread-safe registry of keep-alive sessions keyed by host."""
+
+    def __init__(self, pool_size: int = 10, idle_timeout: float = 90.0) -> None:
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self._entries: Dict[str, _Entry] = {}
+        self._async_entries: Dict[str, _AsyncEntry] = {}
+        self._lock = threading.Lock()
+        self._transport: Optional[BaseAdapter] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        # retries are handled by request_json, not by urllib3
+        adapter = self._transport or HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size, max_retries=0
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["Connection"] = "keep-alive"
+        return session
+
+    def _evict_idle_locked(self, now: float) -> None:
+        for key, entry in list(self._entries.items()):
+            if now - entry.last_used > self.idle_timeout:
+                entry.session.close()
+                del self._entries[key]
+                self.evictions += 1
+                logger.debug("evicted idle session", extra={"step": "net.pool", "host": key})
+
+    def get(self, url: str) -> requests.Session:
+        """Return the pooled session for the host of ``url``."""
+        key = _host_key(url)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle_locked(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                entry = _Entry(self._new_session(), now)
+                self._entries[key] = entry
+            else:
+                self.hits += 1
+                entry.last_used = now
+            return entry.session
+
+    async def get_async(self, url: str) -> "httpx.AsyncClient":
+        """Return the pooled ``httpx.AsyncClient`` for the host of ``url``."""
+        if httpx is None:
+            raise RuntimeError("httpx is not installed. Run: pip install httpx")
+        key = _host_key(url)
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        stale = []
+        foreign = []
+        with self._lock:
+            for k, entry in list(self._async_entries.items()):
+                if entry.loop is loop and now - entry.last_used > self.idle_timeout:
+                    stale.append(entry.client)
+                    del self._async_entries[k]
+                    self.evictions += 1
+            entry = self._async_entries.get(key)
+            if entry is None or entry.loop is not loop or entry.loop.is_closed():
+                if entry is not None:
+                    foreign.append(entry)
+                self.misses += 1
+                limits = httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                    keepalive_expiry=self.idle_timeout,
+                )
+                entry = _AsyncEntry(httpx.AsyncClient(limits=limits), loop, now)
+                self._async_entries[key] = entry
+            else:
+                self.hits += 1
+                entry.last_used = now
+            client = entry.client
+        for old in stale:
+            await old.aclose()
+        for old_entry in foreign:
+            _close_foreign(old_entry)
+        return client
+
+    def evict_idle(self) -> None:
+        """Close sessions that were idle longer than ``idle_timeout``."""
+        with self._lock:
+            self._evict_idle_locked(time.monotonic())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hosts": len(self._entries) + len(self._async_entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "pool_size": self.pool_size,
+            }
+
+    def set_transport(self, adapter: Optional[BaseAdapter]) -> None:
+        """Send all sync traffic through ``adapter``; ``None`` restores real HTTP."""
+        with self._lock:
+            self._transport = adapter
+            # сессии со старым адаптером закрываем, новые создадутся с новым
+            for entry in self._entries.values():
+                entry.session.close()
+            self._entries.clear()
+
+    def _drain_locked(self) -> list:
+        for entry in self._entries.values():
+            entry.session.close()
+        self._entries.clear()
+        entries = list(self._async_entries.values())
+        self._async_entries.clear()
+        return entries
+
+    def close(self) -> None:
+        """Close all sessions; async clients are closed on their own loops."""
+        with self._lock:
+            entries = self._drain_locked()
+        for entry in entries:
+            _close_foreign(entry)
+
+    async def aclose_all(self) -> None:
+        """Close all sessions, awaiting the async clients of the running loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entries = self._drain_locked()
+        for entry in entries:
+            if entry.loop is loop:
+                await entry.client.aclose()
+            else:
+                _close_foreign(entry)
+
+
+_pool = SessionPool(
+    pool_size=_env_int("HTTP_POOL_SIZE", 10),
+    idle_timeout=_env_float("HTTP_POOL_IDLE_S", 90.0),
+)
+
+
+def get_session(url: str) -> requests.Session:
+    """Shared keep-alive session for the host of ``url``."""
+    return _pool.get(url)
+
+
+async def get_async_client(url: str) -> "httpx.AsyncClient":
+    """Shared keep-alive async client for the host of ``url``."""
+    return await _pool.get_async(url)
+
+
+def set_transport(adapter: Optional[BaseAdapter]) -> None:
+    """Mount ``adapter`` on every pooled session (``None`` — back to HTTP)."""
+    _pool.set_transport(adapter)
+
+
+def pool_stats() -> Dict[str, int]:
+    """Hit/miss counters of the shared pool for monitoring."""
+    return _pool.stats()
+
+
+def close_pool() -> None:
+    _pool.close()
+
+
+async def aclose_pool() -> None:
+    """Close the shared pool from async shutdown code."""
+    await _pool.aclose_all()
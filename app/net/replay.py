@@ -0,0 +1,254 @@
+"""Record and replay provider traffic at the ``requests`` transport level.
+
+:class:`RecordingAdapter` sends requests for real and appends every exchange
+(status, body, a few headers and the measured latency) to a JSONL cassette.
+:class:`ReplayAdapter` answers from such a cassette without any network:
+it waits the recorded latency (times ``speed``) and can inject failures
+with probability ``error_rate``, either as connection errors or as an HTTP
+status.  Both are mounted on the shared session pool with :func:`recording` /
+:func:`replaying`, so ``request_json``, SSE streams, the GenAPI client and
+image downloads all go through them unchanged.  The asyncio (httpx) path is
+not covered.
+
+Requests are matched by method, URL and a hash of the body; if the exact
+request was not recorded, any recorded response for the same method and URL
+(then for the same path without the query) is used in turn, so a cassette
+recorded for a few words can drive a benchmark over many cards.  Request
+headers are never stored; URLs are, so do not record flows that carry
+secrets in the URL (the Telegram Bot API).
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .pool import set_transport
+
+__all__ = ["Cassette", "RecordingAdapter", "ReplayAdapter", "recording", "replaying"]
+
+# response headers worth keeping: everything else is noise or private
+KEEP_HEADERS = ("content-type", "retry-after")
+
+
+def _body_hash(body: Any) -> Optional[str]:
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if isinstance(body, bytes):
+        return hashlib.sha1(body).hexdigest()
+    return None  # потоковое тело (генератор) не хэшируем — его нельзя прочитать дважды
+
+
+def _path(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+class Cassette:
+    """JSONL file of recorded exchanges with round-robin lookup."""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self.entries: List[Dict[str, Any]] = []
+        self._index: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        self._next: Dict[Tuple[str, ...], int] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+
+    @staticmethod
+    def _keys(method: str, url: str, body_hash: Optional[str]) -> List[Tuple[str, ...]]:
+        # от точного совпадения к любому ответу того же адреса
+        return [(method, url, body_hash or ""), (method, url), (method, _path(url))]
+
+    def _add(self, entry: Dict[str, Any]) -> None:
+        self.entries.append(entry)
+        for key in self._keys(entry["method"], entry["url"], entry.get("body_sha1")):
+            self._index.setdefault(key, []).append(entry)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._add(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def lookup(
+        self, method: str, url: str, body_hash: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for key in self._keys(method, url, body_hash):
+                found = self._index.get(key)
+                if found:
+                    i = self._next.get(key, 0)
+                    self._next[key] = i + 1
+                    return found[i % len(found)]
+        return None
+
+    def latency_profile(self) -> Dict[str, Dict[str, float]]:
+        """Recorded latency per host: count, p50, p95, max (ms)."""
+        by_host: Dict[str, List[float]] = {}
+        for e in self.entries:
+            by_host.setdefault(urlsplit(e["url"]).netloc, []).append(e.get("lat_ms", 0))
+        out = {}
+        for host, values in by_host.items():
+            values.sort()
+            out[host] = {
+                "count": len(values),
+                "p50_ms": values[int(0.5 * (len(values) - 1))],
+                "p95_ms": values[int(0.95 * (len(values) - 1))],
+                "max_ms": values[-1],
+            }
+        return out
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Real HTTP that also writes every exchange to ``cassette``."""
+
+    def __init__(self, cassette: Cassette, **kwargs: Any) -> None:
+        super().__init__(max_retries=0, **kwargs)
+        self.cassette = cassette
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        start = time.perf_counter()
+        resp = super().send(request, **kwargs)
+        content = resp.content  # дочитываем и потоковый ответ: задержка — до конца тела
+        entry: Dict[str, Any] = {
+            "method": request.method,
+            "url": request.url,
+            "body_sha1": _body_hash(request.body),
+            "status": resp.status_code,
+            "reason": resp.reason,
+            "headers": {k: v for k, v in resp.headers.items() if k.lower() in KEEP_HEADERS},
+            "lat_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        try:
+            entry["text"] = content.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(content).decode("ascii")
+        self.cassette.append(entry)
+        return resp
+
+
+def _read_timeout(timeout: Any) -> Optional[float]:
+    if isinstance(timeout, tuple):
+        timeout = timeout[1]
+    return float(timeout) if timeout is not None else None
+
+
+class ReplayAdapter(BaseAdapter):
+    """Answer from ``cassette`` with the recorded latency, no network at all."""
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        *,
+        speed: float = 1.0,
+        error_rate: float = 0.0,
+        error_status: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        super().__init__()
+        self.cassette = cassette
+        self.speed = speed
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.served = 0
+        self.injected = 0
+        self.missing = 0
+
+    def _roll(self) -> bool:
+        with self._lock:
+            self.served += 1
+            hit = self._random.random() < self.error_rate
+            self.injected += hit
+            return hit
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Any = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        method, url = request.method or "", request.url or ""
+        entry = self.cassette.lookup(method, url, _body_hash(request.body))
+        if entry is None:
+            with self._lock:
+                self.missing += 1
+            raise requests.ConnectionError(f"no recorded response for {method} {url}")
+        delay = entry.get("lat_ms", 0) / 1000 * self.speed
+        limit = _read_timeout(timeout)
+        if limit is not None and delay > limit:
+            time.sleep(limit)
+            raise requests.ReadTimeout(f"replayed latency {delay:.1f}s exceeds timeout")
+        time.sleep(delay)
+        if self._roll():
+            if self.error_status is None:
+                raise requests.ConnectionError("injected failure")
+            return self._response(request, {"status": self.error_status, "text": "injected"})
+        return self._response(request, entry)
+
+    @staticmethod
+    def _response(request: requests.PreparedRequest, entry: Dict[str, Any]) -> requests.Response:
+        resp = requests.Response()
+        resp.status_code = entry["status"]
+        resp.reason = entry.get("reason") or ""
+        resp.headers = CaseInsensitiveDict(entry.get("headers") or {})
+        if "body_b64" in entry:
+            content = base64.b64decode(entry["body_b64"])
+        else:
+            content = (entry.get("text") or "").encode("utf-8")
+        # тело уже целиком в памяти: iter_lines/iter_content (stream=True) читают его
+        resp._content = content
+        resp._content_consumed = True
+        resp.raw = io.BytesIO(content)
+        resp.encoding = "utf-8"
+        resp.url = request.url or ""
+        resp.request = request
+        return resp
+
+    def close(self) -> None:
+        pass
+
+
+@contextmanager
+def recording(path: Path | str) -> Iterator[Cassette]:
+    """Record all sync provider traffic inside the block into ``path``."""
+    cassette = Cassette(path)
+    set_transport(RecordingAdapter(cassette))
+    try:
+        yield cassette
+    finally:
+        set_transport(None)
+
+
+@contextmanager
+def replaying(path: Path | str, **kwargs: Any) -> Iterator[ReplayAdapter]:
+    """Serve all sync provider traffic inside the block from ``path``.
+
+    ``kwargs`` go to :class:`ReplayAdapter` (``speed``, ``error_rate``, ...).
+    """
+    adapter = ReplayAdapter(Cassette(path), **kwargs)
+    set_transport(adapter)
+    try:
+        yield adapter
+    finally:
+        set_transport(None)
@@ -0,0 +1,269 @@
+"""Server-sent event streams (``"stream": true`` chat completions).
+
+:func:`stream_sse` and :func:`stream_sse_async` yield the JSON payload of
+every ``data:`` event until ``[DONE]``.  They go through the same breaker,
+rate limit, concurrency slot and deadline as :func:`app.net.http.request_json`.
+Only opening the stream is retried: once an event has been handed to the
+caller a broken stream raises, since a retry would repeat the text.  Closing
+the generator early (``close()`` / ``aclose()``) drops the connection, so
+the provider stops generating.
+"""
+from __future__ import annotations
+
+import asyncio
+import json as jsonlib
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from . import breaker
+from .deadline import time_left
+from .http import (
+    NetworkError,
+    _attempt_timeout,
+    _circuit_open,
+    _deadline_exceeded,
+    _http_error,
+    _log_error,
+    _log_ok,
+    _record,
+    _retry_delay,
+    httpx,
+)
+from .limits import acquire_rate, acquire_rate_async, concurrency_slot, concurrency_slot_async
+from .pool import get_async_client, get_session
+
+__all__ = ["chat_delta", "iter_sse", "stream_sse", "stream_sse_async"]
+
+DONE = "[DONE]"
+
+
+class _Parser:
+    """Collect ``data:`` lines into events (blank line = end of event)."""
+
+    def __init__(self) -> None:
+        self._data: List[str] = []
+
+    def feed(self, line: str) -> Optional[str]:
+        if not line:
+            data, self._data = self._data, []
+            return "\n".join(data) if data else None
+        if line.startswith("data:"):
+            self._data.append(line[5:].lstrip(" "))
+        return None  # комментарии (":") и прочие поля не нужны
+
+    def flush(self) -> Optional[str]:
+        return self.feed("")
+
+
+def _decode(data: str) -> Any:
+    try:
+        return jsonlib.loads(data)
+    except ValueError as exc:
+        raise NetworkError("json", str(exc), {"data": data[:200]}) from exc
+
+
+def iter_sse(lines: Iterable[str]) -> Iterator[Any]:
+    """Decoded ``data:`` payloads of an SSE line stream, up to ``[DONE]``."""
+    parser = _Parser()
+    for line in lines:
+        data = parser.feed(line.rstrip("\r"))
+        if data == DONE:
+            return
+        if data is not None:
+            yield _decode(data)
+    data = parser.flush()
+    if data is not None and data != DONE:
+        yield _decode(data)
+
+
+def chat_delta(event: Any) -> str:
+    """Text of one ``chat.completion.chunk`` event (``""`` if it carries none)."""
+    try:
+        return event["choices"][0]["delta"].get("content") or ""
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return ""
+
+
+def _check_deadline(provider: str, deadline: Optional[float]) -> None:
+    left = time_left(deadline)
+    if left is not None and left <= 0:
+        raise _deadline_exceeded(provider, None)
+
+
+def stream_sse(
+    method: str,
+    url: str,
+    *,
+    json: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: int = 30,
+    retries: int = 3,
+    provider: Optional[str] = None,
+    backoff_base: float = 1,
+    deadline: Optional[float] = None,
+) -> Iterator[Any]:
+    """Open an SSE stream and yield its events; ``timeout`` is per read."""
+    provider = provider or urlparse(url).netloc
+
+    last_error: Optional[NetworkError] = None
+    for attempt in range(1, retries + 1):
+        if not breaker.allow(provider):
+            last_error = _circuit_open(provider)
+            break
+        acquire_rate(provider)
+        left = time_left(deadline)
+        if left is not None and left <= 0:
+            # запрос не ушёл: пропуск (в half-open — единственная проба) возвращаем
+            breaker.release(provider)
+            last_error = _deadline_exceeded(provider, last_error)
+            break
+        start = time.perf_counter()
+        events = 0
+        try:
+            with concurrency_slot(provider):
+                resp = get_session(url).request(
+                    method,
+                    url,
+                    json=json,
+                    headers=headers,
+                    timeout=_attempt_timeout(timeout, left),
+                    stream=True,
+                )
+                try:
+                    resp.raise_for_status()
+                    for event in iter_sse(resp.iter_lines(decode_unicode=True)):
+                        _check_deadline(provider, deadline)
+                        events += 1
+                        yield event
+                finally:
+                    resp.close()
+            _log_ok(provider, attempt, start, resp.status_code, None)
+            _record(provider, start, None)
+            return
+        except GeneratorExit:
+            # потребитель закрыл поток раньше конца — для провайдера это успех
+            _log_ok(provider, attempt, start, resp.status_code, None)
+            _record(provider, start, None)
+            raise
+        except requests.HTTPError as exc:  # noqa: PERF203
+            last_error = _http_error(exc.response)
+            _log_error(provider, attempt, retries, start, last_error.code)
+        except requests.RequestException as exc:
+            last_error = NetworkError("network", str(exc))
+            _log_error(provider, attempt, retries, start)
+        except NetworkError as exc:  # json / deadline inside the stream
+            last_error = exc
+            _log_error(provider, attempt, retries, start)
+        _record(provider, start, last_error)
+        if events or last_error.code in ("json", "deadline"):
+            break  # часть текста уже отдана — повтор её продублирует
+
+        delay = _retry_delay(provider, last_error, attempt, backoff_base)
+        if attempt == retries or breaker.is_open(provider):
+            break
+        left = time_left(deadline)
+        if left is not None and delay >= left:
+            last_error = _deadline_exceeded(provider, last_error)
+            break
+        if delay > 0:
+            time.sleep(delay)
+
+    assert last_error is not None  # for mypy
+    raise last_error
+
+
+async def stream_sse_async(
+    method: str,
+    url: str,
+    *,
+    json: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: int = 30,
+    retries: int = 3,
+    provider: Optional[str] = None,
+    backoff_base: float = 1,
+    deadline: Optional[float] = None,
+) -> AsyncIterator[Any]:
+    """Asyncio twin of :func:`stream_sse`; close it with ``aclose()``."""
+    if httpx is None:
+        raise NetworkError("config", "httpx is not installed")
+    provider = provider or urlparse(url).netloc
+
+    last_error: Optional[NetworkError] = None
+    for attempt in range(1, retries + 1):
+        if not breaker.allow(provider):
+            last_error = _circuit_open(provider)
+            break
+        await acquire_rate_async(provider)
+        left = time_left(deadline)
+        if left is not None and left <= 0:
+            # запрос не ушёл: пропуск (в half-open — единственная проба) возвращаем
+            breaker.release(provider)
+            last_error = _deadline_exceeded(provider, last_error)
+            break
+        start = time.perf_counter()
+        events = 0
+        try:
+            client = await get_async_client(url)
+            async with concurrency_slot_async(provider):
+                async with client.stream(
+                    method,
+                    url,
+                    json=json,
+                    headers=headers,
+                    timeout=_attempt_timeout(timeout, left),
+                ) as resp:
+                    if resp.status_code >= 400:
+                        await resp.aread()  # текст ошибки для NetworkError
+                    resp.raise_for_status()
+                    parser = _Parser()
+                    async for line in resp.aiter_lines():
+                        data = parser.feed(line.rstrip("\r"))
+                        if data is None:
+                            continue
+                        if data == DONE:
+                            break
+                        _check_deadline(provider, deadline)
+                        events += 1
+                        yield _decode(data)
+                    else:
+                        data = parser.flush()
+                        if data is not None and data != DONE:
+                            events += 1
+                            yield _decode(data)
+            _log_ok(provider, attempt, start, resp.status_code, None)
+            _record(provider, start, None)
+            return
+        except GeneratorExit:
+            # aclose() до конца потока — для провайдера это успех
+            _log_ok(provider, attempt, start, resp.status_code, None)
+            _record(provider, start, None)
+            raise
+        except httpx.HTTPStatusError as exc:  # noqa: PERF203
+            last_error = _http_error(exc.response)
+            _log_error(provider, attempt, retries, start, last_error.code)
+        except httpx.HTTPError as exc:
+            last_error = NetworkError("network", str(exc))
+            _log_error(provider, attempt, retries, start)
+        except NetworkError as exc:
+            last_error = exc
+            _log_error(provider, attempt, retries, start)
+        _record(provider, start, last_error)
+        if events or last_error.code in ("json", "deadline"):
+            break
+
+        delay = _retry_delay(provider, last_error, attempt, backoff_base)
+        if attempt == retries or breaker.is_open(provider):
+            break
+        left = time_left(deadline)
+        if left is not None and delay >= left:
+            last_error = _deadline_exceeded(provider, last_error)
+            break
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    assert last_error is not None  # for mypy
+    raise last_error
@@ -0,0 +1,107 @@
+"""Tiny embedded HTTP receiver for provider callbacks (webhooks).
+
+:class:`WebhookServer` runs :class:`http.server.ThreadingHTTPServer` in a
+daemon thread and hands every JSON ``POST`` body to ``handler``.  The handler
+returns ``True`` when it recognised the payload (answered with ``200``) and
+``False`` otherwise (``404``), so the provider can tell a delivered callback
+from a misrouted one.  With ``token`` set, only requests carrying it as the
+``token`` query parameter (or the ``X-Callback-Token`` header) reach the
+handler; the rest get ``403`` before the body is read.
+"""
+from __future__ import annotations
+
+import hmac
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+__all__ = ["WebhookServer"]
+
+logger = logging.getLogger(__name__)
+
+# callbacks carry at most one base64 image
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+class WebhookServer:
+    """Serve ``POST`` callbacks on ``host:port`` (port ``0`` picks a free one)."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        handler: Callable[[Any], bool],
+        token: Optional[str] = None,
+    ) -> None:
+        self.handler = handler
+        self.token = token
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def _authorized(self) -> bool:
+                if not server.token:
+                    return True
+                query = parse_qs(urlsplit(self.path).query)
+                given = (query.get("token") or [""])[0] or self.headers.get(
+                    "X-Callback-Token", ""
+                )
+                return hmac.compare_digest(given.encode(), server.token.encode())
+
+            def do_POST(self) -> None:  # noqa: N802 - http.server API
+                if not self._authorized():
+                    logger.warning("callback without token", extra={"step": "net.webhook"})
+                    self._reply(403, {"ok": False, "error": "forbidden"})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                if length <= 0 or length > MAX_BODY_BYTES:
+                    self._reply(400, {"ok": False, "error": "bad length"})
+                    return
+                try:
+                    payload = json.loads(self.rfile.read(length))
+                except ValueError:
+                    self._reply(400, {"ok": False, "error": "bad json"})
+                    return
+                try:
+                    accepted = server.handler(payload)
+                except Exception:
+                    logger.exception("callback handler failed", extra={"step": "net.webhook"})
+                    self._reply(500, {"ok": False})
+                    return
+                self._reply(200 if accepted else 404, {"ok": bool(accepted)})
+
+            def _reply(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug(format, *args, extra={"step": "net.webhook"})
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> tuple:
+        return self._httpd.server_address[:2]
+
+    def start(self) -> "WebhookServer":
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._httpd.serve_forever, name="webhook", daemon=True
+            )
+            self._thread.start()
+            logger.info("listening on %s:%s", *self.address, extra={"step": "net.webhook"})
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread = None
+        self._httpd.server_close()
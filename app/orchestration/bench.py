@@ -0,0 +1,158 @@
+"""Throughput benchmark of the card pipeline.
+
+:func:`run_bench` builds ``cards`` cards on ``concurrency`` threads and
+reports cards per second, p50/p95/p99 of the whole card and of every stage
+(from the ``timings`` that :func:`app.mcp_tools.lesson.make_card` returns),
+errors by type and the peak RSS of the process.  Together with
+:mod:`app.net.replay` it runs without paid APIs, so the numbers can be
+compared before and after every performance change (``python -m app.cli
+bench``, see ``docs/BENCH.md``).
+
+:func:`log_overhead` times the application's log handler chain (context and
+secret filters, formatter, rotating file) on the calling thread, with and
+without the queue in front of it; :func:`log_overhead_report` turns that
+into milliseconds per card for the number of records a card really logs.
+"""
+from __future__ import annotations
+
+import logging
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+from app.logging import LOG_FORMAT, ContextFilter, SecretsFilter, log_secrets, queue_handlers
+
+from .jobs import percentile
+
+__all__ = [
+    "count_log_records",
+    "log_overhead",
+    "log_overhead_report",
+    "peak_rss_mb",
+    "run_bench",
+]
+
+Card = Callable[[str], Dict[str, Any]]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _summary(values: Sequence[float]) -> Dict[str, float]:
+    return {f"p{q}": percentile(values, q) for q in (50, 95, 99)}
+
+
+def run_bench(
+    card: Card, words: Sequence[str], *, cards: int = 20, concurrency: int = 4
+) -> Dict[str, Any]:
+    """Run ``card`` for ``cards`` words (cycling ``words``) and summarise."""
+    if not words:
+        raise ValueError("no words to benchmark")
+    lock = threading.Lock()
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+
+    def one(i: int) -> None:
+        start = time.perf_counter()
+        try:
+            result = card(words[i % len(words)])
+        except Exception as exc:
+            with lock:
+                name = type(exc).__name__
+                code = getattr(exc, "code", None)
+                key = f"{name}:{code}" if code is not None else name
+                errors[key] = errors.get(key, 0) + 1
+            return
+        lat_ms = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(lat_ms)
+            for stage, timing in (result.get("timings") or {}).items():
+                stages.setdefault(stage, []).append(timing["lat_ms"])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="bench") as pool:
+        list(pool.map(one, range(cards)))
+    wall_s = time.perf_counter() - start
+    return {
+        "cards": cards,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall_s, 3),
+        "cards_per_s": round(len(latencies) / wall_s, 3) if wall_s else 0.0,
+        "latency_ms": _summary(latencies),
+        "stages_ms": {name: _summary(values) for name, values in sorted(stages.items())},
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+class _Counter(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.count += 1
+
+
+@contextmanager
+def count_log_records() -> Iterator[_Counter]:
+    """Count records that reach the root logger's handlers inside the block."""
+    counter = _Counter()
+    root = logging.getLogger()
+    root.addHandler(counter)
+    try:
+        yield counter
+    finally:
+        root.removeHandler(counter)
+
+
+def log_overhead(path: Path, *, queued: bool, records: int = 5000) -> float:
+    """Microseconds the caller spends per INFO record, like the ones cards log."""
+    logger = logging.getLogger(f"bench.logging.{'queued' if queued else 'sync'}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = RotatingFileHandler(path, maxBytes=5 * 1024 * 1024, backupCount=1)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SecretsFilter(log_secrets()))
+    logger.addHandler(handler)
+    listener = queue_handlers(logger) if queued else None
+    try:
+        start = time.perf_counter()
+        for i in range(records):
+            logger.info("ok", extra={"step": "text.generate", "lat_ms": i, "outlen": 42})
+        elapsed = time.perf_counter() - start
+    finally:
+        if listener is not None:
+            listener.stop()
+        for h in list(logger.handlers):
+            logger.removeHandler(h)
+        handler.close()
+    return elapsed / records * 1e6
+
+
+def log_overhead_report(records: int, cards: int, samples: int = 5000) -> Dict[str, Any]:
+    """Logging cost per card on the request thread: synchronous vs queued handlers."""
+    per_card = records / cards if cards else 0.0
+    out: Dict[str, Any] = {"records_per_card": round(per_card, 1)}
+    with tempfile.TemporaryDirectory(prefix="bench-log-") as tmp:
+        for mode, queued in (("sync", False), ("queued", True)):
+            us = log_overhead(Path(tmp) / f"{mode}.log", queued=queued, records=samples)
+            out[mode] = {
+                "us_per_record": round(us, 1),
+                "ms_per_card": round(us * per_card / 1000, 3),
+            }
+    return out
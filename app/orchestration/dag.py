@@ -0,0 +1,174 @@
+"""Tiny dependency-graph executor for pipeline stages.
+
+A pipeline is a list of :class:`Stage` objects.  Each stage receives the dict
+of already computed results and returns its own value; a stage starts as soon
+as all of its ``deps`` are finished, so independent branches overlap.  The same
+stage list can be run with threads (:func:`run_graph`) or on the event loop
+(:func:`run_graph_async`, where stage functions may return awaitables).
+
+Both runners return ``(results, timings)``; ``timings`` maps a stage name to
+``{"start_ms": ..., "lat_ms": ...}`` measured from the start of the graph, which
+is enough to reconstruct the critical path.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import inspect
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.telemetry.metrics import observe_step
+from app.telemetry.tracing import span
+
+__all__ = ["Stage", "run_graph", "run_graph_async"]
+
+logger = logging.getLogger(__name__)
+
+Timings = Dict[str, Dict[str, int]]
+
+
+@dataclass
+class Stage:
+    """One node of the graph.
+
+    ``check`` validates/transforms the resolved value (may raise).  With
+    ``optional=True`` a failing stage resolves to ``None`` instead of aborting
+    the whole graph.
+    """
+
+    name: str
+    fn: Callable[[Dict[str, Any]], Any]
+    deps: Tuple[str, ...] = ()
+    check: Optional[Callable[[Any], Any]] = None
+    optional: bool = False
+
+
+def _validate(stages: Sequence[Stage]) -> Dict[str, Stage]:
+    by_name = {s.name: s for s in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("duplicate stage names")
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"stage {stage.name!r} depends on unknown {dep!r}")
+    return by_name
+
+
+def _ready(stages: Sequence[Stage], done: Dict[str, Any], started: set) -> List[Stage]:
+    return [
+        s
+        for s in stages
+        if s.name not in started and all(d in done for d in s.deps)
+    ]
+
+
+def _finish(stage: Stage, value: Any) -> Any:
+    return stage.check(value) if stage.check else value
+
+
+def _record(timings: Timings, name: str, t0: float, start: float, ok: bool) -> None:
+    now = time.perf_counter()
+    timings[name] = {
+        "start_ms": int((start - t0) * 1000),
+        "lat_ms": int((now - start) * 1000),
+    }
+    observe_step(f"dag.{name}", (now - start) * 1000, ok)
+    logger.debug("stage", extra={"step": f"dag.{name}", "lat_ms": timings[name]["lat_ms"]})
+
+
+def _run_stage(stage: Stage, results: Dict[str, Any], t0: float, timings: Timings) -> Any:
+    start = time.perf_counter()
+    ok = False
+    try:
+        with span(f"dag.{stage.name}"):
+            value = _finish(stage, stage.fn(results))
+        ok = True
+        return value
+    except Exception:
+        if not stage.optional:
+            raise
+        logger.warning("optional stage failed", exc_info=True, extra={"step": f"dag.{stage.name}"})
+        return None
+    finally:
+        _record(timings, stage.name, t0, start, ok)
+
+
+def run_graph(
+    stages: Sequence[Stage], *, max_workers: Optional[int] = None
+) -> Tuple[Dict[str, Any], Timings]:
+    """Run ``stages`` on a thread pool, overlapping independent branches."""
+    _validate(stages)
+    t0 = time.perf_counter()
+    results: Dict[str, Any] = {}
+    timings: Timings = {}
+    started: set = set()
+    running: Dict[Future, Stage] = {}
+    pool = ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1)
+    try:
+        while len(results) < len(stages):
+            for stage in _ready(stages, results, started):
+                started.add(stage.name)
+                snapshot = dict(results)
+                # стадия — дочерний спан того, кто запустил граф
+                run = contextvars.copy_context().run
+                running[pool.submit(run, _run_stage, stage, snapshot, t0, timings)] = stage
+            if not running:
+                raise RuntimeError("dependency cycle in stage graph")
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                stage = running.pop(fut)
+                results[stage.name] = fut.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results, timings
+
+
+async def run_graph_async(stages: Sequence[Stage]) -> Tuple[Dict[str, Any], Timings]:
+    """Run ``stages`` as asyncio tasks; stage functions may return awaitables."""
+    _validate(stages)
+    t0 = time.perf_counter()
+    results: Dict[str, Any] = {}
+    timings: Timings = {}
+    started: set = set()
+    running: Dict[asyncio.Task, Stage] = {}
+
+    async def _run(stage: Stage, snapshot: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        ok = False
+        try:
+            with span(f"dag.{stage.name}"):
+                value = stage.fn(snapshot)
+                if inspect.isawaitable(value):
+                    value = await value
+                value = _finish(stage, value)
+            ok = True
+            return value
+        except Exception:
+            if not stage.optional:
+                raise
+            logger.warning(
+                "optional stage failed", exc_info=True, extra={"step": f"dag.{stage.name}"}
+            )
+            return None
+        finally:
+            _record(timings, stage.name, t0, start, ok)
+
+    try:
+        while len(results) < len(stages):
+            for stage in _ready(stages, results, started):
+                started.add(stage.name)
+                running[asyncio.ensure_future(_run(stage, dict(results)))] = stage
+            if not running:
+                raise RuntimeError("dependency cycle in stage graph")
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                stage = running.pop(task)
+                results[stage.name] = task.result()
+    finally:
+        for task in running:
+            task.cancel()
+    return results, timings
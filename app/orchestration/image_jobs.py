@@ -0,0 +1,289 @@
+"""Отложенная картинка для уже созданных заметок Anki.
+
+В режиме ``CARD_IMAGE_DEFERRED`` :func:`app.mcp_tools.lesson.make_card`
+создаёт заметку только с текстом и ставит картинку в очередь
+:class:`ImageJobs`. Фоновые потоки генерируют изображение и дописывают его в
+заметку (``storeMediaFile`` + ``updateNoteFields``). Задания хранятся в
+SQLite, поэтому незавершённые после перезапуска подхватываются снова
+(:meth:`ImageJobs.resume`).
+
+Базу могут делить несколько процессов, поэтому у задания есть владелец
+(``host:pid:экземпляр``) и срок аренды: владелец продлевает его, пока процесс жив.
+:meth:`ImageJobs.resume` забирает только ничьи задания, задания с истёкшей
+арендой и задания умершего процесса на этом же хосте — одну картинку не
+генерируют (и не оплачивают) дважды.
+"""
+from __future__ import annotations
+
+import importlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+GenerateFn = Callable[[str], str]
+AttachFn = Callable[[int, str], str]
+
+
+def _owner_alive(owner: str) -> bool:
+    """Is the owning process still running?  Unknown (another host) counts as alive."""
+    parts = owner.split(":")
+    if len(parts) != 3 or parts[0] != socket.gethostname() or not parts[1].isdigit():
+        return True
+    try:
+        os.kill(int(parts[1]), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # процесс есть, но не наш
+    return True
+
+
+class ImageJobs:
+    """Очередь «сгенерировать и прикрепить картинку» с журналом в SQLite.
+
+    Строка задания живёт в статусе ``pending``, пока картинка не прикреплена
+    (``done``) или не исчерпаны ``max_attempts`` попыток (``failed``).
+    Перед повтором поток ждёт ``backoff_s``, с каждой попыткой вдвое дольше
+    (не больше ``max_backoff_s``); :meth:`close` прерывает ожидание, задание
+    остаётся ``pending`` до :meth:`resume`.
+    ``generate(sentence)`` возвращает путь к файлу (``""`` — не вышло),
+    ``attach(note_id, path)`` дописывает его в заметку.
+    """
+
+    def __init__(
+        self,
+        path: str | Path = "var/image_jobs.sqlite",
+        *,
+        generate: GenerateFn,
+        attach: AttachFn,
+        workers: int = 2,
+        max_attempts: int = 2,
+        backoff_s: float = 5.0,
+        max_backoff_s: float = 300.0,
+        lease_s: float = 300.0,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.generate = generate
+        self.attach = attach
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.lease_s = lease_s
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._leases_done = threading.Event()  # останов продления аренды
+        self._heartbeat: Optional[threading.Thread] = None
+        self._running: Dict[int, Future] = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-job")
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, note_id INT, sentence TEXT, "
+            "status TEXT, attempts INT DEFAULT 0, error TEXT, image TEXT, "
+            "created_at REAL, updated_at REAL)"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("owner TEXT", "lease_until REAL"):  # база до появления аренды
+            if column.split()[0] not in columns:
+                self.conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self.conn.commit()
+
+    def enqueue(self, note_id: int, sentence: str) -> Future:
+        """Записать задание и запустить его; future вернёт имя файла или ``""``."""
+        now = time.time()
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT INTO jobs (note_id, sentence, status, created_at, updated_at, "
+                "owner, lease_until) VALUES (?, ?, 'pending', ?, ?, ?, ?)",
+                (int(note_id), sentence, now, now, self.owner, now + self.lease_s),
+            )
+            self.conn.commit()
+            job_id = int(cur.lastrowid)
+        logger.info(
+            "queued", extra={"step": "image.deferred", "job_id": job_id, "note_id": note_id}
+        )
+        return self._start(job_id, int(note_id), sentence)
+
+    def resume(self) -> int:
+        """Перезапустить задания, не завершённые к прошлому останову.
+
+        Задание живого процесса с действующей арендой не трогаем; остальные
+        забираем атомарно (сравнением с прежним владельцем), чтобы два
+        процесса не взяли одно и то же.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, note_id, sentence, owner, lease_until FROM jobs "
+                "WHERE status = 'pending' ORDER BY id"
+            ).fetchall()
+        started = 0
+        for job_id, note_id, sentence, owner, lease_until in rows:
+            if job_id in self._running or not self._claimable(owner, lease_until, now):
+                continue
+            if self._claim(job_id, (owner, lease_until), now):
+                self._start(job_id, note_id, sentence)
+                started += 1
+        if started:
+            logger.info("resumed", extra={"step": "image.deferred", "count": started})
+        return started
+
+    @staticmethod
+    def _claimable(owner: Optional[str], lease_until: Optional[float], now: float) -> bool:
+        return owner is None or (lease_until or 0) < now or not _owner_alive(owner)
+
+    def _claim(
+        self, job_id: int, previous: Tuple[Optional[str], Optional[float]], now: float
+    ) -> bool:
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE jobs SET owner = ?, lease_until = ? WHERE id = ? "
+                "AND status = 'pending' AND owner IS ? AND lease_until IS ?",
+                (self.owner, now + self.lease_s, job_id, *previous),
+            )
+            self.conn.commit()
+            return cur.rowcount > 0
+
+    def _renew_leases(self) -> None:
+        # одна запись продлевает аренду всех заданий процесса
+        while not self._leases_done.wait(self.lease_s / 3):
+            try:
+                with self._lock:
+                    self.conn.execute(
+                        "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = 'pending'",
+                        (time.time() + self.lease_s, self.owner),
+                    )
+                    self.conn.commit()
+            except sqlite3.Error:
+                logger.warning(
+                    "lease renewal failed", exc_info=True, extra={"step": "image.deferred"}
+                )
+
+    def _start(self, job_id: int, note_id: int, sentence: str) -> Future:
+        fut = self._pool.submit(self._run, job_id, note_id, sentence)
+        with self._lock:
+            self._running[job_id] = fut
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(
+                    target=self._renew_leases, name="image-job-lease", daemon=True
+                )
+                self._heartbeat.start()
+        fut.add_done_callback(lambda _f: self._forget(job_id))
+        return fut
+
+    def _forget(self, job_id: int) -> None:
+        with self._lock:
+            self._running.pop(job_id, None)
+
+    def _run(self, job_id: int, note_id: int, sentence: str) -> str:
+        while True:
+            attempts = self._bump(job_id)
+            try:
+                path = self.generate(sentence)
+                if not path:
+                    raise RuntimeError("image was not generated")
+                filename = self.attach(note_id, path)
+            except Exception as exc:
+                if attempts < self.max_attempts:
+                    logger.warning(
+                        "attempt failed: %s", exc,
+                        extra={"step": "image.deferred", "job_id": job_id, "attempt": attempts},
+                    )
+                    delay = min(self.max_backoff_s, self.backoff_s * 2 ** (attempts - 1))
+                    if self._stop.wait(delay):
+                        return ""  # останов: задание остаётся pending до resume()
+                    continue
+                logger.error(
+                    "image was not attached: %s", exc,
+                    extra={"step": "image.deferred", "job_id": job_id, "note_id": note_id},
+                )
+                self._finish(job_id, "failed", error=str(exc))
+                return ""
+            logger.info(
+                "ok", extra={"step": "image.deferred", "job_id": job_id, "note_id": note_id}
+            )
+            self._finish(job_id, "done", image=filename)
+            return filename
+
+    def _bump(self, job_id: int) -> int:
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+            self.conn.commit()
+            return self.conn.execute(
+                "SELECT attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()[0]
+
+    def _finish(
+        self, job_id: int, status: str, *, image: Optional[str] = None, error: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, image = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, image, error, time.time(), job_id),
+            )
+            self.conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+            return {"pending": 0, "done": 0, "failed": 0, **dict(rows), "running": len(self._running)}
+
+    def close(self, wait: bool = True) -> None:
+        self._stop.set()
+        self._pool.shutdown(wait=wait)
+        self._leases_done.set()
+        with self._lock:
+            self.conn.close()
+
+
+def _generate(sentence: str) -> str:
+    # в режиме callback ждёт результат не дольше GENAPI_CALLBACK_TIMEOUT_S
+    return importlib.import_module("app.mcp_tools.image").generate_image_file(sentence)
+
+
+def _attach(note_id: int, path: str) -> str:
+    anki_mod = importlib.import_module("app.mcp_tools.anki")
+    return anki_mod.attach_image(note_id, path)
+
+
+_jobs: Optional[ImageJobs] = None
+_jobs_lock = threading.Lock()
+
+
+def get_image_jobs() -> ImageJobs:
+    """Общая очередь процесса; при создании подхватывает прерванные задания."""
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            from app.settings import settings
+
+            _jobs = ImageJobs(
+                getattr(settings, "IMAGE_JOBS_PATH", "var/image_jobs.sqlite"),
+                generate=_generate,
+                attach=_attach,
+                workers=getattr(settings, "IMAGE_JOBS_WORKERS", 2),
+                backoff_s=getattr(settings, "IMAGE_JOBS_BACKOFF_S", 5),
+            )
+            _jobs.resume()
+        return _jobs
+
+
+def image_jobs_stats() -> Dict[str, int]:
+    """Счётчики заданий или ``{}``, если очередь в этом процессе не запускалась."""
+    return _jobs.stats() if _jobs is not None else {}
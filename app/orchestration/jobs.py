@@ -0,0 +1,340 @@
+"""Durable job queue on SQLite.
+
+Producers (the Telegram bot, the MCP ``jobs.enqueue_card`` tool used by n8n)
+only :meth:`JobQueue.enqueue` work; ``python -m app.worker`` leases jobs and
+runs them.  A lease expires after ``lease_s`` seconds, so jobs of a crashed
+worker are picked up again.  Failed jobs are retried with exponential backoff
+and moved to the ``dead`` status after ``max_attempts`` attempts.
+
+Statuses: ``queued`` → ``leased`` → ``done`` | ``queued`` (retry) | ``dead``.
+Every lease gets its own token (:attr:`Job.lease_token`); only the holder
+of the current token may finish the job or :meth:`JobQueue.renew` the
+lease.  A worker whose lease expired and was taken over — by another
+process or another thread of the same one — gets ``False``/``"lost"`` from
+:meth:`JobQueue.complete`/:meth:`JobQueue.fail` and must drop its result.
+Long handlers keep their lease by renewing it (the worker does that in a
+heartbeat).
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+__all__ = ["Job", "JobQueue", "get_job_queue", "percentile"]
+
+# сколько последних завершённых заданий учитывать в перцентилях
+LATENCY_WINDOW = 1000
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    status: str
+    attempts: int
+    max_attempts: int
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    lease_token: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+_COLUMNS = (
+    "id, kind, payload, status, attempts, max_attempts, result, error, "
+    "created_at, started_at, finished_at"
+)
+
+
+def _job(row: Sequence[Any]) -> Job:
+    return Job(
+        id=row[0],
+        kind=row[1],
+        payload=json.loads(row[2]),
+        status=row[3],
+        attempts=row[4],
+        max_attempts=row[5],
+        result=json.loads(row[6]) if row[6] is not None else None,
+        error=row[7],
+        created_at=row[8],
+        started_at=row[9],
+        finished_at=row[10],
+    )
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of ``values`` (``q`` in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil
+    return float(ordered[int(rank) - 1])
+
+
+class JobQueue:
+    """SQLite-backed queue shared by producers and worker processes.
+
+    Every state change is a short write transaction, so several processes
+    can use the same file.  ``backoff_s`` is the delay before the first
+    retry; it doubles with each attempt up to ``max_backoff_s``.
+    """
+
+    def __init__(
+        self,
+        path: str | Path = "var/jobs.sqlite",
+        *,
+        max_attempts: int = 5,
+        lease_s: float = 300.0,
+        backoff_s: float = 5.0,
+        max_backoff_s: float = 300.0,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.lease_s = lease_s
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self._lock = threading.Lock()
+        # autocommit: транзакции открываются явно через BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, payload TEXT, status TEXT, "
+            "attempts INT DEFAULT 0, max_attempts INT, available_at REAL, "
+            "leased_until REAL, worker TEXT, result TEXT, error TEXT, "
+            "created_at REAL, started_at REAL, finished_at REAL, lease_token TEXT)"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "lease_token" not in columns:  # очередь, созданная до токенов аренды
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN lease_token TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at)")
+
+    def enqueue(
+        self, kind: str, payload: Dict[str, Any], *, max_attempts: Optional[int] = None
+    ) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT INTO jobs (kind, payload, status, max_attempts, available_at, created_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?)",
+                (
+                    kind,
+                    json.dumps(payload, ensure_ascii=False),
+                    max_attempts or self.max_attempts,
+                    now,
+                    now,
+                ),
+            )
+            return int(cur.lastrowid)
+
+    def lease(self, worker: str, *, kinds: Optional[Sequence[str]] = None) -> Optional[Job]:
+        """Take the oldest ready job (or one whose lease expired) for ``worker``."""
+        now = time.time()
+        kind_filter = ""
+        params: List[Any] = [now, now]
+        if kinds:
+            kind_filter = f" AND kind IN ({', '.join('?' for _ in kinds)})"
+            params.extend(kinds)
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # воркер упал на последней попытке — дальше не пробуем
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'dead', error = 'lease expired', finished_at = ? "
+                    "WHERE status = 'leased' AND leased_until < ? AND attempts >= max_attempts",
+                    (now, now),
+                )
+                row = self.conn.execute(
+                    f"SELECT {_COLUMNS} FROM jobs WHERE "
+                    "((status = 'queued' AND available_at <= ?) "
+                    "OR (status = 'leased' AND leased_until < ?))"
+                    f"{kind_filter} ORDER BY available_at, id LIMIT 1",
+                    params,
+                ).fetchone()
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                job = _job(row)
+                job.status = "leased"
+                job.attempts += 1
+                job.started_at = job.started_at or now
+                job.lease_token = uuid.uuid4().hex
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'leased', attempts = ?, leased_until = ?, "
+                    "worker = ?, started_at = ?, lease_token = ? WHERE id = ?",
+                    (
+                        job.attempts,
+                        now + self.lease_s,
+                        worker,
+                        job.started_at,
+                        job.lease_token,
+                        job.id,
+                    ),
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return job
+
+    def renew(self, job_id: int, token: str) -> bool:
+        """Extend the lease by ``lease_s``; ``False`` if ``token`` is no longer current."""
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE jobs SET leased_until = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                (time.time() + self.lease_s, job_id, token),
+            )
+            return cur.rowcount > 0
+
+    def complete(self, job_id: int, result: Any = None, *, token: str) -> bool:
+        """Mark the job done; ``False`` if the lease ``token`` is no longer current."""
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, "
+                "leased_until = NULL, lease_token = NULL, finished_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                (
+                    json.dumps(result, ensure_ascii=False, default=str),
+                    time.time(),
+                    job_id,
+                    token,
+                ),
+            )
+            return cur.rowcount > 0
+
+    def fail(self, job_id: int, error: str, *, token: str, retry: bool = True) -> str:
+        """Record a failed attempt; returns the new status (``queued`` or ``dead``).
+
+        Returns ``"lost"`` and changes nothing if the lease ``token`` is no
+        longer current (the lease expired and the job was leased again).
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT attempts, max_attempts, status, lease_token FROM jobs WHERE id = ?",
+                    (job_id,),
+                ).fetchone()
+                if row is None:
+                    raise KeyError(job_id)
+                attempts, max_attempts, status, holder = row
+                if status != "leased" or holder != token:
+                    status = "lost"
+                elif retry and attempts < max_attempts:
+                    delay = min(self.max_backoff_s, self.backoff_s * 2 ** (attempts - 1))
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'queued', error = ?, leased_until = NULL, "
+                        "lease_token = NULL, available_at = ? WHERE id = ?",
+                        (error, now + delay, job_id),
+                    )
+                    status = "queued"
+                else:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'dead', error = ?, leased_until = NULL, "
+                        "lease_token = NULL, finished_at = ? WHERE id = ?",
+                        (error, now, job_id),
+                    )
+                    status = "dead"
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return status
+
+    def requeue(self, job_id: int) -> bool:
+        """Return a dead job to the queue with a fresh attempt budget."""
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, "
+                "finished_at = NULL WHERE id = ? AND status = 'dead'",
+                (time.time(), job_id),
+            )
+            return cur.rowcount > 0
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return _job(row) if row is not None else None
+
+    def dead(self, limit: int = 50) -> List[Job]:
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE status = 'dead' ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [_job(row) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth per status and latency percentiles of recent jobs (ms).
+
+        ``latency_ms`` is enqueue → done, ``run_ms`` is first lease → done.
+        """
+        with self._lock:
+            counts = dict(
+                self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+            )
+            rows = self.conn.execute(
+                "SELECT finished_at - created_at, finished_at - started_at FROM jobs "
+                "WHERE status = 'done' ORDER BY finished_at DESC LIMIT ?",
+                (LATENCY_WINDOW,),
+            ).fetchall()
+        depth = {status: counts.get(status, 0) for status in ("queued", "leased", "done", "dead")}
+        latency = [r[0] * 1000 for r in rows]
+        run = [r[1] * 1000 for r in rows if r[1] is not None]
+        return {
+            "depth": depth["queued"] + depth["leased"],
+            "by_status": depth,
+            "latency_ms": {f"p{q}": round(percentile(latency, q)) for q in (50, 95, 99)},
+            "run_ms": {f"p{q}": round(percentile(run, q)) for q in (50, 95, 99)},
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide :class:`JobQueue` configured from settings."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            from app.settings import settings
+
+            _queue = JobQueue(
+                getattr(settings, "JOBS_PATH", "var/jobs.sqlite"),
+                max_attempts=getattr(settings, "JOBS_MAX_ATTEMPTS", 5),
+                lease_s=getattr(settings, "JOBS_LEASE_S", 300),
+                backoff_s=getattr(settings, "JOBS_BACKOFF_S", 5),
+            )
+        return _queue
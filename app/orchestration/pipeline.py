@@ -6,7 +6,8 @@ from pydantic import BaseModel
 from ..tools.yt_transcript import fetch_transcript
 from ..tools.cefr_level import extract_vocab
 from ..tools.grammar import check_text
-from ..tools.anki_tool import add_basic_note
+from ..mcp_tools.anki import AnkiWriter
+from ..tools.anki_tool import basic_note
 from ..tools.tts import speak_to_file
 
 
@@ -32,13 +33,18 @@ def build_lesson(cfg: LessonConfig) -> Dict:
     vocab = extract_vocab(text, limit=cfg.limit)
     issues = check_text(text, language=cfg.language)
 
-    for item in vocab:
-        front = item["term"]
-        back = f"{item['gloss']}\n\nExample: {item['example']}"
-        audio_path = None
-        if cfg.tts:
-            audio_path = speak_to_file(item["example"], f"{item['term']}.mp3")
-        add_basic_note(front, back, cfg.deck, tags=[cfg.tag], audio_path=audio_path)
-        item["audio"] = audio_path
+    # заметки уходят в Anki общими запросами addNotes, а не по одной
+    with AnkiWriter() as writer:
+        notes = []
+        for item in vocab:
+            front = item["term"]
+            back = f"{item['gloss']}\n\nExample: {item['example']}"
+            audio_path = None
+            if cfg.tts:
+                audio_path = speak_to_file(item["example"], f"{item['term']}.mp3")
+            notes.append(writer.submit(basic_note(front, back, cfg.deck, [cfg.tag], audio_path)))
+            item["audio"] = audio_path
+    for note in notes:
+        note.result()
 
     return {"vocab": vocab, "issues": issues, "chars": len(text)}
@@ -20,7 +20,24 @@ class Settings(BaseModel):
     ANKI_TAG: str = "tg-auto"
     TELEGRAM_BOT_TOKEN: str
     TEXT_MAX_RETRIES: int = 3
+    TEXT_DEADLINE_S: float = 0.0
+    TEXT_HEDGE_ENABLED: bool = False
+    TEXT_HEDGE_MODEL: str | None = None
+    TEXT_HEDGE_DELAY_MS: int = 3000
+    TEXT_HEDGE_MIN_MS: int = 300
+    TEXT_STREAM_ENABLED: bool = False
+    TEXT_BACKEND: str = "openrouter"
+    TEXT_LOCAL_BASE_URL: str = ""
+    TEXT_LOCAL_MODEL: str = ""
+    TEXT_LOCAL_API_KEY: str = ""
+    TEXT_LOCAL_TIMEOUT_S: int = 120
+    TEXT_LOCAL_PARALLEL: int = 4
+    TEXT_BATCH_PARALLEL: int = 1
+    TEXT_MODELS_GENERATE: str = ""
+    TEXT_MODELS_TRANSLATE: str = ""
+    TEXT_ROUTER_MAX_COST: float = 0.0
     IMAGE_MAX_RETRIES: int = 3
+    IMAGE_STORE_MAX_MB: int = 1024
     GENERATION_DELAY_MS: int = 0
 
     # GenAPI image settings
@@ -31,6 +48,45 @@ class Settings(BaseModel):
     GENAPI_BACKGROUND: str = "transparent"
     GENAPI_IS_SYNC: bool = True
     GENAPI_CALLBACK_URL: str | None = None
+    GENAPI_CALLBACK_HOST: str = "127.0.0.1"
+    GENAPI_CALLBACK_PORT: int = 8766
+    GENAPI_CALLBACK_TIMEOUT_S: int = 600
+    GENAPI_CALLBACK_SECRET: str | None = None
+    GENAPI_CALLBACK_IMAGE_HOSTS: str = "gen-api.ru"
+
+    # Deferred image attachment
+    CARD_IMAGE_DEFERRED: bool = False
+    IMAGE_JOBS_PATH: str = "var/image_jobs.sqlite"
+    IMAGE_JOBS_WORKERS: int = 2
+    IMAGE_JOBS_BACKOFF_S: float = 5.0
+
+    # LLM response cache
+    TEXT_CACHE_ENABLED: bool = True
+    TEXT_CACHE_PATH: str = "var/text_cache.sqlite"
+    TEXT_CACHE_TTL_S: int = 30 * 24 * 3600
+    TEXT_CACHE_MAX_ENTRIES: int = 50000
+
+    # Batch engine
+    BATCH_WORKERS: int = 4
+    TRANSLATE_BATCH_SIZE: int = 20
+    SENTENCE_BATCH_SIZE: int = 10
+    OPENROUTER_MAX_CONCURRENCY: int = 8
+    GENAPI_MAX_CONCURRENCY: int = 2
+    ANKI_MAX_CONCURRENCY: int = 2
+    OPENROUTER_RPS: float = 0.0
+    OPENROUTER_BURST: int = 1
+    GENAPI_RPS: float = 0.0
+    GENAPI_BURST: int = 1
+    ANKI_BATCH_SIZE: int = 50
+    ANKI_FLUSH_INTERVAL_S: float = 0.5
+
+    # Job queue / worker
+    JOBS_PATH: str = "var/jobs.sqlite"
+    JOBS_WORKERS: int = 4
+    JOBS_MAX_ATTEMPTS: int = 5
+    JOBS_LEASE_S: int = 300
+    JOBS_BACKOFF_S: float = 5.0
+    BOT_ENQUEUE: bool = False
 
     @field_validator("GENAPI_QUALITY", mode="before")
     @classmethod
@@ -51,7 +107,26 @@ def _load_settings() -> Settings:
             "ANKI_TAG": os.environ.get("ANKI_TAG", "tg-auto"),
             "TELEGRAM_BOT_TOKEN": os.environ["TELEGRAM_BOT_TOKEN"],
             "TEXT_MAX_RETRIES": int(os.environ.get("TEXT_MAX_RETRIES", 3)),
+            "TEXT_DEADLINE_S": float(os.environ.get("TEXT_DEADLINE_S", 0)),
+            "TEXT_HEDGE_ENABLED": os.environ.get("TEXT_HEDGE_ENABLED", "false").lower()
+            in {"1", "true", "yes"},
+            "TEXT_HEDGE_MODEL": os.environ.get("TEXT_HEDGE_MODEL") or None,
+            "TEXT_HEDGE_DELAY_MS": int(os.environ.get("TEXT_HEDGE_DELAY_MS", 3000)),
+            "TEXT_HEDGE_MIN_MS": int(os.environ.get("TEXT_HEDGE_MIN_MS", 300)),
+            "TEXT_STREAM_ENABLED": os.environ.get("TEXT_STREAM_ENABLED", "false").lower()
+            in {"1", "true", "yes"},
+            "TEXT_BACKEND": os.environ.get("TEXT_BACKEND", "openrouter").lower(),
+            "TEXT_LOCAL_BASE_URL": os.environ.get("TEXT_LOCAL_BASE_URL", ""),
+            "TEXT_LOCAL_MODEL": os.environ.get("TEXT_LOCAL_MODEL", ""),
+            "TEXT_LOCAL_API_KEY": os.environ.get("TEXT_LOCAL_API_KEY", ""),
+            "TEXT_LOCAL_TIMEOUT_S": int(os.environ.get("TEXT_LOCAL_TIMEOUT_S", 120)),
+            "TEXT_LOCAL_PARALLEL": int(os.environ.get("TEXT_LOCAL_PARALLEL", 4)),
+            "TEXT_BATCH_PARALLEL": int(os.environ.get("TEXT_BATCH_PARALLEL", 1)),
+            "TEXT_MODELS_GENERATE": os.environ.get("TEXT_MODELS_GENERATE", ""),
+            "TEXT_MODELS_TRANSLATE": os.environ.get("TEXT_MODELS_TRANSLATE", ""),
+            "TEXT_ROUTER_MAX_COST": float(os.environ.get("TEXT_ROUTER_MAX_COST", 0)),
             "IMAGE_MAX_RETRIES": int(os.environ.get("IMAGE_MAX_RETRIES", 3)),
+            "IMAGE_STORE_MAX_MB": int(os.environ.get("IMAGE_STORE_MAX_MB", 1024)),
             "GENERATION_DELAY_MS": int(os.environ.get("GENERATION_DELAY_MS", 0)),
             "GENAPI_API_KEY": os.environ.get("GENAPI_API_KEY", ""),
             "GENAPI_MODEL_ID": os.environ.get("GENAPI_MODEL_ID", "gpt-image-1"),
@@ -61,6 +136,41 @@ def _load_settings() -> Settings:
             "GENAPI_IS_SYNC": os.environ.get("GENAPI_IS_SYNC", "true").lower()
             in {"1", "true", "yes"},
             "GENAPI_CALLBACK_URL": os.environ.get("GENAPI_CALLBACK_URL") or None,
+            "GENAPI_CALLBACK_HOST": os.environ.get("GENAPI_CALLBACK_HOST", "127.0.0.1"),
+            "GENAPI_CALLBACK_PORT": int(os.environ.get("GENAPI_CALLBACK_PORT", 8766)),
+            "GENAPI_CALLBACK_TIMEOUT_S": int(os.environ.get("GENAPI_CALLBACK_TIMEOUT_S", 600)),
+            "GENAPI_CALLBACK_SECRET": os.environ.get("GENAPI_CALLBACK_SECRET") or None,
+            "GENAPI_CALLBACK_IMAGE_HOSTS": os.environ.get(
+                "GENAPI_CALLBACK_IMAGE_HOSTS", "gen-api.ru"
+            ),
+            "CARD_IMAGE_DEFERRED": os.environ.get("CARD_IMAGE_DEFERRED", "false").lower()
+            in {"1", "true", "yes"},
+            "IMAGE_JOBS_PATH": os.environ.get("IMAGE_JOBS_PATH", "var/image_jobs.sqlite"),
+            "IMAGE_JOBS_WORKERS": int(os.environ.get("IMAGE_JOBS_WORKERS", 2)),
+            "IMAGE_JOBS_BACKOFF_S": float(os.environ.get("IMAGE_JOBS_BACKOFF_S", 5)),
+            "TEXT_CACHE_ENABLED": os.environ.get("TEXT_CACHE_ENABLED", "true").lower()
+            in {"1", "true", "yes"},
+            "TEXT_CACHE_PATH": os.environ.get("TEXT_CACHE_PATH", "var/text_cache.sqlite"),
+            "TEXT_CACHE_TTL_S": int(os.environ.get("TEXT_CACHE_TTL_S", 30 * 24 * 3600)),
+            "TEXT_CACHE_MAX_ENTRIES": int(os.environ.get("TEXT_CACHE_MAX_ENTRIES", 50000)),
+            "BATCH_WORKERS": int(os.environ.get("BATCH_WORKERS", 4)),
+            "TRANSLATE_BATCH_SIZE": int(os.environ.get("TRANSLATE_BATCH_SIZE", 20)),
+            "SENTENCE_BATCH_SIZE": int(os.environ.get("SENTENCE_BATCH_SIZE", 10)),
+            "OPENROUTER_MAX_CONCURRENCY": int(os.environ.get("OPENROUTER_MAX_CONCURRENCY", 8)),
+            "GENAPI_MAX_CONCURRENCY": int(os.environ.get("GENAPI_MAX_CONCURRENCY", 2)),
+            "ANKI_MAX_CONCURRENCY": int(os.environ.get("ANKI_MAX_CONCURRENCY", 2)),
+            "OPENROUTER_RPS": float(os.environ.get("OPENROUTER_RPS", 0)),
+            "OPENROUTER_BURST": int(os.environ.get("OPENROUTER_BURST", 1)),
+            "GENAPI_RPS": float(os.environ.get("GENAPI_RPS", 0)),
+            "GENAPI_BURST": int(os.environ.get("GENAPI_BURST", 1)),
+            "ANKI_BATCH_SIZE": int(os.environ.get("ANKI_BATCH_SIZE", 50)),
+            "ANKI_FLUSH_INTERVAL_S": float(os.environ.get("ANKI_FLUSH_INTERVAL_S", 0.5)),
+            "JOBS_PATH": os.environ.get("JOBS_PATH", "var/jobs.sqlite"),
+            "JOBS_WORKERS": int(os.environ.get("JOBS_WORKERS", 4)),
+            "JOBS_MAX_ATTEMPTS": int(os.environ.get("JOBS_MAX_ATTEMPTS", 5)),
+            "JOBS_LEASE_S": int(os.environ.get("JOBS_LEASE_S", 300)),
+            "JOBS_BACKOFF_S": float(os.environ.get("JOBS_BACKOFF_S", 5)),
+            "BOT_ENQUEUE": os.environ.get("BOT_ENQUEUE", "false").lower() in {"1", "true", "yes"},
         }
     except KeyError as e:  # pragma: no cover - simple error path
         raise RuntimeError(f"Missing required environment variable: {e.args[0]}") from None
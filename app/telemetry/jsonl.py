@@ -1,26 +1,190 @@
+"""Telemetry events as JSON lines.
+
+An event is ``{"ts": <unix time>, "name": ..., "payload": {...}}``; every
+card built by :func:`app.mcp_tools.lesson.make_card` is a ``card`` event.
+:mod:`app.telemetry.query` reads, filters and rolls them up.
+
+:func:`log_event` only serialises the event and appends it to an in-memory
+buffer; a :class:`JsonlWriter` writes the buffer out every
+``TELEMETRY_FLUSH_S`` seconds (1 by default), when it holds ``max_buffer``
+lines and at exit, and rotates the file at ``TELEMETRY_MAX_MB`` like
+:class:`logging.handlers.RotatingFileHandler` (``events.jsonl.1`` …).  Call
+:func:`flush_events` to read the file right after writing.  If the disk
+write fails the lines stay in the buffer (at most ``max_pending``, the oldest
+are dropped) and the next flush retries them.
+"""
+import atexit
 import json
+import logging
+import os
+import threading
+import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Dict, List, Optional
 
 
 _SENSITIVE_KEYS = {"api_key", "token", "authorization", "password"}
 
+EVENTS_PATH = Path("var/telemetry/events.jsonl")
+
+logger = logging.getLogger(__name__)
+
 
 def _filter_payload(payload: dict[str, Any]) -> dict[str, Any]:
     """Remove sensitive keys from payload (case-insensitive)."""
     return {k: v for k, v in payload.items() if k.lower() not in _SENSITIVE_KEYS}
 
 
+def events_enabled() -> bool:
+    """Whether the pipeline emits events (``TELEMETRY_ENABLED``, on by default)."""
+    return os.environ.get("TELEMETRY_ENABLED", "true").lower() in {"1", "true", "yes"}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class JsonlWriter:
+    """Buffered append-only JSONL file with periodic flush and size rotation."""
+
+    def __init__(
+        self,
+        path: Path | str,
+        *,
+        flush_interval_s: float = 1.0,
+        max_buffer: int = 512,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 3,
+        max_pending: int = 16384,
+    ) -> None:
+        self.path = Path(path)
+        self.flush_interval_s = flush_interval_s
+        self.max_buffer = max(1, max_buffer)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_pending = max(self.max_buffer, max_pending)
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()  # буфер
+        self._io_lock = threading.Lock()  # файл: запись и ротация
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.max_buffer
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(
+                    target=self._run, name="telemetry-writer", daemon=True
+                )
+                self._thread.start()
+        if full:
+            self._wake.set()  # запись — в фоне, вызывающий поток не ждёт диск
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:  # поток записи не должен умирать
+                logger.exception("telemetry flush failed", extra={"path": str(self.path)})
+
+    def flush(self) -> None:
+        with self._io_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if not lines:
+                return
+            data = "".join(lines).encode("utf-8")
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                if self.max_bytes > 0 and self.path.exists():
+                    if self.path.stat().st_size + len(data) > self.max_bytes:
+                        self._rotate()
+                with self.path.open("ab") as f:
+                    f.write(data)
+            except OSError as exc:
+                self._requeue(lines, exc)
+
+    def _requeue(self, lines: List[str], exc: OSError) -> None:
+        """Put unwritten ``lines`` back in front of the buffer, keeping ``max_pending``."""
+        with self._lock:
+            self._buffer[:0] = lines
+            dropped = len(self._buffer) - self.max_pending
+            if dropped > 0:
+                del self._buffer[:dropped]
+        logger.warning(
+            "telemetry write failed: %s",
+            exc,
+            extra={"path": str(self.path), "dropped": max(0, dropped)},
+        )
+
+    def _rotate(self) -> None:
+        if self.backup_count <= 0:
+            self.path.unlink()
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+
+_writers: Dict[str, JsonlWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def writer_for(path: Path | str) -> JsonlWriter:
+    """Shared :class:`JsonlWriter` of ``path``, flushed by :func:`flush_events` and at exit."""
+    # путь относительный: процесс (и тесты) может сменить текущий каталог
+    key = os.path.abspath(path)
+    writer = _writers.get(key)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(key)
+            if writer is None:
+                writer = _writers[key] = JsonlWriter(
+                    key,
+                    flush_interval_s=_env_float("TELEMETRY_FLUSH_S", 1.0),
+                    max_bytes=int(_env_float("TELEMETRY_MAX_MB", 10) * 1024 * 1024),
+                )
+    return writer
+
+
 def log_event(name: str, payload: dict) -> None:
-    """Append a telemetry event as JSON line.
+    """Append a telemetry event as JSON line (buffered, see :func:`flush_events`).
 
     Args:
         name: Event name.
         payload: Event payload dictionary.
     """
-    path = Path("var/telemetry/events.jsonl")
-    path.parent.mkdir(parents=True, exist_ok=True)
-    record = {"name": name, "payload": _filter_payload(payload)}
-    with path.open("a", encoding="utf-8") as f:
-        json.dump(record, f, ensure_ascii=False)
-        f.write("\n")
+    record = {"ts": round(time.time(), 3), "name": name, "payload": _filter_payload(payload)}
+    writer_for(EVENTS_PATH).write(record)
+
+
+def flush_events() -> None:
+    """Write all buffered events (and spans, see :func:`writer_for`) to disk."""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.flush()
+
+
+@atexit.register
+def _close_all() -> None:
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()
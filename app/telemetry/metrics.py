@@ -0,0 +1,491 @@
+"""In-process metrics: counters, gauges and latency histograms.
+
+Everything that used to be visible only as ``lat_ms`` in log lines is also
+recorded here: MCP tools (:func:`app.tool_logging.log_tool`), every HTTP
+attempt of :func:`app.net.http.request_json` and SSE streams (per provider),
+the requests in flight per provider, and every pipeline step (``text.*``,
+``lesson.make_card``, ``anki.*``, ``worker.job`` and the ``dag.*`` stages of
+a card).
+
+:class:`Histogram` keeps HDR-style log-linear buckets: 16 sub-buckets per
+power of two, so a percentile is off by at most ~6 % while memory stays
+constant however many values are observed.  Percentiles cover a sliding
+window of the last one to two ``METRICS_WINDOW_S`` (60 s by default; ``0`` —
+since start), so they follow changes of concurrency in real time; counts and
+sums are cumulative, as Prometheus expects.  Each series also remembers the
+trace id of its slowest value in the window (``slowest_trace`` in the JSON
+snapshot, see :mod:`app.telemetry.tracing`), so a bad p99 leads straight to
+the trace that caused it.
+
+The registry is rendered in the Prometheus text format by :func:`render` and
+served at ``/metrics`` by :class:`MetricsServer` (``METRICS_PORT``); the same
+numbers as JSON come from :func:`metrics_snapshot` (``/metrics.json`` and the
+MCP tool ``server.metrics``).
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .tracing import current_ids
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsServer",
+    "Registry",
+    "REGISTRY",
+    "Usage",
+    "add_usage",
+    "metrics_snapshot",
+    "observe_step",
+    "render",
+    "start_metrics_server",
+    "usage_scope",
+]
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "lang_assistant_"
+QUANTILES = (0.5, 0.95, 0.99)
+SUB_BUCKETS = 16
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _plain(key: LabelKey) -> str:
+    return ",".join(f"{k}={v}" for k, v in key)
+
+
+def _number(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(round(value, 3))
+
+
+class _Family:
+    """Metric with children per label set."""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values: Dict[LabelKey, Any] = {}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def _header(self, name: str) -> List[str]:
+        return [f"# HELP {name} {self.help}", f"# TYPE {name} {self.kind}"]
+
+
+class Counter(_Family):
+    """Monotonic count per label set."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(_key(labels), 0)
+
+    def render(self, prefix: str) -> List[str]:
+        name = prefix + self.name
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header(name) + [f"{name}{_labels(k)} {_number(v)}" for k, v in items]
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {_plain(k): v for k, v in sorted(self._values.items())}
+
+
+class Gauge(Counter):
+    """Value that goes up and down (requests in flight, queue length)."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+def _bucket(value: float) -> int:
+    """Log-linear bucket index: 16 linear sub-buckets per power of two."""
+    if value < 1:
+        return int(max(value, 0.0) * SUB_BUCKETS)
+    mantissa, exp = math.frexp(value)  # value = mantissa * 2**exp, 0.5 <= mantissa < 1
+    return SUB_BUCKETS * exp + int((mantissa * 2 - 1) * SUB_BUCKETS)
+
+
+def _bucket_high(index: int) -> float:
+    """Upper edge of bucket ``index``."""
+    if index < SUB_BUCKETS:
+        return (index + 1) / SUB_BUCKETS
+    exp, sub = divmod(index, SUB_BUCKETS)
+    return math.ldexp(1 + (sub + 1) / SUB_BUCKETS, exp - 1)
+
+
+class _Series:
+    """Buckets of one label set: the current and the previous window."""
+
+    __slots__ = (
+        "count",
+        "sum",
+        "max",
+        "current",
+        "previous",
+        "rotated",
+        "slowest",
+        "slowest_prev",
+    )
+
+    def __init__(self, now: float) -> None:
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.current: Dict[int, int] = {}
+        self.previous: Dict[int, int] = {}
+        self.rotated = now
+        # (value, trace_id) самого медленного значения в окне
+        self.slowest: Tuple[float, str] = (0.0, "-")
+        self.slowest_prev: Tuple[float, str] = (0.0, "-")
+
+    def rotate(self, now: float, window: float) -> None:
+        if window <= 0 or now - self.rotated < window:
+            return
+        # окно целиком пропущено — старые значения уже не «текущие»
+        if now - self.rotated < 2 * window:
+            self.previous, self.slowest_prev = self.current, self.slowest
+        else:
+            self.previous, self.slowest_prev = {}, (0.0, "-")
+        self.current = {}
+        self.slowest = (0.0, "-")
+        self.rotated = now
+
+    def slowest_trace(self) -> str:
+        return max(self.slowest, self.slowest_prev)[1]
+
+    def quantiles(self, qs: Tuple[float, ...]) -> Dict[float, float]:
+        merged = dict(self.previous)
+        for index, n in self.current.items():
+            merged[index] = merged.get(index, 0) + n
+        total = sum(merged.values())
+        out = {q: 0.0 for q in qs}
+        if not total:
+            return out
+        seen = 0
+        pending = sorted(qs)
+        for index in sorted(merged):
+            seen += merged[index]
+            while pending and seen >= pending[0] * total:
+                out[pending.pop(0)] = min(_bucket_high(index), self.max)
+            if not pending:
+                break
+        return out
+
+
+class Histogram(_Family):
+    """Latency distribution per label set with windowed percentiles."""
+
+    kind = "summary"
+
+    def __init__(self, name: str, help: str, window_s: Optional[float] = None) -> None:
+        super().__init__(name, help)
+        self.window_s = window_s
+
+    def _window(self) -> float:
+        if self.window_s is not None:
+            return self.window_s
+        return _env_float("METRICS_WINDOW_S", 60)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _key(labels)
+        now = time.monotonic()
+        window = self._window()
+        trace_id = current_ids()[0]
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = _Series(now)
+            series.rotate(now, window)
+            series.count += 1
+            series.sum += value
+            series.max = max(series.max, value)
+            if value >= series.slowest[0]:
+                series.slowest = (value, trace_id)
+            index = _bucket(value)
+            series.current[index] = series.current.get(index, 0) + 1
+
+    def _collect(self) -> List[Tuple[LabelKey, _Series, Dict[float, float]]]:
+        now = time.monotonic()
+        window = self._window()
+        with self._lock:
+            out = []
+            for key, series in sorted(self._values.items()):
+                series.rotate(now, window)
+                out.append((key, series, series.quantiles(QUANTILES)))
+            return out
+
+    def quantile(self, q: float, **labels: Any) -> float:
+        with self._lock:
+            series = self._values.get(_key(labels))
+            return series.quantiles((q,))[q] if series is not None else 0.0
+
+    def render(self, prefix: str) -> List[str]:
+        name = prefix + self.name
+        lines = self._header(name)
+        for key, series, quantiles in self._collect():
+            for q, value in quantiles.items():
+                lines.append(f"{name}{_labels(key, (('quantile', str(q)),))} {_number(value)}")
+            lines.append(f"{name}_sum{_labels(key)} {_number(series.sum)}")
+            lines.append(f"{name}_count{_labels(key)} {series.count}")
+        return lines
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for key, series, quantiles in self._collect():
+            count = series.count
+            entry: Dict[str, Any] = {
+                "count": count,
+                "mean": round(series.sum / count, 1) if count else 0.0,
+            }
+            for q, value in quantiles.items():
+                entry[f"p{int(q * 100)}"] = round(value, 1)
+            entry["slowest_trace"] = series.slowest_trace()
+            out[_plain(key)] = entry
+        return out
+
+
+class Registry:
+    """Named metric families, rendered in the Prometheus text format."""
+
+    def __init__(self, prefix: str = PREFIX) -> None:
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._families: Dict[str, _Family] = {}
+
+    def _get(self, cls: type, name: str, help: str, **kwargs: Any) -> Any:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = cls(name, help, **kwargs)
+            elif not isinstance(family, cls):
+                raise ValueError(f"metric {name!r} is already a {family.kind}")
+            return family
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name: str, help: str, window_s: Optional[float] = None) -> Histogram:
+        return self._get(Histogram, name, help, window_s=window_s)
+
+    def render(self) -> str:
+        with self._lock:
+            families = sorted(self._families.values(), key=lambda f: f.name)
+        lines: List[str] = []
+        for family in families:
+            lines.extend(family.render(self.prefix))
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            families = sorted(self._families.values(), key=lambda f: f.name)
+        return {f.name: f.snapshot() for f in families}
+
+    def reset(self) -> None:
+        with self._lock:
+            families = list(self._families.values())
+        for family in families:
+            family.clear()
+
+
+REGISTRY = Registry()
+
+TOOL_CALLS = REGISTRY.counter("tool_calls_total", "MCP tool calls by tool and status.")
+TOOL_LATENCY = REGISTRY.histogram("tool_latency_ms", "MCP tool latency in milliseconds.")
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP attempts by provider and status code (or error kind)."
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_latency_ms", "Latency of one HTTP attempt in milliseconds, by provider."
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_in_flight", "HTTP requests in flight, by provider.")
+STEP_LATENCY = REGISTRY.histogram(
+    "step_latency_ms", "Latency of pipeline steps in milliseconds, by step."
+)
+STEP_ERRORS = REGISTRY.counter("step_errors_total", "Failed pipeline steps, by step.")
+
+
+def observe_step(step: str, lat_ms: float, ok: bool = True) -> None:
+    """Record one pipeline step (the same ``step`` name as in the logs)."""
+    STEP_LATENCY.observe(lat_ms, step=step)
+    if not ok:
+        STEP_ERRORS.inc(step=step)
+
+
+class Usage:
+    """Counts of billable work (successful requests per provider) of one card."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: Dict[str, float] = {}
+
+    def add(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + amount
+
+    def counts(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._counts)
+
+
+_usage: contextvars.ContextVar[Optional[Usage]] = contextvars.ContextVar("usage", default=None)
+
+
+@contextmanager
+def usage_scope() -> Iterator[Usage]:
+    """Collect :func:`add_usage` calls of the block (and of its stage threads)."""
+    usage = Usage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def add_usage(key: str, amount: float = 1) -> None:
+    usage = _usage.get()
+    if usage is not None:
+        usage.add(key, amount)
+
+
+def render() -> str:
+    """The default registry in the Prometheus text format."""
+    return REGISTRY.render()
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    """The default registry as JSON: counts and p50/p95/p99 per label set."""
+    return REGISTRY.snapshot()
+
+
+class MetricsServer:
+    """Serve ``GET /metrics`` (Prometheus) and ``/metrics.json`` on ``host:port``."""
+
+    def __init__(self, host: str, port: int, registry: Registry = REGISTRY) -> None:
+        self.registry = registry
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server API
+                path = self.path.split("?", 1)[0].rstrip("/")
+                if path == "/metrics":
+                    body = server.registry.render().encode("utf-8")
+                    ctype = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(server.registry.snapshot()).encode("utf-8")
+                    ctype = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug(format, *args, extra={"step": "metrics.http"})
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> tuple:
+        return self._httpd.server_address[:2]
+
+    def start(self) -> "MetricsServer":
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._httpd.serve_forever, name="metrics", daemon=True
+            )
+            self._thread.start()
+            logger.info("listening on %s:%s", *self.address, extra={"step": "metrics.http"})
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread = None
+        self._httpd.server_close()
+
+
+_server: Optional[MetricsServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server() -> Optional[MetricsServer]:
+    """Start the ``/metrics`` endpoint if ``METRICS_PORT`` is set (once per process)."""
+    global _server
+    port = int(_env_float("METRICS_PORT", 0))
+    if port <= 0:
+        return None
+    with _server_lock:
+        if _server is None:
+            host = os.environ.get("METRICS_HOST", "127.0.0.1")
+            try:
+                _server = MetricsServer(host, port).start()
+            except OSError:
+                # порт занят (второй процесс) — метрики не повод падать
+                logger.warning(
+                    "cannot listen on %s:%s", host, port, exc_info=True,
+                    extra={"step": "metrics.http"},
+                )
+                return None
+        return _server
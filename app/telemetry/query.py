@@ -0,0 +1,603 @@
+"""Read, filter and roll up telemetry events without loading the file.
+
+The event files (:mod:`app.telemetry.jsonl`: ``events.jsonl`` and its
+rotated ``events.jsonl.1`` …) are read line by line, so memory stays
+constant however large they are:
+
+* :func:`iter_events` yields events by name and time window; the start of the
+  window is found by a binary search over byte offsets (events are appended in
+  time order), so ``--since 15m`` of a big file reads only the last minutes;
+* :func:`tail` reads blocks from the end of the file, :func:`follow` waits
+  for new lines and survives rotation;
+* :class:`Rollup` aggregates per-step latency percentiles (the log-linear
+  buckets of :mod:`app.telemetry.metrics`, mergeable), error rates and, for
+  ``card`` events, provider requests and cost per card;
+* :func:`write_daily_rollups` keeps one compact ``YYYY-MM-DD.json`` per UTC
+  day, which :func:`load_rollups` merges, so weeks of history are queried
+  without the raw events (those rotate away).
+
+Cost is counted from successful provider requests: the pipeline does not see
+token usage, so prices are per request (``TELEMETRY_PRICES``).
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .jsonl import EVENTS_PATH
+from .metrics import _bucket, _bucket_high
+
+__all__ = [
+    "DAILY_DIR",
+    "Digest",
+    "Rollup",
+    "event_files",
+    "follow",
+    "iter_events",
+    "load_rollups",
+    "parse_prices",
+    "parse_time",
+    "prices_from_env",
+    "tail",
+    "write_daily_rollups",
+]
+
+DAILY_DIR = EVENTS_PATH.parent / "daily"
+
+# ts берётся до записи в буфер, так что соседние строки бывают не по порядку
+TIME_SLACK_S = 5.0
+
+_BLOCK = 64 * 1024
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_time(value: str, now: Optional[float] = None) -> float:
+    """Unix time from ``"15m"``/``"2h"``/``"7d"`` (ago), an ISO date or a number.
+
+    Dates without a timezone are UTC.
+    """
+    value = value.strip()
+    match = _DURATION.match(value)
+    if match:
+        ago = float(match.group(1)) * _UNITS[match.group(2)]
+        return (time.time() if now is None else now) - ago
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"bad time: {value!r} (expected 15m, 2h, 7d or an ISO date)")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds")
+
+
+def event_files(path: Path | str = EVENTS_PATH, rotated: bool = True) -> List[Path]:
+    """``path`` and (with ``rotated``) its existing backups, oldest first."""
+    path = Path(path)
+    files: List[Path] = []
+    if rotated:
+        i = 1
+        while path.with_name(f"{path.name}.{i}").exists():
+            files.insert(0, path.with_name(f"{path.name}.{i}"))
+            i += 1
+    if path.exists():
+        files.append(path)
+    return files
+
+
+def _parse(line: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None  # оборванная строка: файл дописывается прямо сейчас
+    return event if isinstance(event, dict) else None
+
+
+def _ts(event: Optional[Dict[str, Any]]) -> Optional[float]:
+    ts = event.get("ts") if event else None
+    return ts if isinstance(ts, (int, float)) else None
+
+
+def _first_ts_after(f: IO[bytes], pos: int) -> Tuple[int, Optional[float]]:
+    """Offset and ``ts`` of the first whole event line at or after ``pos``."""
+    if pos > 0:
+        f.seek(pos - 1)
+        f.readline()  # хвост строки, в которую попали
+    else:
+        f.seek(0)
+    while True:
+        start = f.tell()
+        line = f.readline()
+        if not line:
+            return start, None
+        ts = _ts(_parse(line))
+        if ts is not None:
+            return start, ts
+
+
+def _seek_since(f: IO[bytes], since: float) -> None:
+    target = since - TIME_SLACK_S
+    lo, hi = 0, f.seek(0, os.SEEK_END)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        _, ts = _first_ts_after(f, mid)
+        if ts is None or ts >= target:
+            hi = mid
+        else:
+            lo = mid + 1
+    start, _ = _first_ts_after(f, lo)
+    f.seek(start)
+
+
+def _matches(
+    event: Dict[str, Any],
+    names: Optional[Iterable[str]],
+    since: Optional[float],
+    until: Optional[float],
+) -> bool:
+    if names is not None and event.get("name") not in names:
+        return False
+    if since is None and until is None:
+        return True
+    ts = _ts(event)
+    if ts is None:
+        return False  # события без ts (старые файлы) в окно не попадают
+    return (since is None or ts >= since) and (until is None or ts < until)
+
+
+def iter_events(
+    path: Path | str = EVENTS_PATH,
+    *,
+    names: Optional[Iterable[str]] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    rotated: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """Events of ``path`` (and its backups) in file order, one line in memory at a time.
+
+    Args:
+        path: The current event file.
+        names: Only events with one of these names.
+        since: Unix time, inclusive.
+        until: Unix time, exclusive.
+        rotated: Also read ``events.jsonl.N`` backups.
+    """
+    wanted = set(names) if names is not None else None
+    for file in event_files(path, rotated):
+        try:
+            f = file.open("rb")
+        except FileNotFoundError:
+            continue  # ротировали между поиском и открытием
+        with f:
+            if since is not None:
+                _seek_since(f, since)
+            for line in f:
+                event = _parse(line)
+                if event is None:
+                    continue
+                ts = _ts(event)
+                if until is not None and ts is not None and ts >= until + TIME_SLACK_S:
+                    return
+                if _matches(event, wanted, since, until):
+                    yield event
+
+
+def _reverse_lines(f: IO[bytes]) -> Iterator[bytes]:
+    pos = f.seek(0, os.SEEK_END)
+    rest = b""
+    while pos > 0:
+        size = min(_BLOCK, pos)
+        pos -= size
+        f.seek(pos)
+        lines = (f.read(size) + rest).split(b"\n")
+        rest = lines.pop(0)  # начало строки — в предыдущем блоке
+        for line in reversed(lines):
+            if line:
+                yield line
+    if rest:
+        yield rest
+
+
+def tail(
+    path: Path | str = EVENTS_PATH, n: int = 10, *, names: Optional[Iterable[str]] = None
+) -> List[Dict[str, Any]]:
+    """The last ``n`` events (of ``names``), oldest first; the file is read from the end."""
+    wanted = set(names) if names is not None else None
+    out: List[Dict[str, Any]] = []
+    if n <= 0:
+        return out
+    for file in reversed(event_files(path)):
+        with file.open("rb") as f:
+            for line in _reverse_lines(f):
+                event = _parse(line)
+                if event is not None and _matches(event, wanted, None, None):
+                    out.append(event)
+                    if len(out) >= n:
+                        return out[::-1]
+    return out[::-1]
+
+
+def follow(
+    path: Path | str = EVENTS_PATH,
+    *,
+    names: Optional[Iterable[str]] = None,
+    poll_s: float = 0.5,
+    stop: Callable[[], bool] = lambda: False,
+) -> Iterator[Dict[str, Any]]:
+    """New events appended to ``path`` (like ``tail -F``) until ``stop()``."""
+    path = Path(path)
+    wanted = set(names) if names is not None else None
+    f: Optional[IO[bytes]] = None
+    inode = None
+    rest = b""
+    from_end = True  # первый раз — только новые строки
+    try:
+        while not stop():
+            if f is None and path.exists():
+                f = path.open("rb")
+                inode = os.fstat(f.fileno()).st_ino
+                if from_end:
+                    f.seek(0, os.SEEK_END)
+            if f is None:
+                time.sleep(poll_s)
+                continue
+            chunk = f.read()
+            if chunk:
+                lines = (rest + chunk).split(b"\n")
+                rest = lines.pop()
+                for line in lines:
+                    event = _parse(line)
+                    if event is not None and _matches(event, wanted, None, None):
+                        yield event
+                continue
+            try:
+                rotated = os.stat(path).st_ino != inode
+            except FileNotFoundError:
+                rotated = True
+            if rotated:
+                # старый файл дочитан — новый читаем с начала
+                f.close()
+                f, rest, from_end = None, b"", False
+                continue
+            time.sleep(poll_s)
+    finally:
+        if f is not None:
+            f.close()
+
+
+class Digest:
+    """Mergeable latency distribution: the log-linear buckets of the metrics histograms."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        index = _bucket(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other: "Digest") -> None:
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= q * self.count:
+                return min(_bucket_high(index), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "max": self.max,
+            "buckets": {str(i): n for i, n in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Digest":
+        digest = cls()
+        digest.counts = {int(i): n for i, n in data.get("buckets", {}).items()}
+        digest.count = data.get("count", 0)
+        digest.sum = data.get("sum", 0.0)
+        digest.max = data.get("max", 0.0)
+        return digest
+
+
+class _Step:
+    __slots__ = ("latency", "errors")
+
+    def __init__(self) -> None:
+        self.latency = Digest()
+        self.errors = 0
+
+
+class Rollup:
+    """Aggregates of a stream of events; rollups of different days merge.
+
+    A ``card`` event counts as the ``lesson.make_card`` step plus one
+    ``dag.<stage>`` step per stage of the card; any other event with a
+    numeric ``lat_ms`` counts as its ``step`` (or its name).
+    """
+
+    def __init__(self) -> None:
+        self.events: Dict[str, int] = {}
+        self.steps: Dict[str, _Step] = {}
+        self.cards = 0
+        self.card_errors = 0
+        self.requests: Dict[str, float] = {}
+        self.first_ts: Optional[float] = None
+        self.last_ts: Optional[float] = None
+
+    def _step(self, name: str, lat_ms: Any, ok: bool) -> None:
+        step = self.steps.get(name)
+        if step is None:
+            step = self.steps[name] = _Step()
+        if isinstance(lat_ms, (int, float)):
+            step.latency.add(lat_ms)
+        if not ok:
+            step.errors += 1
+
+    def add(self, event: Dict[str, Any]) -> None:
+        name = str(event.get("name"))
+        payload = event.get("payload") or {}
+        self.events[name] = self.events.get(name, 0) + 1
+        ts = _ts(event)
+        if ts is not None:
+            self.first_ts = ts if self.first_ts is None else min(self.first_ts, ts)
+            self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+        ok = bool(payload.get("ok", True)) and not payload.get("error")
+        if name == "card":
+            self.cards += 1
+            self.card_errors += not ok
+            self._step("lesson.make_card", payload.get("lat_ms"), ok)
+            for stage, lat_ms in (payload.get("stages") or {}).items():
+                self._step(f"dag.{stage}", lat_ms, True)
+            for provider, n in (payload.get("requests") or {}).items():
+                self.requests[provider] = self.requests.get(provider, 0) + n
+        elif isinstance(payload.get("lat_ms"), (int, float)):
+            self._step(str(payload.get("step") or name), payload["lat_ms"], ok)
+
+    def merge(self, other: "Rollup") -> None:
+        for name, n in other.events.items():
+            self.events[name] = self.events.get(name, 0) + n
+        for name, theirs in other.steps.items():
+            step = self.steps.get(name)
+            if step is None:
+                step = self.steps[name] = _Step()
+            step.latency.merge(theirs.latency)
+            step.errors += theirs.errors
+        self.cards += other.cards
+        self.card_errors += other.card_errors
+        for provider, n in other.requests.items():
+            self.requests[provider] = self.requests.get(provider, 0) + n
+        for ts in (other.first_ts, other.last_ts):
+            if ts is not None:
+                self.first_ts = ts if self.first_ts is None else min(self.first_ts, ts)
+                self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+
+    def summary(self, prices: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Percentiles (ms), error rates, requests and cost per card."""
+        steps = {}
+        for name in sorted(self.steps):
+            step = self.steps[name]
+            count = max(step.latency.count, step.errors)
+            steps[name] = {
+                "count": count,
+                "errors": step.errors,
+                "error_rate": round(step.errors / count, 4) if count else 0.0,
+                "mean": round(step.latency.sum / step.latency.count, 1)
+                if step.latency.count
+                else 0.0,
+                **{f"p{q}": round(step.latency.quantile(q / 100), 1) for q in (50, 95, 99)},
+                "max": step.latency.max,
+            }
+        cards: Dict[str, Any] = {
+            "count": self.cards,
+            "errors": self.card_errors,
+            "error_rate": round(self.card_errors / self.cards, 4) if self.cards else 0.0,
+            "requests_per_card": {
+                p: round(n / self.cards, 3) for p, n in sorted(self.requests.items())
+            }
+            if self.cards
+            else {},
+        }
+        if prices is not None:
+            cost = sum(n * prices.get(p, 0.0) for p, n in self.requests.items())
+            cards["cost"] = round(cost, 6)
+            cards["cost_per_card"] = round(cost / self.cards, 6) if self.cards else 0.0
+            cards["unpriced"] = sorted(p for p in self.requests if p not in prices)
+        return {
+            "from": _iso(self.first_ts),
+            "to": _iso(self.last_ts),
+            "events": dict(sorted(self.events.items())),
+            "steps": steps,
+            "cards": cards,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "events": self.events,
+            "cards": self.cards,
+            "card_errors": self.card_errors,
+            "requests": self.requests,
+            "steps": {
+                name: {"errors": s.errors, "latency": s.latency.to_dict()}
+                for name, s in sorted(self.steps.items())
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Rollup":
+        rollup = cls()
+        rollup.first_ts = data.get("first_ts")
+        rollup.last_ts = data.get("last_ts")
+        rollup.events = dict(data.get("events", {}))
+        rollup.cards = data.get("cards", 0)
+        rollup.card_errors = data.get("card_errors", 0)
+        rollup.requests = dict(data.get("requests", {}))
+        for name, s in data.get("steps", {}).items():
+            step = rollup.steps[name] = _Step()
+            step.errors = s.get("errors", 0)
+            step.latency = Digest.from_dict(s.get("latency", {}))
+        return rollup
+
+    @classmethod
+    def of(cls, events: Iterable[Dict[str, Any]]) -> "Rollup":
+        rollup = cls()
+        for event in events:
+            rollup.add(event)
+        return rollup
+
+
+def prices_from_env() -> Dict[str, float]:
+    """``TELEMETRY_PRICES=api.openai.com=0.002,api.elevenlabs.io=0.01`` — per request."""
+    return parse_prices(os.environ.get("TELEMETRY_PRICES", "").split(","))
+
+
+def parse_prices(items: Iterable[str]) -> Dict[str, float]:
+    prices: Dict[str, float] = {}
+    for item in items:
+        provider, sep, price = item.strip().partition("=")
+        if not sep:
+            continue
+        try:
+            prices[provider.strip()] = float(price)
+        except ValueError:
+            raise ValueError(f"bad price: {item!r} (expected provider=price)")
+    return prices
+
+
+def _write_day(out_dir: Path, day: str, rollup: Rollup, until: Optional[float]) -> None:
+    path = out_dir / f"{day}.json"
+    tmp = path.with_name(path.name + ".tmp")
+    data = {"day": day, "until": until, "rollup": rollup.to_dict(), "summary": rollup.summary()}
+    tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)  # читатель не увидит файл наполовину
+
+
+def _daily_files(out_dir: Path) -> List[Path]:
+    return sorted(out_dir.glob("????-??-??.json"))
+
+
+def _covers(path: Path | str, ts: float) -> bool:
+    """Do the raw event files still hold every event since ``ts``?"""
+    files = event_files(path)
+    if not files:
+        return False
+    with files[0].open("rb") as f:
+        _, first = _first_ts_after(f, 0)
+    return first is not None and first < ts
+
+
+def _read_day(out_dir: Path, day: str) -> Tuple[Rollup, Optional[float]]:
+    data = json.loads((out_dir / f"{day}.json").read_text(encoding="utf-8"))
+    return Rollup.from_dict(data["rollup"]), data.get("until")
+
+
+def write_daily_rollups(
+    path: Path | str = EVENTS_PATH, out_dir: Path | str = DAILY_DIR
+) -> List[str]:
+    """Roll the events up into ``out_dir/YYYY-MM-DD.json`` (UTC days); return the days written.
+
+    Incremental: days before the newest existing file are kept as they are
+    (their raw events may already be rotated away), later days are built
+    from scratch.  The newest one — usually the unfinished «today» of the
+    previous run — is rebuilt if the raw files still reach back to its
+    start; otherwise only events after its ``until`` (the last ``ts`` it
+    counted) are merged into it.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    existing = _daily_files(out_dir)
+    since = parse_time(existing[-1].stem) if existing else None
+    pending: Dict[str, Rollup] = {}
+    last: Dict[str, Optional[float]] = {}
+    written: List[str] = []
+    # день, в который только дописываем: его начало уже ротировали
+    keep_day: Optional[str] = None
+    keep_until = float("-inf")
+    if since is not None and not _covers(path, since):
+        keep_day = existing[-1].stem
+        _, until = _read_day(out_dir, keep_day)
+        # файл старого формата: не знаем, что уже учтено, — день не трогаем
+        keep_until = until if until is not None else float("inf")
+
+    def flush(day: str) -> None:
+        rollup, until = pending.pop(day), last.pop(day)
+        if day not in written:
+            written.append(day)
+        _write_day(out_dir, day, rollup, until)
+
+    for event in iter_events(path, since=since):
+        ts = _ts(event)
+        if ts is None:
+            continue
+        day = _day(ts)
+        if day == keep_day and ts <= keep_until:
+            continue  # уже в файле дня
+        if day not in pending:
+            if day == keep_day or day in written:
+                # дописываем к файлу: запоздавшее событие или день без начала
+                pending[day], last[day] = _read_day(out_dir, day)
+            else:
+                pending[day], last[day] = Rollup(), None
+        pending[day].add(event)
+        last[day] = max(ts, last[day] or ts)
+        # в памяти — не больше пары дней: соседние строки на стыке суток
+        while len(pending) > 2:
+            flush(min(pending))
+    for day in sorted(pending):
+        flush(day)
+    return written
+
+
+def load_rollups(
+    out_dir: Path | str = DAILY_DIR, *, since: Optional[float] = None, until: Optional[float] = None
+) -> Rollup:
+    """Merge the daily files of the days that overlap ``[since, until)``."""
+    first = _day(since) if since is not None else None
+    last = _day(until - 0.001) if until is not None else None
+    total = Rollup()
+    for file in _daily_files(Path(out_dir)):
+        day = file.stem
+        if (first and day < first) or (last and day > last):
+            continue
+        data = json.loads(file.read_text(encoding="utf-8"))
+        total.merge(Rollup.from_dict(data["rollup"]))
+    return total
@@ -0,0 +1,247 @@
+"""Trace and span ids for the card pipeline.
+
+The current span lives in a :class:`~contextvars.ContextVar`, so it follows
+asyncio tasks (and ``asyncio.to_thread``) by itself; work handed to a thread
+pool must run in ``contextvars.copy_context().run``, as the DAG runner,
+hedged and batched LLM requests and the bot do.  Every log record gets
+``trace_id``/``span_id``/``run_id`` of the current span
+(:class:`app.logging.ContextFilter`) and every latency histogram remembers the
+trace of its slowest value (:mod:`app.telemetry.metrics`), so a slow card
+can be followed hop by hop: tool or bot handler → ``lesson.make_card`` →
+``dag.<stage>`` → ``net.http`` (one span per HTTP attempt).
+
+With ``TRACE_EXPORT_PATH`` set, finished spans are appended to that file as
+JSON lines in the OTLP/JSON format (one ``ExportTraceServiceRequest`` per
+line), which the OpenTelemetry Collector ``otlpjsonfile`` receiver and most
+trace viewers read as is.  Spans go through the same buffered
+:class:`~app.telemetry.jsonl.JsonlWriter` as telemetry events, so a span costs
+a list append, not a file open.
+"""
+from __future__ import annotations
+
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .jsonl import writer_for
+
+__all__ = [
+    "JsonlSpanExporter",
+    "Span",
+    "current_ids",
+    "current_span",
+    "record_span",
+    "set_exporter",
+    "span",
+    "traced",
+]
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "mcp-language-assistant"
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "span", default=None
+)
+# ids не секретны — хватает быстрого генератора
+_random = random.Random()
+
+
+def _new_id(bits: int) -> str:
+    return f"{_random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """One timed operation; ``trace_id`` and ``run_id`` are inherited from the parent."""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "run_id",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        parent: Optional["Span"] = None,
+        *,
+        run_id: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+        start_ns: Optional[int] = None,
+    ) -> None:
+        self.name = name
+        self.trace_id = parent.trace_id if parent else _new_id(128)
+        self.span_id = _new_id(64)
+        self.parent_id = parent.span_id if parent else None
+        self.run_id = run_id or (parent.run_id if parent else None)
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def finish(self, end_ns: Optional[int] = None) -> None:
+        self.end_ns = end_ns if end_ns is not None else time.time_ns()
+        _export(self)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_ids() -> Tuple[str, str, str]:
+    """``(trace_id, span_id, run_id)`` of the current span, ``"-"`` outside of one."""
+    sp = _current.get()
+    if sp is None:
+        return "-", "-", "-"
+    return sp.trace_id, sp.span_id, sp.run_id or "-"
+
+
+@contextmanager
+def span(name: str, *, run_id: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    """Run the block as a child span of the current one (or as a new trace)."""
+    sp = Span(name, _current.get(), run_id=run_id, attributes=attributes)
+    token = _current.set(sp)
+    try:
+        yield sp
+    except BaseException as exc:
+        sp.error = type(exc).__name__
+        raise
+    finally:
+        _current.reset(token)
+        sp.finish()
+
+
+def record_span(
+    name: str, start: float, *, error: Optional[str] = None, **attributes: Any
+) -> Span:
+    """Finished child span for work that started at ``start`` (``perf_counter``)."""
+    now_ns = time.time_ns()
+    start_ns = now_ns - int((time.perf_counter() - start) * 1e9)
+    sp = Span(name, _current.get(), attributes=attributes, start_ns=start_ns)
+    sp.error = error
+    sp.finish(now_ns)
+    return sp
+
+
+def traced(name: str) -> Callable:
+    """Decorator: every call of the function (sync or async) is a span."""
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}  # int64 в OTLP/JSON — строкой
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(values: Dict[str, Any]) -> list:
+    return [{"key": k, "value": _value(v)} for k, v in values.items() if v is not None]
+
+
+class JsonlSpanExporter:
+    """Append finished spans to ``path``, one OTLP/JSON request per line (buffered)."""
+
+    def __init__(self, path: Path | str, service: str = SERVICE_NAME) -> None:
+        self.path = Path(path)
+        self.service = service
+        self._writer = writer_for(self.path)
+
+    def to_otlp(self, sp: Span) -> Dict[str, Any]:
+        attributes = dict(sp.attributes)
+        if sp.run_id:
+            attributes["run_id"] = sp.run_id
+        if sp.error:
+            attributes["error.type"] = sp.error
+        otlp_span: Dict[str, Any] = {
+            "traceId": sp.trace_id,
+            "spanId": sp.span_id,
+            "name": sp.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(sp.start_ns),
+            "endTimeUnixNano": str(sp.end_ns),
+            "attributes": _attributes(attributes),
+            "status": {"code": 2 if sp.error else 1},
+        }
+        if sp.parent_id:
+            otlp_span["parentSpanId"] = sp.parent_id
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": _attributes({"service.name": self.service})},
+                    "scopeSpans": [{"scope": {"name": "app"}, "spans": [otlp_span]}],
+                }
+            ]
+        }
+
+    def export(self, sp: Span) -> None:
+        self._writer.write(self.to_otlp(sp))
+
+    def flush(self) -> None:
+        self._writer.flush()
+
+
+_UNSET: Any = object()
+_exporter: Any = _UNSET
+
+
+def set_exporter(exporter: Optional[JsonlSpanExporter]) -> None:
+    """Replace the span exporter (``None`` — spans are not written anywhere)."""
+    global _exporter
+    _exporter = exporter
+
+
+def _export(sp: Span) -> None:
+    global _exporter
+    if _exporter is _UNSET:
+        # файл из окружения берём при первом спане: .env к этому времени уже загружен
+        path = os.environ.get("TRACE_EXPORT_PATH", "")
+        _exporter = JsonlSpanExporter(path) if path else None
+    if _exporter is None:
+        return
+    try:
+        _exporter.export(sp)
+    except OSError:
+        logger.warning("span export failed", exc_info=True, extra={"step": "telemetry.trace"})
@@ -7,6 +7,9 @@ import traceback
 from functools import wraps
 from typing import Any, Callable, Iterable
 
+from app.telemetry.metrics import TOOL_CALLS, TOOL_LATENCY
+from app.telemetry.tracing import traced
+
 logger = logging.getLogger("mcp.tools")
 
 _DEFAULT_SENSITIVE = {"token", "password", "secret", "api_key", "key"}
@@ -25,7 +28,10 @@ def _filter_args(bound: inspect.BoundArguments, sensitive: set[str]) -> dict[str
 
 def _log(name: str, status: str, start: float, filtered: dict[str, Any], err: str = "") -> None:
     """Helper to log execution info in a consistent format."""
-    dur_ms = int((time.perf_counter() - start) * 1000)
+    lat_ms = (time.perf_counter() - start) * 1000
+    TOOL_CALLS.inc(tool=name, status=status)
+    TOOL_LATENCY.observe(lat_ms, tool=name)
+    dur_ms = int(lat_ms)
     msg = f"{name} {status} {dur_ms}ms"
     if err:
         logger.warning("%s %s", msg, err)
@@ -42,6 +48,8 @@ def log_tool(server: Any, name: str, *, sensitive_fields: Iterable[str] | None =
     def decorator(func: Callable):
         is_coro = inspect.iscoroutinefunction(func)
         sig = inspect.signature(func)
+        # вызов инструмента — корневой спан трассы
+        call = traced(f"tool.{name}")(func)
 
         if is_coro:
             @wraps(func)
@@ -50,7 +58,7 @@ def log_tool(server: Any, name: str, *, sensitive_fields: Iterable[str] | None =
                 filtered = _filter_args(bound, sensitive)
                 start = time.perf_counter()
                 try:
-                    result = await func(*args, **kwargs)
+                    result = await call(*args, **kwargs)
                 except Exception as exc:  # noqa: BLE001
                     _log(name, "err", start, filtered, str(exc).splitlines()[0])
                     raise
@@ -64,7 +72,7 @@ def log_tool(server: Any, name: str, *, sensitive_fields: Iterable[str] | None =
                 filtered = _filter_args(bound, sensitive)
                 start = time.perf_counter()
                 try:
-                    result = func(*args, **kwargs)
+                    result = call(*args, **kwargs)
                 except Exception as exc:  # noqa: BLE001
                     _log(name, "err", start, filtered, str(exc).splitlines()[0])
                     raise
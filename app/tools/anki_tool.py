@@ -24,14 +24,14 @@ def _invoke(action: str, **params):
     return out["result"]
 
 
-def add_basic_note(
+def basic_note(
     front: str,
     back: str,
     deck: str,
     tags: Optional[List[str]] = None,
     audio_path: Optional[str] = None,
-) -> int:
-    """Add a basic Anki note with optional audio attachment."""
+) -> dict:
+    """Build the AnkiConnect note dict for a basic note with optional audio."""
     tags = tags or []
     note = {
         "deckName": deck,
@@ -47,4 +47,15 @@ def add_basic_note(
                 "fields": ["Back"],
             }
         ]
-    return _invoke("addNote", note=note)
+    return note
+
+
+def add_basic_note(
+    front: str,
+    back: str,
+    deck: str,
+    tags: Optional[List[str]] = None,
+    audio_path: Optional[str] = None,
+) -> int:
+    """Add a basic Anki note with optional audio attachment."""
+    return _invoke("addNote", note=basic_note(front, back, deck, tags, audio_path))
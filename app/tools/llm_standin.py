@@ -0,0 +1,224 @@
+"""Stand-in OpenAI-compatible LLM server that replays recorded answers.
+
+Serves ``POST /v1/chat/completions`` (plain and ``"stream": true``) and
+``GET /v1/models`` from a JSON fixture file, so the text pipeline can be run
+and tested offline against ``TEXT_BACKEND=local``.  A fixture is a list of
+recorded exchanges::
+
+    [{"system": "Translate to ru. Output only the translation.",
+      "user": "Hund", "content": "собака"}]
+
+An answer is looked up by system prompt and last user message; ``system``
+may be omitted to match any prompt.  Unknown requests get ``404`` — or, with
+``--record URL``, are forwarded to a real OpenAI-compatible server and the
+answer is appended to the fixture file.
+
+    python -m app.tools.llm_standin --fixtures app/tools/llm_fixtures.json --port 8089
+    TEXT_BACKEND=local TEXT_LOCAL_BASE_URL=http://127.0.0.1:8089/v1 python cli/make_card.py --word Hund --lang de --deck Test --tag offline
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+__all__ = ["StandinServer", "load_fixtures"]
+
+DEFAULT_FIXTURES = Path(__file__).with_name("llm_fixtures.json")
+
+
+def load_fixtures(path: Path | str = DEFAULT_FIXTURES) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _prompt(messages: List[Dict[str, Any]]) -> tuple[Optional[str], str]:
+    system = next((m.get("content") for m in messages if m.get("role") == "system"), None)
+    user = next(
+        (m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), ""
+    )
+    return system, user
+
+
+class StandinServer:
+    """Threaded HTTP server answering from ``fixtures``; ``port=0`` picks a free port."""
+
+    def __init__(
+        self,
+        fixtures: List[Dict[str, Any]],
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        record_url: Optional[str] = None,
+        record_key: str = "",
+        fixtures_path: Optional[Path] = None,
+    ) -> None:
+        self.fixtures = list(fixtures)
+        self.record_url = record_url.rstrip("/") if record_url else None
+        self.record_key = record_key
+        self.fixtures_path = fixtures_path
+        # every request body seen, for assertions in tests
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def answer(self, messages: List[Dict[str, Any]], model: str = "") -> Optional[str]:
+        system, user = _prompt(messages)
+        with self._lock:
+            for entry in self.fixtures:
+                if entry.get("user") == user and entry.get("system", system) == system:
+                    return entry["content"]
+        if self.record_url is None:
+            return None
+        return self._record(messages, model, system, user)
+
+    def _record(
+        self, messages: List[Dict[str, Any]], model: str, system: Optional[str], user: str
+    ) -> str:
+        import requests
+
+        headers = {"Authorization": f"Bearer {self.record_key}"} if self.record_key else {}
+        resp = requests.post(
+            f"{self.record_url}/chat/completions",
+            json={"model": model, "messages": messages},
+            headers=headers,
+            timeout=120,
+        )
+        resp.raise_for_status()
+        content = resp.json()["choices"][0]["message"]["content"]
+        with self._lock:
+            self.fixtures.append({"system": system, "user": user, "content": content})
+            if self.fixtures_path is not None:
+                self.fixtures_path.write_text(
+                    json.dumps(self.fixtures, ensure_ascii=False, indent=2), encoding="utf-8"
+                )
+        return content
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:  # тихо, как и положено фикстуре
+                pass
+
+            def _json(self, status: int, body: Dict[str, Any]) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                if self.path.rstrip("/") == "/v1/models":
+                    self._json(200, {"object": "list", "data": [{"id": "standin"}]})
+                else:
+                    self._json(404, {"error": "not found"})
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests.append(body)
+                if self.path.rstrip("/") != "/v1/chat/completions":
+                    self._json(404, {"error": "not found"})
+                    return
+                content = server.answer(body.get("messages") or [], body.get("model", ""))
+                if content is None:
+                    self._json(404, {"error": "no recorded answer"})
+                elif body.get("stream"):
+                    self._stream(content)
+                else:
+                    self._json(
+                        200,
+                        {
+                            "object": "chat.completion",
+                            "model": body.get("model", "standin"),
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "message": {"role": "assistant", "content": content},
+                                    "finish_reason": "stop",
+                                }
+                            ],
+                        },
+                    )
+
+            def _stream(self, content: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                # по слову на событие, как настоящий сервер отдаёт токены
+                words = content.split(" ")
+                try:
+                    for i, word in enumerate(words):
+                        delta = word if i == len(words) - 1 else word + " "
+                        event = {"choices": [{"index": 0, "delta": {"content": delta}}]}
+                        self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # клиент закрыл поток раньше — так и задумано
+                self.close_connection = True
+
+        return Handler
+
+    def start(self) -> "StandinServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="llm-standin", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "StandinServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded LLM answers")
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--record", metavar="URL", help="Forward misses to this /v1 server")
+    parser.add_argument("--api-key", default="", help="Bearer token for --record")
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures.exists() else []
+    server = StandinServer(
+        fixtures,
+        host=args.host,
+        port=args.port,
+        record_url=args.record,
+        record_key=args.api_key,
+        fixtures_path=args.fixtures,
+    )
+    print(f"serving {len(fixtures)} answers on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover - manual execution only
+    raise SystemExit(main())
@@ -0,0 +1,219 @@
+"""Card worker: runs queued card pipelines.
+
+The bot (``BOT_ENQUEUE=true``) and the MCP tool ``jobs.enqueue_card`` only
+put jobs into :class:`~app.orchestration.jobs.JobQueue`; this process leases
+them and runs up to ``JOBS_WORKERS`` pipelines concurrently.  When a job is
+done (or dead-lettered) its producer is notified: a Telegram message for jobs
+with ``chat_id``, a JSON ``POST`` for jobs with ``callback_url`` (n8n).
+
+    python -m app.worker --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from . import log_effective_settings, setup_logging
+from .net.http import request_json
+from .orchestration.jobs import Job, JobQueue, get_job_queue
+from .settings import settings
+from .telemetry.metrics import observe_step, start_metrics_server
+from .telemetry.tracing import span
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Any]
+Notify = Callable[[Job], None]
+
+TELEGRAM_API = "https://api.telegram.org"
+
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def make_card_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Handler for ``make_card`` jobs."""
+    from .mcp_tools.lesson import make_card
+
+    result = make_card(
+        payload["word"],
+        payload.get("lang"),
+        payload.get("deck") or settings.ANKI_DECK,
+        payload.get("tag") or settings.ANKI_TAG,
+    )
+    return {k: v for k, v in result.items() if k != "timings"}
+
+
+HANDLERS: Dict[str, Handler] = {"make_card": make_card_job}
+
+
+def _card_text(job: Job) -> str:
+    if job.status != "done":
+        return f"Не удалось создать карточку «{job.payload.get('word', '')}»: {job.error}"
+    result = job.result or {}
+    back = " ".join(_HTML_TAG_RE.sub(" ", str(result.get("back", ""))).split())
+    return f"Карта создана:\n{result.get('front', '')}\n— {back}"
+
+
+def notify_job(job: Job) -> None:
+    """Tell the producer that ``job`` finished (best effort)."""
+    payload = job.payload
+    if payload.get("chat_id") is not None:
+        request_json(
+            "POST",
+            f"{TELEGRAM_API}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage",
+            json={"chat_id": payload["chat_id"], "text": _card_text(job)},
+            provider="telegram",
+        )
+    if payload.get("callback_url"):
+        request_json("POST", payload["callback_url"], json=job.as_dict(), provider="callback")
+
+
+class Worker:
+    """Lease jobs from ``queue`` and run them on ``concurrency`` threads."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Optional[Dict[str, Handler]] = None,
+        *,
+        concurrency: int = 4,
+        poll_interval: float = 0.5,
+        notify: Optional[Notify] = notify_job,
+        name: Optional[str] = None,
+    ) -> None:
+        self.queue = queue
+        self.handlers = handlers if handlers is not None else HANDLERS
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.notify = notify
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def run_once(self) -> bool:
+        """Process one ready job in the calling thread; ``False`` if none."""
+        job = self.queue.lease(self.name, kinds=list(self.handlers))
+        if job is None:
+            return False
+        with span("worker.job", run_id=f"job-{job.id}", kind=job.kind, attempt=job.attempts):
+            self._process(job)
+        return True
+
+    def _process(self, job: Job) -> None:
+        start = time.perf_counter()
+        extra = {"step": "worker.job", "job_id": job.id, "kind": job.kind, "attempt": job.attempts}
+        try:
+            with self._heartbeat(job, extra):
+                result = self.handlers[job.kind](job.payload)
+        except Exception as exc:
+            observe_step("worker.job", (time.perf_counter() - start) * 1000, ok=False)
+            status = self.queue.fail(job.id, str(exc), token=job.lease_token or "")
+            logger.warning("job failed (%s): %s", status, exc, extra=extra)
+            if status != "dead":
+                return
+        else:
+            if not self.queue.complete(job.id, result, token=job.lease_token or ""):
+                # аренда истекла, задание уже у другого воркера — результат не наш
+                logger.warning("lease lost, result dropped", extra=extra)
+                return
+            lat_ms = (time.perf_counter() - start) * 1000
+            observe_step("worker.job", lat_ms)
+            logger.info("ok", extra={**extra, "lat_ms": int(lat_ms)})
+        if self.notify is not None:
+            finished = self.queue.get(job.id)
+            try:
+                if finished is not None:
+                    self.notify(finished)
+            except Exception:
+                logger.warning("notification failed", exc_info=True, extra=extra)
+
+    @contextmanager
+    def _heartbeat(self, job: Job, extra: Dict[str, Any]) -> Iterator[None]:
+        """Renew the lease of ``job`` every ``lease_s / 3`` while its handler runs."""
+        done = threading.Event()
+        interval = max(0.01, self.queue.lease_s / 3)
+
+        def beat() -> None:
+            while not done.wait(interval):
+                try:
+                    renewed = self.queue.renew(job.id, job.lease_token or "")
+                except Exception:
+                    logger.warning("lease renewal failed", exc_info=True, extra=extra)
+                    continue
+                if not renewed:
+                    logger.warning("lease lost", extra=extra)
+                    return
+
+        thread = threading.Thread(target=beat, name=f"lease-{job.id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                busy = self.run_once()
+            except Exception:
+                logger.exception("worker loop error", extra={"step": "worker.job"})
+                busy = False
+            if not busy:
+                self._stop.wait(self.poll_interval)
+
+    def start(self) -> "Worker":
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f"worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(
+            "started", extra={"step": "worker", "workers": self.concurrency, "worker": self.name}
+        )
+        return self
+
+    def stop(self, wait: bool = True) -> None:
+        self._stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run queued card jobs")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="How many cards to build concurrently (default JOBS_WORKERS)",
+    )
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    log_effective_settings(logger)
+    from .net.limits import configure_providers
+
+    # общие лимиты на провайдеров, как у сервера и бота
+    configure_providers()
+    start_metrics_server()
+    worker = Worker(
+        get_job_queue(), concurrency=args.workers or getattr(settings, "JOBS_WORKERS", 4)
+    ).start()
+    try:
+        while True:
+            time.sleep(60)
+            logger.info("queue", extra={"step": "worker.stats", **get_job_queue().stats()})
+    except KeyboardInterrupt:
+        worker.stop()
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover - manual execution only
+    raise SystemExit(main())
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import contextvars
 import logging
 import os
 import re
@@ -14,7 +15,11 @@ from telegram.ext import Application, MessageHandler, ContextTypes, filters
 
 from app import setup_logging, log_effective_settings
 from app.mcp_tools.lesson import make_card
+from app.net.limits import configure_providers
+from app.orchestration.image_jobs import get_image_jobs
+from app.orchestration.jobs import get_job_queue
 from app.settings import settings
+from app.telemetry.tracing import span
 
 TOKEN = settings.TELEGRAM_BOT_TOKEN
 DECK = settings.ANKI_DECK
@@ -51,40 +56,55 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 
     lang = _detect_lang(text)
 
-    run_id = uuid.uuid4().hex[:8]
-    logger.info("Pipeline started", extra={"step": "pipeline", "run_id": run_id})
-
-    try:
-        loop = asyncio.get_running_loop()
-        result: Dict[str, Any] = await loop.run_in_executor(
-            None, lambda: make_card(text, lang, DECK, TAG)
-        )
-
-        front = str(result.get("front", text))
-        back_html = str(result.get("back", ""))
-        back_plain = _HTML_TAG_RE.sub(" ", back_html)
-        back_plain = " ".join(back_plain.split()).strip()
-
-        image_name = result.get("image") or result.get("image_path")  # совместимость
-        image_path = _image_fs_path(image_name)
-
-        caption = f"Карта создана:\n{front}\n— {back_plain}"
-        if image_path:
-            with image_path.open("rb") as fh:
-                await update.message.reply_photo(photo=fh, caption=caption)
-        else:
-            await update.message.reply_text(caption)
-        logger.info(
-            "Pipeline finished", extra={"step": "pipeline", "run_id": run_id, "status": "ok"}
+    if settings.BOT_ENQUEUE:
+        # карточку соберёт python -m app.worker и сам ответит в этот чат;
+        # запись в SQLite может ждать блокировку — не в цикле событий
+        payload = {"word": text, "lang": lang, "deck": DECK, "tag": TAG,
+                   "chat_id": update.effective_chat.id}
+        job_id = await asyncio.to_thread(
+            lambda: get_job_queue().enqueue("make_card", payload)
         )
+        logger.info("Job queued", extra={"step": "bot.enqueue", "job_id": job_id})
+        await update.message.reply_text("Слово принято, карточка скоро будет готова.")
+        return
 
-    except Exception as e:  # noqa: BLE001
-        logger.error(
-            "Pipeline finished",
-            exc_info=True,
-            extra={"step": "pipeline", "run_id": run_id, "status": "error"},
-        )
-        await update.message.reply_text(f"Ошибка: {e}")
+    run_id = uuid.uuid4().hex[:8]
+    with span("bot.handle_text", run_id=run_id):
+        logger.info("Pipeline started", extra={"step": "pipeline", "run_id": run_id})
+
+        try:
+            loop = asyncio.get_running_loop()
+            # run_in_executor не переносит контекст — спан передаём явно
+            ctx = contextvars.copy_context()
+            result: Dict[str, Any] = await loop.run_in_executor(
+                None, lambda: ctx.run(make_card, text, lang, DECK, TAG)
+            )
+
+            front = str(result.get("front", text))
+            back_html = str(result.get("back", ""))
+            back_plain = _HTML_TAG_RE.sub(" ", back_html)
+            back_plain = " ".join(back_plain.split()).strip()
+
+            image_name = result.get("image") or result.get("image_path")  # совместимость
+            image_path = _image_fs_path(image_name)
+
+            caption = f"Карта создана:\n{front}\n— {back_plain}"
+            if image_path:
+                with image_path.open("rb") as fh:
+                    await update.message.reply_photo(photo=fh, caption=caption)
+            else:
+                await update.message.reply_text(caption)
+            logger.info(
+                "Pipeline finished", extra={"step": "pipeline", "run_id": run_id, "status": "ok"}
+            )
+
+        except Exception as e:  # noqa: BLE001
+            logger.error(
+                "Pipeline finished",
+                exc_info=True,
+                extra={"step": "pipeline", "run_id": run_id, "status": "error"},
+            )
+            await update.message.reply_text(f"Ошибка: {e}")
 
 def main() -> None:
     parser = argparse.ArgumentParser()
@@ -103,6 +123,10 @@ def main() -> None:
     log_effective_settings(logger)
     logger.info("Application starting...")
 
+    configure_providers()
+    if settings.CARD_IMAGE_DEFERRED:
+        get_image_jobs()  # дозапустить картинки, прерванные прошлым остановом
+
     app = Application.builder().token(TOKEN).build()
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     logger.info("Telegram polling started", extra={"step": "bot.polling"})
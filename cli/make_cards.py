@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""CLI для пакетного создания карточек Anki в одном процессе."""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import sys
+from pathlib import Path
+from typing import List
+
+from app.mcp_tools import batch
+from app.net.limits import configure_providers
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Create Anki cards for a list of words")
+    parser.add_argument(
+        "--file",
+        required=True,
+        help="Файл со словами: по одному на строку или CSV с колонкой word",
+    )
+    parser.add_argument(
+        "--lang",
+        choices=["de", "ru", "auto"],
+        default="auto",
+        help="Язык исходных слов (de, ru или auto)",
+    )
+    parser.add_argument("--deck", required=True, help="Имя колоды")
+    parser.add_argument("--tag", required=True, help="Тег для карточек")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Сколько карточек собирать одновременно (по умолчанию BATCH_WORKERS)",
+    )
+    return parser.parse_args(argv)
+
+
+def read_words(path: str) -> List[str]:
+    text = Path(path).read_text(encoding="utf-8")
+    lines = text.splitlines()
+    if lines and lines[0].strip().split(",")[0] == "word":
+        return [row["word"].strip() for row in csv.DictReader(lines) if row.get("word")]
+    return [line.strip() for line in lines if line.strip()]
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    configure_providers()
+    lang = None if args.lang == "auto" else args.lang
+    words = read_words(args.file)
+    failed = 0
+
+    def emit(index: int, result: dict) -> None:
+        nonlocal failed
+        if result.get("error"):
+            failed += 1
+            print(f"{words[index]}: {result['error']}", file=sys.stderr)
+        else:
+            print(json.dumps({"word": words[index], **result}, ensure_ascii=False), flush=True)
+
+    batch.make_cards_from_list(words, lang, args.deck, args.tag, workers=args.workers, on_result=emit)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Пиковая память на одну загрузку картинки в AnkiConnect.
+
+Сравнивает прежний способ (файл целиком → base64 → JSON) с потоковым телом
+:class:`app.net.body.Base64JsonBody`. Сеть не используется: тело просто
+вычитывается так же, как его отправляет ``requests``. Нужен тот же ``.env``,
+что и для приложения (пакет ``app`` читает настройки при импорте).
+
+    python scripts/bench_media_upload.py --size-mb 3 --runs 5
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.net.body import Base64JsonBody  # noqa: E402
+
+
+def _payload(params: dict) -> dict:
+    return {"action": "storeMediaFile", "version": 6, "params": params}
+
+
+def upload_whole(path: str) -> int:
+    with open(path, "rb") as f:
+        encoded = base64.b64encode(f.read()).decode("ascii")
+    body = json.dumps(_payload({"filename": os.path.basename(path), "data": encoded}))
+    return len(body.encode("utf-8"))
+
+
+def upload_streaming(path: str) -> int:
+    body = Base64JsonBody(
+        _payload({"filename": os.path.basename(path), "data": "@file"}), path
+    )
+    return sum(len(chunk) for chunk in body)
+
+
+def upload_path(path: str) -> int:
+    body = json.dumps(_payload({"filename": os.path.basename(path), "path": path}))
+    return len(body.encode("utf-8"))
+
+
+def peak_kib(fn: Callable[[str], int], path: str, runs: int) -> float:
+    peaks = []
+    for _ in range(runs):
+        tracemalloc.start()
+        fn(path)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return max(peaks) / 1024
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=3.0, help="Размер тестового файла")
+    parser.add_argument("--runs", type=int, default=3, help="Повторов на вариант")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "image.png")
+        with open(path, "wb") as f:
+            f.write(os.urandom(int(args.size_mb * 1024 * 1024)))
+
+        print(f"file: {os.path.getsize(path) / 1024:.0f} KiB")
+        for name, fn in [
+            ("whole-file base64", upload_whole),
+            ("streaming base64", upload_streaming),
+            ("local path", upload_path),
+        ]:
+            print(f"{name:<18} peak {peak_kib(fn, path, args.runs):>10.1f} KiB")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,5 +1,13 @@
+import os
 import sys
 from pathlib import Path
 
 # Ensure the project root is on the path for imports
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Tests must not share cached LLM answers through var/text_cache.sqlite
+os.environ.setdefault("TEXT_CACHE_ENABLED", "false")
+# ...nor trip circuit breakers with deliberately failing fakes
+os.environ.setdefault("BREAKER_ENABLED", "false")
+# ...nor append card events to var/telemetry/events.jsonl
+os.environ.setdefault("TELEMETRY_ENABLED", "false")
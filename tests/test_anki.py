@@ -1,4 +1,5 @@
 import base64
+import json
 import os
 
 import pytest
@@ -60,6 +61,7 @@ def test_store_media_file(monkeypatch, tmp_path):
         return {"error": None, "result": "pic.png"}
 
     monkeypatch.setattr(anki, "request_json", fake_request_json)
+    monkeypatch.setattr(anki.settings, "ANKI_CONNECT_URL", "http://127.0.0.1:8765")
 
     media = tmp_path / "pic.png"
     media.write_bytes(b"data")
@@ -70,8 +72,39 @@ def test_store_media_file(monkeypatch, tmp_path):
     assert payload["action"] == "storeMediaFile"
     params = payload["params"]
     assert params["filename"] == "pic.png"
-    expected = base64.b64encode(b"data").decode("ascii")
-    assert params["data"] == expected
+    # локальный Anki читает файл сам, base64 не нужен
+    assert params["path"] == str(media)
+    assert "data" not in params
+
+
+def test_store_media_file_remote_streams_base64(monkeypatch, tmp_path):
+    sent = {}
+
+    def fake_request_json(method, url, data=None, timeout=None, headers=None):
+        sent["length"] = len(data)
+        # тело перечитывается при повторах
+        sent["body"] = b"".join(data)
+        sent["again"] = b"".join(data)
+        sent["headers"] = headers
+        return {"error": None, "result": "pic.png"}
+
+    monkeypatch.setattr(anki, "request_json", fake_request_json)
+    monkeypatch.setattr(anki.settings, "ANKI_CONNECT_URL", "http://anki.example:8765")
+
+    raw = bytes(range(256)) * 1000
+    media = tmp_path / "pic.png"
+    media.write_bytes(raw)
+
+    assert anki.store_media_file(str(media)) == "pic.png"
+    body = json.loads(sent["body"])
+    assert body == {
+        "action": "storeMediaFile",
+        "version": 6,
+        "params": {"filename": "pic.png", "data": base64.b64encode(raw).decode("ascii")},
+    }
+    assert sent["length"] == len(sent["body"])
+    assert sent["again"] == sent["body"]
+    assert sent["headers"] == {"Content-Type": "application/json"}
 
 
 def test_add_anki_note(monkeypatch, tmp_path):
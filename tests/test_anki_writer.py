@@ -0,0 +1,87 @@
+import pytest
+
+from app.mcp_tools import anki
+from app.net.http import NetworkError
+
+
+def _fake_anki(calls, add_notes=None):
+    def fake_request_json(method, url, json=None, timeout=None, headers=None):
+        calls.append(json)
+        assert json["action"] == "multi"
+        out = []
+        for action in json["params"]["actions"]:
+            params = action["params"]
+            if action["action"] == "storeMediaFile":
+                out.append({"result": params["filename"], "error": None})
+            elif action["action"] == "addNotes":
+                out.append(add_notes(params["notes"]))
+            elif action["action"] == "addNote":
+                if params["note"]["fields"]["Front"] == "dup":
+                    out.append({"result": None, "error": "duplicate"})
+                else:
+                    out.append({"result": 7, "error": None})
+        return {"result": out, "error": None}
+
+    return fake_request_json
+
+
+def test_writer_coalesces_notes_and_media(monkeypatch, tmp_path):
+    calls = []
+    ids = iter(range(100, 200))
+    monkeypatch.setattr(
+        anki,
+        "request_json",
+        _fake_anki(calls, lambda notes: {"result": [next(ids) for _ in notes], "error": None}),
+    )
+    media = tmp_path / "pic.png"
+    media.write_bytes(b"img")
+
+    with anki.AnkiWriter(max_batch=10, flush_interval=60) as writer:
+        first = writer.add_note("Hund", "Back", "Deck", ["tag"], media_path=str(media))
+        second = writer.add_note("Haus", "Back", "Deck")
+        assert not first.done()
+
+    assert len(calls) == 1
+    actions = calls[0]["params"]["actions"]
+    assert [a["action"] for a in actions] == ["storeMediaFile", "addNotes"]
+    notes = actions[1]["params"]["notes"]
+    assert '<img src="pic.png">' in notes[0]["fields"]["Back"]
+    assert first.result() == 100
+    assert second.result() == 101
+
+
+def test_writer_flushes_on_size(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        anki,
+        "request_json",
+        _fake_anki(calls, lambda notes: {"result": [1] * len(notes), "error": None}),
+    )
+    writer = anki.AnkiWriter(max_batch=2, flush_interval=60)
+
+    futures = [writer.add_note(w, "b", "Deck") for w in ["a", "b", "c"]]
+
+    assert len(calls) == 1
+    assert [f.done() for f in futures] == [True, True, False]
+    writer.close()
+    assert len(calls) == 2
+
+
+def test_writer_maps_per_note_errors(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        anki,
+        "request_json",
+        _fake_anki(calls, lambda notes: {"result": None, "error": "cannot create note"}),
+    )
+
+    with anki.AnkiWriter(flush_interval=60) as writer:
+        ok = writer.add_note("Hund", "b", "Deck")
+        bad = writer.add_note("dup", "b", "Deck")
+
+    assert ok.result() == 7
+    with pytest.raises(NetworkError) as exc:
+        bad.result()
+    assert exc.value.message == "duplicate"
+    # addNotes rejected as a whole -> one more multi with addNote per note
+    assert [a["action"] for a in calls[1]["params"]["actions"]] == ["addNote", "addNote"]
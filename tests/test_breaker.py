@@ -0,0 +1,98 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from app.mcp_tools import lesson
+from app.net import breaker, http
+from app.net.breaker import CircuitBreaker
+from app.net.http import NetworkError, request_json
+
+
+def test_breaker_opens_probes_and_closes(monkeypatch):
+    b = CircuitBreaker("p", window=4, min_calls=4, failure_rate=0.5, open_s=10)
+    for ok in (True, False, True, False):
+        assert b.allow()
+        b.record(ok)
+    assert b.state == "open" and not b.allow()
+
+    clock = time.monotonic() + 11
+    monkeypatch.setattr(breaker.time, "monotonic", lambda: clock)
+    assert b.allow()  # одна пробная заявка
+    assert b.state == "half_open" and not b.allow()
+    b.record(False)
+    assert b.state == "open"
+
+    clock += 11
+    assert b.allow()
+    b.record(True)
+    assert b.state == "closed" and b.allow()
+
+
+def test_breaker_counts_slow_calls():
+    b = CircuitBreaker("p", window=2, min_calls=2, failure_rate=0.5, slow_ms=100)
+    b.record(True, lat_ms=10)
+    b.record(True, lat_ms=500)
+    assert b.state == "open"
+    assert b.snapshot()["opens"] == 1
+
+
+@pytest.fixture
+def breakers(monkeypatch):
+    monkeypatch.setenv("BREAKER_ENABLED", "true")
+    monkeypatch.setenv("BREAKER_MIN_CALLS", "2")
+    breaker.reset_breakers()
+    yield
+    breaker.reset_breakers()
+
+
+def test_request_json_fails_fast_when_open(monkeypatch, breakers):
+    calls = []
+
+    def fake_request(*args, **kwargs):
+        calls.append(1)
+        raise requests.ConnectionError("down")
+
+    monkeypatch.setattr(http, "get_session", lambda url: SimpleNamespace(request=fake_request))
+    monkeypatch.setattr(time, "sleep", lambda s: None)
+
+    with pytest.raises(NetworkError) as first:
+        request_json("GET", "http://down.example", retries=5)
+    # после двух неудач breaker открылся, остальные попытки не делались
+    assert first.value.code == "network" and len(calls) == 2
+
+    with pytest.raises(NetworkError) as second:
+        request_json("GET", "http://down.example")
+    assert second.value.code == "circuit-open" and len(calls) == 2
+    assert breaker.breaker_states()["down.example"]["state"] == "open"
+
+
+def test_expired_deadline_releases_half_open_probe(monkeypatch, breakers):
+    b = breaker.get_breaker("slow.example")
+    b.record(False)
+    b.record(False)
+    clock = time.monotonic() + 60
+    monkeypatch.setattr(breaker.time, "monotonic", lambda: clock)
+    monkeypatch.setattr(http, "get_session", lambda url: SimpleNamespace(request=pytest.fail))
+
+    with pytest.raises(NetworkError) as exc:
+        request_json("GET", "http://slow.example", deadline=time.monotonic() - 1)
+    assert exc.value.code == "deadline"
+    # проба не ушла — следующий вызов снова может её сделать
+    assert b.state == "half_open" and b.allow()
+
+
+def test_make_card_skips_image_when_breaker_open(monkeypatch):
+    monkeypatch.setattr(lesson, "image_breaker_open", lambda: True)
+    monkeypatch.setattr(lesson, "image_callback_mode", lambda: False)
+    monkeypatch.setattr(
+        lesson, "generate_image_file", lambda s: (_ for _ in ()).throw(AssertionError("called"))
+    )
+    monkeypatch.setattr(lesson, "generate_sentence", lambda w: "Der Hund schläft.")
+    monkeypatch.setattr(lesson, "translate_text", lambda text, src, tgt: "Собака спит")
+    monkeypatch.setattr(lesson, "add_anki_note", lambda **kwargs: 5)
+
+    result = lesson.make_card("Hund", "de", "Deck", "tag", defer_image=False)
+    assert result["image"] == ""
+    assert result["message"] == "Карточка создана без изображения"
@@ -0,0 +1,31 @@
+import runpy
+
+
+def test_make_cards_cli_configures_provider_limits(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "x")
+    monkeypatch.setenv("OPENROUTER_TEXT_MODEL", "x")
+    monkeypatch.setenv("ANKI_DECK", "Deck")
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "x")
+
+    from app.mcp_tools import batch
+    from app.net import limits
+
+    events = []
+    monkeypatch.setattr(limits, "configure_providers", lambda: events.append("limits"))
+
+    def fake_make_cards(words, lang, deck, tag, workers=None, on_result=None):
+        events.append("cards")
+        for i, word in enumerate(words):
+            on_result(i, {"front": word})
+
+    monkeypatch.setattr(batch, "make_cards_from_list", fake_make_cards)
+    words = tmp_path / "words.txt"
+    words.write_text("Hund\nHaus\n", encoding="utf-8")
+
+    module_globals = runpy.run_path("cli/make_cards.py", run_name="__not_main__")
+    exit_code = module_globals["main"](["--file", str(words), "--deck", "Deck", "--tag", "t"])
+
+    assert exit_code == 0
+    # лимиты заданы до первой карточки
+    assert events == ["limits", "cards"]
+    assert capsys.readouterr().out.count("\n") == 2
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import pytest
+
+from app.orchestration.dag import Stage, run_graph, run_graph_async
+
+
+def _slow(value, delay=0.2):
+    def fn(results):
+        time.sleep(delay)
+        return value
+
+    return fn
+
+
+def test_run_graph_overlaps_independent_stages():
+    stages = [
+        Stage("root", lambda r: 1),
+        Stage("a", _slow("a"), ("root",)),
+        Stage("b", _slow("b"), ("root",)),
+        Stage("join", lambda r: r["a"] + r["b"], ("a", "b")),
+    ]
+
+    start = time.perf_counter()
+    results, timings = run_graph(stages)
+    elapsed = time.perf_counter() - start
+
+    assert results["join"] == "ab"
+    assert elapsed < 0.35
+    assert set(timings) == {"root", "a", "b", "join"}
+    assert timings["join"]["start_ms"] >= timings["a"]["lat_ms"]
+
+
+def test_run_graph_optional_and_errors():
+    def boom(results):
+        raise RuntimeError("boom")
+
+    results, _ = run_graph([Stage("x", boom, optional=True), Stage("y", lambda r: r["x"], ("x",))])
+    assert results == {"x": None, "y": None}
+
+    with pytest.raises(RuntimeError):
+        run_graph([Stage("x", boom), Stage("y", lambda r: 1, ("x",))])
+
+    with pytest.raises(ValueError):
+        run_graph([Stage("x", lambda r: 1, ("missing",))])
+
+
+def test_run_graph_async_awaits_stages():
+    async def slow(value):
+        await asyncio.sleep(0.2)
+        return value
+
+    stages = [
+        Stage("root", lambda r: "x", check=str.upper),
+        Stage("a", lambda r: slow(r["root"] + "a"), ("root",)),
+        Stage("b", lambda r: slow(r["root"] + "b"), ("root",)),
+    ]
+
+    start = time.perf_counter()
+    results, _ = asyncio.run(run_graph_async(stages))
+
+    assert results == {"root": "X", "a": "Xa", "b": "Xb"}
+    assert time.perf_counter() - start < 0.35
@@ -151,3 +151,15 @@ def test_get_task_status_timeouts(monkeypatch):
     result = client.get_task_status(request_id)
     assert result["status"] == "success"
     assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_get_task_status_no_wait_returns_processing():
+    client = make_client()
+    request_id = "abc"
+    url = f"{client.BASE_URL}/api/v1/requests/{request_id}"
+    responses.add(responses.GET, url, json={"status": "processing", "eta": 5}, status=200)
+
+    result = client.get_task_status(request_id, wait=False)
+    assert result == {"status": "processing", "eta": 5}
+    assert len(responses.calls) == 1
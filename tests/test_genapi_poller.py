@@ -0,0 +1,119 @@
+import base64
+import threading
+
+import pytest
+
+from app.net.genapi_client import GenAPITaskFailed
+from app.net.genapi_poller import TaskPoller, next_interval
+
+
+def test_next_interval_grows_and_honours_eta():
+    delays = [next_interval(n, {}, first=0.5, max_interval=4) for n in range(1, 6)]
+    assert delays == [0.5, 1.0, 2.0, 4, 4]
+    assert next_interval(1, {"eta": 12}, first=0.5, max_interval=4) == 12
+
+
+def test_poller_resolves_many_tasks_on_one_thread():
+    calls = {}
+    lock = threading.Lock()
+
+    def status(request_id):
+        with lock:
+            calls[request_id] = calls.get(request_id, 0) + 1
+            n = calls[request_id]
+        if n < 3:
+            return {"status": "processing"}
+        return {"status": "success", "id": request_id}
+
+    poller = TaskPoller(status, first_interval=0.01, max_interval=0.02)
+    futures = [poller.submit(f"r{i}") for i in range(20)]
+
+    results = [f.result(timeout=5) for f in futures]
+
+    assert [r["id"] for r in results] == [f"r{i}" for i in range(20)]
+    assert all(n == 3 for n in calls.values())
+    # scheduler + worker pool, not one thread per task
+    assert len([t for t in threading.enumerate() if t.name.startswith("genapi-poll")]) <= 5
+    poller.stop()
+
+
+def test_poller_failed_and_timeout():
+    poller = TaskPoller(
+        lambda rid: {"status": "failed"} if rid == "bad" else {"status": "processing"},
+        first_interval=0.01,
+        max_interval=0.01,
+    )
+    bad = poller.submit("bad")
+    slow = poller.submit("slow", timeout=0.05)
+
+    with pytest.raises(GenAPITaskFailed):
+        bad.result(timeout=5)
+    with pytest.raises(TimeoutError):
+        slow.result(timeout=5)
+    poller.stop()
+
+
+def test_image_genapi_uses_shared_poller(monkeypatch, tmp_path):
+    from app.mcp_tools import image_genapi
+
+    monkeypatch.setenv("GENAPI_MODEL_ID", "m")
+    monkeypatch.setenv("GENAPI_POLL_INTERVAL_MS", "10")
+    monkeypatch.setattr(image_genapi, "MEDIA_DIR", tmp_path)
+    monkeypatch.setattr(image_genapi, "_poller", None)
+    monkeypatch.setattr(image_genapi, "create_generation_task", lambda **kw: {"request_id": "42"})
+    polls = []
+
+    def fake_status(request_id):
+        polls.append(request_id)
+        if len(polls) < 2:
+            return {"status": "processing"}
+        return {"images": [{"b64_json": base64.b64encode(b"png").decode()}]}
+
+    monkeypatch.setattr(image_genapi, "get_task_status", fake_status)
+
+    fut = image_genapi.start_image_genapi("Der Hund bellt.")
+    path = fut.result(timeout=5)
+
+    assert path.startswith(str(tmp_path))
+    assert (tmp_path / path.split("/")[-1]).read_bytes() == b"png"
+    assert polls == ["42", "42"]
+    image_genapi._task_poller().stop()
+
+
+def test_image_save_does_not_block_poller_threads():
+    from concurrent.futures import Future
+
+    from app.mcp_tools import image_genapi
+
+    src = Future()
+    seen = []
+    out = image_genapi._then(src, lambda data: seen.append(threading.current_thread().name) or "p")
+    src.set_result({})
+    assert out.result(timeout=5) == "p"
+    assert seen[0].startswith("genapi-save")
+
+
+def test_client_poll_shares_one_poller_with_per_call_timeout(monkeypatch):
+    from app.net.genapi_client import GenAPIClient
+
+    client = GenAPIClient("t")
+    monkeypatch.setattr(client, "get_task_status", lambda rid, wait: {"status": "processing"})
+    barrier = threading.Barrier(8)
+    pollers = []
+
+    def first_call():
+        barrier.wait()
+        client.poll("r", timeout=60)
+        pollers.append(client._poller)
+
+    threads = [threading.Thread(target=first_call) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(p) for p in pollers}) == 1
+    # тайм-аут первого вызова не становится общим: без него задача ждёт бессрочно
+    assert client._poller.timeout is None
+    with pytest.raises(TimeoutError):
+        client.poll("slow", timeout=0.05).result(timeout=5)
+    client._poller.stop()
@@ -17,7 +17,7 @@ def _cfg():
 def test_genapi_check_ok(monkeypatch):
     monkeypatch.setattr(health_genapi, "settings", _cfg())
     resp = type("R", (), {"status_code": 200, "text": "", "json": lambda self: {"id": "1"}})()
-    monkeypatch.setattr(health_genapi.requests, "post", lambda *a, **k: resp)
+    monkeypatch.setattr(health_genapi, "get_session", lambda url: SimpleNamespace(post=lambda *a, **k: resp))
 
     assert health_genapi.genapi_check() == {"ok": True, "id": "1"}
 
@@ -25,7 +25,7 @@ def test_genapi_check_ok(monkeypatch):
 def test_genapi_check_error(monkeypatch):
     monkeypatch.setattr(health_genapi, "settings", _cfg())
     resp = type("R", (), {"status_code": 500, "text": "boom"})()
-    monkeypatch.setattr(health_genapi.requests, "post", lambda *a, **k: resp)
+    monkeypatch.setattr(health_genapi, "get_session", lambda url: SimpleNamespace(post=lambda *a, **k: resp))
 
     out = health_genapi.genapi_check()
     assert out["ok"] is False
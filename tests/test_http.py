@@ -1,8 +1,10 @@
 import time
+from types import SimpleNamespace
 
 import pytest
 import requests
 
+from app.net import http
 from app.net.http import NetworkError, request_json
 
 
@@ -24,7 +26,7 @@ def test_request_json_success(monkeypatch):
     def fake_request(method, url, json=None, headers=None, timeout=None):
         return DummyResponse({"ok": True})
 
-    monkeypatch.setattr(requests, "request", fake_request)
+    monkeypatch.setattr(http, "get_session", lambda url: SimpleNamespace(request=fake_request))
     assert request_json("GET", "http://example.com") == {"ok": True}
 
 
@@ -38,7 +40,7 @@ def test_request_json_retry(monkeypatch):
             raise requests.RequestException("boom")
         return DummyResponse({"ok": True})
 
-    monkeypatch.setattr(requests, "request", fake_request)
+    monkeypatch.setattr(http, "get_session", lambda url: SimpleNamespace(request=fake_request))
     monkeypatch.setattr(time, "sleep", lambda s: sleeps.append(s))
 
     assert request_json("GET", "http://example.com") == {"ok": True}
@@ -50,7 +52,7 @@ def test_request_json_fail(monkeypatch):
         raise requests.RequestException("boom")
 
     sleeps = []
-    monkeypatch.setattr(requests, "request", fake_request)
+    monkeypatch.setattr(http, "get_session", lambda url: SimpleNamespace(request=fake_request))
     monkeypatch.setattr(time, "sleep", lambda s: sleeps.append(s))
 
     with pytest.raises(NetworkError) as exc:
@@ -58,3 +60,65 @@ def test_request_json_fail(monkeypatch):
 
     assert exc.value.code == "network"
     assert sleeps == [1, 2]
+
+
+def test_request_json_respects_deadline(monkeypatch):
+    from app.net.deadline import deadline_scope
+
+    timeouts = []
+
+    def fake_request(method, url, json=None, headers=None, timeout=None):
+        timeouts.append(timeout)
+        raise requests.RequestException("slow")
+
+    monkeypatch.setattr(http, "get_session", lambda url: SimpleNamespace(request=fake_request))
+    monkeypatch.setattr(time, "sleep", lambda s: pytest.fail("no retry fits the deadline"))
+
+    with deadline_scope(0.5):
+        with pytest.raises(NetworkError) as exc:
+            request_json("GET", "http://example.com", timeout=30, retries=3)
+
+    # попытка урезана до остатка дедлайна, а повтор с паузой 1 с уже не влезает
+    assert len(timeouts) == 1 and timeouts[0] <= 0.5
+    assert exc.value.code == "deadline"
+    assert exc.value.details["last_error"] == "slow"
+
+
+def test_stream_sse_yields_events_and_closes_early(monkeypatch):
+    from app.net import sse
+
+    lines = [
+        ": keep-alive",
+        'data: {"n": 1}',
+        "",
+        'data: {"n": 2}',
+        "",
+        'data: {"n": 3}',
+        "",
+        "data: [DONE]",
+        "",
+    ]
+    closed = []
+
+    class StreamResponse(DummyResponse):
+        def iter_lines(self, decode_unicode=False):
+            return iter(lines)
+
+        def close(self):
+            closed.append(True)
+
+    def fake_request(method, url, json=None, headers=None, timeout=None, stream=False):
+        assert stream
+        return StreamResponse(None)
+
+    recorded = []
+    monkeypatch.setattr(sse, "get_session", lambda url: SimpleNamespace(request=fake_request))
+    monkeypatch.setattr(sse, "_record", lambda provider, start, error: recorded.append(error))
+    assert list(sse.stream_sse("POST", "http://example.com")) == [{"n": 1}, {"n": 2}, {"n": 3}]
+
+    events = sse.stream_sse("POST", "http://example.com")
+    assert next(events) == {"n": 1}
+    events.close()
+    assert closed == [True, True]
+    # закрытие раньше [DONE] — тоже успешный запрос для breaker'а и метрик
+    assert recorded == [None, None]
@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.net import http
+from app.net.http import NetworkError, request_json_async
+
+
+class FakeClient:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    async def request(self, method, url, json=None, headers=None, timeout=None):
+        self.calls.append((method, url, json))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _patch(monkeypatch, client):
+    async def fake_get_async_client(url):
+        return client
+
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(http, "get_async_client", fake_get_async_client)
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    return sleeps
+
+
+def _response(status, data):
+    return httpx.Response(status, json=data, request=httpx.Request("GET", "http://example.com"))
+
+
+def test_request_json_async_retry(monkeypatch):
+    client = FakeClient([httpx.ConnectError("boom"), _response(200, {"ok": True})])
+    sleeps = _patch(monkeypatch, client)
+
+    out = asyncio.run(request_json_async("GET", "http://example.com"))
+
+    assert out == {"ok": True}
+    assert len(client.calls) == 2
+    assert sleeps == [1]
+
+
+def test_request_json_async_http_error(monkeypatch):
+    client = FakeClient([_response(503, {"detail": "busy"})] * 2)
+    sleeps = _patch(monkeypatch, client)
+
+    with pytest.raises(NetworkError) as exc:
+        asyncio.run(request_json_async("POST", "http://example.com", retries=2))
+
+    assert exc.value.code == 503
+    assert sleeps == [1]
+
+
+def test_make_card_async(monkeypatch):
+    from app.mcp_tools import lesson
+
+    async def fake_sentence(word):
+        return "Der Hund schläft."
+
+    async def fake_translate(text, src, tgt):
+        return "Собака спит"
+
+    async def fake_image(sentence):
+        return ""
+
+    params = {}
+
+    async def fake_add_note(**kwargs):
+        params.update(kwargs)
+        return 7
+
+    monkeypatch.setattr(lesson, "generate_sentence_async", fake_sentence)
+    monkeypatch.setattr(lesson, "translate_text_async", fake_translate)
+    monkeypatch.setattr(lesson, "generate_image_file_async", fake_image)
+    monkeypatch.setattr(lesson, "add_anki_note_async", fake_add_note)
+
+    result = asyncio.run(lesson.make_card_async("Hund", "de", "Deck", "tag"))
+
+    assert result["note_id"] == 7
+    assert result["back"] == "<div>Перевод: Собака спит</div><div>Satz: Der Hund schläft.</div>"
+    assert params["media_path"] is None
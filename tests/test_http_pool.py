@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.net.pool import SessionPool
+
+
+def test_pool_reuses_session_per_host():
+    pool = SessionPool(pool_size=4, idle_timeout=60)
+
+    s1 = pool.get("https://openrouter.ai/api/v1/chat/completions")
+    s2 = pool.get("https://openrouter.ai/other")
+    s3 = pool.get("http://127.0.0.1:8765")
+
+    assert s1 is s2
+    assert s3 is not s1
+    assert pool.stats() == {
+        "hosts": 2,
+        "hits": 1,
+        "misses": 2,
+        "evictions": 0,
+        "pool_size": 4,
+    }
+    adapter = s1.get_adapter("https://openrouter.ai")
+    assert adapter._pool_maxsize == 4
+    pool.close()
+
+
+def test_pool_evicts_idle_sessions(monkeypatch):
+    pool = SessionPool(idle_timeout=10)
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+    first = pool.get("https://gen-api.ru/api")
+    now[0] += 11
+    second = pool.get("https://gen-api.ru/api")
+
+    assert first is not second
+    stats = pool.stats()
+    assert stats["evictions"] == 1
+    assert stats["misses"] == 2
+    assert stats["hosts"] == 1
+    pool.close()
+
+
+def test_pool_closes_clients_of_other_loops():
+    httpx = pytest.importorskip("httpx")
+    pool = SessionPool()
+    url = "https://openrouter.ai/api"
+
+    first = asyncio.run(pool.get_async(url))
+    # прошлая петля закрыта: клиент заменяется, а его сокеты закрываются
+    closed = []
+    sock = SimpleNamespace(close=lambda: closed.append(True))
+    stream = SimpleNamespace(get_extra_info=lambda name: sock)
+    conn = SimpleNamespace(_connection=SimpleNamespace(_network_stream=stream))
+    first._transport._pool = SimpleNamespace(connections=[conn])
+
+    async def second_loop():
+        client = await pool.get_async(url)
+        await pool.aclose_all()
+        return client
+
+    second = asyncio.run(second_loop())
+
+    assert second is not first
+    assert closed == [True]
+    assert isinstance(second, httpx.AsyncClient)
+    assert second.is_closed
+    assert pool.stats()["hosts"] == 0
+
+
+def test_pool_close_schedules_aclose_on_running_loop():
+    pytest.importorskip("httpx")
+    pool = SessionPool()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        client = asyncio.run_coroutine_threadsafe(
+            pool.get_async("https://gen-api.ru/api"), loop
+        ).result(timeout=5)
+
+        pool.close()
+
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop).result(timeout=5)
+        assert client.is_closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
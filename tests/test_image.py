@@ -1,8 +1,10 @@
+import asyncio
 import base64
 from pathlib import Path
 from types import SimpleNamespace
 
 from app.mcp_tools import image
+from app.net import limits
 
 
 def _prepare(monkeypatch, tmp_path, sync=True):
@@ -36,7 +38,7 @@ def test_generate_image_b64(monkeypatch, tmp_path):
     img_bytes = b"fake-bytes"
     b64 = base64.b64encode(img_bytes).decode()
     resp = DummyResp({"data": [{"b64_json": b64}]})
-    monkeypatch.setattr(image.requests, "post", lambda *a, **k: resp)
+    monkeypatch.setattr(image, "get_session", lambda url: SimpleNamespace(post=lambda *a, **k: resp))
 
     path = image.generate_image_file("Hallo")
     assert path.startswith("media/")
@@ -48,7 +50,7 @@ def test_generate_image_b64(monkeypatch, tmp_path):
 def test_generate_image_async(monkeypatch, tmp_path):
     _prepare(monkeypatch, tmp_path, sync=False)
     resp = DummyResp({})
-    monkeypatch.setattr(image.requests, "post", lambda *a, **k: resp)
+    monkeypatch.setattr(image, "get_session", lambda url: SimpleNamespace(post=lambda *a, **k: resp))
 
     path = image.generate_image_file("Hallo")
     assert path == ""
@@ -59,9 +61,53 @@ def test_generate_image_error(monkeypatch, tmp_path):
     _prepare(monkeypatch, tmp_path)
     resp = DummyResp(Exception("bad json"), status=500)
     resp.text = "oops"
-    monkeypatch.setattr(image.requests, "post", lambda *a, **k: resp)
+    monkeypatch.setattr(image, "get_session", lambda url: SimpleNamespace(post=lambda *a, **k: resp))
 
     path = image.generate_image_file("Hallo")
     assert path == ""
     assert list(tmp_path.iterdir()) == []
 
+
+
+def test_generate_image_reuses_stored_image(monkeypatch, tmp_path):
+    _prepare(monkeypatch, tmp_path)
+    b64 = base64.b64encode(b"fake-bytes").decode()
+    calls = []
+
+    def fake_post(*a, **k):
+        calls.append(k["json"]["prompt"])
+        return DummyResp({"data": [{"b64_json": b64}]})
+
+    monkeypatch.setattr(image, "get_session", lambda url: SimpleNamespace(post=fake_post))
+
+    first = image.generate_image_file("Hallo")
+    second = image.generate_image_file("Hallo")
+    other = image.generate_image_file("Tschüss")
+
+    assert first == second == other
+    assert len(calls) == 2
+    assert len([p for p in tmp_path.iterdir() if p.suffix == ".png"]) == 1
+
+
+def test_image_rate_limit_pauses_provider(monkeypatch, tmp_path):
+    _prepare(monkeypatch, tmp_path)
+    resp = DummyResp({}, status=419)
+    resp.headers = {"Retry-After": "3"}
+    monkeypatch.setattr(image, "get_session", lambda url: SimpleNamespace(post=lambda *a, **k: resp))
+
+    class Client:
+        async def post(self, *a, **k):
+            return resp
+
+    async def client(url):
+        return Client()
+
+    monkeypatch.setattr(image, "get_async_client", client)
+    paused = []
+    bucket = SimpleNamespace(reserve=lambda: 0.0, pause=paused.append)
+    monkeypatch.setattr(limits, "_bucket", lambda provider: bucket)
+
+    # оба пути (sync и async) ставят паузу на весь провайдер, как GenAPIClient
+    assert image.generate_image_file("Hallo") == ""
+    assert asyncio.run(image.generate_image_file_async("Hallo")) == ""
+    assert paused == [3.0, 3.0]
@@ -0,0 +1,228 @@
+import asyncio
+import base64
+import threading
+from concurrent.futures import Future
+
+from pathlib import Path
+from types import SimpleNamespace
+
+import requests
+
+from app.mcp_tools import anki, image, image_callbacks, lesson
+from app.net.webhook import WebhookServer
+
+
+def _callback(request_id, data=b"png"):
+    return {
+        "request_id": request_id,
+        "status": "success",
+        "result": {"images": [{"b64_json": base64.b64encode(data).decode()}]},
+    }
+
+
+def test_registry_completes_waiting_generation():
+    registry = image_callbacks.CallbackRegistry(timeout=60)
+    saved = []
+    fut = registry.expect("7", lambda data: saved.append(data) or "media/x.png")
+
+    assert not fut.done()
+    assert registry.deliver(_callback("7")) is True
+    assert fut.result(timeout=1) == "media/x.png"
+    assert saved == [b"png"]
+    assert registry.deliver({"unrelated": True}) is False
+
+
+def test_registry_keeps_early_callback():
+    registry = image_callbacks.CallbackRegistry(timeout=60)
+    registry.deliver(_callback("8"))
+
+    fut = registry.expect("8", lambda data: "media/early.png")
+    assert fut.result(timeout=1) == "media/early.png"
+
+
+def test_registry_bounds_early_callbacks_and_rejects_foreign_urls(monkeypatch):
+    monkeypatch.setattr(image_callbacks, "MAX_EARLY", 2)
+    monkeypatch.setattr(image_callbacks, "MAX_EARLY_BYTES", 100)
+    fetched = []
+    monkeypatch.setattr(
+        image_callbacks, "_image_bytes", lambda kind, data: fetched.append(kind) or b"png"
+    )
+    registry = image_callbacks.CallbackRegistry(timeout=60)
+    for request_id in ("a", "b", "c"):
+        assert registry.deliver(_callback(request_id)) is True
+    assert registry.deliver(_callback("big", b"x" * 200)) is False
+    assert not registry.expect("a", lambda data: "never").done()  # вытеснен как самый старый
+    assert registry.expect("b", lambda data: "media/b.png").result(timeout=1) == "media/b.png"
+
+    fut = registry.expect("u", lambda data: "media/u.png")
+    registry.deliver({"request_id": "u", "result": {"images": [{"url": "http://10.0.0.1/x"}]}})
+    assert fut.result(timeout=1) == ""
+    assert fetched == ["b64"]
+
+
+def test_registry_times_out():
+    registry = image_callbacks.CallbackRegistry(timeout=0)
+    fut = registry.expect("9", lambda data: "never")
+    registry.deliver(_callback("other"))
+    assert fut.result(timeout=1) == ""
+
+
+def test_registry_times_out_without_further_traffic():
+    registry = image_callbacks.CallbackRegistry(timeout=0.05)
+    fut = registry.expect("10", lambda data: "never")
+    assert fut.result(timeout=2) == ""
+    assert registry.pending() == 0
+
+
+def test_webhook_server_round_trip():
+    seen = []
+    handler = lambda p: seen.append(p) or p.get("ok", False)  # noqa: E731
+    server = WebhookServer("127.0.0.1", 0, handler, token="s3cret").start()
+    host, port = server.address
+    try:
+        url = f"http://{host}:{port}/genapi?token=s3cret"
+        bad = f"http://{host}:{port}/genapi?token=guess"
+        assert requests.post(bad, json={"ok": True}, timeout=5).status_code == 403
+        assert requests.post(url, json={"ok": True}, timeout=5).status_code == 200
+        assert requests.post(url, json={"ok": False}, timeout=5).status_code == 404
+        assert requests.post(url, data="nope", timeout=5).status_code == 400
+    finally:
+        server.stop()
+    assert seen == [{"ok": True}, {"ok": False}]
+
+
+def test_make_card_attaches_image_later(monkeypatch):
+    pending = Future()
+    attached = []
+    monkeypatch.setattr(lesson, "image_callback_mode", lambda: True)
+    monkeypatch.setattr(lesson, "start_image_file", lambda sentence: pending)
+    monkeypatch.setattr(lesson, "generate_sentence", lambda w: "Der Hund schläft.")
+    monkeypatch.setattr(lesson, "translate_text", lambda text, src, tgt: "Собака спит")
+    monkeypatch.setattr(lesson, "add_anki_note", lambda **kwargs: 5)
+    monkeypatch.setattr(lesson, "attach_image", lambda note_id, path: attached.append((note_id, path)))
+
+    result = lesson.make_card("Hund", "de", "Deck", "tag")
+
+    assert result["note_id"] == 5
+    assert result["image"] == ""
+    assert result["message"] == "Карточка создана, изображение будет добавлено позже"
+    assert attached == []
+    pending.set_result("media/late.png")
+    assert attached == [(5, "media/late.png")]
+
+
+def test_make_card_async_attaches_image_later(monkeypatch):
+    pending = Future()
+    attached = []
+
+    async def start(sentence):
+        return pending
+
+    async def sentence(word):
+        return "Der Hund schläft."
+
+    async def translate(text, src, tgt):
+        return "Собака спит"
+
+    async def add_note(**kwargs):
+        return 6
+
+    monkeypatch.setattr(lesson, "image_deferred", lambda: False)
+    monkeypatch.setattr(lesson, "image_breaker_open", lambda: False)
+    monkeypatch.setattr(lesson, "image_callback_mode", lambda: True)
+    monkeypatch.setattr(lesson, "start_image_file_async", start)
+    monkeypatch.setattr(lesson, "generate_sentence_async", sentence)
+    monkeypatch.setattr(lesson, "translate_text_async", translate)
+    monkeypatch.setattr(lesson, "add_anki_note_async", add_note)
+    monkeypatch.setattr(lesson, "attach_image", lambda note_id, path: attached.append((note_id, path)))
+
+    result = asyncio.run(lesson.make_card_async("Hund", "de", "Deck", "tag"))
+
+    assert result["note_id"] == 6
+    assert result["message"] == "Карточка создана, изображение будет добавлено позже"
+    pending.set_result("media/late.png")
+    assert attached == [(6, "media/late.png")]
+
+
+def test_attach_image_updates_back_field(monkeypatch):
+    calls = []
+
+    def fake_invoke(action, **params):
+        calls.append((action, params))
+        if action == "storeMediaFile":
+            return params["filename"]
+        if action == "notesInfo":
+            return [{"fields": {"Back": {"value": "<div>Satz</div>"}}}]
+        return None
+
+    monkeypatch.setattr(anki, "_invoke", fake_invoke)
+    monkeypatch.setattr(anki.settings, "ANKI_CONNECT_URL", "http://127.0.0.1:8765")
+
+    assert anki.attach_image(5, "media/late.png") == "late.png"
+    assert calls[-1] == (
+        "updateNoteFields",
+        {"note": {"id": 5, "fields": {"Back": '<div>Satz</div><br><img src="late.png">'}}},
+    )
+
+
+def _callback_mode(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        image,
+        "settings",
+        SimpleNamespace(
+            GENAPI_API_KEY="key",
+            GENAPI_MODEL_ID="m",
+            GENAPI_SIZE="1024x1024",
+            GENAPI_QUALITY="low",
+            GENAPI_BACKGROUND="transparent",
+            GENAPI_IS_SYNC=False,
+            GENAPI_CALLBACK_URL="https://example.org/cb",
+        ),
+    )
+    monkeypatch.setattr(
+        image_callbacks, "settings", SimpleNamespace(GENAPI_CALLBACK_URL="https://example.org/cb"),
+    )
+    monkeypatch.setattr(image, "MEDIA_DIR", tmp_path)
+    monkeypatch.setattr(image_callbacks, "ensure_receiver", lambda: None)
+    monkeypatch.setattr(image_callbacks, "registry", image_callbacks.CallbackRegistry(60))
+
+
+def test_start_image_file_waits_for_callback(monkeypatch, tmp_path):
+    _callback_mode(monkeypatch, tmp_path)
+    sent = {}
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        sent.update(json)
+        return SimpleNamespace(
+            status_code=200, raise_for_status=lambda: None, json=lambda: {"request_id": 11}
+        )
+
+    monkeypatch.setattr(image, "get_session", lambda url: SimpleNamespace(post=fake_post))
+
+    fut = image.start_image_file("Hallo")
+    token = image_callbacks.callback_token()
+    assert sent["callback_url"] == f"https://example.org/cb?token={token}"
+    assert sent["is_sync"] is False
+    assert not fut.done()
+
+    image_callbacks.registry.deliver(_callback(11, b"late-png"))
+    path = fut.result(timeout=1)
+    assert path.startswith("media/")
+    assert (tmp_path / Path(path).name).read_bytes() == b"late-png"
+
+
+def test_generate_image_file_waits_for_callback(monkeypatch, tmp_path):
+    _callback_mode(monkeypatch, tmp_path)
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        # GenAPI присылает результат позже, уже после ответа на запрос
+        deliver = image_callbacks.registry.deliver
+        threading.Timer(0.05, deliver, [_callback(12, b"sync-png")]).start()
+        return SimpleNamespace(
+            status_code=200, raise_for_status=lambda: None, json=lambda: {"request_id": 12}
+        )
+
+    monkeypatch.setattr(image, "get_session", lambda url: SimpleNamespace(post=fake_post))
+
+    path = image.generate_image_file("Hallo")
+    assert (tmp_path / Path(path).name).read_bytes() == b"sync-png"
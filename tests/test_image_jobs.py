@@ -0,0 +1,170 @@
+import asyncio
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from app.mcp_tools import lesson
+from app.orchestration.image_jobs import ImageJobs
+
+
+def test_job_generates_and_attaches(tmp_path):
+    attached = []
+    jobs = ImageJobs(
+        tmp_path / "jobs.sqlite",
+        generate=lambda sentence: f"media/{sentence}.png",
+        attach=lambda note_id, path: attached.append((note_id, path)) or "a.png",
+    )
+
+    assert jobs.enqueue(7, "satz").result(timeout=5) == "a.png"
+    assert attached == [(7, "media/satz.png")]
+    stats = jobs.stats()
+    assert stats["done"] == 1 and stats["pending"] == 0
+    jobs.close()
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    calls = []
+    jobs = ImageJobs(
+        tmp_path / "jobs.sqlite",
+        generate=lambda sentence: calls.append(sentence) or "",
+        attach=lambda note_id, path: "never",
+        max_attempts=3,
+        backoff_s=0.5,
+        max_backoff_s=0.75,
+    )
+    waits = []
+    jobs._stop = SimpleNamespace(wait=lambda delay: waits.append(delay) or False, set=lambda: None)
+
+    assert jobs.enqueue(1, "satz").result(timeout=5) == ""
+    assert len(calls) == 3
+    assert waits == [0.5, 0.75]
+    assert jobs.stats()["failed"] == 1
+    jobs.close()
+
+
+def test_close_interrupts_backoff_and_keeps_job_pending(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    jobs = ImageJobs(path, generate=lambda s: "", attach=lambda n, p: "", backoff_s=60)
+    fut = jobs.enqueue(1, "satz")
+    start = time.monotonic()
+    jobs.close()
+    assert fut.result(timeout=5) == ""
+    assert time.monotonic() - start < 5
+    assert ImageJobs(path, generate=str, attach=str).stats()["pending"] == 1
+
+
+def test_pending_jobs_survive_restart(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    conn = sqlite3.connect(path)
+    ImageJobs(path, generate=lambda s: "", attach=lambda n, p: "").close()
+    now = time.time()
+    conn.execute(
+        "INSERT INTO jobs (note_id, sentence, status, created_at, updated_at) "
+        "VALUES (3, 'satz', 'pending', ?, ?)",
+        (now, now),
+    )
+    conn.commit()
+    conn.close()
+
+    attached = []
+    jobs = ImageJobs(
+        path,
+        generate=lambda sentence: "media/x.png",
+        attach=lambda note_id, path: attached.append(note_id) or "x.png",
+    )
+    assert jobs.resume() == 1
+    jobs.close()
+    assert attached == [3]
+    assert ImageJobs(path, generate=str, attach=str).stats()["done"] == 1
+
+
+def test_resume_skips_jobs_of_live_owners(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    ImageJobs(path, generate=lambda s: "", attach=lambda n, p: "").close()
+    host, now = socket.gethostname(), time.time()
+    rows = [
+        (1, "otherhost:1:a", now + 60),  # живой процесс на другом хосте — не трогаем
+        (2, "otherhost:1:a", now - 1),  # аренда истекла
+        (3, f"{host}:999999999:b", now + 60),  # процесс этого хоста умер
+        (4, None, None),  # запись до появления аренды
+    ]
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO jobs (note_id, sentence, status, created_at, updated_at, owner, lease_until) "
+        "VALUES (?, 'satz', 'pending', 0, 0, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+    attached = []
+    jobs = ImageJobs(
+        path,
+        generate=lambda sentence: "media/x.png",
+        attach=lambda note_id, p: attached.append(note_id) or "x.png",
+    )
+    other = ImageJobs(path, generate=str, attach=str)
+    assert jobs.resume() == 3
+    jobs.close()
+    assert other.resume() == 0  # всё уже забрано
+    other.close()
+    assert sorted(attached) == [2, 3, 4]
+
+
+def test_make_card_defers_image(monkeypatch):
+    queued = []
+    monkeypatch.setattr(lesson, "generate_sentence", lambda w: "Der Hund schläft.")
+    monkeypatch.setattr(lesson, "translate_text", lambda text, src, tgt: "Собака спит")
+    monkeypatch.setattr(lesson, "add_anki_note", lambda **kwargs: 5)
+    monkeypatch.setattr(
+        lesson, "generate_image_file", lambda s: (_ for _ in ()).throw(AssertionError("blocked"))
+    )
+    monkeypatch.setattr(lesson, "enqueue_image", lambda note_id, s: queued.append((note_id, s)))
+
+    result = lesson.make_card("Hund", "de", "Deck", "tag", defer_image=True)
+
+    assert result["note_id"] == 5
+    assert result["image"] == ""
+    assert result["message"] == "Карточка создана, изображение будет добавлено позже"
+    assert queued == [(5, "Der Hund schläft.")]
+
+
+def test_make_card_async_queues_image_off_the_loop(monkeypatch):
+    threads = []
+
+    async def fake_sentence(word):
+        return "Der Hund schläft."
+
+    async def fake_translate(text, src, tgt):
+        return "Собака спит"
+
+    async def fake_add_note(**kwargs):
+        return 5
+
+    monkeypatch.setattr(lesson, "generate_sentence_async", fake_sentence)
+    monkeypatch.setattr(lesson, "translate_text_async", fake_translate)
+    monkeypatch.setattr(lesson, "add_anki_note_async", fake_add_note)
+    monkeypatch.setattr(lesson, "image_deferred", lambda: True)
+    monkeypatch.setattr(
+        lesson, "enqueue_image", lambda note_id, s: threads.append(threading.current_thread())
+    )
+
+    result = asyncio.run(lesson.make_card_async("Hund", "de", "Deck", "tag"))
+
+    assert result["note_id"] == 5
+    # запись в очередь идёт не в потоке event loop
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+
+
+def test_deferred_image_waits_for_buffered_note(monkeypatch):
+    queued = []
+    note = Future()
+    monkeypatch.setattr(lesson, "enqueue_image", lambda note_id, s: queued.append(note_id))
+
+    lesson._enqueue_when_created(note, "Satz")
+    assert queued == []
+    note.set_result(11)
+    assert queued == [11]
@@ -0,0 +1,50 @@
+from app.cache.image_store import ImageStore, image_key
+
+
+def test_lookup_does_not_create_index(tmp_path):
+    store = ImageStore(tmp_path)
+    assert store.get("missing") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_put_get_and_dedup(tmp_path):
+    store = ImageStore(tmp_path)
+    first = store.put(image_key("m", "a"), b"\x89PNG same bytes")
+    second = store.put(image_key("m", "b"), b"\x89PNG same bytes")
+
+    assert first == second
+    assert first.endswith(".png")
+    assert store.get(image_key("m", "a")) == first
+    assert store.get(image_key("m", "b")) == first
+    stats = store.stats()
+    assert stats["entries"] == 1
+    assert stats["dedup"] == 1
+    assert stats["hits"] == 2
+
+
+def test_quota_evicts_least_recently_used(tmp_path):
+    store = ImageStore(tmp_path, quota_bytes=25)
+    old = store.put("old", b"a" * 10)
+    recent = store.put("recent", b"b" * 10)
+    store.get("old")  # теперь "recent" использовался давнее
+    store.put("new", b"c" * 10)
+
+    assert store.get("recent") is None
+    assert not (tmp_path / recent).exists()
+    assert store.get("old") == old
+    assert store.stats()["evictions"] == 1
+
+
+def test_missing_file_is_forgotten(tmp_path):
+    store = ImageStore(tmp_path)
+    name = store.put("k", b"data")
+    (tmp_path / name).unlink()
+    assert store.get("k") is None
+    assert store.stats()["entries"] == 0
+
+
+def test_image_key_depends_on_params():
+    assert image_key("m", "p", size="1") != image_key("m", "p", size="2")
+    assert image_key("m", "p", size="1", quality="low") == image_key(
+        "m", "p", quality="low", size="1"
+    )
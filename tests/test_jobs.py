@@ -0,0 +1,97 @@
+import time
+
+from app.orchestration.jobs import JobQueue, percentile
+from app.worker import Worker
+
+
+def test_enqueue_lease_complete(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite")
+    job_id = queue.enqueue("make_card", {"word": "Hund"})
+
+    job = queue.lease("w1")
+    assert job.id == job_id and job.payload == {"word": "Hund"} and job.attempts == 1
+    assert queue.lease("w2") is None  # уже закреплено за w1
+
+    assert queue.complete(job_id, {"note_id": 5}, token=job.lease_token)
+    done = queue.get(job_id)
+    assert done.status == "done" and done.result == {"note_id": 5}
+    stats = queue.stats()
+    assert stats["depth"] == 0 and stats["by_status"]["done"] == 1
+    assert set(stats["latency_ms"]) == {"p50", "p95", "p99"}
+
+
+def test_retry_backoff_then_dead_letter(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite", max_attempts=2, backoff_s=60)
+    job_id = queue.enqueue("make_card", {})
+
+    job = queue.lease("w")
+    assert queue.fail(job_id, "boom", token=job.lease_token) == "queued"
+    assert queue.lease("w") is None  # ждёт backoff
+
+    queue.backoff_s = 0
+    queue.conn.execute("UPDATE jobs SET available_at = 0")
+    job = queue.lease("w")
+    assert job.attempts == 2
+    assert queue.fail(job_id, "boom again", token=job.lease_token) == "dead"
+    assert [j.id for j in queue.dead()] == [job_id]
+    assert queue.requeue(job_id) and queue.get(job_id).status == "queued"
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite", lease_s=0)
+    job_id = queue.enqueue("make_card", {})
+    late = queue.lease("host:1")
+
+    # тот же воркер (другой поток) берёт задание снова — аренда уже другая
+    job = queue.lease("host:1")
+    assert job.id == job_id and job.attempts == 2
+    assert job.lease_token != late.lease_token
+
+    # опоздавший поток не может ни продлить, ни завершить, ни провалить чужую аренду
+    assert not queue.renew(job_id, late.lease_token)
+    assert not queue.complete(job_id, {"note_id": 1}, token=late.lease_token)
+    assert queue.fail(job_id, "late", token=late.lease_token) == "lost"
+    assert queue.get(job_id).status == "leased"
+    assert queue.complete(job_id, {"note_id": 2}, token=job.lease_token)
+    assert queue.get(job_id).result == {"note_id": 2}
+
+
+def test_worker_renews_lease_of_long_handler(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite", lease_s=0.15)
+    taken = []
+
+    def slow(payload):
+        time.sleep(0.5)  # дольше аренды
+        taken.append(queue.lease("other"))
+        return "ok"
+
+    worker = Worker(queue, {"slow": slow}, notify=None)
+    job_id = queue.enqueue("slow", {})
+    assert worker.run_once()
+    assert taken == [None]  # аренду продлевали — второй раз задание не выдали
+    assert queue.get(job_id).status == "done"
+
+
+def test_worker_runs_handler_and_notifies(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite", max_attempts=1)
+    notified = []
+    worker = Worker(
+        queue,
+        {"ok": lambda p: {"word": p["word"]}, "bad": lambda p: 1 / 0},
+        notify=lambda job: notified.append((job.id, job.status)),
+    )
+    ok = queue.enqueue("ok", {"word": "Hund"})
+    bad = queue.enqueue("bad", {})
+
+    assert worker.run_once() and worker.run_once()
+    assert not worker.run_once()
+    assert queue.get(ok).result == {"word": "Hund"}
+    assert queue.get(bad).status == "dead" and "division" in queue.get(bad).error
+    assert notified == [(ok, "done"), (bad, "dead")]
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 95) == 0.0
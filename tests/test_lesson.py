@@ -23,6 +23,10 @@ def test_make_card_no_image(monkeypatch):
 
     result = lesson.make_card("Hund", "de", "Deck", "tag")
 
+    timings = result.pop("timings")
+    assert set(timings) == {
+        "word_de", "sentence_de", "translation_ru", "image", "media", "back", "note"
+    }
     assert result == {
         "note_id": 42,
         "front": "Hund",
@@ -31,3 +35,21 @@ def test_make_card_no_image(monkeypatch):
         "message": "Карточка создана без изображения",
     }
     assert params["media_path"] is None
+
+
+def test_make_card_media_upload_failure(monkeypatch):
+    monkeypatch.setattr(lesson, "generate_sentence", lambda w: "Der Hund schläft.")
+    monkeypatch.setattr(lesson, "translate_text", lambda text, src, tgt: "Собака спит")
+    monkeypatch.setattr(lesson, "generate_image_file", lambda sentence: "media/x.png")
+
+    def fail_upload(path):
+        raise RuntimeError("anki down")
+
+    monkeypatch.setattr(lesson, "store_media_file", fail_upload)
+    monkeypatch.setattr(lesson, "add_anki_note", lambda **kwargs: 1)
+
+    result = lesson.make_card("Hund", "de", "Deck", "tag")
+
+    assert result["image"] == ""
+    assert "<img" not in result["back"]
+    assert result["message"] == "Карточка создана без изображения"
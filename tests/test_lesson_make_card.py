@@ -34,7 +34,7 @@ def test_make_card_happy_path(monkeypatch):
 
     result = lesson.make_card("Hund", "de", "Deck", "tag")
 
-    assert set(result) == {"note_id", "front", "back", "image", "message"}
+    assert set(result) == {"note_id", "front", "back", "image", "message", "timings"}
     assert result["note_id"] == 123
     assert result["front"] == "Hund"
     assert (
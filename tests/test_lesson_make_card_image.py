@@ -28,6 +28,12 @@ def _prepare(monkeypatch, tmp_path):
 
     monkeypatch.setattr(lesson, "add_anki_note", fake_add_anki_note)
 
+    def fake_store_media_file(path):
+        called["uploaded"] = path
+        return Path(path).name
+
+    monkeypatch.setattr(lesson, "store_media_file", fake_store_media_file)
+
     fake_settings = SimpleNamespace(
         GENAPI_API_KEY="key",
         GENAPI_MODEL_ID="m",
@@ -49,7 +55,7 @@ def test_make_card_image_success(monkeypatch, tmp_path):
     img_bytes = b"img-bytes"
     b64 = base64.b64encode(img_bytes).decode()
     resp = type("R", (), {"status_code": 200, "text": "", "json": lambda self: {"data": [{"b64_json": b64}]}})()
-    monkeypatch.setattr(image.requests, "post", lambda *a, **k: resp)
+    monkeypatch.setattr(image, "get_session", lambda url: SimpleNamespace(post=lambda *a, **k: resp))
 
     result = lesson.make_card("Hund", "de", "Deck", "tag")
 
@@ -61,7 +67,9 @@ def test_make_card_image_success(monkeypatch, tmp_path):
 
     assert (tmp_path / Path(result["image"]).name).read_bytes() == img_bytes
     assert called["back_html"] == result["back"]
-    assert called["media_path"] == result["image"]
+    # media is uploaded by its own stage as soon as the image is ready
+    assert called["uploaded"] == result["image"]
+    assert called["media_path"] is None
 
 
 def test_make_card_image_failure(monkeypatch, tmp_path):
@@ -72,7 +80,7 @@ def test_make_card_image_failure(monkeypatch, tmp_path):
         (),
         {"status_code": 500, "text": "boom", "json": lambda self: (_ for _ in ()).throw(RuntimeError("boom"))},
     )()
-    monkeypatch.setattr(image.requests, "post", lambda *a, **k: resp)
+    monkeypatch.setattr(image, "get_session", lambda url: SimpleNamespace(post=lambda *a, **k: resp))
 
     result = lesson.make_card("Hund", "de", "Deck", "tag")
 
@@ -83,6 +91,7 @@ def test_make_card_image_failure(monkeypatch, tmp_path):
     assert result["message"] == "Карточка создана без изображения"
 
     assert called["media_path"] is None
+    assert "uploaded" not in called
     assert "<img" not in called["back_html"]
     assert list(tmp_path.iterdir()) == []
 
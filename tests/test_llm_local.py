@@ -0,0 +1,49 @@
+import asyncio
+import importlib
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.mcp_tools import text
+from app.mcp_tools.llm_local import LocalBackend
+from app.tools.llm_standin import StandinServer, load_fixtures
+
+# пакет app.mcp_tools затирает одноимённый атрибут, поэтому берём сам модуль
+llm_text = importlib.import_module("app.mcp_tools.llm_text")
+
+
+@pytest.fixture
+def standin():
+    with StandinServer(load_fixtures()) as server:
+        yield server
+
+
+def test_local_backend_chat_and_stream(standin):
+    backend = LocalBackend(standin.base_url, model="qwen", parallel=2)
+    messages = text._translate_messages("Hund", "ru")
+    assert backend.chat(messages) == "собака"
+    assert standin.requests[-1]["model"] == "qwen"
+    sentence = text._translate_messages("Der Hund wartet jeden Abend geduldig an der Tür.", "ru")
+    assert "".join(backend.chat_stream(sentence)) == "Собака каждый вечер терпеливо ждёт у двери."
+
+    async def main():
+        return await backend.chat_async(messages)
+
+    assert asyncio.run(main()) == "собака"
+
+
+def test_pipeline_offline_through_local_backend(monkeypatch, standin):
+    monkeypatch.setattr(llm_text, "settings", SimpleNamespace(TEXT_BACKEND="local"))
+    monkeypatch.setattr("app.mcp_tools.llm_local._backend", LocalBackend(standin.base_url))
+    monkeypatch.setattr(text, "llm_text", llm_text)
+    monkeypatch.setattr(
+        text, "settings", SimpleNamespace(TEXT_STREAM_ENABLED=True, TEXT_BATCH_PARALLEL=2)
+    )
+    assert text.generate_sentence("Hund") == "Der Hund wartet jeden Abend geduldig an der Tür."
+    assert standin.requests[-1]["stream"] is True
+    assert text.translate_many(["Hund", "Haus"], "de", "ru") == ["собака", "дом"]
+    # неизвестный запрос — 404 от заглушки, а не обращение к OpenRouter
+    monkeypatch.setattr(time, "sleep", lambda s: None)
+    with pytest.raises(text.NetworkError):
+        text.translate_text("Katze", "de", "ru")
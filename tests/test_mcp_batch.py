@@ -10,21 +10,91 @@ def test_make_cards_from_list_handles_errors(monkeypatch):
 
     calls = []
 
-    def fake_make_card(word, lang, deck, tag):
+    def fake_make_card(word, lang, deck, tag, prefilled=None, anki=None):
         calls.append(word)
         if word == "bad":
             raise RuntimeError("boom")
         return {"word": word}
 
     monkeypatch.setattr(batch, "make_card", fake_make_card)
+    monkeypatch.setattr(batch, "_prefetch_text", lambda words, lang: [{} for _ in words])
 
     words = ["good", "bad", "great"]
     result = batch.make_cards_from_list(words, "de", "Deck", "tag")
 
-    # ensure make_card was called for all words
-    assert calls == words
+    # ensure make_card was called for all words (order may vary across workers)
+    assert sorted(calls) == sorted(words)
     # ensure error for failing word captured
     assert result[1] == {"word": "bad", "error": "boom"}
     # ensure successful words return their data
     assert result[0] == {"word": "good"}
     assert result[2] == {"word": "great"}
+
+
+def test_make_cards_from_list_parallel_keeps_order(monkeypatch):
+    import threading
+    import time
+
+    from app.mcp_tools import batch
+
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+    streamed = []
+
+    def fake_make_card(word, lang, deck, tag, prefilled=None, anki=None):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        # later words finish first
+        time.sleep(0.05 * (5 - int(word)))
+        with lock:
+            active["now"] -= 1
+        return {"front": word}
+
+    monkeypatch.setattr(batch, "make_card", fake_make_card)
+    monkeypatch.setattr(batch, "_prefetch_text", lambda words, lang: [{} for _ in words])
+
+    words = ["1", "2", "3", "4"]
+    result = batch.make_cards_from_list(
+        words, "de", "Deck", "tag", workers=2, on_result=lambda i, r: streamed.append(i)
+    )
+
+    assert [r["front"] for r in result] == words
+    assert active["peak"] == 2
+    assert sorted(streamed) == [0, 1, 2, 3]
+    assert streamed != [0, 1, 2, 3]
+
+
+def test_batch_translates_in_bulk(monkeypatch):
+    from app.mcp_tools import batch
+
+    bulk_calls = []
+
+    def fake_translate_many(texts, src, tgt):
+        bulk_calls.append((list(texts), src, tgt))
+        if src == "ru":
+            return [{"собака": "Hund", "дом": "Haus"}[t] for t in texts]
+        return [f"RU({t})" for t in texts]
+
+    seen = {}
+
+    def fake_make_card(word, lang, deck, tag, prefilled=None, anki=None):
+        seen[word] = prefilled
+        return {"front": prefilled["word_de"]}
+
+    monkeypatch.setattr(batch, "translate_many", fake_translate_many)
+    monkeypatch.setattr(batch, "generate_sentences", lambda ws: [f"Das ist {w}." for w in ws])
+    monkeypatch.setattr(batch, "make_card", fake_make_card)
+
+    result = batch.make_cards_from_list(["собака", "дом"], None, "Deck", "tag", workers=2)
+
+    assert [r["front"] for r in result] == ["Hund", "Haus"]
+    assert bulk_calls == [
+        (["собака", "дом"], "ru", "de"),
+        (["Das ist Hund.", "Das ist Haus."], "de", "ru"),
+    ]
+    assert seen["дом"] == {
+        "word_de": "Haus",
+        "sentence_de": "Das ist Haus.",
+        "translation_ru": "RU(Das ist Haus.)",
+    }
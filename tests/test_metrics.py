@@ -0,0 +1,91 @@
+import json
+import random
+import urllib.request
+from types import SimpleNamespace
+
+import requests
+
+from app.net import http
+from app.net.http import request_json
+from app.telemetry import metrics
+from app.telemetry.metrics import MetricsServer, Registry
+from app.tool_logging import log_tool
+
+
+def test_histogram_percentiles_and_window(monkeypatch):
+    registry = Registry(prefix="t_")
+    hist = registry.histogram("lat_ms", "Latency.", window_s=60)
+    now = [1000.0]
+    monkeypatch.setattr(metrics.time, "monotonic", lambda: now[0])
+
+    rnd = random.Random(1)
+    values = [rnd.uniform(1, 1000) for _ in range(5000)]
+    for v in values:
+        hist.observe(v, provider="a")
+    values.sort()
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert abs(hist.quantile(q, provider="a") - exact) / exact < 0.07
+    assert hist.quantile(0.5, provider="b") == 0.0
+
+    # через два окна старые значения уже не влияют на перцентили, счётчики — накопительные
+    now[0] += 130
+    hist.observe(5, provider="a")
+    assert hist.quantile(0.99, provider="a") <= 5.25
+    snap = registry.snapshot()["lat_ms"]["provider=a"]
+    assert snap["count"] == 5001
+
+    text = registry.render()
+    assert "# TYPE t_lat_ms summary" in text
+    assert 't_lat_ms{provider="a",quantile="0.95"}' in text
+    assert 't_lat_ms_count{provider="a"} 5001' in text
+
+
+def test_request_json_and_log_tool_feed_registry(monkeypatch):
+    metrics.REGISTRY.reset()
+
+    def fake_request(method, url, json=None, headers=None, timeout=None):
+        if "bad" in url:
+            raise requests.RequestException("boom")
+        return SimpleNamespace(status_code=200, raise_for_status=lambda: None, json=lambda: {})
+
+    monkeypatch.setattr(http, "get_session", lambda url: SimpleNamespace(request=fake_request))
+    request_json("GET", "http://ok.example/x")
+    try:
+        request_json("GET", "http://bad.example/x", retries=1)
+    except http.NetworkError:
+        pass
+
+    tools = {}
+    server = SimpleNamespace(tool=lambda name: lambda f: tools.setdefault(name, f))
+
+    @log_tool(server, "sample")
+    def sample():
+        return 1
+
+    sample()
+
+    assert metrics.HTTP_REQUESTS.value(provider="ok.example", status=200) == 1
+    assert metrics.HTTP_REQUESTS.value(provider="bad.example", status="error") == 1
+    assert metrics.HTTP_IN_FLIGHT.value(provider="ok.example") == 0
+    assert metrics.TOOL_CALLS.value(tool="sample", status="ok") == 1
+    snap = metrics.metrics_snapshot()
+    assert snap["http_latency_ms"]["provider=ok.example"]["count"] == 1
+    assert snap["tool_latency_ms"]["tool=sample"]["count"] == 1
+
+
+def test_metrics_server_serves_prometheus_and_json():
+    registry = Registry(prefix="t_")
+    registry.counter("calls_total", "Calls.").inc(step="text.generate")
+    server = MetricsServer("127.0.0.1", 0, registry).start()
+    try:
+        host, port = server.address
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics") as resp:
+            body = resp.read().decode()
+            assert resp.headers["Content-Type"].startswith("text/plain")
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics.json") as resp:
+            data = json.load(resp)
+    finally:
+        server.stop()
+    assert 't_calls_total{step="text.generate"} 1' in body
+    assert data == {"calls_total": {"step=text.generate": 1}}
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+from app.mcp_tools import text
+from app.mcp_tools.model_router import Candidate, ModelRouter, parse_candidates
+
+
+def test_parse_candidates():
+    assert parse_candidates("a/m:0.5, b/m ,") == [Candidate("a/m", 0.5), Candidate("b/m")]
+    assert parse_candidates("") == []
+
+
+def test_router_prefers_fast_valid_model_within_cost():
+    router = ModelRouter(
+        {"generate": [Candidate("slow"), Candidate("fast"), Candidate("pricey", 5)]},
+        max_cost=1,
+        explore_every=0,
+    )
+    # без статистики — порядок конфигурации, дорогая модель отброшена
+    assert router.order("generate") == ["slow", "fast"]
+    for _ in range(10):
+        router.record("generate", "slow", True, 900)
+        router.record("generate", "fast", True, 200)
+    assert router.order("generate") == ["fast", "slow"]
+    # быстрая, но почти всегда без целевого слова — хуже медленной
+    for _ in range(10):
+        router.record_validation("generate", "fast", False)
+    assert router.order("generate") == ["slow", "fast"]
+    assert router.stats()["generate"]["fast"]["p95_ms"] == 200
+
+
+def test_router_puts_always_failing_model_last():
+    router = ModelRouter({"generate": [Candidate("dead"), Candidate("good")]}, explore_every=0)
+    for _ in range(50):
+        router.record("generate", "good", True, 300)
+        router.record("generate", "dead", False, 50)
+    assert router.order("generate") == ["good", "dead"]
+
+
+def test_chat_falls_back_and_credits_validation(monkeypatch):
+    monkeypatch.setattr(
+        text, "settings", SimpleNamespace(TEXT_MODELS_GENERATE="broken,good")
+    )
+    monkeypatch.setattr(text, "_router", None)
+    calls = []
+
+    class Backend:
+        def chat(self, messages, model=None):
+            calls.append(model)
+            if model == "broken":
+                raise RuntimeError("down")
+            return "Der Hund schläft im Garten."
+
+    monkeypatch.setattr(text, "llm_text", Backend())
+    assert text.generate_sentence("Hund") == "Der Hund schläft im Garten."
+    assert calls == ["broken", "good"]
+    stats = text.router_stats()["generate"]
+    assert stats["broken"]["success_rate"] < stats["good"]["success_rate"]
+    assert stats["good"]["pass_rate"] > 0.5
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import requests
+
+from app.net import http
+from app.net.limits import (
+    TokenBucket,
+    concurrency_slot,
+    concurrency_slot_async,
+    configure_concurrency,
+    configure_rate_limits,
+    retry_after_s,
+)
+
+
+def test_concurrency_slot_caps_threads():
+    configure_concurrency({"capped.example": 2})
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def work():
+        with concurrency_slot("capped.example"):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(0.05)
+            with lock:
+                active["now"] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert active["peak"] == 2
+    configure_concurrency({"capped.example": 0})
+
+
+def test_concurrency_slot_async_shares_cap():
+    configure_concurrency({"async.example": 1})
+    active = {"now": 0, "peak": 0}
+
+    async def work():
+        async with concurrency_slot_async("async.example"):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.02)
+            active["now"] -= 1
+
+    async def main():
+        await asyncio.gather(*(work() for _ in range(4)))
+
+    asyncio.run(main())
+    assert active["peak"] == 1
+    configure_concurrency({"async.example": 0})
+
+
+def test_uncapped_provider_is_free():
+    with concurrency_slot("free.example"):
+        with concurrency_slot("free.example"):
+            pass
+
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=2, burst=2)
+    delays = [bucket.reserve(now=10.0) for _ in range(4)]
+    assert delays == [0.0, 0.0, 0.5, 1.0]
+    # после паузы накопленный запас не расходуется пачкой
+    assert bucket.reserve(now=20.0) == 0.0
+    bucket.pause(3, now=20.0)
+    assert bucket.reserve(now=20.0) == 3.0
+    assert bucket.reserve(now=20.0) == 3.5
+
+
+def test_retry_after_parsing():
+    assert retry_after_s({"Retry-After": "7"}) == 7.0
+    assert retry_after_s({}) is None
+    assert retry_after_s({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+    assert retry_after_s({"Retry-After": "soon"}) is None
+
+
+def test_request_json_honours_retry_after(monkeypatch):
+    class Response:
+        def __init__(self, status_code):
+            self.status_code = status_code
+            self.text = ""
+            self.headers = {"Retry-After": "2"}
+
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise requests.HTTPError(response=self)
+
+        def json(self):
+            return {"ok": True}
+
+    answers = [Response(429), Response(200)]
+    sleeps = []
+    monkeypatch.setattr(
+        http, "get_session", lambda url: SimpleNamespace(request=lambda *a, **k: answers.pop(0))
+    )
+    monkeypatch.setattr(time, "sleep", lambda s: sleeps.append(s))
+
+    # без квоты запрос сам ждёт Retry-After вместо backoff
+    assert http.request_json("GET", "http://quota.example") == {"ok": True}
+    assert sleeps == [2.0]
+
+    # с квотой пауза ставится на весь провайдер и ожидание идёт в bucket
+    configure_rate_limits({"quota.example": (100, 1)})
+    answers[:] = [Response(429), Response(200)]
+    sleeps.clear()
+    assert http.request_json("GET", "http://quota.example") == {"ok": True}
+    assert len(sleeps) == 1 and 1.9 < sleeps[0] <= 2.0
+    configure_rate_limits({"quota.example": (0, 1)})
+
+
+def test_configure_providers_from_settings(monkeypatch):
+    from app.net import limits
+    from app.net.limits import configure_providers, provider_caps, provider_rates
+
+    applied = {}
+    monkeypatch.setattr(limits, "configure_concurrency", lambda caps: applied.update(caps=caps))
+    monkeypatch.setattr(limits, "configure_rate_limits", lambda rates: applied.update(rates=rates))
+    configure_providers()
+    assert applied == {"caps": provider_caps(), "rates": provider_rates()}
+    assert provider_caps()["openrouter.ai"] > 0
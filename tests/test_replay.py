@@ -0,0 +1,104 @@
+import logging
+import time
+
+import pytest
+
+from app.net.http import NetworkError, request_json
+from app.net.replay import Cassette, recording, replaying
+from app.net.sse import chat_delta, stream_sse
+from app.orchestration.bench import count_log_records, log_overhead_report, run_bench
+from app.tools.llm_standin import StandinServer, load_fixtures
+
+
+def _chat(base_url, user):
+    payload = {
+        "model": "m",
+        "messages": [
+            {"role": "system", "content": "Translate to ru. Output only the translation."},
+            {"role": "user", "content": user},
+        ],
+    }
+    return request_json("POST", f"{base_url}/chat/completions", json=payload, retries=1)
+
+
+def test_record_then_replay_without_network(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    with StandinServer(load_fixtures()) as server, recording(path):
+        base_url = server.base_url
+        recorded = _chat(base_url, "Hund")
+    entry = Cassette(path).entries[0]
+    assert entry["status"] == 200 and entry["lat_ms"] >= 0
+    assert "authorization" not in {k.lower() for k in entry["headers"]}
+
+    # сервер остановлен: ответ приходит из кассеты, в том числе для другого тела
+    with replaying(path, speed=0) as adapter:
+        assert _chat(base_url, "Hund") == recorded
+        assert _chat(base_url, "Katze") == recorded
+    assert adapter.served == 2 and adapter.missing == 0
+
+
+def test_replay_serves_sse_streams(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    payload = {
+        "model": "m",
+        "stream": True,
+        "messages": [
+            {"role": "system", "content": "Translate to ru. Output only the translation."},
+            {"role": "user", "content": "Der Hund wartet jeden Abend geduldig an der Tür."},
+        ],
+    }
+
+    def streamed(base_url):
+        events = stream_sse("POST", f"{base_url}/chat/completions", json=payload, retries=1)
+        return "".join(chat_delta(e) for e in events)
+
+    with StandinServer(load_fixtures()) as server, recording(path):
+        base_url = server.base_url
+        recorded = streamed(base_url)
+    assert recorded == "Собака каждый вечер терпеливо ждёт у двери."
+    with replaying(path, speed=0):
+        assert streamed(base_url) == recorded
+
+
+def test_replay_injects_errors_and_latency(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    Cassette(path).append(
+        {"method": "GET", "url": "http://p.example/x", "status": 200, "text": "{}", "lat_ms": 50}
+    )
+    with replaying(path) as adapter:
+        start = time.perf_counter()
+        assert request_json("GET", "http://p.example/x", retries=1) == {}
+        assert time.perf_counter() - start >= 0.05
+    with replaying(path, speed=0, error_rate=1, error_status=503):
+        with pytest.raises(NetworkError) as err:
+            request_json("GET", "http://p.example/x", retries=1)
+    assert err.value.code == 503
+    with replaying(path, speed=0):
+        with pytest.raises(NetworkError) as err:
+            request_json("GET", "http://other.example/", retries=1)
+    assert err.value.code == "network"
+
+
+def test_run_bench_reports_stages_and_errors():
+    def card(word):
+        if word == "bad":
+            raise NetworkError("validation", "target word missing")
+        return {"timings": {"sentence": {"start_ms": 0, "lat_ms": 10}}}
+
+    report = run_bench(card, ["Hund", "bad"], cards=6, concurrency=3)
+    assert report["ok"] == 3 and report["errors"] == {"NetworkError:validation": 3}
+    assert report["stages_ms"]["sentence"]["p95"] == 10
+    assert report["cards_per_s"] > 0 and report["peak_rss_mb"] > 0
+
+
+def test_log_overhead_report_counts_records_per_card():
+    log = logging.getLogger("bench.test")
+    log.setLevel(logging.INFO)
+    with count_log_records() as logged:
+        run_bench(lambda w: log.info("ok", extra={"step": "x"}) or {}, ["Hund"], cards=4)
+    assert logged.count == 4
+
+    report = log_overhead_report(logged.count, 4, samples=200)
+    assert report["records_per_card"] == 1.0
+    for mode in ("sync", "queued"):
+        assert report[mode]["us_per_record"] > 0
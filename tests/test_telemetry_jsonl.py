@@ -1,13 +1,17 @@
 import json
 from pathlib import Path
 
-from app.telemetry.jsonl import log_event
+from app.telemetry.jsonl import JsonlWriter, flush_events, log_event
 
 
 def read_events(base: Path):
+    flush_events()
     path = base / "var" / "telemetry" / "events.jsonl"
     lines = path.read_text().splitlines()
-    return [json.loads(line) for line in lines]
+    events = [json.loads(line) for line in lines]
+    for event in events:
+        assert isinstance(event.pop("ts"), float)
+    return events
 
 
 def test_log_event_writes(tmp_path, monkeypatch):
@@ -33,3 +37,34 @@ def test_log_event_filters(tmp_path, monkeypatch):
     log_event("secret", payload)
     events = read_events(tmp_path)
     assert events == [{"name": "secret", "payload": {"keep": 42}}]
+
+
+def test_writer_buffers_and_rotates(tmp_path):
+    path = tmp_path / "events.jsonl"
+    writer = JsonlWriter(path, flush_interval_s=60, max_bytes=100, backup_count=2)
+    writer.write({"n": 0})
+    assert not path.exists()  # пока в буфере
+    for i in range(1, 40):
+        writer.flush()
+        writer.write({"n": i})
+    writer.close()
+    files = [tmp_path / "events.jsonl.2", tmp_path / "events.jsonl.1", path]
+    assert all(f.stat().st_size <= 100 for f in files)
+    assert not (tmp_path / "events.jsonl.3").exists()
+    numbers = [json.loads(line)["n"] for f in files for line in f.read_text().splitlines()]
+    assert numbers == list(range(numbers[0], 40))
+
+
+def test_writer_keeps_lines_when_disk_write_fails(tmp_path):
+    path = tmp_path / "events.jsonl"
+    writer = JsonlWriter(path, flush_interval_s=60, max_buffer=2, max_bytes=0, max_pending=3)
+    path.mkdir()  # открыть файл на запись не получится
+    for i in range(5):
+        writer.write({"n": i})
+    writer.flush()
+    assert writer._thread.is_alive()
+
+    path.rmdir()
+    writer.close()
+    # самые старые строки отброшены, остальные дописаны по порядку
+    assert [json.loads(line)["n"] for line in path.read_text().splitlines()] == [2, 3, 4]
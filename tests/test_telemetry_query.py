@@ -0,0 +1,124 @@
+import json
+import random
+
+from app.mcp_tools import lesson
+from app.telemetry import jsonl
+from app.telemetry.metrics import add_usage
+from app.telemetry.query import (
+    Rollup,
+    iter_events,
+    load_rollups,
+    parse_time,
+    tail,
+    write_daily_rollups,
+)
+
+DAY = 86400.0
+T0 = parse_time("2026-10-01")
+
+
+def write_events(path, events):
+    with path.open("a") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+def test_iter_events_window_names_rotation_and_tail(tmp_path):
+    path = tmp_path / "events.jsonl"
+    events = [
+        {"ts": 1000.0 + i, "name": "a" if i % 2 else "b", "payload": {"i": i}}
+        for i in range(3000)
+    ]
+    write_events(path.with_name("events.jsonl.1"), events[:1000])
+    write_events(path, events[1000:])
+    with path.open("a") as f:
+        f.write('{"ts": 9999, "name": "a", "pay')  # строку ещё дописывают
+
+    got = [e["payload"]["i"] for e in iter_events(path, names={"a"}, since=1500, until=1600)]
+    assert got == list(range(501, 600, 2))
+    window = iter_events(path, since=1998, until=2002)
+    assert [e["payload"]["i"] for e in window] == [998, 999, 1000, 1001]
+    assert sum(1 for _ in iter_events(path)) == 3000
+    assert [e["payload"]["i"] for e in tail(path, 3, names=["b"])] == [2994, 2996, 2998]
+    assert parse_time("15m", now=1000) == 100
+    assert parse_time("2026-10-01T00:00:00+00:00") == T0
+
+
+def test_card_events_roll_up_to_percentiles_errors_and_cost(tmp_path, monkeypatch):
+    monkeypatch.setenv("TELEMETRY_ENABLED", "true")
+    monkeypatch.setattr(jsonl, "EVENTS_PATH", tmp_path / "events.jsonl")
+
+    def sentence(word):
+        add_usage("api.openai.com")
+        if word == "Fehler":
+            raise RuntimeError("llm down")
+        return "Der Hund schläft."
+
+    monkeypatch.setattr(lesson, "generate_sentence", sentence)
+    monkeypatch.setattr(lesson, "translate_text", lambda text, src, tgt: "Собака спит")
+    monkeypatch.setattr(lesson, "generate_image_file", lambda sentence: "")
+    monkeypatch.setattr(lesson, "add_anki_note", lambda **kwargs: 1)
+    lesson.make_card("Hund", "de", "Deck", "tag")
+    try:
+        lesson.make_card("Fehler", "de", "Deck", "tag")
+    except RuntimeError:
+        pass
+    jsonl.flush_events()
+
+    cards = list(iter_events(tmp_path / "events.jsonl", names={"card"}))
+    assert [c["payload"]["ok"] for c in cards] == [True, False]
+    assert cards[0]["payload"]["requests"] == {"api.openai.com": 1}
+    assert "sentence_de" in cards[0]["payload"]["stages"]
+
+    rollup = Rollup.of(cards)
+    rnd = random.Random(1)
+    values = sorted(rnd.uniform(10, 5000) for _ in range(2000))
+    for v in values:
+        rollup.add({"ts": T0, "name": "card", "payload": {"ok": True, "lat_ms": v}})
+    summary = rollup.summary({"api.openai.com": 0.5})
+    card = summary["steps"]["lesson.make_card"]
+    assert card["count"] == 2002 and card["errors"] == 1
+    assert abs(card["p95"] - values[int(0.95 * 2002)]) / card["p95"] < 0.07
+    assert summary["cards"]["count"] == 2002
+    assert summary["cards"]["cost"] == 1.0
+    assert summary["steps"]["dag.sentence_de"]["count"] == 1
+
+
+def test_daily_rollups_are_incremental_and_merge(tmp_path):
+    path = tmp_path / "events.jsonl"
+    out = tmp_path / "daily"
+
+    def card(ts, lat_ms, ok=True):
+        return {"ts": ts, "name": "card", "payload": {"ok": ok, "lat_ms": lat_ms}}
+
+    write_events(
+        path, [card(T0 + 100, 10), card(T0 + DAY + 50, 15), card(T0 + DAY + 100, 20, ok=False)]
+    )
+    assert write_daily_rollups(path, out) == ["2026-10-01", "2026-10-02"]
+
+    # сырые события ротировали; старый день остаётся, в последний дописываются
+    # только новые события — начала дня в сырых файлах уже нет
+    path.unlink()
+    write_events(path, [card(T0 + DAY + 100, 20, ok=False), card(T0 + DAY + 200, 30)])
+    write_events(path, [card(T0 + 2 * DAY + 100, 40)])
+    assert write_daily_rollups(path, out) == ["2026-10-02", "2026-10-03"]
+    # повторный проход пересчитывает последний день целиком и ничего не удваивает
+    assert write_daily_rollups(path, out) == ["2026-10-03"]
+
+    total = load_rollups(out).summary()
+    assert total["cards"] == {
+        "count": 5, "errors": 1, "error_rate": 0.2, "requests_per_card": {}
+    }
+    assert total["steps"]["lesson.make_card"]["max"] == 40
+    second = load_rollups(out, since=T0 + DAY, until=T0 + 2 * DAY).summary()
+    assert second["cards"]["count"] == 3
+
+
+def test_cli_rollup_rejects_name_with_daily():
+    from typer.testing import CliRunner
+
+    from app.cli import app
+
+    result = CliRunner().invoke(app, ["events", "rollup", "--daily", "--name", "card"])
+    assert result.exit_code == 2
+    assert "--name cannot be combined with --daily" in result.output
@@ -37,3 +37,299 @@ def test_translate_text_fallback(monkeypatch):
 
     translated = text.translate_text("Hund", "de", "ru")
     assert translated == "собака"
+
+
+def test_translate_text_uses_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(text, "llm_text", None)
+    monkeypatch.setattr(
+        text,
+        "settings",
+        SimpleNamespace(
+            OPENROUTER_API_KEY="k",
+            OPENROUTER_TEXT_MODEL="m",
+            TEXT_CACHE_ENABLED=True,
+            TEXT_CACHE_PATH=str(tmp_path / "cache.sqlite"),
+            TEXT_CACHE_TTL_S=0,
+            TEXT_CACHE_MAX_ENTRIES=0,
+        ),
+    )
+    monkeypatch.setattr(text, "_cache", None)
+    calls = []
+
+    def fake_request_json(method, url, *, headers=None, json=None, timeout=30):  # noqa: D401
+        calls.append(json)
+        return {"choices": [{"message": {"content": "собака"}}]}
+
+    monkeypatch.setattr(text, "request_json", fake_request_json)
+
+    assert text.translate_text("Hund", "de", "ru") == "собака"
+    assert text.translate_text("Hund", "de", "ru") == "собака"
+    assert len(calls) == 1
+    assert text.cache_stats()["l1_hits"] == 1
+
+
+def test_cache_keys_on_the_model_that_answered(monkeypatch, tmp_path):
+    monkeypatch.setattr(text, "llm_text", None)
+    monkeypatch.setattr(
+        text,
+        "settings",
+        SimpleNamespace(
+            OPENROUTER_API_KEY="k",
+            OPENROUTER_TEXT_MODEL="m",
+            TEXT_MODELS_TRANSLATE="broken,good",
+            TEXT_CACHE_ENABLED=True,
+            TEXT_CACHE_PATH=str(tmp_path / "cache.sqlite"),
+            TEXT_CACHE_TTL_S=0,
+            TEXT_CACHE_MAX_ENTRIES=0,
+        ),
+    )
+    monkeypatch.setattr(text, "_cache", None)
+    monkeypatch.setattr(text, "_router", None)
+    calls = []
+
+    def fake_request_json(method, url, *, headers=None, json=None, timeout=30):  # noqa: D401
+        calls.append(json)
+        if json["model"] == "broken":
+            raise RuntimeError("down")
+        return {"choices": [{"message": {"content": "собака"}}]}
+
+    monkeypatch.setattr(text, "request_json", fake_request_json)
+
+    assert text.translate_text("Hund", "de", "ru") == "собака"
+    messages = calls[-1]["messages"]
+    cache = text._get_cache()
+    # ответила запасная модель — под её ключом, а не под OPENROUTER_TEXT_MODEL
+    assert cache.get(text._cache_key(messages, "good")) == "собака"
+    assert cache.get(text._cache_key(messages)) is None
+    assert text.translate_text("Hund", "de", "ru") == "собака"
+    assert [c["model"] for c in calls] == ["broken", "good"]
+
+
+def test_translate_many_single_request(monkeypatch):
+    import json
+
+    monkeypatch.setattr(text, "settings", SimpleNamespace(TRANSLATE_BATCH_SIZE=20))
+    calls = []
+
+    def fake_chat(messages):
+        items = json.loads(messages[-1]["content"])
+        calls.append(items)
+        return json.dumps([f"de:{i}" for i in items], ensure_ascii=False)
+
+    monkeypatch.setattr(text, "_chat", fake_chat)
+
+    out = text.translate_many(["кот", "дом", "кот"], "ru", "de")
+    assert out == ["de:кот", "de:дом", "de:кот"]
+    assert calls == [["кот", "дом"]]
+
+
+def test_translate_many_splits_bad_answer(monkeypatch):
+    import json
+
+    monkeypatch.setattr(text, "settings", SimpleNamespace(TRANSLATE_BATCH_SIZE=20))
+    calls = []
+
+    def fake_chat(messages):
+        items = json.loads(messages[-1]["content"])
+        calls.append(items)
+        if len(items) == 4:
+            return '["only", "three", "items"]'
+        return json.dumps([i.upper() for i in items])
+
+    monkeypatch.setattr(text, "_chat", fake_chat)
+
+    assert text.translate_many(["a", "b", "c", "d"], "de", "ru") == ["A", "B", "C", "D"]
+    assert calls == [["a", "b", "c", "d"], ["a", "b"], ["c", "d"]]
+
+
+def test_translate_many_empty_item_falls_back(monkeypatch):
+    monkeypatch.setattr(text, "settings", SimpleNamespace(TRANSLATE_BATCH_SIZE=20))
+    monkeypatch.setattr(text, "_chat", lambda messages: '["A", ""]')
+    monkeypatch.setattr(text, "translate_text", lambda t, src, tgt: f"single:{t}")
+
+    assert text.translate_many(["a", "b"], "de", "ru") == ["A", "single:b"]
+
+
+def test_generate_sentences_retries_only_failures(monkeypatch):
+    import json
+
+    monkeypatch.setattr(text, "settings", SimpleNamespace(TRANSLATE_BATCH_SIZE=20))
+    calls = []
+
+    def fake_chat(messages):
+        words = json.loads(messages[-1]["content"])
+        calls.append(words)
+        if len(calls) == 1:
+            return json.dumps(["Der Hund bellt laut.", "Das ist schön.", "Ich trinke Tee."])
+        return json.dumps([f"Ich sehe das {w} heute." for w in words])
+
+    monkeypatch.setattr(text, "_chat", fake_chat)
+
+    out = text.generate_sentences(["Hund", "Haus", "Tee"])
+    assert out == ["Der Hund bellt laut.", "Ich sehe das Haus heute.", "Ich trinke Tee."]
+    assert calls == [["Hund", "Haus", "Tee"], ["Haus"]]
+
+
+def test_generate_sentences_uses_own_batch_size(monkeypatch):
+    import json
+
+    monkeypatch.setattr(
+        text, "settings", SimpleNamespace(TRANSLATE_BATCH_SIZE=20, SENTENCE_BATCH_SIZE=2)
+    )
+    calls = []
+
+    def fake_chat(messages):
+        words = json.loads(messages[-1]["content"])
+        calls.append(words)
+        return json.dumps([f"Ich sehe das {w} heute." for w in words])
+
+    monkeypatch.setattr(text, "_chat", fake_chat)
+
+    assert len(text.generate_sentences(["Hund", "Haus", "Tee"])) == 3
+    assert sorted(map(len, calls)) == [1, 2]
+
+
+def test_generate_sentences_gives_up_after_attempts(monkeypatch):
+    monkeypatch.setattr(text, "settings", SimpleNamespace(TRANSLATE_BATCH_SIZE=20))
+    calls = []
+
+    def fake_chat(messages):
+        calls.append(messages)
+        return "not json"
+
+    monkeypatch.setattr(text, "_chat", fake_chat)
+
+    assert text.generate_sentences(["Hund", "Haus"]) == ["", ""]
+    assert len(calls) == text.SENTENCE_ATTEMPTS
+
+
+def _hedge_settings(monkeypatch, **extra):
+    monkeypatch.setattr(
+        text,
+        "settings",
+        SimpleNamespace(
+            TEXT_HEDGE_ENABLED=True,
+            TEXT_HEDGE_DELAY_MS=50,
+            TEXT_HEDGE_MIN_MS=0,
+            TEXT_HEDGE_MODEL="fast-model",
+            **extra,
+        ),
+    )
+    monkeypatch.setattr(text, "_hedge_counts", dict.fromkeys(text._hedge_counts, 0))
+    monkeypatch.setattr(text, "_latencies", text.deque(maxlen=text.HEDGE_WINDOW))
+
+
+def test_chat_hedge_wins_when_primary_is_slow(monkeypatch):
+    import time
+
+    _hedge_settings(monkeypatch)
+
+    class SlowPrimary:
+        def chat(self, messages, model=None):
+            if model is None:
+                time.sleep(0.5)
+                return "slow"
+            return "fast"
+
+    monkeypatch.setattr(text, "llm_text", SlowPrimary())
+    assert text._chat([{"role": "user", "content": "x"}]) == "fast"
+    stats = text.hedge_stats()
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1 and stats["primary_wins"] == 0
+
+
+def test_chat_without_hedge_when_primary_is_fast(monkeypatch):
+    _hedge_settings(monkeypatch)
+    models = []
+
+    class Fast:
+        def chat(self, messages, model=None):
+            models.append(model)
+            return "ok"
+
+    monkeypatch.setattr(text, "llm_text", Fast())
+    assert text._chat([{"role": "user", "content": "x"}]) == "ok"
+    assert models == [None]
+    assert text.hedge_stats()["primary_wins"] == 1
+
+
+def test_failed_primary_is_not_counted_as_win(monkeypatch):
+    import pytest
+
+    _hedge_settings(monkeypatch)
+
+    class Broken:
+        def chat(self, messages, model=None):
+            raise RuntimeError("down")
+
+    monkeypatch.setattr(text, "llm_text", Broken())
+    with pytest.raises(RuntimeError):
+        text._hedged_complete([{"role": "user", "content": "x"}])
+    assert text.hedge_stats()["primary_wins"] == 0
+
+
+def test_chat_async_hedge_cancels_loser(monkeypatch):
+    import asyncio
+
+    _hedge_settings(monkeypatch)
+    cancelled = []
+
+    class SlowPrimary:
+        async def chat_async(self, messages, model=None):
+            if model is None:
+                try:
+                    await asyncio.sleep(1)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+                return "slow"
+            return "fast"
+
+    monkeypatch.setattr(text, "llm_text", SlowPrimary())
+
+    async def main():
+        out = await text._chat_async([{"role": "user", "content": "x"}])
+        await asyncio.sleep(0)
+        return out
+
+    assert asyncio.run(main()) == "fast"
+    assert cancelled == [True]
+    assert text.hedge_stats()["hedge_wins"] == 1
+
+
+def test_generate_sentence_stream_stops_at_first_sentence(monkeypatch):
+    monkeypatch.setattr(text, "settings", SimpleNamespace(TEXT_STREAM_ENABLED=True))
+    answers = iter(
+        [
+            ["Die Katze ", "schläft.", " Erklärung: ", "..."],
+            ["Der Hund ", "schläft im Garten.", "\nHinweis", "..."],
+        ]
+    )
+    read = []
+
+    class Streaming:
+        def chat(self, messages):
+            raise AssertionError("not streamed")
+
+        def chat_stream(self, messages):
+            chunks = next(answers)
+            for i, chunk in enumerate(chunks):
+                read.append(i)
+                yield chunk
+
+    monkeypatch.setattr(text, "llm_text", Streaming())
+    assert text.generate_sentence("Hund") == "Der Hund schläft im Garten."
+    # без целевого слова — сразу повтор; пояснения после предложения не читаются
+    assert read == [0, 1, 2, 0, 1, 2]
+
+
+def test_first_sentence_skips_ordinals_and_abbreviations():
+    assert text._first_sentence("Am 3. Mai gehen wir. Dann") == "Am 3. Mai gehen wir."
+    assert text._first_sentence("Ich sehe z. B. Hunde. Und") == "Ich sehe z. B. Hunde."
+    assert text._first_sentence("Wir kaufen z.B. Brot. Ja") == "Wir kaufen z.B. Brot."
+    assert text._first_sentence("Dr. Müller kommt. Heute") == "Dr. Müller kommt."
+    assert text._first_sentence("Er kommt ca. 5 Minuten später. Dann") == (
+        "Er kommt ca. 5 Minuten später."
+    )
+    # конец ещё не пришёл — ждём следующий фрагмент
+    assert text._first_sentence("Am 3. Mai") is None
+    assert text._first_sentence("Am 3. Mai", final=True) == "Am 3. Mai"
@@ -33,3 +33,77 @@ def test_idempotent(tmp_path):
     count = conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
     conn.close()
     assert count == 1
+
+
+def test_ttl_expires(tmp_path, monkeypatch):
+    import time
+
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = TextCache(tmp_path / "cache.sqlite", ttl=60)
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+
+    now[0] += 61
+    assert cache.get("k") is None
+    assert TextCache(tmp_path / "cache.sqlite", ttl=60).get("k") is None
+
+
+def test_lru_eviction_and_stats(tmp_path, monkeypatch):
+    import time
+
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = TextCache(tmp_path / "cache.sqlite", max_entries=2, l1_size=1)
+
+    cache.set("a", "aaa")
+    now[0] += 1
+    cache.set("b", "bb")
+    now[0] += 1
+    assert cache.get("a") == "aaa"  # L2 hit, refreshes "a"
+    now[0] += 1
+    cache.set("c", "c")  # evicts least recently used "b"
+
+    fresh = TextCache(tmp_path / "cache.sqlite")
+    assert fresh.get("b") is None
+    assert fresh.get("a") == "aaa"
+
+    stats = cache.stats()
+    assert stats["l2_hits"] == 1
+    assert stats["bytes_saved"] == 3
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    assert cache.get("c") == "c"
+    assert cache.stats()["l1_hits"] == 1
+
+
+def test_l1_hits_keep_rows_from_eviction_and_lookup_counts_one_miss(tmp_path, monkeypatch):
+    import time
+
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = TextCache(tmp_path / "cache.sqlite", max_entries=2, l1_size=2)
+
+    cache.set("a", "aaa")
+    now[0] += 1
+    cache.set("b", "bb")
+    now[0] += 1
+    assert cache.get("a") == "aaa"  # из L1, SQLite не трогается
+    now[0] += 1
+    cache.set("c", "c")  # вытесняет "b", а не горячий "a"
+
+    fresh = TextCache(tmp_path / "cache.sqlite")
+    assert fresh.get("b") is None
+    assert fresh.get("a") == "aaa"
+
+    assert cache.get_first(["x", "y", "c"]) == "c"
+    assert cache.get_first(["x", "y", "z"]) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_make_key_is_content_addressed():
+    from app.cache.text_cache import make_key
+
+    msgs = [{"role": "user", "content": "Hund"}]
+    assert make_key("m", "sys", msgs, {"t": 1}) == make_key("m", "sys", list(msgs), {"t": 1})
+    assert make_key("m", "sys", msgs) != make_key("other", "sys", msgs)
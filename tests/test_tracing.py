@@ -0,0 +1,73 @@
+import asyncio
+import json
+import logging
+from types import SimpleNamespace
+
+from app.logging import ContextFilter
+from app.net import http
+from app.net.http import request_json
+from app.orchestration.dag import Stage, run_graph
+from app.telemetry import metrics, tracing
+from app.telemetry.tracing import JsonlSpanExporter, current_ids, span
+
+
+def read_spans(path):
+    out = []
+    for line in path.read_text().splitlines():
+        out.extend(json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"])
+    return out
+
+
+def test_spans_follow_dag_threads_into_http(tmp_path, monkeypatch):
+    path = tmp_path / "spans.jsonl"
+    exporter = JsonlSpanExporter(path)
+    monkeypatch.setattr(tracing, "_exporter", exporter)
+    seen = []
+
+    def fake_request(method, url, json=None, headers=None, timeout=None):
+        record = logging.LogRecord("t", logging.INFO, __file__, 1, "x", None, None)
+        ContextFilter().filter(record)
+        seen.append((record.trace_id, record.run_id))
+        return SimpleNamespace(status_code=200, raise_for_status=lambda: None, json=lambda: {})
+
+    monkeypatch.setattr(http, "get_session", lambda url: SimpleNamespace(request=fake_request))
+    stages = [
+        Stage("a", lambda r: request_json("GET", "http://a.example/x")),
+        Stage("b", lambda r: request_json("GET", "http://b.example/x")),
+    ]
+    with span("card", run_id="r1") as root:
+        run_graph(stages)
+
+    assert seen == [(root.trace_id, "r1"), (root.trace_id, "r1")]
+    assert current_ids() == ("-", "-", "-")
+    exporter.flush()
+    spans = read_spans(path)
+    by_id = {s["spanId"]: s for s in spans}
+    assert {s["traceId"] for s in spans} == {root.trace_id}
+    provider_a = {"key": "provider", "value": {"stringValue": "a.example"}}
+    http_a = next(s for s in spans if s["name"] == "net.http" and provider_a in s["attributes"])
+    stage = by_id[http_a["parentSpanId"]]
+    assert stage["name"] == "dag.a"
+    assert by_id[stage["parentSpanId"]]["name"] == "card"
+    assert "parentSpanId" not in by_id[stage["parentSpanId"]]
+
+
+def test_asyncio_tasks_inherit_span_and_metrics_keep_slowest_trace(monkeypatch):
+    monkeypatch.setattr(tracing, "_exporter", None)
+    hist = metrics.Registry(prefix="t_").histogram("lat_ms", "Latency.", window_s=0)
+
+    async def child(delay_ms):
+        hist.observe(delay_ms, step="x")
+        return current_ids()[0]
+
+    async def main():
+        with span("a") as a:
+            first = await asyncio.gather(child(10), child(20))
+        with span("b") as b:
+            second = await asyncio.gather(child(500))
+        return a, b, first, second
+
+    a, b, first, second = asyncio.run(main())
+    assert first == [a.trace_id, a.trace_id]
+    assert second == [b.trace_id]
+    assert hist.snapshot()["step=x"]["slowest_trace"] == b.trace_id